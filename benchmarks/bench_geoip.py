@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# benchmarks/bench_geoip.py
+"""
+Compares offline GeoIP lookups (local memory-mapped MaxMind DB) with online lookups
+against GEO_IP_SERVICE.
+
+    python benchmarks/bench_geoip.py                          # synthetic DB, 1 online lookup
+    python benchmarks/bench_geoip.py --db ~/GeoLite2-City.mmdb --ip 8.8.8.8
+    python benchmarks/bench_geoip.py --online 0               # offline only (air-gapped)
+
+Online lookups bypass the GeoIP cache and are kept few on purpose: ip-api.com's free
+tier is rate limited and each call sends the IP to a third party.
+"""
+import argparse
+import ipaddress
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from guardian_spy import mmdb_reader, network_checker # noqa: E402
+from benchmarks.mmdb_fixture import build_mmdb, synthetic_city_networks # noqa: E402
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def _report(label, samples_s):
+    us = [s * 1_000_000 for s in samples_s]
+    print(f"{label:<28} n={len(us):<7} mean={statistics.mean(us):>11.1f}us  p50={_percentile(us, 50):>11.1f}us  "
+          f"p99={_percentile(us, 99):>11.1f}us")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="MaxMind DB file to use (default: build a synthetic one)")
+    parser.add_argument("--networks", type=int, default=50_000, help="Networks in the synthetic DB (default: 50000)")
+    parser.add_argument("--lookups", type=int, default=20_000, help="Offline lookups to time (default: 20000)")
+    parser.add_argument("--online", type=int, default=1, help="Online lookups to time (default: 1, 0 to skip)")
+    parser.add_argument("--ip", help="IP used for the online lookups (default: a public resolver IP)")
+    args = parser.parse_args(argv)
+
+    tmp_path = None
+    db_path = args.db
+    if not db_path:
+        fd, tmp_path = tempfile.mkstemp(suffix=".mmdb"); os.close(fd)
+        started = time.perf_counter()
+        networks = synthetic_city_networks(args.networks)
+        with open(tmp_path, "wb") as f: f.write(build_mmdb(networks))
+        print(f"Built synthetic DB with {args.networks} networks in {time.perf_counter() - started:.2f}s: {tmp_path}")
+        db_path = tmp_path
+        sample_ips = [str(ipaddress.ip_network(cidr)[random.randrange(1, 255)]) for cidr, _ in random.sample(networks, min(1000, len(networks)))]
+    else:
+        sample_ips = [str(ipaddress.IPv4Address(random.getrandbits(32))) for _ in range(1000)]
+
+    try:
+        started = time.perf_counter()
+        reader = mmdb_reader.MMDBReader(db_path)
+        print(f"Opened {reader.metadata.get('database_type')} (record size {reader.record_size}, "
+              f"{reader.node_count} nodes) in {(time.perf_counter() - started) * 1000:.2f}ms")
+
+        cold, warm, found = [], [], 0
+        for ip in sample_ips: # Primera pasada: registros sin decodificar todavía
+            t0 = time.perf_counter(); record = reader.lookup(ip); cold.append(time.perf_counter() - t0)
+            found += record is not None
+        for i in range(args.lookups):
+            ip = sample_ips[i % len(sample_ips)]
+            t0 = time.perf_counter(); reader.lookup(ip); warm.append(time.perf_counter() - t0)
+        print(f"Offline: {found}/{len(sample_ips)} sample IPs found")
+        _report("offline lookup (cold)", cold)
+        _report("offline lookup (warm)", warm)
+
+        if args.online > 0:
+            online_ip = args.ip or "1.1.1.1"
+            online, errors = [], []
+            for _ in range(args.online):
+                t0 = time.perf_counter()
+                geo_info, error = network_checker._fetch_geo_info_remote(online_ip)
+                online.append(time.perf_counter() - t0)
+                if error: errors.append(error)
+            _report("online lookup (ip-api)", online)
+            if errors: print(f"  online errors (timings include the failure): {errors[:3]}")
+            else: print(f"Offline warm lookups are ~{statistics.mean(online) / statistics.mean(warm):,.0f}x faster than online.")
+        reader.close()
+    finally:
+        if tmp_path and os.path.exists(tmp_path): os.remove(tmp_path)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
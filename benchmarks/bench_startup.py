@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# benchmarks/bench_startup.py
+"""
+Measures Guardian Spy start-up latency from a fresh interpreter (wall clock, as the user
+sees it) and checks time-to-prompt against the 'startup_budget_ms' budget.
+
+    python benchmarks/bench_startup.py              # 10 runs of each case
+    python benchmarks/bench_startup.py --runs 30 --budget-ms 300
+
+Cases: '--version' and '--help' (fast path, must not load rich/requests) and the
+interactive start up to the first 'GuardianSpy >' prompt. Each run uses a throw-away
+HOME and a stub 'firefox' on PATH, so results do not depend on installed browsers or
+existing settings. Exits with status 1 if the median time-to-prompt exceeds the budget.
+"""
+import argparse
+import os
+import select
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from guardian_spy.config_manager import DEFAULT_SETTINGS # noqa: E402
+
+ENTRY_POINT = os.path.join(ROOT, "guardian_spy.py")
+PROMPT_MARKER = b"GuardianSpy >"
+
+def _environment(home_dir, bin_dir):
+    env = dict(os.environ, HOME=home_dir, PATH=bin_dir + os.pathsep + os.environ.get("PATH", ""))
+    env.pop("GUARDIAN_SPY_DEBUG", None)
+    return env
+
+def _time_exit(args, env):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, ENTRY_POINT, *args], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - started
+
+def _time_to_prompt(env, timeout=30.0):
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, ENTRY_POINT], env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = b""
+    try:
+        while PROMPT_MARKER not in output:
+            remaining = started + timeout - time.perf_counter()
+            if remaining <= 0 or process.poll() is not None:
+                raise RuntimeError(f"No prompt within {timeout:.0f}s. Output tail: {output[-300:]!r}")
+            ready, _, _ = select.select([process.stdout], [], [], remaining)
+            if ready: output += os.read(process.stdout.fileno(), 65536)
+        elapsed = time.perf_counter() - started
+        process.stdin.write(b"quit\ny\n"); process.stdin.flush()
+        process.wait(timeout=10)
+        return elapsed
+    finally:
+        if process.poll() is None: process.kill()
+
+def _report(label, samples):
+    ms = sorted(s * 1000 for s in samples)
+    print(f"{label:<18} n={len(ms):<4} median={statistics.median(ms):>7.1f}ms  min={ms[0]:>7.1f}ms  max={ms[-1]:>7.1f}ms")
+    return statistics.median(ms)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="Runs per case (default: 10)")
+    parser.add_argument("--budget-ms", type=float, default=float(DEFAULT_SETTINGS["startup_budget_ms"]),
+                        help="Time-to-prompt budget (default: the 'startup_budget_ms' default)")
+    args = parser.parse_args(argv)
+    if not hasattr(select, "select") or os.name == "nt":
+        print("Time-to-prompt measurement needs select() on pipes (POSIX only)."); return 2
+
+    work_dir = tempfile.mkdtemp(prefix="gs-bench-startup-")
+    try:
+        home_dir = os.path.join(work_dir, "home"); bin_dir = os.path.join(work_dir, "bin")
+        os.makedirs(home_dir); os.makedirs(bin_dir)
+        stub = os.path.join(bin_dir, "firefox") # Solo tiene que existir en PATH: nunca se lanza
+        with open(stub, "w") as f: f.write("#!/bin/sh\nexit 0\n")
+        os.chmod(stub, 0o755)
+        env = _environment(home_dir, bin_dir)
+
+        _time_to_prompt(env) # Calentamiento: .pyc y caché de disco
+        _report("--version", [_time_exit(["--version"], env) for _ in range(args.runs)])
+        _report("--help", [_time_exit(["--help"], env) for _ in range(args.runs)])
+        median_ms = _report("time-to-prompt", [_time_to_prompt(env) for _ in range(args.runs)])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if median_ms > args.budget_ms:
+        print(f"FAIL: median time-to-prompt {median_ms:.1f}ms exceeds the {args.budget_ms:.0f}ms budget")
+        return 1
+    print(f"OK: median time-to-prompt {median_ms:.1f}ms is within the {args.budget_ms:.0f}ms budget")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
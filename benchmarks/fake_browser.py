@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# benchmarks/fake_browser.py
+"""
+Stand-in for Firefox / Chrome / Chromium used by the load-test harness. It accepts the
+command lines launch_browser_with_profile() builds ('-profile PATH' or '--user-data-dir=PATH')
+and behaves like a small browser session:
+
+- writes the files a real profile gets (prefs, SQLite databases and their -wal files,
+  cache entries, crash-recovery data) and the lock files (Firefox 'lock'/'.parentlock',
+  Chrome 'SingletonLock'/'SingletonSocket'/'SingletonCookie');
+- starts child processes (content/GPU processes) that keep files in the profile open
+  and keep writing to them;
+- on a clean exit removes its lock files and exits with the configured status; on a
+  simulated crash it leaves them behind, like a real crash.
+
+Behaviour comes from environment variables (launch_browser_with_profile passes its environment on to the browser):
+
+    GS_FAKE_BROWSER_LIFETIME     seconds the session stays open (default 0.2)
+    GS_FAKE_BROWSER_CHILDREN     child processes to start (default 2)
+    GS_FAKE_BROWSER_CHILD_LINGER seconds children outlive the parent, holding files open (default 0)
+    GS_FAKE_BROWSER_FILES        cache entries written (default 40)
+    GS_FAKE_BROWSER_EXIT_CODE    status of a clean exit (default 0)
+    GS_FAKE_BROWSER_CRASH_RATE   probability of a crash: no cleanup, exit status 134 (default 0)
+
+install() writes small wrapper executables ('firefox', 'google-chrome', 'chromium') that run this
+script, for the 'browser_executables' setting or for PATH.
+"""
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+CRASH_EXIT_CODE = 134 # Lo que devuelve un navegador abortado (SIGABRT)
+WRAPPER_NAMES = {"firefox": "firefox", "chrome": "google-chrome", "chromium": "chromium"}
+
+def _env_float(name: str, default: float) -> float:
+    try: return float(os.environ.get(name, default))
+    except ValueError: return default
+
+def _write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f: f.write(data)
+
+def _lock_target() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def _write_firefox_profile(profile: str, files: int) -> List[str]:
+    _write(os.path.join(profile, "prefs.js"), b'user_pref("browser.startup.homepage_override.mstone", "ignore");\n')
+    _write(os.path.join(profile, "times.json"), json.dumps({"created": int(time.time() * 1000)}).encode())
+    for db in ("places.sqlite", "cookies.sqlite", "favicons.sqlite", "webappsstore.sqlite"):
+        _write(os.path.join(profile, db), b"SQLite format 3\x00" + os.urandom(4096))
+        _write(os.path.join(profile, db + "-wal"), os.urandom(1024))
+    for i in range(files):
+        _write(os.path.join(profile, "cache2", "entries", f"{random.getrandbits(160):040X}"), os.urandom(random.randint(512, 16384)))
+    _write(os.path.join(profile, ".parentlock"), b"")
+    locks = [os.path.join(profile, ".parentlock")]
+    if hasattr(os, "symlink"):
+        try: os.symlink(f"127.0.0.1:+{os.getpid()}", os.path.join(profile, "lock")); locks.append(os.path.join(profile, "lock"))
+        except OSError: pass
+    return locks
+
+def _write_chrome_profile(profile: str, files: int) -> List[str]:
+    _write(os.path.join(profile, "Local State"), json.dumps({"profile": {"last_used": "Default"}}).encode())
+    default = os.path.join(profile, "Default")
+    _write(os.path.join(default, "Preferences"), json.dumps({"browser": {"has_seen_welcome_page": True}}).encode())
+    for db in ("History", "Cookies", "Web Data", "Login Data"):
+        _write(os.path.join(default, db), b"SQLite format 3\x00" + os.urandom(4096))
+        _write(os.path.join(default, db + "-journal"), b"")
+    for i in range(files):
+        _write(os.path.join(default, "Cache", "Cache_Data", f"f_{i:06x}"), os.urandom(random.randint(512, 16384)))
+    locks = []
+    for name in ("SingletonLock", "SingletonCookie", "SingletonSocket"):
+        path = os.path.join(profile, name)
+        try:
+            if hasattr(os, "symlink"): os.symlink(_lock_target() if name == "SingletonLock" else str(random.getrandbits(63)), path)
+            else: _write(path, b"")
+            locks.append(path)
+        except OSError: pass
+    return locks
+
+def _parse_profile(argv: List[str]):
+    for i, arg in enumerate(argv):
+        if arg == "-profile" and i + 1 < len(argv): return "firefox", argv[i + 1]
+        if arg.startswith("--user-data-dir="): return "chrome", arg.split("=", 1)[1]
+    return None, None
+
+def _run_child(profile: str, lifetime: float) -> int:
+    # Proceso hijo: mantiene abierto un archivo del perfil y escribe en él hasta agotar su tiempo
+    deadline = time.monotonic() + lifetime
+    path = os.path.join(profile, f"child-{os.getpid()}.tmp")
+    try:
+        with open(path, "ab") as handle:
+            while time.monotonic() < deadline:
+                handle.write(os.urandom(256)); handle.flush()
+                time.sleep(min(0.05, max(0.0, deadline - time.monotonic())))
+    except OSError: pass # El perfil ya se borró: un hijo real también acabaría con error
+    return 0
+
+def main(argv: List[str]) -> int:
+    if argv[:1] == ["--child"]: return _run_child(argv[1], float(argv[2]))
+    flavour, profile = _parse_profile(argv)
+    if not profile:
+        print(f"fake_browser: no profile in arguments {argv}", file=sys.stderr); return 2
+    lifetime = _env_float("GS_FAKE_BROWSER_LIFETIME", 0.2)
+    linger = _env_float("GS_FAKE_BROWSER_CHILD_LINGER", 0.0)
+    crashed = random.random() < _env_float("GS_FAKE_BROWSER_CRASH_RATE", 0.0)
+
+    os.makedirs(profile, exist_ok=True)
+    files = int(_env_float("GS_FAKE_BROWSER_FILES", 40))
+    locks = _write_firefox_profile(profile, files) if flavour == "firefox" else _write_chrome_profile(profile, files)
+    children = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", profile, str(lifetime + linger)],
+                                 stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                for _ in range(int(_env_float("GS_FAKE_BROWSER_CHILDREN", 2)))]
+    session_file = os.path.join(profile, "sessionstore-backups", "recovery.jsonlz4") if flavour == "firefox" else os.path.join(profile, "Default", "Current Session")
+    with open(os.path.join(profile, "fake-browser.log"), "a") as handle: # Abierto durante toda la sesión, como los logs reales
+        handle.write(f"pid={os.getpid()} flavour={flavour} children={[c.pid for c in children]}\n"); handle.flush()
+        time.sleep(lifetime)
+        if crashed: return CRASH_EXIT_CODE
+        _write(session_file, os.urandom(2048))
+    for path in locks:
+        try: os.remove(path)
+        except OSError: pass
+    if not linger:
+        for child in children: child.wait()
+    return int(_env_float("GS_FAKE_BROWSER_EXIT_CODE", 0))
+
+def install(bin_dir: str, python: str = sys.executable) -> Dict[str, str]:
+    """Writes one wrapper executable per browser type into bin_dir. Returns {browser_type: path}."""
+    os.makedirs(bin_dir, exist_ok=True)
+    script = os.path.abspath(__file__)
+    paths = {}
+    for browser_type, name in WRAPPER_NAMES.items():
+        if os.name == "nt":
+            path = os.path.join(bin_dir, name + ".cmd")
+            with open(path, "w") as f: f.write(f'@"{python}" "{script}" %*\n')
+        else:
+            path = os.path.join(bin_dir, name)
+            with open(path, "w") as f: f.write(f'#!/bin/sh\nexec "{python}" "{script}" "$@"\n')
+            os.chmod(path, 0o755)
+        paths[browser_type] = path
+    return paths
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# benchmarks/fake_ip_services.py
+"""
+Local stand-ins for ipify, icanhazip and ip-api, with injectable latency and failures,
+so network checks can run under load with no network access.
+
+    python benchmarks/fake_ip_services.py --port 8765 --latency-ms 80 --jitter-ms 40 --failure-rate 0.1
+
+prints the settings ('ip_providers', 'geoip_remote_url', 'http_pool_sizes') to put in settings.json
+and serves until interrupted. From Python:
+
+    with FakeIPServices(latency_ms=50) as services:
+        services.configure("icanhazip", failure_rate=1.0, failure_mode="hang")
+        settings.update(services.settings())
+
+Endpoints (one HTTP/1.1 keep-alive server): /ipify?format=json, /icanhazip and /ip-api/json/<ip>.
+Failure modes: "error" (HTTP 503), "drop" (connection closed without a response),
+"hang" (no answer for 'hang_seconds', so the client times out) and "garbage" (a 200 with a body that is not an IP or JSON).
+"""
+import argparse
+import json
+import random
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+SERVICES = ("ipify", "icanhazip", "ip-api")
+FAILURE_MODES = ("error", "drop", "hang", "garbage")
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, como los servicios reales detrás del pool de requests
+
+    def log_message(self, format, *args): pass # Sin ruido en stderr
+
+    def do_GET(self):
+        services: "FakeIPServices" = self.server.services
+        path = self.path.split("?", 1)[0]
+        if path == "/ipify": service = "ipify"
+        elif path == "/icanhazip": service = "icanhazip"
+        elif path.startswith("/ip-api/json/"): service = "ip-api"
+        else: return self._send(404, b"not found", "text/plain")
+        behaviour = services.behaviour(service)
+        delay = max(0.0, behaviour["latency_ms"] + random.uniform(-1, 1) * behaviour["jitter_ms"]) / 1000
+        if delay: time.sleep(delay)
+        failure = behaviour["failure_mode"] if random.random() < behaviour["failure_rate"] else None
+        services._count(service, failure)
+        if failure == "drop":
+            self.close_connection = True
+            try: self.connection.shutdown(socket.SHUT_RDWR)
+            except OSError: pass
+            return
+        if failure == "hang":
+            time.sleep(behaviour["hang_seconds"]); self.close_connection = True
+            return
+        if failure == "error": return self._send(503, b"Service Unavailable", "text/plain")
+        if failure == "garbage": return self._send(200, b"<html>captive portal</html>", "text/html")
+        ip = behaviour["ip"]
+        if service == "ipify": self._send(200, json.dumps({"ip": ip}).encode(), "application/json")
+        elif service == "icanhazip": self._send(200, f"{ip}\n".encode(), "text/plain")
+        else:
+            query = path.rsplit("/", 1)[1] or ip
+            self._send(200, json.dumps({"status": "success", "country": "Testland", "regionName": "Loopback", "city": "Localhost",
+                                        "isp": "Fake ISP", "org": "Guardian Spy harness", "query": query}).encode(), "application/json")
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class FakeIPServices:
+    """Threaded local HTTP server answering like ipify, icanhazip and ip-api. Behaviour can be changed while running."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, ip: str = "203.0.113.7", latency_ms: float = 0.0,
+                 jitter_ms: float = 0.0, failure_rate: float = 0.0, failure_mode: str = "error", hang_seconds: float = 30.0):
+        if failure_mode not in FAILURE_MODES: raise ValueError(f"failure_mode must be one of {FAILURE_MODES}")
+        defaults = {"ip": ip, "latency_ms": latency_ms, "jitter_ms": jitter_ms, "failure_rate": failure_rate,
+                    "failure_mode": failure_mode, "hang_seconds": hang_seconds}
+        self._behaviour = {service: dict(defaults) for service in SERVICES}
+        self._stats = {service: {"requests": 0, "failures": 0} for service in SERVICES}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.services = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def configure(self, service: Optional[str] = None, **behaviour):
+        """Changes latency_ms, jitter_ms, failure_rate, failure_mode, hang_seconds or ip of one service (or of all)."""
+        unknown = set(behaviour) - set(self._behaviour["ipify"])
+        if unknown: raise ValueError(f"Unknown behaviour keys: {sorted(unknown)}")
+        with self._lock:
+            for name in ([service] if service else SERVICES): self._behaviour[name].update(behaviour)
+
+    def behaviour(self, service: str) -> Dict:
+        with self._lock: return dict(self._behaviour[service])
+
+    def _count(self, service: str, failure: Optional[str]):
+        with self._lock:
+            self._stats[service]["requests"] += 1
+            if failure: self._stats[service]["failures"] += 1
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock: return {name: dict(values) for name, values in self._stats.items()}
+
+    def settings(self) -> Dict:
+        """Settings that point Guardian Spy at these stand-ins instead of the real services."""
+        return {"ip_providers": [{"name": "ipify", "url": f"{self.base_url}/ipify?format=json", "format": "json", "json_key": "ip"},
+                                 {"name": "icanhazip", "url": f"{self.base_url}/icanhazip", "format": "text"}],
+                "geoip_remote_url": f"{self.base_url}/ip-api/json/",
+                "http_pool_sizes": {self.base_url: 16}}
+
+    def start(self) -> "FakeIPServices":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ip-services", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown(); self._server.server_close()
+
+    def __enter__(self): return self.start()
+    def __exit__(self, *exc): self.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ip", default="203.0.113.7", help="Public IP the services report (default: a TEST-NET-3 address)")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability (0-1) of a failed request")
+    parser.add_argument("--failure-mode", choices=FAILURE_MODES, default="error")
+    args = parser.parse_args(argv)
+    services = FakeIPServices(args.host, args.port, args.ip, args.latency_ms, args.jitter_ms, args.failure_rate, args.failure_mode)
+    print(json.dumps(services.settings(), indent=4))
+    print(f"Serving on {services.base_url} (Ctrl+C to stop)", file=sys.stderr)
+    try: services._server.serve_forever()
+    except KeyboardInterrupt: pass
+    finally: services._server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# benchmarks/load_sessions.py
+"""
+End-to-end load test of the session pipeline with fake browsers and fake IP services.
+No real browser and no network access are used.
+
+    python benchmarks/load_sessions.py                                   # 200 sessions, 16 at a time
+    python benchmarks/load_sessions.py --sessions 500 --concurrency 50 --latency-ms 80 --failure-rate 0.2
+    python benchmarks/load_sessions.py --crash-rate 0.1 --child-linger 0.5 --failure-mode hang
+
+Each session runs the network checks against the local stand-ins and then calls
+create_profile(), launch_browser_with_profile() (the benchmarks/fake_browser.py
+executables, set through the 'browser_executables' setting), waits for the browser to exit, and calls
+remove_profile(). Everything happens in a throw-away config dir and TMPDIR.
+
+Reports outcomes, browser exit statuses, leftover profile directories and the timing
+span percentiles. Exits with status 1 if any profile could not be created, launched or removed.
+Injected network failures are counted but do not fail the run unless --strict-network is given.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import fake_browser # noqa: E402
+from benchmarks.fake_ip_services import FAILURE_MODES, FakeIPServices # noqa: E402
+
+REPORTED_SPANS = ("check.network", "net.ip_race", "net.ip_provider", "net.geoip_remote", "profile.create",
+                  "bookmarks.write", "browser.process_start", "profile.cleanup")
+
+def _run_session(index: int, args, services_ip: str) -> dict:
+    from guardian_spy import browser_manager, network_checker
+    browser = args.browsers[index % len(args.browsers)]
+    outcome = {"browser": browser, "network": None, "stage": None, "exit_code": None}
+    if not args.no_network:
+        results = network_checker.run_network_checks_concurrently(timeout=args.network_timeout)
+        ip_result, geo_result = results[network_checker.CHECK_IP], results[network_checker.CHECK_GEO]
+        if ip_result["status"] != "ok" or ip_result["value"] != services_ip: outcome["network"] = f"ip {ip_result['status']}"
+        else: outcome["network"] = "ok" if geo_result["status"] == "ok" else f"geo {geo_result['status']}"
+    profile_path = browser_manager.create_profile(browser, bookmark_set_identifier=args.bookmarks)
+    if not profile_path: outcome["stage"] = "create"; return outcome
+    process = browser_manager.launch_browser_with_profile(browser, profile_path)
+    if process is None:
+        outcome["stage"] = "launch"; browser_manager.remove_profile(profile_path); return outcome
+    outcome["exit_code"] = process.wait(timeout=args.lifetime + 60)
+    if not browser_manager.remove_profile(profile_path) or os.path.exists(profile_path): outcome["stage"] = "remove"
+    return outcome
+
+def _write_settings(config_dir: str, settings: dict):
+    os.makedirs(config_dir, exist_ok=True)
+    with open(os.path.join(config_dir, "settings.json"), "w", encoding="utf-8") as f: json.dump(settings, f, indent=4)
+
+def _fmt_ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.1f}ms"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--browsers", default="firefox,chrome,chromium", help="Comma-separated browser types, used round-robin")
+    parser.add_argument("--bookmarks", default="__GENERAL__", help="Bookmark set identifier for create_profile ('none' for no bookmarks)")
+    fb = parser.add_argument_group("fake browser")
+    fb.add_argument("--lifetime", type=float, default=0.2, help="Seconds each browser session stays open")
+    fb.add_argument("--children", type=int, default=2, help="Child processes per browser")
+    fb.add_argument("--child-linger", type=float, default=0.0, help="Seconds children outlive the browser, holding files open")
+    fb.add_argument("--files", type=int, default=40, help="Cache entries written per profile")
+    fb.add_argument("--exit-code", type=int, default=0, help="Exit status of a clean browser exit")
+    fb.add_argument("--crash-rate", type=float, default=0.0, help="Probability (0-1) that a browser crashes")
+    net = parser.add_argument_group("fake IP services")
+    net.add_argument("--no-network", action="store_true", help="Skip the network checks")
+    net.add_argument("--latency-ms", type=float, default=20.0)
+    net.add_argument("--jitter-ms", type=float, default=10.0)
+    net.add_argument("--failure-rate", type=float, default=0.0)
+    net.add_argument("--failure-mode", choices=FAILURE_MODES, default="error")
+    net.add_argument("--network-timeout", type=float, default=5.0, help="Budget of each network check (seconds)")
+    net.add_argument("--strict-network", action="store_true", help="Fail the run if any network check fails")
+    parser.add_argument("--keep", action="store_true", help="Keep the work directory for inspection")
+    args = parser.parse_args(argv)
+    args.browsers = [b.strip() for b in args.browsers.split(",") if b.strip()]
+    if args.bookmarks.lower() == "none": args.bookmarks = None
+
+    work_dir = tempfile.mkdtemp(prefix="gs-load-")
+    config_dir = os.path.join(work_dir, "config"); tmp_dir = os.path.join(work_dir, "tmp"); os.makedirs(tmp_dir)
+    os.environ.update({"GUARDIAN_SPY_CONFIG_DIR": config_dir, "TMPDIR": tmp_dir,
+                       "GS_FAKE_BROWSER_LIFETIME": str(args.lifetime), "GS_FAKE_BROWSER_CHILDREN": str(args.children),
+                       "GS_FAKE_BROWSER_CHILD_LINGER": str(args.child_linger), "GS_FAKE_BROWSER_FILES": str(args.files),
+                       "GS_FAKE_BROWSER_EXIT_CODE": str(args.exit_code), "GS_FAKE_BROWSER_CRASH_RATE": str(args.crash_rate)})
+    tempfile.tempdir = None # Que tempfile relea TMPDIR
+    services = FakeIPServices(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, failure_rate=args.failure_rate,
+                              failure_mode=args.failure_mode, hang_seconds=args.network_timeout + 1).start()
+    try:
+        settings = {"browser_executables": fake_browser.install(os.path.join(work_dir, "bin")),
+                    "geoip_cache_ttl": 0, "geoip_negative_ttl": 0, # Cada sesión llega de verdad al ip-api falso
+                    "history_enabled": False, "leak_monitor_enabled": False}
+        settings.update(services.settings())
+        _write_settings(config_dir, settings)
+
+        from guardian_spy import timing
+        print(f"{args.sessions} sessions, {args.concurrency} concurrent, browsers: {', '.join(args.browsers)}; work dir: {work_dir}")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            outcomes = list(pool.map(lambda i: _run_session(i, args, services.behaviour("ipify")["ip"]), range(args.sessions)))
+        elapsed = time.perf_counter() - started
+    finally:
+        services.stop()
+
+    failed = Counter(o["stage"] for o in outcomes if o["stage"])
+    network = Counter(o["network"] for o in outcomes if o["network"])
+    exit_codes = Counter(o["exit_code"] for o in outcomes if o["exit_code"] is not None)
+    profiles_root = os.path.join(tmp_dir, "guardian_spy_browser_profiles")
+    leftovers = os.listdir(profiles_root) if os.path.isdir(profiles_root) else []
+
+    print(f"\nFinished in {elapsed:.2f}s ({args.sessions / elapsed:.1f} sessions/s)")
+    print(f"Sessions ok: {args.sessions - sum(failed.values())}  failed: {dict(failed) or 0}")
+    print(f"Browser exit statuses: {dict(exit_codes)}")
+    if not args.no_network:
+        print(f"Network checks: {dict(network)}  fake services: {services.stats()}")
+    print(f"Leftover profile directories: {len(leftovers)}")
+    print(f"\n{'span':<24} {'count':>6} {'p50':>10} {'p95':>10} {'p99':>10} {'max':>10}")
+    for name, s in timing.get_stats().items():
+        if name in REPORTED_SPANS:
+            print(f"{name:<24} {s['count']:>6} {_fmt_ms(s['p50']):>10} {_fmt_ms(s['p95']):>10} {_fmt_ms(s['p99']):>10} {_fmt_ms(s['max']):>10}")
+
+    if args.keep: print(f"\nWork directory kept: {work_dir}")
+    else: shutil.rmtree(work_dir, ignore_errors=True)
+    network_failed = args.strict_network and sum(n for status, n in network.items() if status != "ok")
+    return 1 if failed or leftovers or network_failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+# benchmarks/mmdb_fixture.py
+"""
+Tiny MaxMind DB writer used to build synthetic GeoIP databases for benchmarks,
+so they can run without downloading GeoLite2 / DB-IP files.
+Only supports what the fixtures need: IPv4 trees, 24/28/32-bit records, and
+maps, strings, arrays, uints and doubles in the data section.
+"""
+import ipaddress
+import random
+import struct
+from typing import Dict, List, Tuple
+
+from guardian_spy.mmdb_reader import METADATA_MARKER
+
+def _encode_control(type_num: int, size: int) -> bytes:
+    if size < 29: size_bits, size_extra = size, b""
+    elif size < 285: size_bits, size_extra = 29, bytes([size - 29])
+    elif size < 65821: size_bits, size_extra = 30, (size - 285).to_bytes(2, "big")
+    else: size_bits, size_extra = 31, (size - 65821).to_bytes(3, "big")
+    if type_num <= 7: return bytes([(type_num << 5) | size_bits]) + size_extra
+    return bytes([size_bits, type_num - 7]) + size_extra
+
+def encode_value(value) -> bytes:
+    if isinstance(value, str):
+        raw = value.encode("utf-8"); return _encode_control(2, len(raw)) + raw
+    if isinstance(value, bool): return _encode_control(14, int(value))
+    if isinstance(value, float): return _encode_control(3, 8) + struct.pack(">d", value)
+    if isinstance(value, int):
+        if value < 0: raise ValueError("negative ints not supported by the fixture writer")
+        raw = value.to_bytes((value.bit_length() + 7) // 8, "big") if value else b""
+        type_num = 6 if len(raw) <= 4 else 9
+        return _encode_control(type_num, len(raw)) + raw
+    if isinstance(value, dict):
+        out = _encode_control(7, len(value))
+        for key, item in value.items(): out += encode_value(str(key)) + encode_value(item)
+        return out
+    if isinstance(value, list):
+        return _encode_control(11, len(value)) + b"".join(encode_value(item) for item in value)
+    raise TypeError(f"Unsupported type {type(value).__name__}")
+
+def build_mmdb(networks: List[Tuple[str, Dict]], record_size: int = 28, database_type: str = "GS-Fixture-City") -> bytes:
+    """Builds an IPv4 MaxMind DB mapping each CIDR in networks to its record."""
+    nodes: List[List] = [[None, None]] # [izquierda, derecha]: None, ("node", n) o ("data", offset)
+    data_chunks: List[bytes] = []; data_size = 0
+    data_offsets: Dict[bytes, int] = {}
+    for cidr, record in networks:
+        network = ipaddress.ip_network(cidr)
+        encoded = encode_value(record)
+        if encoded not in data_offsets: # Registros iguales se comparten, como en las bases reales
+            data_offsets[encoded] = data_size; data_chunks.append(encoded); data_size += len(encoded)
+        node = 0; bits = int(network.network_address); plen = network.prefixlen
+        for depth in range(plen):
+            bit = (bits >> (31 - depth)) & 1
+            if depth == plen - 1:
+                nodes[node][bit] = ("data", data_offsets[encoded])
+            else:
+                child = nodes[node][bit]
+                if not (child and child[0] == "node"):
+                    nodes.append([None, None]); child = ("node", len(nodes) - 1); nodes[node][bit] = child
+                node = child[1]
+    node_count = len(nodes)
+
+    def _record_value(rec) -> int:
+        if rec is None: return node_count
+        if rec[0] == "node": return rec[1]
+        return node_count + 16 + rec[1]
+
+    tree = bytearray()
+    for left, right in nodes:
+        lv, rv = _record_value(left), _record_value(right)
+        if record_size == 24: tree += lv.to_bytes(3, "big") + rv.to_bytes(3, "big")
+        elif record_size == 28:
+            tree += (lv & 0xFFFFFF).to_bytes(3, "big") + bytes([((lv >> 24) << 4) | (rv >> 24)]) + (rv & 0xFFFFFF).to_bytes(3, "big")
+        else: tree += lv.to_bytes(4, "big") + rv.to_bytes(4, "big")
+    metadata = {
+        "node_count": node_count, "record_size": record_size, "ip_version": 4,
+        "database_type": database_type, "languages": ["en"],
+        "binary_format_major_version": 2, "binary_format_minor_version": 0,
+        "build_epoch": 0, "description": {"en": "Guardian Spy synthetic benchmark database"},
+    }
+    return bytes(tree) + b"\x00" * 16 + b"".join(data_chunks) + METADATA_MARKER + encode_value(metadata)
+
+def synthetic_city_networks(count: int, seed: int = 1234) -> List[Tuple[str, Dict]]:
+    """Returns count random, non-overlapping /24 networks with City-style records."""
+    rng = random.Random(seed)
+    countries = ["Spain", "France", "Germany", "Netherlands", "Sweden", "Iceland", "Canada", "Japan"]
+    seen = set(); networks = []
+    while len(networks) < count:
+        prefix = rng.randrange(1, 223) << 16 | rng.randrange(0, 65536)
+        if prefix in seen: continue
+        seen.add(prefix)
+        country = rng.choice(countries)
+        city = f"City{rng.randrange(50)}"
+        networks.append((f"{ipaddress.IPv4Address(prefix << 8)}/24", {
+            "country": {"iso_code": country[:2].upper(), "names": {"en": country}},
+            "subdivisions": [{"names": {"en": f"{country} Region {rng.randrange(5)}"}}],
+            "city": {"names": {"en": city}},
+            "location": {"latitude": rng.uniform(-80, 80), "longitude": rng.uniform(-170, 170)},
+            "autonomous_system_organization": f"AS-{country}-{rng.randrange(10)}",
+        }))
+    return networks
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# benchmarks/suite.py
+"""
+Start-up and hot-path benchmark suite with JSON baselines and regression thresholds.
+
+    python benchmarks/suite.py run --save benchmarks/baselines/my-laptop.json
+    python benchmarks/suite.py compare benchmarks/baselines/my-laptop.json --threshold 0.25
+    python benchmarks/suite.py run --quick --filter bookmarks.
+    python benchmarks/suite.py list
+
+'compare' re-runs the cases stored in the baseline and exits with status 1 if any
+case's best time ('min', far steadier than the median on a busy machine) is more than
+--threshold (relative) slower than the baseline; both sides are floored at --min-seconds
+so timer noise on microsecond cases does not trip it. Baselines are machine specific: record them on
+the machine you compare on.
+
+Everything runs against a throw-away config dir (GUARDIAN_SPY_CONFIG_DIR), temp dir and
+stub browser executables on PATH, so installed browsers and real profiles are never touched.
+"""
+import argparse
+import fnmatch
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SUITE_VERSION = 1
+BOOKMARK_SIZES = (1_000, 100_000, 1_000_000)
+PROFILE_STORE_SIZES = (10, 1_000, 10_000)
+BROWSERS = ("firefox", "chrome", "chromium")
+BOOKMARK_IDENTIFIERS = (None, "00_opsec_checks.json", "__GENERAL__", "__ALL__")
+# bookmarks_set_name de los perfiles sintéticos: sin bookmarks, varios sets y la carpeta general, como en un profiles.json real
+PROFILE_BOOKMARK_SETS = (None, ["00_opsec_checks.json", "osint_tools.json"], "__GENERAL__")
+
+class Case:
+    """One benchmark. setup() returns the state passed to run(state); teardown(state) cleans up (untimed)."""
+
+    def __init__(self, name: str, run: Callable, setup: Optional[Callable] = None, teardown: Optional[Callable] = None,
+                 quick: bool = True, max_runs: int = 50, self_timed: bool = False):
+        self.name = name; self.run = run; self.setup = setup; self.teardown = teardown
+        self.quick = quick # False = solo en ejecuciones completas (casos de varios segundos)
+        self.max_runs = max_runs
+        self.self_timed = self_timed # run() devuelve su propia duración (p. ej. medida dentro de un subproceso)
+
+def _measure(case: Case, min_time: float) -> Dict:
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < case.max_runs and (len(samples) < 3 or time.perf_counter() - started < min_time):
+        state = case.setup() if case.setup else None
+        try:
+            gc.collect(); gc.disable() # Como timeit: el GC depende de lo que hayan dejado los casos anteriores
+            try:
+                t0 = time.perf_counter(); result = case.run(state); elapsed = time.perf_counter() - t0
+            finally:
+                gc.enable()
+            samples.append(result if case.self_timed else elapsed)
+        finally:
+            if case.teardown: case.teardown(state)
+    return {"median": statistics.median(samples), "min": min(samples), "max": max(samples), "runs": len(samples)}
+
+# --- Entorno aislado ---
+
+class Sandbox:
+    def __init__(self):
+        self.root = tempfile.mkdtemp(prefix="gs-bench-")
+        self.config_dir = os.path.join(self.root, "config")
+        self.bin_dir = os.path.join(self.root, "bin")
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        self.bookmarks_dir = os.path.join(self.root, "bookmarks")
+        for path in (self.config_dir, self.bin_dir, self.tmp_dir, self.bookmarks_dir): os.makedirs(path)
+        for name in ("firefox", "google-chrome", "chromium-browser", "chromium"):
+            stub = os.path.join(self.bin_dir, name)
+            with open(stub, "w") as f: f.write("#!/bin/sh\nexit 0\n")
+            os.chmod(stub, 0o755)
+        self._saved_env = {k: os.environ.get(k) for k in ("GUARDIAN_SPY_CONFIG_DIR", "PATH", "TMPDIR")}
+        os.environ["GUARDIAN_SPY_CONFIG_DIR"] = self.config_dir
+        os.environ["PATH"] = self.bin_dir + os.pathsep + os.environ.get("PATH", "")
+        os.environ["TMPDIR"] = self.tmp_dir
+        tempfile.tempdir = None # Que tempfile relea TMPDIR
+
+    def close(self):
+        for key, value in self._saved_env.items():
+            if value is None: os.environ.pop(key, None)
+            else: os.environ[key] = value
+        tempfile.tempdir = None
+        shutil.rmtree(self.root, ignore_errors=True)
+
+def _synthetic_bookmarks(count: int, seed: int, duplicate_ratio: float = 0.1) -> List[Dict]:
+    rng = random.Random(seed)
+    entries = []
+    for i in range(count):
+        n = rng.randrange(count) if rng.random() < duplicate_ratio else i # Algunas URLs repetidas entre sets
+        entries.append({"name": f"Tool {n} & <friends>", "url": f"https://tool{n}.example.org/search?q={n}&lang=en"})
+    return entries
+
+# --- Casos ---
+
+def build_cases(sandbox: Sandbox) -> List[Case]:
+    from guardian_spy import bookmarks_handler, browser_manager, config_manager, utils
+
+    cases: List[Case] = []
+
+    def _import_main_cli(_):
+        # Intérprete nuevo en cada muestra: solo se cuenta el import, no el arranque de Python
+        code = "import time; t = time.perf_counter(); import guardian_spy.main_cli; print(time.perf_counter() - t)"
+        return float(subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True, text=True).stdout)
+    cases.append(Case("startup.import_main_cli", _import_main_cli, max_runs=15, self_timed=True))
+    cases.append(Case("browser.check_executables", lambda _: utils.check_browser_executables(console=None)))
+
+    # create_profile por navegador e identificador de bookmarks (assets/bookmarks reales)
+    for browser in BROWSERS:
+        for identifier in BOOKMARK_IDENTIFIERS:
+            label = {None: "none", "__GENERAL__": "general", "__ALL__": "all"}.get(identifier, "single")
+            cases.append(Case(f"profile.create.{browser}.{label}",
+                              lambda _, b=browser, i=identifier: _check(browser_manager.create_profile(b, bookmark_set_identifier=i)),
+                              teardown=lambda _: _clear_temp_profiles(sandbox), max_runs=30))
+
+    # remove_profile de un perfil sintético (~600 archivos en 30 directorios, como un perfil recién usado)
+    def _make_profile_tree(_=None):
+        path = tempfile.mkdtemp(dir=sandbox.tmp_dir, prefix="profile-")
+        for d in range(30):
+            sub = os.path.join(path, f"dir{d}"); os.makedirs(sub)
+            for f in range(20):
+                with open(os.path.join(sub, f"f{f}.bin"), "wb") as fh: fh.write(b"x" * 2048)
+        return path
+    cases.append(Case("profile.remove.600_files", lambda path: _check(browser_manager.remove_profile(path)), setup=_make_profile_tree, max_runs=20))
+
+    # Fusión de sets de bookmarks: 4 sets sintéticos que suman 'size' entradas (con URLs repetidas)
+    for size in BOOKMARK_SIZES:
+        cases.append(Case(f"bookmarks.merge.{_size_label(size)}", lambda files: bookmarks_handler.load_multiple_bookmark_sets(files, {f: f for f in files}),
+                          setup=_BookmarkSets(sandbox, size).setup, quick=size < 1_000_000, max_runs=10 if size >= 100_000 else 50))
+        entries = _LazyEntries(size)
+        cases.append(Case(f"bookmarks.serialize_chrome.{_size_label(size)}", lambda _, e=entries: json.dumps(bookmarks_handler.generate_chrome_bookmarks_content(e.get()), indent=4),
+                          quick=size < 1_000_000, max_runs=10 if size >= 100_000 else 50))
+        cases.append(Case(f"bookmarks.serialize_firefox.{_size_label(size)}", lambda _, e=entries: bookmarks_handler.generate_firefox_bookmarks_html(e.get()),
+                          quick=size < 1_000_000, max_runs=10 if size >= 100_000 else 50))
+
+    # Almacén de perfiles (profiles.json) con 10 / 1k / 10k perfiles
+    for size in PROFILE_STORE_SIZES:
+        profiles = [{"profile_name": f"case-{i:05d}", "browser_type": BROWSERS[i % 3], "created_at": "2025-01-01 00:00:00",
+                     "browser_profile_path": os.path.join(sandbox.config_dir, "browser_profiles", f"case-{i:05d}"),
+                     "bookmarks_set_name": PROFILE_BOOKMARK_SETS[i // len(BROWSERS) % len(PROFILE_BOOKMARK_SETS)], "notes": ""} for i in range(size)]
+        def _seed(_=None, p=profiles): config_manager.save_profiles_data(p)
+        label = _size_label(size)
+        cases.append(Case(f"profiles.save.{label}", lambda _, p=profiles: config_manager.save_profiles_data(p), max_runs=30))
+        cases.append(Case(f"profiles.load.{label}", lambda _: config_manager.load_profiles_data(), setup=_seed, max_runs=30))
+        cases.append(Case(f"profiles.get_by_name.{label}", lambda _, n=f"case-{size - 1:05d}": _check(config_manager.get_profile_by_name(n)), setup=_seed, max_runs=30))
+    return cases
+
+def _check(result):
+    if not result: raise RuntimeError("benchmarked call reported failure")
+    return result
+
+def _size_label(size: int) -> str:
+    return f"{size // 1_000_000}M" if size >= 1_000_000 else (f"{size // 1_000}k" if size >= 1_000 else str(size))
+
+def _clear_temp_profiles(sandbox: Sandbox):
+    shutil.rmtree(os.path.join(sandbox.tmp_dir, "guardian_spy_browser_profiles"), ignore_errors=True)
+
+class _LazyEntries:
+    # Los datos grandes se generan solo si el caso se ejecuta (y una sola vez)
+    def __init__(self, size): self.size = size; self._entries = None
+    def get(self):
+        if self._entries is None: self._entries = _synthetic_bookmarks(self.size, seed=self.size)
+        return self._entries
+
+class _BookmarkSets:
+    def __init__(self, sandbox: Sandbox, size: int):
+        self.sandbox = sandbox; self.size = size; self.files = None
+    def setup(self):
+        from guardian_spy import bookmarks_handler
+        bookmarks_handler.BOOKMARKS_DIR = self.sandbox.bookmarks_dir
+        if self.files is None:
+            self.files = []
+            for part in range(4):
+                filename = f"bench_{self.size}_{part}.json"
+                with open(os.path.join(self.sandbox.bookmarks_dir, filename), "w", encoding="utf-8") as f:
+                    json.dump(_synthetic_bookmarks(self.size // 4, seed=part), f)
+                self.files.append(filename)
+        return self.files
+
+# --- Ejecución, baselines y comparación ---
+
+def run_cases(case_names: Optional[List[str]], patterns: List[str], quick: bool, min_time: float) -> Dict:
+    sandbox = Sandbox()
+    try:
+        results = {}
+        for case in build_cases(sandbox):
+            if case_names is not None and case.name not in case_names: continue
+            if patterns and not any(fnmatch.fnmatch(case.name, p if any(c in p for c in "*?[") else f"*{p}*") for p in patterns): continue
+            if quick and not case.quick: continue
+            results[case.name] = _measure(case, min_time)
+            r = results[case.name]
+            print(f"{case.name:<42} median={_fmt(r['median']):>10}  min={_fmt(r['min']):>10}  runs={r['runs']}", flush=True)
+        return results
+    finally:
+        sandbox.close()
+
+def _fmt(seconds: float) -> str:
+    if seconds < 1e-3: return f"{seconds * 1e6:.1f}us"
+    if seconds < 1: return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds:.3f}s"
+
+def _metadata() -> Dict:
+    try: revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError: revision = None
+    return {"suite_version": SUITE_VERSION, "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(), "platform": platform.platform(), "machine": platform.node(), "git_revision": revision}
+
+def compare(baseline: Dict, current: Dict, threshold: float, min_seconds: float) -> List[str]:
+    """Returns the names of the cases whose best time regressed beyond threshold."""
+    regressions = []
+    print(f"\n{'case':<42} {'baseline':>10} {'current':>10} {'change':>8}  (best of runs)")
+    for name, cur in current.items():
+        base = baseline["results"][name]
+        ratio = max(cur["min"], min_seconds) / max(base["min"], min_seconds) - 1
+        flag = "  REGRESSION" if ratio > threshold else ""
+        if flag: regressions.append(name)
+        print(f"{name:<42} {_fmt(base['min']):>10} {_fmt(cur['min']):>10} {ratio:>+7.1%}{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_p = sub.add_parser("run", help="Run the suite and optionally save the results as a baseline")
+    run_p.add_argument("--save", metavar="FILE", help="Write the results as a JSON baseline")
+    cmp_p = sub.add_parser("compare", help="Re-run the cases of a baseline and fail on regressions")
+    cmp_p.add_argument("baseline", help="Baseline JSON written by 'run --save'")
+    cmp_p.add_argument("--threshold", type=float, default=0.25, help="Allowed relative slowdown per case (default: 0.25 = 25%%)")
+    cmp_p.add_argument("--min-seconds", type=float, default=0.0005, help="Noise floor applied to both sides (default: 0.0005)")
+    cmp_p.add_argument("--save", metavar="FILE", help="Also write the new results as JSON")
+    for p in (run_p, cmp_p):
+        p.add_argument("--filter", action="append", default=[], help="Only cases matching this substring or glob (repeatable)")
+        p.add_argument("--quick", action="store_true", help="Skip the multi-second cases (1M bookmarks)")
+        p.add_argument("--min-time", type=float, default=0.5, help="Minimum seconds spent per case (default: 0.5)")
+    sub.add_parser("list", help="List the case names")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        sandbox = Sandbox()
+        try:
+            for case in build_cases(sandbox): print(case.name + ("" if case.quick else "  (full runs only)"))
+        finally: sandbox.close()
+        return 0
+
+    baseline = None
+    if args.command == "compare":
+        with open(args.baseline, "r", encoding="utf-8") as f: baseline = json.load(f)
+        if baseline.get("meta", {}).get("suite_version") != SUITE_VERSION:
+            print(f"Baseline was recorded by suite version {baseline.get('meta', {}).get('suite_version')}, this is {SUITE_VERSION}.")
+            return 2
+        if baseline["meta"].get("machine") != platform.node():
+            print(f"Warning: baseline recorded on '{baseline['meta'].get('machine')}', comparing on '{platform.node()}'.")
+    results = run_cases(list(baseline["results"]) if baseline else None, args.filter, args.quick, args.min_time)
+    if baseline and not args.filter and not args.quick:
+        for name in sorted(set(baseline["results"]) - set(results)): print(f"Warning: baseline case '{name}' no longer exists")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f: json.dump({"meta": _metadata(), "results": results}, f, indent=2)
+        print(f"Results written to {args.save}")
+    if baseline:
+        regressions = compare(baseline, results, args.threshold, args.min_seconds)
+        if regressions:
+            print(f"\nFAIL: {len(regressions)} case(s) regressed more than {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+        print(f"\nOK: no case regressed more than {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,99 +5,95 @@
 Guardian Spy: OPSEC Assistant for OSINT Practioners.
 Entry point for the Guardian Spy CLI application.
 """
-import sys 
-print("DEBUG: guardian_spy.py - Top of script", file=sys.stderr) # DEBUG 1
+import os
+import sys
 
-import os 
-from datetime import datetime 
-import traceback 
+# --debug se decide antes de importar el paquete: guardian_spy.DEBUG_MODE se lee del entorno al importarlo
+if "--debug" in sys.argv[1:]: os.environ["GUARDIAN_SPY_DEBUG"] = "1"
+
+import logging
+import traceback
 
 # Variable global para la instancia de consola, se intentará poblar desde main_cli
 # Esto es para que los bloques except puedan intentar usarla si está disponible.
 # Pero no debe causar un error si main_cli falla al importar.
 effective_console_instance = sys.stderr # Fallback inicial
+main_cli = None
+cli_args = None
+
+def _pause_if_interactive(message):
+    # Solo pausar con una terminal delante (nunca en --check-setup ni en scripts)
+    if sys.stdin.isatty() and not any(arg in sys.argv[1:] for arg in ("--check-setup", "-h", "--help", "-v", "--version")) \
+            and not (cli_args is not None and cli_args.is_scripted(sys.argv[1:])):
+        input(message)
 
-# --- Intento de Importación de Módulos Guardian Spy ---
-print("DEBUG: guardian_spy.py - About to import guardian_spy specific modules", file=sys.stderr) # DEBUG 2
+# --- Camino rápido: argumentos, --version y --help sin cargar la UI (rich, requests...) ---
 try:
-    from guardian_spy import main_cli # Intenta importar el módulo primero
-    print("DEBUG: guardian_spy.py - main_cli module imported successfully", file=sys.stderr) # DEBUG 3
-    try:
-        # Intentar obtener la consola de Rich desde main_cli DESPUÉS de importar main_cli
-        if hasattr(main_cli, 'console') and main_cli.console is not None:
-            effective_console_instance = main_cli.console
-            print("DEBUG: guardian_spy.py - Rich console instance obtained from main_cli", file=sys.stderr) # DEBUG 4
-        else:
-            print("DEBUG: guardian_spy.py - main_cli.console not found or is None, using stderr", file=sys.stderr) # DEBUG 4b
-    except Exception as e_console_fetch:
-        print(f"DEBUG: guardian_spy.py - Error fetching console from main_cli: {e_console_fetch}, using stderr", file=sys.stderr) # DEBUG 4c
+    from guardian_spy import DEBUG_MODE, cli_args, log_setup
+    if cli_args.is_scripted(sys.argv[1:]): # Subcomandos para scripts: JSON, sin UI ni prompts
+        if not any(a in ("-h", "--help") for a in sys.argv[1:]): # La ayuda no crea logs/ ni arranca el hilo del registro
+            log_setup.configure(debug=DEBUG_MODE, filename=log_setup.SCRIPTED_LOG_FILENAME, rotate=False) # Varios a la vez: sin rotar
+        from guardian_spy import scripted
+        sys.exit(scripted.run(sys.argv[1:]))
+    args, unknown_args, parser = cli_args.parse_args() # --version imprime y sale aquí
+    if args.help:
+        cli_args.print_help(parser)
+        sys.exit(0)
 
-    from guardian_spy import DEBUG_MODE
-    print(f"DEBUG: guardian_spy.py - DEBUG_MODE is {DEBUG_MODE}", file=sys.stderr) # DEBUG 5
+    if args.check_setup: # Texto plano, sin la UI interactiva (rich, asyncio)
+        log_setup.configure(debug=DEBUG_MODE, filename=log_setup.SCRIPTED_LOG_FILENAME, rotate=False) # Proceso corto, como los scripts
+        from guardian_spy import check_setup
+        sys.exit(check_setup.run(args))
 
+    # --- Importación de la UI (solo para el modo interactivo) ---
+    log_setup.configure(debug=DEBUG_MODE) # JSON lines en logs/ (hilo aparte); la terminal solo ve avisos con --debug
+    from guardian_spy import startup
+    startup.begin() # Descubrimiento de navegadores, config y bookmarks en paralelo con la importación de la UI
+    from guardian_spy import main_cli
+    if hasattr(main_cli, 'console') and main_cli.console is not None:
+        effective_console_instance = main_cli.console
 except ImportError as e_import_gs:
     print(f"FATAL IMPORT ERROR in guardian_spy.py: Could not import core modules: {e_import_gs}", file=sys.stderr)
     traceback.print_exc(file=sys.stderr)
     # No podemos usar Rich console aquí porque la importación falló
-    input("FATAL IMPORT ERROR. Press Enter to exit...") # Pausa para ver el error
-    sys.exit(1)
-except Exception as e_early_init: # Capturar otros errores durante la inicialización de imports
-    print(f"FATAL EARLY INIT ERROR in guardian_spy.py: {e_early_init}", file=sys.stderr)
-    traceback.print_exc(file=sys.stderr)
-    input("FATAL EARLY INIT ERROR. Press Enter to exit...")
+    _pause_if_interactive("FATAL IMPORT ERROR. Press Enter to exit...") # Pausa para ver el error
     sys.exit(1)
 # --- Fin de Importaciones ---
 
 
 if __name__ == "__main__":
-    print("DEBUG: guardian_spy.py - Entered __main__ block", file=sys.stderr) # DEBUG 6
-    
     def _print_error_banner_fallback(): # Para errores si Rich no está disponible
         print("="*50, file=sys.stderr)
         print(" GUARDIAN SPY - CRITICAL ERROR ".center(50, "="), file=sys.stderr)
         print("="*50, file=sys.stderr)
 
     try:
-        print("DEBUG: guardian_spy.py - In __main__, about to call main_cli.start()", file=sys.stderr) # DEBUG 7
-        main_cli.start() 
-        print("DEBUG: guardian_spy.py - Returned from main_cli.start() (Program should have self-exited)", file=sys.stderr) # DEBUG 8
+        main_cli.start(args, unknown_args, parser)
 
     except KeyboardInterrupt:
-        # ... (bloque KeyboardInterrupt como antes, usando effective_console_instance) ...
         if hasattr(effective_console_instance, 'print') and effective_console_instance is not sys.stderr:
             if hasattr(effective_console_instance, 'clear'): effective_console_instance.clear()
             if hasattr(main_cli, 'display_initial_banner_and_app_info'): main_cli.display_initial_banner_and_app_info()
             effective_console_instance.print("\n[bold yellow]Guardian Spy session terminated by user.[/bold yellow]")
         else:
             print("\nGuardian Spy session terminated by user.", file=sys.stderr)
-        sys.exit(130) 
+        sys.exit(130)
 
     except SystemExit as e_sys_exit:
-        print(f"DEBUG: guardian_spy.py - Caught SystemExit (code: {e_sys_exit.code}). Exiting.", file=sys.stderr) # DEBUG 9
+        logging.getLogger("guardian_spy").debug("SystemExit (code: %s)", e_sys_exit.code)
         sys.exit(e_sys_exit.code if e_sys_exit.code is not None else 0)
 
     except Exception as e:
-        print(f"DEBUG: guardian_spy.py - Caught UNHANDLED top-level Exception: {type(e).__name__}", file=sys.stderr) # DEBUG 10
         _print_error_banner_fallback()
         print(f"CRITICAL ERROR: {type(e).__name__}: {e}", file=sys.stderr)
-        
-        error_log_path = os.path.join(os.path.expanduser("~"), "guardian_spy_crash.log")
-        try:
-            with open(error_log_path, "a", encoding="utf-8") as f:
-                f.write(f"\n--- CRASH AT {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---\n")
-                traceback.print_exc(file=f)
-            print(f"Crash details logged to: {error_log_path}", file=sys.stderr)
-        except Exception as log_e:
-            print(f"Failed to write crash log: {log_e}", file=sys.stderr)
+
+        logging.getLogger("guardian_spy").critical("Unhandled exception: %s: %s", type(e).__name__, e, exc_info=True)
+        log_setup.shutdown() # Escribir el registro antes de la pausa / salida
+        if log_setup.get_log_path() and os.path.exists(log_setup.get_log_path()):
+            print(f"Crash details logged to: {log_setup.get_log_path()}", file=sys.stderr)
 
         if DEBUG_MODE:
             traceback.print_exc(file=sys.stderr) # Imprimir traceback a stderr si DEBUG_MODE
-        
-        input("Press Enter to exit...") # Pausar para ver el error
-        sys.exit(1)
 
-    finally:
-        print("DEBUG: guardian_spy.py - Reached final 'finally' block.", file=sys.stderr) # DEBUG 11
-        # El programa debería haber salido con sys.exit() antes de este punto en la mayoría de los casos.
-        # Si llegamos aquí, es una salida "natural" del try block sin un exit explícito.
-        pass
\ No newline at end of file
+        _pause_if_interactive("Press Enter to exit...") # Pausar para ver el error
+        sys.exit(1)
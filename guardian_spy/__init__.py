@@ -14,11 +14,19 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 # guardian_spy/__init__.py
+import os
+import time
+
+STARTED_AT = time.perf_counter() # Referencia para medir el tiempo hasta el primer prompt
+
 __version__ = "0.1.0-alpha"
 __author__ = "Kanarath & AI Spy"
 __app_name__ = "Guardian Spy"
 
 # --- Flag de Depuración Global ---
-# Cambia a True para ver los console.log detallados de los módulos Y MÁS TRACEBACKS.
-# En producción o uso normal, debería ser False para una UI limpia.
-DEBUG_MODE = True # <--- Poner en True para depurar el cierre
\ No newline at end of file
+# Se activa en tiempo de ejecución con --debug (guardian_spy.py exporta GUARDIAN_SPY_DEBUG=1
+# antes de importar el paquete) o definiendo GUARDIAN_SPY_DEBUG=1 en el entorno.
+# Con él activo se ven los console.log detallados de los módulos, los tracebacks y el log
+# de depuración (logger "guardian_spy") en stderr. Por defecto False: UI limpia.
+DEBUG_ENV_VAR = "GUARDIAN_SPY_DEBUG"
+DEBUG_MODE = os.environ.get(DEBUG_ENV_VAR, "").strip().lower() in ("1", "true", "yes", "on")
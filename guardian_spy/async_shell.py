@@ -0,0 +1,303 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/async_shell.py
+"""
+asyncio building blocks of the interactive shell (main_cli.main_loop): a prompt reader
+that does not block the event loop, a registry of named background tasks and a
+supervisor for the browser sessions launched from the shell.
+
+Everything runs on one event loop thread. Blocking work (the prompts of a command,
+HTTP requests, removing a profile) is handed to threads, so the prompt, the session
+supervision and the leak monitor keep running while it waits.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+try:
+    from . import browser_manager, disk_usage, session_journal
+except ImportError:
+    import browser_manager, disk_usage, session_journal
+
+logger = logging.getLogger(__name__)
+
+SESSION_POLL_INTERVAL = 0.5 # Segundos entre comprobaciones de cada navegador (y de alertas del monitor)
+TERMINATE_TIMEOUT = 3.0 # Segundos de gracia tras terminate() antes de kill()
+
+def run_in_thread(func: Callable, *args, **kwargs) -> "asyncio.Future":
+    """
+    Runs a blocking call in a daemon thread and returns a future for its result. Unlike
+    the default executor, the thread is never joined at exit, so a command blocked on
+    input() cannot keep the process alive after Ctrl+C.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def _resolve(result, error):
+        if future.done(): return # Cancelado mientras tanto
+        if error is not None: future.set_exception(error)
+        else: future.set_result(result)
+
+    def _target():
+        try: result, error = func(*args, **kwargs), None
+        except BaseException as e: result, error = None, e
+        try: loop.call_soon_threadsafe(_resolve, result, error)
+        except RuntimeError: pass # El bucle ya se cerró (salida)
+
+    threading.Thread(target=_target, name=f"gs-{getattr(func, '__name__', 'call')}", daemon=True).start()
+    return future
+
+class LineReader:
+    """
+    Reads prompt lines without blocking the event loop. On a POSIX terminal the loop
+    watches stdin (add_reader) and no thread is used; elsewhere (pipes, Windows) a daemon
+    thread reads through sys.stdin, whose buffer the prompts of the commands share.
+    """
+
+    def __init__(self, stream=None):
+        self._stream = stream or sys.stdin
+        self._pending: Optional[asyncio.Future] = None
+        self._thread_line: Optional[asyncio.Future] = None # Lectura en hilo aún sin consumir
+
+    @property
+    def waiting(self) -> bool:
+        """True while the shell is at the prompt waiting for a line."""
+        return self._pending is not None and not self._pending.done()
+
+    def _tty_fileno(self) -> Optional[int]:
+        try: fd = self._stream.fileno()
+        except (AttributeError, OSError, ValueError): return None
+        return fd if os.name == "posix" and os.isatty(fd) else None
+
+    async def readline(self) -> Optional[str]:
+        """The next line without its newline, or None on end of input or interrupt()."""
+        loop = asyncio.get_running_loop()
+        self._pending = loop.create_future()
+        fd = self._tty_fileno()
+        watching = False
+        if fd is not None:
+            try: loop.add_reader(fd, self._on_readable, fd); watching = True
+            except NotImplementedError: pass
+        if not watching:
+            if self._thread_line is None: self._thread_line = run_in_thread(self._stream.readline)
+            self._thread_line.add_done_callback(self._on_thread_line)
+        try:
+            line = await self._pending
+        finally:
+            if watching: loop.remove_reader(fd)
+            elif self._thread_line is not None: self._thread_line.remove_done_callback(self._on_thread_line)
+        return None if line is None else line.rstrip("\r\n")
+
+    def _on_readable(self, fd: int):
+        # En modo canónico cada read() devuelve como mucho una línea completa
+        try: data = os.read(fd, 65536)
+        except OSError: data = b""
+        if not self._pending.done():
+            self._pending.set_result(data.decode(getattr(self._stream, "encoding", None) or "utf-8", "replace") if data else None)
+
+    def _on_thread_line(self, future: "asyncio.Future"):
+        self._thread_line = None
+        if self._pending.done(): return
+        try: line = future.result()
+        except (OSError, ValueError, EOFError): line = ""
+        self._pending.set_result(line or None) # "" = fin de la entrada
+
+    def interrupt(self):
+        """Ends the current readline() with None (Ctrl+C at the prompt)."""
+        if self.waiting: self._pending.set_result(None)
+
+class BackgroundTasks:
+    """Named asyncio tasks of the shell. A task that fails is logged and reported to on_error, never lost."""
+
+    def __init__(self, on_error: Optional[Callable[[str, BaseException], None]] = None):
+        self._tasks: Dict["asyncio.Future", str] = {}
+        self.on_error = on_error
+
+    def spawn(self, name: str, awaitable) -> "asyncio.Future":
+        """Tracks a coroutine (wrapped in a task) or a future, e.g. from run_in_thread()."""
+        task = asyncio.ensure_future(awaitable)
+        self._tasks[task] = name
+        task.add_done_callback(self._on_done)
+        return task
+
+    def _on_done(self, task: "asyncio.Future"):
+        name = self._tasks.pop(task, None)
+        if task.cancelled() or task.exception() is None: return
+        logger.error("Background task %r failed", name, exc_info=task.exception())
+        if self.on_error: self.on_error(name, task.exception())
+
+    def running(self) -> List[str]:
+        return sorted(self._tasks.values())
+
+    async def cancel_all(self, timeout: float = 5.0):
+        tasks = list(self._tasks)
+        for task in tasks: task.cancel()
+        if tasks: await asyncio.wait(tasks, timeout=timeout)
+
+class SessionSupervisor:
+    """
+    Browser sessions launched from the shell. Each session is an asyncio task that polls
+    its process and removes its temporary profile once the browser exits. While any
+    session runs, a single leak monitor (from monitor_factory) samples the network for all of them.
+
+    Events go to on_event(kind, session, **details):
+        "alert"   details: alert (a LeakMonitor alert; session is None)
+        "ended"   session exit_code / stopped are set
+        "cleanup" details: removed (temporary profile removal result)
+        "trimmed" details: result (disk_usage.trim_profile() result; persistent profiles)
+    """
+
+    def __init__(self, tasks: BackgroundTasks, on_event: Callable, monitor_factory: Optional[Callable] = None):
+        self._tasks = tasks
+        self._on_event = on_event
+        self._monitor_factory = monitor_factory
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._sessions: Dict[int, Dict] = {}
+        self._ids = itertools.count(1)
+
+    def running(self) -> List[Dict]:
+        return [s for s in self._sessions.values() if s["exit_code"] is None]
+
+    def get(self, session_id: int) -> Optional[Dict]:
+        return self._sessions.get(session_id)
+
+    def _emit(self, kind: str, session: Optional[Dict], **details):
+        try: self._on_event(kind, session, **details)
+        except Exception: logger.exception("Rendering of session event %r failed", kind)
+
+    def _ensure_monitor(self):
+        if self._monitor_task or not self._monitor_factory: return
+        monitor = self._monitor_factory()
+        if monitor: self._monitor_task = self._tasks.spawn("leak-monitor", monitor.run_async(lambda alert: self._emit("alert", None, alert=alert)))
+
+    def _stop_monitor_if_idle(self):
+        if self._monitor_task and not self.running():
+            self._monitor_task.cancel(); self._monitor_task = None
+
+    async def launch(self, browser: str, profile_path: str, temporary: bool, profile_name: Optional[str] = None, console=None) -> Optional[Dict]:
+        """Starts the browser (the monitor first, so its baseline predates the launch). Returns the session, or None."""
+        self._ensure_monitor()
+        process = await run_in_thread(browser_manager.launch_browser_with_profile, browser_type_requested=browser,
+                                      profile_path=profile_path, console=console)
+        if process is None:
+            self._stop_monitor_if_idle()
+            return None
+        session = {"session": next(self._ids), "browser": browser, "profile": profile_name, "profile_path": profile_path,
+                   "temporary": temporary, "process": process, "pid": process.pid, "started": time.time(),
+                   "ended": None, "exit_code": None, "stopped": False}
+        self._sessions[session["session"]] = session
+        session["task"] = self._tasks.spawn(f"session-{session['session']}", self._supervise(session))
+        return session
+
+    async def _supervise(self, session: Dict):
+        process = session["process"]
+        while process.poll() is None: await asyncio.sleep(SESSION_POLL_INTERVAL)
+        session.update({"exit_code": process.returncode, "ended": time.time()})
+        session_journal.record("ended", session["profile_path"], exit_code=process.returncode)
+        self._stop_monitor_if_idle()
+        self._emit("ended", session)
+        if session["temporary"] and os.path.exists(session["profile_path"]):
+            removed = await run_in_thread(browser_manager.remove_profile, session["profile_path"])
+            self._emit("cleanup", session, removed=removed)
+        elif not session["temporary"]:
+            result = await run_in_thread(disk_usage.trim_after_session, session["profile_path"], session["browser"])
+            if result: self._emit("trimmed", session, result=result)
+
+    async def stop(self, session_id: int) -> Optional[Dict]:
+        """Terminates a running session's browser and waits for its cleanup. None if it is not running."""
+        session = self._sessions.get(session_id)
+        if not session or session["exit_code"] is not None: return None
+        session["stopped"] = True
+        process = session["process"]
+        try: process.terminate()
+        except OSError: pass
+        done, _ = await asyncio.wait([session["task"]], timeout=TERMINATE_TIMEOUT)
+        if not done:
+            try: process.kill()
+            except OSError: pass
+            await asyncio.wait([session["task"]], timeout=TERMINATE_TIMEOUT)
+        return session
+
+    async def stop_all(self) -> List[Dict]:
+        return [s for s in await asyncio.gather(*(self.stop(s["session"]) for s in self.running())) if s]
+
+class Shell:
+    """
+    The interactive prompt on an event loop. dispatch(command_line) is awaited for each
+    line and returns False to leave. Output from background tasks goes through notify(),
+    which redraws the prompt after it.
+    """
+
+    def __init__(self, console, prompt, on_session_event: Callable, monitor_factory: Optional[Callable] = None):
+        self.console = console
+        self.prompt = prompt
+        self.reader = LineReader()
+        self.tasks = BackgroundTasks(on_error=self._on_task_error)
+        self.sessions = SessionSupervisor(self.tasks, lambda kind, session, **details: self.notify(
+            lambda console_obj: on_session_event(kind, session, console_obj, **details)), monitor_factory)
+
+    def notify(self, render: Callable):
+        """Calls render(console) on the loop thread without mangling a prompt that is waiting for input."""
+        at_prompt = self.reader.waiting
+        if at_prompt: self.console.print()
+        render(self.console)
+        if at_prompt: self.console.print(self.prompt, end="")
+
+    def notify_threadsafe(self, render: Callable):
+        self._loop.call_soon_threadsafe(self.notify, render)
+
+    def _on_task_error(self, name: str, error: BaseException):
+        self.notify(lambda console_obj: console_obj.print(f"[red][!] Background task '{name}' failed: {error}[/red]"))
+
+    def _on_sigint(self):
+        # Ctrl+C en el prompt = 'quit' (como siempre); durante un comando, salir como antes
+        if self.reader.waiting: self.reader.interrupt()
+        else: raise KeyboardInterrupt
+
+    def request_exit(self):
+        """Leaves the shell at the next prompt (or now, if it is waiting at one)."""
+        if self.reader.waiting: self.console.print() # Cerrar la línea del prompt
+        self._exit_requested = True
+        self.reader.interrupt()
+
+    async def run(self, dispatch: Callable, on_start: Optional[Callable] = None):
+        """Awaits on_start() (if given) on the loop, then reads and dispatches commands."""
+        self._loop = asyncio.get_running_loop()
+        self._exit_requested = False
+        try: self._loop.add_signal_handler(signal.SIGINT, self._on_sigint)
+        except (NotImplementedError, RuntimeError): pass # Windows: KeyboardInterrupt normal
+        try:
+            if on_start: await on_start()
+            while not self._exit_requested:
+                self.console.print(self.prompt, end="")
+                line = await self.reader.readline()
+                if self._exit_requested: return
+                if line is None: self.console.print(); line = "quit" # Ctrl+C / Ctrl+D
+                if await dispatch(line.strip()) is False: return
+        finally:
+            try: self._loop.remove_signal_handler(signal.SIGINT)
+            except (NotImplementedError, RuntimeError): pass
+
+    async def close(self):
+        """Closes the running browsers (temporary profiles removed) and cancels the remaining tasks."""
+        await self.sessions.stop_all()
+        await self.tasks.cancel_all()
@@ -2,6 +2,7 @@
 import os
 import json
 import time # Ya lo habías añadido, ¡gracias!
+import logging
 from typing import List, Dict, Optional, Tuple, Union # Para type hints
 
 # Asumir que este script está en guardian_spy/ y assets/ está en la raíz del proyecto
@@ -12,6 +13,8 @@ except NameError:
 
 BOOKMARKS_DIR = os.path.join(PROJECT_ROOT, "assets", "bookmarks")
 
+logger = logging.getLogger(__name__)
+
 # Definir qué sets componen el "General OSINT" (nombres de archivo JSON)
 GENERAL_OSINT_SETS = [
     "00_opsec_checks.json",
@@ -42,15 +45,30 @@ def get_available_bookmark_sets(console=None) -> Dict[str, str]:
             sets[friendly_name] = filename 
     return sets
 
+_SET_CACHE: Dict[str, tuple] = {} # {ruta: (mtime_ns, tamaño, bookmarks válidos)}
+
 def load_bookmark_set_data(filename: str, console=None) -> Optional[List[Dict]]:
     """
     Carga los datos de bookmarks de un archivo JSON específico.
+    El resultado se reutiliza mientras el archivo no cambie (mtime/tamaño).
     """
     file_path = os.path.join(BOOKMARKS_DIR, filename)
-    if not os.path.exists(file_path):
+    try:
+        st = os.stat(file_path)
+    except OSError:
         if console:
             console.print(f"[red]Bookmark set file not found: {file_path}[/red]")
         return None
+    cached = _SET_CACHE.get(file_path)
+    if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return [dict(item) for item in cached[2]]
+    data = _read_bookmark_set_file(file_path, filename, console)
+    if data is not None:
+        _SET_CACHE[file_path] = (st.st_mtime_ns, st.st_size, data)
+        return [dict(item) for item in data]
+    return None
+
+def _read_bookmark_set_file(file_path: str, filename: str, console=None) -> Optional[List[Dict]]:
     try:
         with open(file_path, "r", encoding="utf-8") as f:
             data = json.load(f)
@@ -59,8 +77,8 @@ def load_bookmark_set_data(filename: str, console=None) -> Optional[List[Dict]]:
             for item in data:
                 if isinstance(item, dict) and "name" in item and "url" in item:
                     valid_data.append(item)
-                elif console and hasattr(console, 'log') and DEBUG_MODE: # Asumiendo DEBUG_MODE importado
-                    console.log(f"[dim yellow]Warning: Invalid bookmark item in {filename}: {item}. Skipping.[/dim yellow]")
+                else:
+                    logger.debug("Invalid bookmark item in %s: %s. Skipping.", filename, item)
             return valid_data
         else:
             if console: console.print(f"[red]Error: Bookmark set file {filename} does not contain a list.[/red]")
@@ -162,12 +180,6 @@ def generate_firefox_bookmarks_html(bookmarks_list: List[Dict]) -> str:
 """
     return html_content
 
-# Importar DEBUG_MODE al final para evitar problemas de importación circular si bookmarks_handler es importado por __init__
-try:
-    from guardian_spy import DEBUG_MODE
-except ImportError:
-    DEBUG_MODE = False # Fallback
-
 if __name__ == '__main__':
     # ... (código de prueba como antes)
     pass
\ No newline at end of file
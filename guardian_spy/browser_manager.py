@@ -1,4 +1,6 @@
 # guardian_spy/browser_manager.py
+from __future__ import annotations # Las anotaciones con Console no se evalúan: rich no se importa aquí
+
 import subprocess
 import platform
 import os
@@ -6,23 +8,42 @@ import shutil
 import tempfile
 import time
 import json
-from typing import List, Dict, Optional, Union, Any # ASEGURADO
-from rich.console import Console # ASEGURADO
+import logging
+from typing import TYPE_CHECKING, List, Dict, Optional, Union, Any # ASEGURADO
+if TYPE_CHECKING: from rich.console import Console
 
-from guardian_spy import DEBUG_MODE 
 try:
     from . import config_manager 
     from . import utils 
     from . import bookmarks_handler 
+    from . import timing
+    from . import session_journal
+    from . import metrics
 except ImportError: 
     import config_manager
     import utils
     import bookmarks_handler
+    import timing
+    import session_journal
+    import metrics
+
+logger = logging.getLogger(__name__)
+
+def get_temp_profiles_dir() -> str:
+    """Directory holding the temporary (per-session) browser profiles."""
+    return os.path.join(tempfile.gettempdir(), "guardian_spy_browser_profiles")
+
+def get_configured_browser_path(browser_type: str) -> Optional[str]:
+    """Returns the executable set for browser_type in the 'browser_executables' setting, if any."""
+    configured = config_manager.get_setting("browser_executables") or {}
+    path = configured.get(browser_type) if isinstance(configured, dict) else None
+    return os.path.expanduser(path) if path else None
 
 def get_os_specific_browser_path(browser_type: str, specific_name: Optional[str] = None) -> Optional[str]:
-    # ... (sin cambios)
     system = platform.system()
     if specific_name: return specific_name
+    configured_path = get_configured_browser_path(browser_type)
+    if configured_path: return configured_path
     if browser_type == "firefox":
         if system == "Windows":
             for p in [r"C:\Program Files\Mozilla Firefox\firefox.exe", r"C:\Program Files (x86)\Mozilla Firefox\firefox.exe"]:
@@ -50,10 +71,9 @@ def load_bookmarks_to_profile(
     combined_bookmarks_data: List[Dict], 
     console: Optional[Console] = None
 ) -> bool:
-    bm_console_for_logs = console if DEBUG_MODE and console else None
 
     if not combined_bookmarks_data: 
-        if bm_console_for_logs: bm_console_for_logs.log("[dim]No bookmark data provided to write to profile. Skipping.[/dim]")
+        logger.debug("No bookmark data provided to write to profile. Skipping.")
         return True 
 
     dest_path: Optional[str] = None # CORRECCIÓN: Inicializar
@@ -72,18 +92,18 @@ def load_bookmarks_to_profile(
         dest_path = os.path.join(profile_path, "bookmarks_to_import.html")
         content_to_write = bookmarks_handler.generate_firefox_bookmarks_html(combined_bookmarks_data)
     else:
-        if bm_console_for_logs: bm_console_for_logs.log(f"[yellow]Bookmarks writing not implemented for: {browser_type}[/yellow]")
+        logger.debug("Bookmarks writing not implemented for: %s", browser_type)
         return False
 
     if not dest_path or not content_to_write: # CORRECCIÓN: Chequear antes de escribir
-        if bm_console_for_logs: bm_console_for_logs.log(f"[yellow]Bookmark writing skipped: no valid dest_path or content for {browser_type}.[/yellow]")
+        logger.debug("Bookmark writing skipped: no valid dest_path or content for %s.", browser_type)
         # Si no hay contenido (ej. bookmarks_data estaba vacío pero no se filtró antes), no es un error de escritura.
         # Si combined_bookmarks_data NO estaba vacío pero content_to_write SÍ lo está, es un error de generación.
         return not combined_bookmarks_data # Retorna True si no había nada que escribir, False si debería haber habido.
 
     try:
         with open(dest_path, write_mode, encoding="utf-8") as f: f.write(content_to_write)
-        if bm_console_for_logs: bm_console_for_logs.log(f"Bookmarks written to [cyan]{dest_path}[/cyan]")
+        logger.debug("Bookmarks written to %s", dest_path)
         if browser_type == "firefox" and console: 
             console.print("[yellow]For Firefox, import '[italic]bookmarks_to_import.html[/italic]' manually (Ctrl+Shift+O).[/yellow]")
         return True
@@ -92,13 +112,13 @@ def load_bookmarks_to_profile(
         return False
 
 # create_profile (sin cambios respecto a la última versión que te pasé, solo confirmo que usa bookmark_set_identifier)
+@timing.timed("profile.create")
 def create_profile(browser_type: str, 
                    profile_name_prefix: str ="gs_temp_profile", 
                    profile_custom_name: Optional[str]=None, 
                    is_persistent: bool =False,      
                    bookmark_set_identifier: Union[str, List[str], None] = None, 
                    console: Optional[Console] = None):
-    cp_console_for_logs = console if DEBUG_MODE and console else None
     profile_path = None
     if is_persistent:
         if not profile_custom_name:
@@ -107,49 +127,57 @@ def create_profile(browser_type: str,
         base_dir = config_manager.get_browser_profiles_base_dir() 
         profile_dir_name = profile_custom_name 
         profile_path = os.path.join(base_dir, profile_dir_name)
-        if cp_console_for_logs: cp_console_for_logs.log(f"Persistent browser profile directory target: {profile_path}")
+        logger.debug("Persistent browser profile directory target: %s", profile_path)
     else: 
-        base_dir = os.path.join(tempfile.gettempdir(), "guardian_spy_browser_profiles")
+        base_dir = get_temp_profiles_dir()
         try: os.makedirs(base_dir, exist_ok=True)
         except OSError as e:
             if console: console.print(f"[bold red]Error creating base temp dir {base_dir}: {e}[/bold red]"); return None
         unique_suffix = str(int(time.time() * 1000))
         profile_dir_name = f"{profile_name_prefix}_{browser_type}_{unique_suffix}"
         profile_path = os.path.join(base_dir, profile_dir_name)
-        if cp_console_for_logs: cp_console_for_logs.log(f"Temporary browser profile directory target: {profile_path}")
+        logger.debug("Temporary browser profile directory target: %s", profile_path)
+        session_journal.record("created", profile_path, browser=browser_type) # Antes de crearlo: un corte a mitad también se recupera
 
     try:
         if os.path.exists(profile_path):
-            if cp_console_for_logs: cp_console_for_logs.log(f"[yellow]Warning: Profile directory {profile_path} already exists. Removing and recreating.[/yellow]")
+            logger.warning("Profile directory %s already exists. Removing and recreating.", profile_path)
             shutil.rmtree(profile_path)
         os.makedirs(profile_path, exist_ok=True)
-        if cp_console_for_logs:
-            profile_type_str = "Persistent" if is_persistent else "Temporary"
-            cp_console_for_logs.log(f"Creating new {profile_type_str} browser profile directory for {browser_type} at: {profile_path}")
+        logger.debug("Creating new %s browser profile directory for %s at: %s", "Persistent" if is_persistent else "Temporary", browser_type, profile_path)
         
         if bookmark_set_identifier is not None: 
-            if cp_console_for_logs: cp_console_for_logs.log(f"Attempting to load bookmarks for identifier: '{bookmark_set_identifier}'...")
-            all_available_sets = bookmarks_handler.get_available_bookmark_sets(console=console)
-            combined_data = bookmarks_handler.load_multiple_bookmark_sets(
-                bookmark_set_identifier, all_available_sets, console=console
-            )
+            logger.debug("Attempting to load bookmarks for identifier: '%s'...", bookmark_set_identifier)
+            with timing.span("bookmarks.load"):
+                all_available_sets = bookmarks_handler.get_available_bookmark_sets(console=console)
+                combined_data = bookmarks_handler.load_multiple_bookmark_sets(
+                    bookmark_set_identifier, all_available_sets, console=console
+                )
             if combined_data: 
-                load_bookmarks_to_profile(browser_type, profile_path, combined_data, console=console)
-            elif bookmark_set_identifier is not None and cp_console_for_logs:
-                 cp_console_for_logs.log(f"[yellow]No valid bookmarks found for identifier '{bookmark_set_identifier}'. No bookmarks loaded.[/yellow]")
+                with timing.span("bookmarks.write", browser=browser_type):
+                    load_bookmarks_to_profile(browser_type, profile_path, combined_data, console=console)
+            else:
+                logger.debug("No valid bookmarks found for identifier '%s'. No bookmarks loaded.", bookmark_set_identifier)
         return profile_path
     except Exception as e:
         if console: console.print(f"[bold red]Error creating browser profile directory at {profile_path}: {e}[/bold red]")
         if profile_path and os.path.exists(profile_path): 
             try: shutil.rmtree(profile_path)
             except Exception as e_clean:
-                if cp_console_for_logs: cp_console_for_logs.log(f"[bold red]Error cleaning up {profile_path}: {e_clean}[/bold red]")
+                logger.warning("Error cleaning up %s: %s", profile_path, e_clean)
+        if not is_persistent and not os.path.exists(profile_path): session_journal.record("cleaned", profile_path)
         return None
 
 # ... (launch_browser_with_profile y remove_profile como en la última versión completa que te pasé,
 #      que ya tenían el DEBUG_MODE y la lógica de reintentos para remove_profile)
-def launch_browser_with_profile(browser_type_requested: str, profile_path: str, console: Optional[Console] = None) -> Optional[subprocess.Popen]:
-    lp_console_for_logs = console if DEBUG_MODE and console else None
+def launch_browser_with_profile(browser_type_requested: str, profile_path: str, console: Optional[Console] = None,
+                                quiet: bool = False, detach: bool = False, env: Optional[Dict[str, str]] = None) -> Optional[subprocess.Popen]:
+    """
+    Starts the browser on profile_path. quiet sends the browser's stdin/stdout/stderr to
+    os.devnull (scripted mode keeps its stdout for JSON); detach also puts it in its own
+    session/process group so it outlives Guardian Spy and the terminal. env replaces this
+    process's environment (the daemon launches with the client's DISPLAY, proxies...).
+    """
     actual_browser_type = browser_type_requested
     browser_executable = None
     if browser_type_requested == "firefox":
@@ -161,17 +189,19 @@ def launch_browser_with_profile(browser_type_requested: str, profile_path: str,
         if os.path.isabs(path_suggestion_gc) and os.path.exists(path_suggestion_gc): browser_executable = path_suggestion_gc
         else: browser_executable = utils.find_executable(path_suggestion_gc)
         if not browser_executable and platform.system() == "Linux": 
-            if lp_console_for_logs: lp_console_for_logs.log("[yellow]GC not found, trying Chromium.[/yellow]")
+            logger.debug("GC not found, trying Chromium.")
             for name in ["chromium-browser", "chromium"]:
                 browser_executable = utils.find_executable(name)
                 if browser_executable: actual_browser_type = "chromium"; break
     elif browser_type_requested == "chromium": 
         names_to_try = ["chromium-browser", "chromium"] if platform.system() == "Linux" else [get_os_specific_browser_path("chromium")]
+        if get_configured_browser_path("chromium"): names_to_try = [get_configured_browser_path("chromium")]
         for name in names_to_try:
             browser_executable = utils.find_executable(name)
             if browser_executable: actual_browser_type = "chromium"; break
     if not browser_executable:
         if console: console.print(f"[bold red]Could not find executable for: {browser_type_requested}[/bold red]")
+        metrics.inc("launch_failures", browser=browser_type_requested)
         return None
     cmd = []
     if actual_browser_type == "firefox": cmd = [browser_executable, "-profile", profile_path, "-new-instance", "-no-remote"]
@@ -180,45 +210,59 @@ def launch_browser_with_profile(browser_type_requested: str, profile_path: str,
         if console: console.print(f"[bold red]Unsupported browser for launch: {actual_browser_type}[/bold red]")
         return None
     try:
-        if lp_console_for_logs: lp_console_for_logs.log(f"Executing: {' '.join(cmd)}")
+        logger.debug("Executing: %s", ' '.join(cmd))
         creationflags = 0
         if platform.system() == "Windows": creationflags = getattr(subprocess, 'CREATE_NO_WINDOW', 0) 
-        process = subprocess.Popen(cmd, creationflags=creationflags)
+        popen_kwargs = {"env": env} if env is not None else {}
+        if quiet or detach: popen_kwargs.update(stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if detach:
+            if platform.system() == "Windows": creationflags |= getattr(subprocess, 'CREATE_NEW_PROCESS_GROUP', 0) | getattr(subprocess, 'DETACHED_PROCESS', 0)
+            else: popen_kwargs["start_new_session"] = True
+        with timing.span("browser.process_start", browser=actual_browser_type):
+            process = subprocess.Popen(cmd, creationflags=creationflags, **popen_kwargs)
+        session_journal.record("started", profile_path, pid=process.pid, browser=actual_browser_type, detached=detach)
+        metrics.inc("sessions_launched", browser=actual_browser_type)
         return process
     except FileNotFoundError: 
         if console: console.print(f"[bold red]Error: {actual_browser_type} executable not found at '{browser_executable}'.[/bold red]")
     except Exception as e:
         if console: console.print(f"[bold red]Error launching {actual_browser_type}: {e}[/bold red]")
+    metrics.inc("launch_failures", browser=actual_browser_type)
     return None
 
+@timing.timed("profile.cleanup")
 def remove_profile(profile_path: str, console: Optional[Console] = None) -> bool:
-    rp_console_for_logs = console if DEBUG_MODE and console else None
     if not profile_path or not os.path.exists(profile_path):
-        if rp_console_for_logs: rp_console_for_logs.log(f"Profile dir not found: {profile_path}.")
+        logger.debug("Profile dir not found: %s.", profile_path)
+        session_journal.record("cleaned", profile_path)
         return True 
     max_retries = 5; retry_delay = 0.5
     for attempt in range(max_retries):
         try:
             shutil.rmtree(profile_path)
-            if rp_console_for_logs: rp_console_for_logs.log(f"Removed profile dir: {profile_path} (attempt {attempt+1})")
+            logger.debug("Removed profile dir: %s (attempt %s)", profile_path, attempt+1)
+            session_journal.record("cleaned", profile_path)
             return True 
         except PermissionError as e_perm: 
-            if rp_console_for_logs: rp_console_for_logs.log(f"[dim y]Attempt {attempt+1} remove {profile_path} failed (in use). Retrying... Err: {e_perm.winerror if hasattr(e_perm, 'winerror') else e_perm}[/dim y]")
-            if attempt < max_retries - 1: time.sleep(retry_delay)
+            logger.debug("Attempt %s remove %s failed (in use). Retrying... Err: %s", attempt+1, profile_path, e_perm.winerror if hasattr(e_perm, 'winerror') else e_perm)
+            if attempt < max_retries - 1: metrics.inc("profile_cleanup_retries"); time.sleep(retry_delay)
             else: 
                 if console: 
                     console.print(f"[bold red][!] Error removing {profile_path} after {max_retries} attempts.[/bold red]")
                     console.print(f"    Reason: File in use (e.g., {e_perm.filename}). Manual deletion may be needed.[/yellow]")
+                metrics.inc("profile_cleanup_failures")
                 return False
         except OSError as e_os:
-            if rp_console_for_logs: rp_console_for_logs.log(f"[dim y]Attempt {attempt+1} remove {profile_path} failed (OSError). Retrying... Err: {e_os.errno}[/dim y]")
-            if attempt < max_retries - 1: time.sleep(retry_delay)
+            logger.debug("Attempt %s remove %s failed (OSError). Retrying... Err: %s", attempt+1, profile_path, e_os.errno)
+            if attempt < max_retries - 1: metrics.inc("profile_cleanup_retries"); time.sleep(retry_delay)
             else:
                 if console: console.print(f"[bold red][!] Error removing {profile_path}: {e_os}[/bold red]")
+                metrics.inc("profile_cleanup_failures")
                 return False
         except Exception as e: 
             if console: console.print(f"[bold red][!] Unexpected error removing {profile_path}: {e}[/bold red]")
-            if rp_console_for_logs: import traceback; rp_console_for_logs.log(f"[dim r]{traceback.format_exc()}[/dim r]")
+            logger.exception("Unexpected error removing %s", profile_path)
+            metrics.inc("profile_cleanup_failures")
             return False
-    if rp_console_for_logs: rp_console_for_logs.log(f"All {max_retries} retries failed for {profile_path}")
+    logger.debug("All %s retries failed for %s", max_retries, profile_path)
     return False 
\ No newline at end of file
@@ -0,0 +1,116 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/check_setup.py
+"""
+--check-setup: the browser and network checks of 'check', printed as plain text, for
+scripts and cron jobs. It never imports the interactive UI (rich, asyncio, async_shell,
+main_cli), so it starts as fast as the checks allow.
+
+    guardian_spy.py --check-setup    # status 0 if the public IP and DNS servers were found
+"""
+import importlib
+import logging
+import os
+import sys
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict
+
+try:
+    from . import config_manager, network_checker, timing, utils
+except ImportError:
+    import config_manager, network_checker, timing, utils
+
+logger = logging.getLogger(__name__)
+
+BROWSER_LABELS = {"firefox": "Firefox", "chrome": "Chrome", "chromium": "Chromium"}
+
+def _feature(module_name):
+    """Imports a module only some checks need (history_store, local_network, profiling) on first use."""
+    return importlib.import_module(f"{__package__}.{module_name}") if __package__ else importlib.import_module(module_name)
+
+def _out(line: str = ""):
+    print(line, flush=True)
+
+def _render_result(check_name: str, result: Dict):
+    """One line (plus details) per finished check, as they arrive."""
+    status, value, elapsed = result["status"], result["value"], f"({result['elapsed']:.1f}s)"
+    if check_name == network_checker.CHECK_IP:
+        if status != "ok": _out(f"[!] Public IP: {'timed out' if status == 'timeout' else 'could not be retrieved'} {elapsed}"); return
+        _out(f"[*] Public IP: {value}" + (f" via {result['provider']}" if result.get("provider") else "") + f" {elapsed}")
+        if result.get("disagreement"):
+            _out("[!] IP providers disagree (possible split tunnel or proxy):")
+            for provider_name, provider_ip in result.get("answers", {}).items(): _out(f"      - {provider_name}: {provider_ip}")
+        elif result.get("quorum_met") is False: _out("[!] Provider quorum not reached.")
+    elif check_name == network_checker.CHECK_GEO:
+        if status == "ok" and value and value.get("country"):
+            _out(f"[*] Location: {value.get('city', 'N/A')}, {value.get('region', 'N/A')}, {value.get('country', 'N/A')} {elapsed}")
+            _out(f"    ISP: {value.get('isp', 'N/A')}")
+        elif status != "skipped": _out(f"[!] Geolocation: {'timed out' if status == 'timeout' else 'not available'} {elapsed}")
+    elif check_name == network_checker.CHECK_DNS:
+        if status == "ok" and value:
+            _out(f"[*] System DNS servers: {', '.join(value)} {elapsed}")
+        else: _out(f"[!] System DNS servers: {'timed out' if status == 'timeout' else 'could not be retrieved'} {elapsed}")
+
+def _render_inventory(inventory: Dict):
+    if not inventory["supported"]: return
+    _out(f"[*] VPN tunnel: {', '.join(inventory['tunnel_interfaces']) or 'none detected'}")
+    for route in inventory["routes"]: _out(f"      IPv{route['family']} {route['destination']} via {route['interface']}")
+    for finding in inventory["findings"]: _out(f"[{'*' if finding['severity'] == 'info' else '!'}] {finding['message']}")
+
+def checks() -> bool:
+    """Runs and prints the checks. True if the public IP and DNS servers were found."""
+    _out("Browser executables:")
+    browsers = utils.check_browser_executables()
+    for browser, path in browsers.items(): _out(f"  [*] {BROWSER_LABELS.get(browser, browser)}: {path}")
+    if not browsers: _out("  [!] No supported browser (Firefox, Chrome, Chromium) found.")
+    _out()
+    _out("Network checks:")
+    try: results = network_checker.run_network_checks_concurrently(on_result=_render_result)
+    except Exception as e_checks:
+        _out(f"[!] Network checks failed: {e_checks}"); return False
+    if config_manager.get_setting("history_enabled", True):
+        try: _feature("history_store").get_history_store().record_check(results)
+        except Exception as e_history: # El historial nunca debe impedir la comprobación
+            logger.warning("Could not record check history: %s", e_history)
+    try: _render_inventory(_feature("local_network").get_local_inventory())
+    except Exception as e_inventory: logger.warning("Local interface inventory failed: %s", e_inventory)
+    ip_ok = results.get(network_checker.CHECK_IP, {}).get("status") == "ok"
+    dns_ok = results.get(network_checker.CHECK_DNS, {}).get("status") == "ok" and bool(results[network_checker.CHECK_DNS]["value"])
+    _out()
+    _out(f"Checks complete: IP {'OK' if ip_ok else 'ERROR'}, DNS {'OK' if dns_ok else 'ERROR'}")
+    return ip_ok and dns_ok
+
+def run(args) -> int:
+    """Entry point from guardian_spy.py: honours --trace / --profile-run / --trace-malloc. Returns the exit status."""
+    trace_path = None
+    if args.trace is not None or config_manager.get_setting("timing_trace_enabled", False):
+        timing.enable_trace(True)
+        trace_path = args.trace or os.path.join(timing.get_traces_dir(), f"trace-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.json")
+    profiling = None
+    if args.profile_run or args.trace_malloc or config_manager.get_setting("profiling_enabled", False):
+        profiling = _feature("profiling")
+        profiling.configure(enabled=args.profile_run or config_manager.get_setting("profiling_enabled", False), malloc=args.trace_malloc)
+    with timing.span("cmd.check_setup"), (profiling.command("check-setup") if profiling else nullcontext()) as session:
+        ok = checks()
+    if session:
+        for report in session.reports: _out(f"Profile report: {report}")
+    if trace_path:
+        try:
+            written = timing.dump_trace(trace_path)
+            if written: print(f"Timing trace written to {written}", file=sys.stderr)
+        except OSError: pass
+    return 0 if ok else 1
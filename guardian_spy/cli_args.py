@@ -0,0 +1,81 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/cli_args.py
+"""
+Command-line arguments of Guardian Spy. Deliberately imports nothing but argparse, so
+--version and --help are answered without loading rich, requests or the interactive UI.
+"""
+import argparse
+from typing import List, Optional, Tuple
+
+from guardian_spy import __version__, __app_name__
+
+INTERACTIVE_HINT = "Once Guardian Spy starts in interactive mode, type 'help' for in-app commands."
+SCRIPTED_COMMANDS = ("check", "profiles", "launch", "bookmarks", "sessions", "stop", "daemon") # Subcomandos no interactivos (guardian_spy/scripted.py)
+SCRIPTED_HINT = ("Non-interactive JSON commands for scripts: guardian_spy.py {check,profiles,launch,bookmarks,sessions,stop,daemon} ... "
+                 "(see 'guardian_spy.py <command> --help').")
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="guardian_spy.py", add_help=False,
+                                     description=f"{__app_name__} v{__version__}: OPSEC assistant for OSINT practitioners.")
+    info_group = parser.add_argument_group('Informational Arguments')
+    info_group.add_argument("-v", "--version", action="version", version=f"%(prog)s {__version__}")
+    info_group.add_argument("-h", "--help", action="store_true", help="Show Guardian Spy command-line argument help and exit.")
+    info_group.add_argument("--check-setup", action="store_true", help="Perform setup checks (browsers, network) and exit (status 0 if the public IP and DNS servers were found, 1 otherwise).")
+    info_group.add_argument("--debug", action="store_true", help="Log at DEBUG level to logs/guardian_spy.jsonl and show warnings and detailed errors (same as GUARDIAN_SPY_DEBUG=1).")
+    info_group.add_argument("--trace", nargs="?", const="", metavar="FILE", help="Write a Chrome-trace JSON of this run's timings on exit (default: <config dir>/traces/).")
+    info_group.add_argument("--profile-run", action="store_true", help="Profile each command (stack sampling, or cProfile with the 'profiling_mode' setting) and write reports to <config dir>/profiling/.")
+    info_group.add_argument("--trace-malloc", action="store_true", help="Write the top memory allocations of each command (tracemalloc) to <config dir>/profiling/.")
+    action_group = parser.add_argument_group('Session Setup Arguments (influences initial interactive state)')
+    action_group.add_argument("-b", "--browser", choices=['firefox', 'chrome', 'chromium'], help="Pre-select BROWSER for the initial session setup.")
+    action_group.add_argument("--no-bookmarks", action="store_true", help="Start with 'no bookmarks' selected in the initial session setup.")
+    action_group.add_argument("--bookmarks", metavar="SET_IDENTIFIER", help="Pre-select bookmarks. Use filename (e.g. '00_opsec.json'), '__ALL__', or '__GENERAL__'.")
+    return parser
+
+def parse_args(argv: Optional[List[str]] = None) -> Tuple[argparse.Namespace, List[str], argparse.ArgumentParser]:
+    """Returns (args, unknown_args, parser). --version prints and exits here (SystemExit)."""
+    parser = build_parser()
+    args, unknown_args = parser.parse_known_args(argv)
+    return args, unknown_args, parser
+
+# Opciones globales cuyo valor va en el argumento siguiente (--trace: solo si no empieza por '-', como hace argparse)
+VALUE_OPTIONS = ("--trace", "--browser", "-b", "--bookmarks")
+_LONG_OPTIONS = ("--version", "--help", "--check-setup", "--debug", "--trace", "--profile-run", "--trace-malloc",
+                 "--browser", "--no-bookmarks", "--bookmarks")
+
+def _takes_value(arg: str) -> bool:
+    if arg in VALUE_OPTIONS: return True
+    if not arg.startswith("--") or "=" in arg: return False
+    matches = [option for option in _LONG_OPTIONS if option.startswith(arg)] # Abreviaturas de argparse ('--book')
+    return len(matches) == 1 and matches[0] in VALUE_OPTIONS
+
+def subcommand(argv: List[str]) -> Optional[str]:
+    """The first positional argument that is not the value of a global option ('--bookmarks profiles' has none)."""
+    expect_value = False
+    for arg in argv:
+        if arg == "--": return None
+        if expect_value and not arg.startswith("-"): expect_value = False; continue
+        if not arg.startswith("-"): return arg
+        expect_value = _takes_value(arg)
+    return None
+
+def is_scripted(argv: List[str]) -> bool:
+    """True if the subcommand (see subcommand()) is one of the scripted subcommands."""
+    return subcommand(argv) in SCRIPTED_COMMANDS
+
+def print_help(parser: argparse.ArgumentParser):
+    parser.print_help()
+    print(f"\n{INTERACTIVE_HINT}\n{SCRIPTED_HINT}")
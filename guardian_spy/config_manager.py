@@ -16,20 +16,101 @@
 
 # guardian_spy/config_manager.py
 import os
+import sys
 import platform
 import json
+import copy
+import bisect
+import logging
 import shutil # Para eliminar directorios de perfiles de navegador
+import threading
+import contextlib
 from datetime import datetime
 
+try:
+    import fcntl
+except ImportError: # Windows: solo se serializan los hilos de este proceso
+    fcntl = None
+
 APP_NAME = "GuardianSpy" # O el nombre que prefieras para el directorio de config
+CONFIG_DIR_ENV_VAR = "GUARDIAN_SPY_CONFIG_DIR" # Si está definida, sustituye al directorio de config por defecto
+
+logger = logging.getLogger(__name__)
+
+class ProfilesDataError(ValueError):
+    """profiles.json exists but could not be read or parsed (see load_profiles_data(strict=True))."""
+
+# Valores por defecto de settings.json. Cualquier clave ausente en el archivo usa estos valores.
+DEFAULT_SETTINGS = {
+    "network_check_timeout": 12.0, # Presupuesto total (segundos) para las comprobaciones de red de 'check'
+    "http_connect_timeout": 3.0, # Timeout de conexión TCP/TLS por petición HTTP
+    "http_read_timeout": 5.0, # Timeout de lectura por petición HTTP
+    "http_default_pool_size": 4, # Conexiones keep-alive por host (hosts no listados abajo)
+    "http_pool_sizes": { # Conexiones keep-alive por prefijo de URL
+        "https://api.ipify.org": 2,
+        "https://icanhazip.com": 2,
+        "http://ip-api.com": 2,
+    },
+    "ip_providers": [ # Servicios "eco" de IP consultados en paralelo
+        {"name": "ipify", "url": "https://api.ipify.org?format=json", "format": "json", "json_key": "ip"},
+        {"name": "icanhazip", "url": "https://icanhazip.com", "format": "text"},
+    ],
+    "ip_quorum": 1, # 1 = primera respuesta válida; k = esperar a que k proveedores coincidan
+    "ip_disagreement_grace_s": 0.3, # Tras el quórum, espera a las consultas en curso para detectar IPs distintas (0 = no esperar)
+    "ip_race_max_parallel": 3, # Máximo de proveedores consultados a la vez (los más lentos esperan)
+    "geoip_cache_ttl": 3600, # Segundos que se reutiliza una geolocalización correcta (0 = sin caché)
+    "geoip_negative_ttl": 60, # Segundos que se recuerda un fallo de geolocalización
+    "geoip_cache_max_entries": 256, # Máximo de IPs en caché (se expulsan las menos usadas)
+    "geoip_database_path": None, # Ruta a una base .mmdb local (GeoLite2-City, DB-IP lite...) para geolocalizar sin red
+    "geoip_remote_enabled": True, # False = nunca enviar nuestra IP a GEO_IP_SERVICE
+    "geoip_remote_url": None, # Prefijo de URL del servicio GeoIP compatible con ip-api (None = GEO_IP_SERVICE)
+    "browser_executables": None, # {"firefox"|"chrome"|"chromium": ruta} para usar un ejecutable concreto (None = buscar en el sistema)
+    "daemon_socket_path": None, # Socket Unix del daemon (None = <directorio de configuración>/daemon.sock)
+    "daemon_warm_profiles": 1, # Perfiles temporales precreados por navegador mientras corre el daemon (0 = ninguno)
+    "leak_monitor_enabled": True, # Vigilar IP/DNS en segundo plano mientras el navegador está abierto
+    "leak_monitor_min_interval": 15, # Segundos entre muestras tras un cambio
+    "leak_monitor_max_interval": 300, # Intervalo máximo cuando todo está estable
+    "leak_monitor_backoff": 2.0, # Factor de crecimiento del intervalo tras cada muestra estable
+    "leak_monitor_sample_timeout": 8.0, # Presupuesto (segundos) de cada muestra de IP
+    "dns_leak_probe_domain": "example.com", # Dominio bajo el que se generan los nombres aleatorios de la prueba de fugas DNS
+    "dns_leak_probes": 2, # Consultas por resolvedor en la prueba de fugas DNS
+    "dns_leak_timeout": 3.0, # Segundos de espera de respuestas en la prueba de fugas DNS
+    "history_enabled": True, # Guardar cada 'check' en history.sqlite3
+    "history_max_rows": 50000, # Máximo de comprobaciones guardadas (se eliminan las más antiguas)
+    "history_retention_days": 365, # Días que se conserva una comprobación (0 = sin límite)
+    "session_journal_enabled": True, # Registrar las sesiones en sessions.journal para limpiar al arrancar lo que deje un cierre forzado
+    "log_level": "INFO", # Nivel del registro JSON lines en logs/ (con --debug, DEBUG)
+    "log_levels": {}, # Niveles por módulo, p. ej. {"network_checker": "DEBUG"}
+    "log_max_bytes": 5 * 1024 * 1024, # Tamaño a partir del cual se rota el registro
+    "log_backup_count": 3, # Ficheros rotados que se conservan
+    "metrics_enabled": True, # Exportar contadores e histogramas (fichero .prom y, opcional, HTTP) (shell y daemon)
+    "metrics_interval_s": 15, # Segundos entre escrituras del fichero .prom
+    "metrics_textfile_dir": None, # Carpeta del fichero .prom (None = metrics/ en la config); p. ej. la del textfile collector de node_exporter
+    "metrics_http_port": 0, # Puerto de http://127.0.0.1:<puerto>/metrics (0 = sin servidor HTTP)
+    "profile_trim_enabled": True, # Borrar las cachés del navegador de un perfil persistente al terminar su sesión
+    "profile_trim_min_mb": 0, # Solo recortar perfiles de al menos este tamaño (0 = siempre)
+    "profile_trim_paths": None, # {"firefox": [patrones glob], ...} en lugar de disk_usage.TRIM_PATHS (None = los de serie)
+    "profiles_page_size": 20, # Perfiles por página en 'profiles' > 'list'
+    "profiling_enabled": False, # Perfilar cada comando (como --profile-run); informes en profiling/
+    "profiling_mode": "sample", # "sample" (muestreo de pilas, apto para dejar activo) o "cprofile" (determinista, más lento)
+    "profiling_sample_interval_ms": 10, # Intervalo del muestreo de pilas
+    "trace_malloc_frames": 5, # Frames guardados por asignación con --trace-malloc
+    "startup_check_enabled": False, # Lanzar las comprobaciones de red al arrancar el modo interactivo (en segundo plano)
+    "startup_budget_ms": 250, # Presupuesto de arranque hasta el primer prompt (con --debug se avisa si se supera)
+    "timing_trace_enabled": False, # Guardar una traza JSON (formato Chrome) de cada ejecución en traces/
+    "vpn_interface_prefixes": None, # Prefijos de nombre de interfaz VPN (None = tun, tap, wg, ppp, ...)
+}
 
 def get_config_dir():
     """
-    Returns the application's configuration directory path based on OS.
+    Returns the application's configuration directory path based on OS, or the
+    GUARDIAN_SPY_CONFIG_DIR environment variable if set (isolated setups, benchmarks).
     Creates the directory if it doesn't exist.
     """
     system = platform.system()
-    if system == "Windows":
+    if os.environ.get(CONFIG_DIR_ENV_VAR):
+        path = os.path.expanduser(os.environ[CONFIG_DIR_ENV_VAR])
+    elif system == "Windows":
         # %APPDATA%\GuardianSpy
         path = os.path.join(os.environ.get("APPDATA", ""), APP_NAME)
     elif system == "Darwin": # macOS
@@ -59,52 +140,111 @@ def _get_profiles_data_file_path():
     config_dir = get_config_dir()
     return os.path.join(config_dir, "profiles.json")
 
-def load_profiles_data():
+_PROFILES_CACHE = {"key": None, "profiles": None, "error": None}
+_PROFILES_CACHE_LOCK = threading.Lock() # La clave, las filas y el índice se leen y cambian juntos
+_PROFILES_LOCK = threading.RLock() # Hilos de este proceso (flock es por descriptor, no por hilo)
+_PROFILES_LOCK_FD = {"fd": None, "depth": 0}
+
+@contextlib.contextmanager
+def profiles_lock():
+    """
+    Serializes a read-modify-write of profiles.json (load_profiles_data() ... save_profiles_data())
+    between threads and processes: shell, daemon handlers and --no-daemon runs. Reentrant.
+    """
+    with _PROFILES_LOCK:
+        if _PROFILES_LOCK_FD["depth"] == 0:
+            fd = os.open(_get_profiles_data_file_path() + ".lock", os.O_RDWR | os.O_CREAT, 0o600) # Aparte: profiles.json se reemplaza
+            if fcntl: fcntl.flock(fd, fcntl.LOCK_EX)
+            _PROFILES_LOCK_FD["fd"] = fd
+        _PROFILES_LOCK_FD["depth"] += 1
+        try: yield
+        finally:
+            _PROFILES_LOCK_FD["depth"] -= 1
+            if _PROFILES_LOCK_FD["depth"] == 0:
+                fd, _PROFILES_LOCK_FD["fd"] = _PROFILES_LOCK_FD["fd"], None
+                os.close(fd) # Libera también el flock
+
+def load_profiles_data(strict=False):
     """
     Loads the list of persistent profiles from profiles.json.
-    Returns an empty list if the file doesn't exist or is invalid.
+    Returns an empty list if the file doesn't exist or is invalid; with strict, an invalid
+    file raises ProfilesDataError instead (use it before saving: the empty list would
+    replace the unreadable registry).
+    The parsed file is cached until its mtime/size changes (a long-running process such as
+    the daemon re-reads it only after a write); callers get their own profile dicts.
+    """
+    _, profiles, error = _cached_profiles()
+    if strict and error: raise ProfilesDataError(error)
+    return [dict(p) if isinstance(p, dict) else p for p in profiles]
+
+def _cached_profiles():
+    """
+    (cache key, parsed profiles.json, error message if it could not be read) shared by all
+    callers (do not modify the list), re-read only after the file changes. The key
+    identifies the version the rows were parsed from.
     """
     profiles_file = _get_profiles_data_file_path()
-    if not os.path.exists(profiles_file):
-        return []
+    try:
+        st = os.stat(profiles_file)
+        cache_key = (profiles_file, st.st_ino, st.st_mtime_ns, st.st_size) # save_profiles_data() reemplaza el fichero: inodo nuevo
+    except OSError:
+        cache_key = None
+    with _PROFILES_CACHE_LOCK:
+        if cache_key is None: _PROFILES_CACHE.update({"key": None, "profiles": None, "error": None})
+        elif _PROFILES_CACHE["key"] != cache_key:
+            profiles, error = _read_profiles_file(profiles_file)
+            _PROFILES_CACHE.update({"key": cache_key, "profiles": profiles, "error": error})
+        return cache_key, _PROFILES_CACHE["profiles"] or [], _PROFILES_CACHE["error"]
+
+def _read_profiles_file(profiles_file):
+    """(profiles, None), or ([], error message) if the file is not a readable JSON list."""
+    # A stderr: en el modo scripted stdout es solo el documento JSON
     try:
         with open(profiles_file, "r", encoding="utf-8") as f:
             data = json.load(f)
-            # Validar que sea una lista (podría ser un archivo JSON corrupto)
-            if isinstance(data, list):
-                return data
-            else:
-                # console.log(f"[Warning] profiles.json does not contain a list. Returning empty list.") # Necesitaría pasar console
-                print(f"[GuardianSpy Warning] profiles.json data is not a list. Re-initializing.")
-                return []
-    except json.JSONDecodeError:
-        # console.log(f"[Warning] profiles.json is corrupted. Returning empty list.") # Necesitaría pasar console
-        print(f"[GuardianSpy Warning] profiles.json is corrupted. Re-initializing.")
-        return [] # Si el JSON está corrupto, tratar como si no hubiera perfiles
+        # Validar que sea una lista (podría ser un archivo JSON corrupto)
+        if isinstance(data, list): return data, None
+        error = f"{profiles_file} does not contain a list"
+        print(f"[GuardianSpy Warning] profiles.json data is not a list. Ignoring it.", file=sys.stderr)
+    except json.JSONDecodeError as e:
+        error = f"{profiles_file} is corrupted: {e}"
+        print(f"[GuardianSpy Warning] profiles.json is corrupted. Ignoring it.", file=sys.stderr)
     except Exception as e:
-        print(f"[GuardianSpy Error] Failed to load profiles data: {e}")
-        return []
+        error = f"Could not read {profiles_file}: {e}"
+        print(f"[GuardianSpy Error] Failed to load profiles data: {e}", file=sys.stderr)
+    logger.warning("Profiles data unreadable: %s", error)
+    return [], error
 
 def save_profiles_data(profiles_list, console=None):
     """
-    Saves the list of persistent profiles to profiles.json.
+    Saves the list of persistent profiles to profiles.json, atomically (temporary file +
+    os.replace: readers in other processes never see half a file). Wrap the load that
+    produced profiles_list and this call in profiles_lock().
 
     Args:
         profiles_list (list): The list of profile dictionaries to save.
-        console (rich.console.Console, optional): For logging.
+        console (rich.console.Console, optional): For error messages.
     Returns:
         bool: True if successful, False otherwise.
     """
     profiles_file = _get_profiles_data_file_path()
+    for profile in profiles_list: # Textos de la vista de lista, calculados al escribir y no en cada listado
+        if isinstance(profile, dict): profile.update(_profile_display_fields(profile))
+    tmp_path = f"{profiles_file}.{os.getpid()}.tmp"
     try:
-        with open(profiles_file, "w", encoding="utf-8") as f:
-            json.dump(profiles_list, f, indent=4, ensure_ascii=False)
-        if console:
-            console.log(f"Profiles data saved to {profiles_file}")
+        with profiles_lock(): # El nombre temporal es por proceso: los hilos se turnan
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(profiles_list, f, indent=4, ensure_ascii=False)
+                f.flush(); os.fsync(f.fileno())
+            os.replace(tmp_path, profiles_file)
+        logger.debug("Profiles data saved to %s", profiles_file)
         return True
     except Exception as e:
+        try: os.unlink(tmp_path)
+        except OSError: pass
+        logger.error("Error saving profiles data to %s: %s", profiles_file, e)
         if console:
-            console.log(f"[bold red]Error saving profiles data to {profiles_file}: {e}[/bold red]")
+            console.print(f"[bold red]Error saving profiles data to {profiles_file}: {e}[/bold red]")
         else: # Si no hay consola, imprimir al stderr
             print(f"[GuardianSpy Error] Failed to save profiles data: {e}", file=sys.stderr)
         return False
@@ -115,7 +255,7 @@ def get_profile_by_name(profile_name, console=None):
 
     Args:
         profile_name (str): The name of the profile to find.
-        console (rich.console.Console, optional): For logging.
+        console (rich.console.Console, optional): Not used (kept for compatibility).
 
     Returns:
         dict: The profile dictionary if found, else None.
@@ -124,10 +264,186 @@ def get_profile_by_name(profile_name, console=None):
     for profile in profiles:
         if profile.get("profile_name") == profile_name:
             return profile
-    if console:
-        console.log(f"Profile '{profile_name}' not found.")
+    logger.debug("Profile '%s' not found.", profile_name)
     return None
 
+def bookmarks_display_name(identifier, max_length=30):
+    """Short label of a bookmark set identifier (None, "__ALL__", "__GENERAL__", a file or a list of files)."""
+    if identifier == "__ALL__": return "All Sets"
+    if identifier == "__GENERAL__": return "General OSINT"
+    if isinstance(identifier, list):
+        if not identifier: return "None (empty specific)"
+        label = ", ".join(fn.replace(".json", "").replace("_", " ").title() for fn in identifier)
+        return label if len(label) <= max_length else f"{len(identifier)} specific sets"
+    if isinstance(identifier, str): return identifier.replace(".json", "").replace("_", " ").title()
+    return "None"
+
+def _created_timestamp(created_at):
+    """Unix time of a profile's ISO 'created_at' (local time if naive), or None."""
+    if not isinstance(created_at, str) or not created_at: return None
+    try: return datetime.fromisoformat(created_at.replace("Z", "+00:00")).timestamp()
+    except ValueError: return None
+
+def _profile_display_fields(profile):
+    created_at = profile.get("created_at")
+    created_ts = _created_timestamp(created_at)
+    created_date = datetime.fromtimestamp(created_ts).strftime("%Y-%m-%d") if created_ts is not None else \
+        (created_at.split("T")[0] if isinstance(created_at, str) and created_at else "N/A")
+    return {"bookmarks_display": bookmarks_display_name(profile.get("bookmarks_set_name")), "created_date": created_date}
+
+def _bookmark_keys(identifier):
+    if identifier in (None, "", []): return ["none"]
+    return list(identifier) if isinstance(identifier, list) else [identifier]
+
+def _bookmark_filter_key(value):
+    """'none', '__ALL__', '__GENERAL__' or a set file name ('.json' optional)."""
+    value = value.strip()
+    if value.lower() == "none": return "none"
+    return value if value.startswith("__") or value.endswith(".json") else f"{value}.json"
+
+def parse_created_bound(value, end=False):
+    """Unix time of a date ('2025-06-01') or ISO date-time; a bare date as an end bound covers the whole day."""
+    if isinstance(value, (int, float)): return float(value)
+    try: parsed = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    except ValueError: raise ValueError(f"Invalid date: {value!r} (use YYYY-MM-DD or an ISO date-time)")
+    if end and len(str(value).strip()) == 10: return parsed.timestamp() + 86400 - 1e-6
+    return parsed.timestamp()
+
+PROFILE_SORT_KEYS = ("name", "browser", "created")
+
+class ProfileIndex:
+    """
+    profiles.json indexed for list views, built once per version of the file (see
+    get_profile_index()): postings by browser and by bookmark set, names sorted for prefix
+    search, creation times sorted for ranges, and every sort order precomputed. A query
+    touches only the matching entries and returns copies of the requested page.
+    """
+
+    def __init__(self, profiles):
+        self.rows = []
+        for profile in profiles:
+            if not isinstance(profile, dict) or not profile.get("profile_name"): continue
+            row = dict(profile)
+            if "bookmarks_display" not in row or "created_date" not in row: row.update(_profile_display_fields(row)) # Perfiles guardados antes de estos campos
+            self.rows.append(row)
+        self._by_browser, self._by_bookmarks = {}, {}
+        created = []
+        for i, row in enumerate(self.rows):
+            self._by_browser.setdefault(row.get("browser_type"), set()).add(i)
+            for key in _bookmark_keys(row.get("bookmarks_set_name")): self._by_bookmarks.setdefault(key, set()).add(i)
+            created.append(_created_timestamp(row.get("created_at")))
+        self._names = sorted((row["profile_name"].lower(), i) for i, row in enumerate(self.rows))
+        self._created = sorted((ts, i) for i, ts in enumerate(created) if ts is not None)
+        name_order = [i for _, i in self._names]
+        self._orders = {"name": name_order,
+                        "browser": sorted(name_order, key=lambda i: str(self.rows[i].get("browser_type") or "")),
+                        "created": sorted(name_order, key=lambda i: created[i] if created[i] is not None else float("-inf"))}
+        self._ranks = {key: {i: rank for rank, i in enumerate(order)} for key, order in self._orders.items()}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def query(self, browser=None, bookmarks=None, name_prefix=None, created_from=None, created_to=None,
+              sort="name", descending=False, offset=0, limit=None):
+        """
+        Returns (page of profile dicts, total matching). created_from/created_to are
+        inclusive bounds (Unix time or dates, see parse_created_bound()).
+        """
+        if sort not in self._orders: raise ValueError(f"Unknown sort key: {sort} (use {', '.join(PROFILE_SORT_KEYS)})")
+        candidates = None
+        def _narrow(ids):
+            nonlocal candidates
+            candidates = set(ids) if candidates is None else candidates.intersection(ids)
+        if browser: _narrow(self._by_browser.get(browser, ()))
+        if bookmarks: _narrow(self._by_bookmarks.get(_bookmark_filter_key(bookmarks), ()))
+        if name_prefix:
+            prefix = name_prefix.lower()
+            start = bisect.bisect_left(self._names, (prefix,))
+            end = bisect.bisect_left(self._names, (prefix + "\U0010ffff",))
+            _narrow(i for _, i in self._names[start:end])
+        if created_from is not None or created_to is not None:
+            low = parse_created_bound(created_from) if created_from is not None else float("-inf")
+            high = parse_created_bound(created_to, end=True) if created_to is not None else float("inf")
+            start = bisect.bisect_left(self._created, (low, -1))
+            end = bisect.bisect_right(self._created, (high, len(self.rows)))
+            _narrow(i for _, i in self._created[start:end])
+        offset = max(0, int(offset or 0))
+        if candidates is None: # Sin filtros: solo se corta la página del orden ya calculado
+            order, total = self._orders[sort], len(self.rows)
+            stop = total if limit is None else min(total, offset + limit)
+            ids = order[offset:stop] if not descending else [order[total - 1 - k] for k in range(offset, stop)]
+        else:
+            total = len(candidates)
+            ranks = self._ranks[sort]
+            ordered = sorted(candidates, key=ranks.__getitem__, reverse=descending)
+            ids = ordered[offset:None if limit is None else offset + limit]
+        return [dict(self.rows[i]) for i in ids], total
+
+def get_profile_index():
+    """The ProfileIndex of the current profiles.json (rebuilt only after the file changes)."""
+    key, profiles, _ = _cached_profiles()
+    with _PROFILES_CACHE_LOCK: # El índice queda etiquetado con la versión de las filas con las que se construyó
+        index = _PROFILES_CACHE.get("index")
+        if index is None or index[0] != key:
+            index = _PROFILES_CACHE["index"] = (key, ProfileIndex(profiles))
+    return index[1]
+
+def query_profiles(**filters):
+    """get_profile_index().query(**filters): (page of profiles, total matching)."""
+    return get_profile_index().query(**filters)
+
+def _get_settings_file_path():
+    """Returns the full path to the settings.json file."""
+    config_dir = get_config_dir()
+    return os.path.join(config_dir, "settings.json")
+
+_SETTINGS_CACHE = {"key": None, "settings": None}
+
+def load_settings():
+    """
+    Loads user settings from settings.json, merged over DEFAULT_SETTINGS.
+    Unknown keys are kept; a missing or corrupted file yields the defaults.
+    The parsed file is cached until its mtime/size changes; callers get their own copy.
+    """
+    settings_file = _get_settings_file_path()
+    try:
+        st = os.stat(settings_file)
+        cache_key = (settings_file, st.st_mtime_ns, st.st_size)
+    except OSError:
+        cache_key = (settings_file, None, None)
+    if _SETTINGS_CACHE["key"] == cache_key:
+        return copy.deepcopy(_SETTINGS_CACHE["settings"])
+    settings = _read_settings_file(settings_file)
+    _SETTINGS_CACHE.update({"key": cache_key, "settings": settings})
+    return copy.deepcopy(settings)
+
+def _read_settings_file(settings_file):
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    if not os.path.exists(settings_file):
+        return settings
+    try:
+        with open(settings_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            settings.update(data)
+        else:
+            print(f"[GuardianSpy Warning] settings.json data is not an object. Using defaults.", file=sys.stderr)
+    except json.JSONDecodeError:
+        print(f"[GuardianSpy Warning] settings.json is corrupted. Using defaults.", file=sys.stderr)
+    except Exception as e:
+        print(f"[GuardianSpy Error] Failed to load settings: {e}", file=sys.stderr)
+    return settings
+
+def get_setting(key, default=None):
+    """
+    Returns a single setting value.
+
+    Args:
+        key (str): The setting name (see DEFAULT_SETTINGS).
+        default: Returned if the key is neither in settings.json nor in DEFAULT_SETTINGS.
+    """
+    return load_settings().get(key, default)
+
 # --- Funciones para gestionar perfiles (Añadir, Eliminar, etc.) ---
 # Las implementaremos en los siguientes pasos.
 # Por ahora, tenemos la base para cargar y guardar.
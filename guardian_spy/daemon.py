@@ -0,0 +1,383 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/daemon.py
+"""
+Optional resident Guardian Spy daemon with a local Unix-socket API.
+
+It keeps warm what every cold invocation rebuilds: imported modules and the pooled HTTP
+session, the browser discovery result, the bookmark set and profile registry caches,
+and a pool of pre-created temporary profiles. It also owns the browsers it launches
+detached, removing their temporary profiles when they exit. Scripted commands
+(scripted.py) are forwarded here automatically while it runs (see daemon_client.py),
+except 'check' and 'launch --wait', which depend on the caller's network route and
+terminal; browsers are started with the environment the client sends (DISPLAY,
+WAYLAND_DISPLAY, DBUS_SESSION_BUS_ADDRESS, proxies...), not the daemon's.
+
+    guardian_spy.py daemon start | stop [--force] | status
+    python -m guardian_spy.daemon          # foreground, e.g. under systemd
+
+Requests (one JSON object per line, answered in order on the same connection):
+
+    ping                          version, pid, uptime
+    status                        sessions, warm pool, request counters
+    run       argv, version, env  a scripted command -> {"document", "exit_code"}
+    launch    profile | browser, bookmarks, env -> a detached session
+    stop      session             terminate a session's browser (temporary profile removed)
+    sessions                      running and recently finished sessions
+    refresh                       rediscover browsers, refill the pool
+    shutdown  force               stop the daemon (force terminates running sessions)
+
+The socket is created mode 0600 and, on Linux, peers with another uid are rejected.
+"""
+import collections
+import itertools
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from guardian_spy import __version__, DEBUG_MODE
+try:
+    from . import config_manager, browser_manager, disk_usage, log_setup, metrics, scripted, session_journal, timing, utils
+    from .daemon_client import DaemonClient, DaemonUnavailable, MAX_MESSAGE_BYTES, get_socket_path, is_supported
+except ImportError:
+    import config_manager, browser_manager, disk_usage, log_setup, metrics, scripted, session_journal, timing, utils
+    from daemon_client import DaemonClient, DaemonUnavailable, MAX_MESSAGE_BYTES, get_socket_path, is_supported
+
+logger = logging.getLogger("guardian_spy.daemon") # No __name__: con 'python -m' sería "__main__"
+
+REAP_INTERVAL = 0.5 # Segundos entre comprobaciones de navegadores terminados
+FINISHED_SESSIONS_KEPT = 100 # Sesiones terminadas que se siguen mostrando en 'sessions'
+MAX_POOL_KEYS = 8 # Combinaciones (navegador, bookmarks) con perfiles precreados
+START_TIMEOUT = 10.0 # Segundos que 'daemon start' espera a que el socket responda
+DAEMON_LOG_FILENAME = "daemon.jsonl" # En logs/, separado del registro de la CLI
+
+class WarmProfilePool:
+    """
+    Temporary profiles created ahead of time per (browser, bookmarks). take() hands one
+    out in O(1); a background thread refills the pool after every take.
+    """
+
+    def __init__(self, size: int):
+        self.size = max(0, size)
+        self._pools: Dict[str, Dict] = {} # {clave: {"browser", "bookmarks", "paths": deque}}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._refill_loop, name="gs-daemon-pool", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _key(browser: str, bookmarks) -> str:
+        return f"{browser}:{json.dumps(bookmarks, sort_keys=True)}" # Las listas de sets no son hashables
+
+    def want(self, browser: str, bookmarks=None):
+        """Starts keeping warm profiles for this combination (bounded by MAX_POOL_KEYS)."""
+        if not self.size: return
+        with self._lock:
+            key = self._key(browser, bookmarks)
+            if key not in self._pools and len(self._pools) < MAX_POOL_KEYS:
+                self._pools[key] = {"browser": browser, "bookmarks": bookmarks, "paths": collections.deque()}
+        self._wake.set()
+
+    def take(self, browser: str, bookmarks=None) -> Optional[str]:
+        """Returns a pre-created temporary profile path, or None if none is ready."""
+        self.want(browser, bookmarks)
+        with self._lock:
+            pool = self._pools.get(self._key(browser, bookmarks))
+            while pool and pool["paths"]:
+                path = pool["paths"].popleft()
+                if os.path.isdir(path): return path # Alguien pudo limpiar /tmp entretanto
+        return None
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock: return {key: len(pool["paths"]) for key, pool in self._pools.items()}
+
+    def _next_missing(self) -> Optional[Dict]:
+        with self._lock:
+            return next((pool for pool in self._pools.values() if len(pool["paths"]) < self.size), None)
+
+    def _refill_loop(self):
+        while not self._closed:
+            self._wake.wait(); self._wake.clear()
+            while not self._closed:
+                pool = self._next_missing()
+                if pool is None: break
+                path = browser_manager.create_profile(pool["browser"], profile_name_prefix="gs_temp_browser_profile", bookmark_set_identifier=pool["bookmarks"])
+                with self._lock:
+                    keep = bool(path) and not self._closed
+                    if keep: pool["paths"].append(path)
+                    elif not path: self._pools = {k: p for k, p in self._pools.items() if p is not pool} # No reintentar en bucle
+                if keep: continue
+                if path: browser_manager.remove_profile(path) # Cerrado mientras se creaba
+                else: logger.warning("Warm profile pool: could not pre-create a %s profile", pool["browser"])
+
+    def close(self):
+        """Stops refilling and removes every pooled profile."""
+        with self._lock:
+            self._closed = True
+            paths = [path for pool in self._pools.values() for path in pool["paths"]]
+            self._pools.clear()
+        self._wake.set()
+        for path in paths: browser_manager.remove_profile(path)
+
+class SessionRegistry:
+    """Browsers launched detached by the daemon. A reaper thread removes temporary profiles when they exit."""
+
+    def __init__(self):
+        self._running: Dict[int, Dict] = {}
+        self._finished = collections.deque(maxlen=FINISHED_SESSIONS_KEPT)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._reap_loop, name="gs-daemon-reaper", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _summary(session: Dict) -> Dict:
+        return {k: v for k, v in session.items() if k != "process"}
+
+    def track(self, process, browser: str, profile_path: str, temporary: bool, profile_name: Optional[str] = None) -> Dict:
+        session = {"session": next(self._ids), "pid": process.pid, "browser": browser, "profile": profile_name, "profile_path": profile_path,
+                   "temporary": temporary, "started": time.time(), "process": process}
+        with self._lock: self._running[session["session"]] = session
+        return self._summary(session)
+
+    def stop(self, session_id: int, timeout: float = 5.0) -> Optional[Dict]:
+        with self._lock: session = self._running.get(session_id)
+        if session is None: return None
+        process = session["process"]
+        process.terminate()
+        try: process.wait(timeout=timeout)
+        except Exception: process.kill(); process.wait()
+        return self._finish(session, stopped=True)
+
+    def list(self) -> Dict[str, List[Dict]]:
+        with self._lock:
+            return {"running": [self._summary(s) for s in self._running.values()], "finished": list(self._finished)}
+
+    def running_count(self) -> int:
+        with self._lock: return len(self._running)
+
+    def _finish(self, session: Dict, stopped: bool = False) -> Optional[Dict]:
+        with self._lock:
+            if self._running.pop(session["session"], None) is None: return None # Ya lo cerró el otro hilo
+        session.update({"exit_code": session["process"].returncode, "ended": time.time(), "stopped": stopped})
+        session_journal.record("ended", session["profile_path"], exit_code=session["exit_code"])
+        if session["temporary"]: session["profile_removed"] = browser_manager.remove_profile(session["profile_path"])
+        else: session["trimmed"] = disk_usage.trim_after_session(session["profile_path"], session["browser"])
+        summary = self._summary(session)
+        with self._lock: self._finished.appendleft(summary)
+        logger.info("Session %s (%s) ended with status %s", session["session"], session["browser"], session["exit_code"])
+        return summary
+
+    def _reap_loop(self):
+        while not self._stop.wait(REAP_INTERVAL):
+            with self._lock: exited = [s for s in self._running.values() if s["process"].poll() is not None]
+            for session in exited: self._finish(session)
+
+    def close(self, terminate_all: bool = False):
+        """Stops reaping. Temporary sessions (or all, with terminate_all) are terminated so no profile is left behind."""
+        self._stop.set()
+        with self._lock: sessions = list(self._running.values())
+        for session in sessions:
+            if terminate_all or session["temporary"]: self.stop(session["session"])
+
+class DaemonState:
+    """Warm state shared by every client. scripted.py uses it (scripted.DAEMON_STATE) while running inside the daemon."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = collections.Counter()
+        self._browsers_lock = threading.Lock()
+        self._browsers: Optional[Dict[str, str]] = None
+        self.recovery = session_journal.recover() # Sesiones de un daemon o shell anterior que murió sin limpiar
+        self.pool = WarmProfilePool(int(config_manager.get_setting("daemon_warm_profiles", 1)))
+        self.sessions = SessionRegistry()
+
+    def browsers(self, refresh: bool = False) -> Dict[str, str]:
+        """Cached check_browser_executables() result."""
+        with self._browsers_lock:
+            if self._browsers is None or refresh: self._browsers = utils.check_browser_executables()
+            return dict(self._browsers)
+
+    def warm_up(self):
+        for browser in self.browsers(): self.pool.want(browser, None)
+        for module_name in ("network_checker", "history_store", "local_network"): scripted._feature(module_name)
+
+    def close(self, terminate_all: bool = False):
+        self.sessions.close(terminate_all)
+        self.pool.close()
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon: "Daemon" = self.server.owner
+        if not daemon.peer_allowed(self.connection): return
+        while True:
+            line = self.rfile.readline(MAX_MESSAGE_BYTES)
+            if not line: return
+            try: request = json.loads(line)
+            except ValueError: request = None
+            response = daemon.dispatch(request) if isinstance(request, dict) else {"ok": False, "error": {"code": "protocol", "message": "Invalid JSON request"}}
+            try: self.wfile.write((json.dumps(response, default=str, separators=(",", ":")) + "\n").encode("utf-8")); self.wfile.flush()
+            except OSError: return # El cliente se fue (Ctrl+C)
+            if request and request.get("command") == "shutdown" and response.get("ok"): daemon.request_shutdown()
+
+class Daemon:
+    def __init__(self, socket_path: Optional[str] = None):
+        self.socket_path = socket_path or get_socket_path()
+        self.state: Optional[DaemonState] = None
+        self.server: Optional[_Server] = None
+
+    def peer_allowed(self, connection) -> bool:
+        if not hasattr(socket, "SO_PEERCRED"): return True # Sin SO_PEERCRED (macOS): basta con los permisos 0600 del socket
+        pid, uid, gid = struct.unpack("3i", connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")))
+        if uid == os.getuid(): return True
+        logger.warning("Rejected connection from pid %s (uid %s)", pid, uid)
+        return False
+
+    def dispatch(self, request: Dict) -> Dict:
+        command = request.get("command")
+        self.state.requests[command] += 1
+        response = {"id": request.get("id")}
+        try:
+            with timing.span("daemon.request", command=command):
+                response.update(self._handle(command, request))
+        except Exception as e:
+            logger.exception("Request %r failed", command)
+            response.update({"ok": False, "error": {"code": "internal", "message": f"{type(e).__name__}: {e}"}})
+        return response
+
+    def _handle(self, command: str, request: Dict) -> Dict:
+        state = self.state
+        if command == "ping":
+            return {"ok": True, "version": __version__, "pid": os.getpid(), "uptime": time.time() - state.started}
+        if command == "status":
+            return {"ok": True, "version": __version__, "pid": os.getpid(), "socket": self.socket_path, "uptime": time.time() - state.started,
+                    "requests": dict(state.requests), "sessions_running": state.sessions.running_count(),
+                    "warm_profiles": state.pool.snapshot(), "browsers": state.browsers(),
+                    "recovered": {k: v for k, v in state.recovery.items() if k != "sessions"}}
+        if command == "run":
+            if request.get("version") != __version__:
+                return {"ok": False, "error": {"code": "version_mismatch", "message": f"Daemon runs {__version__}, client {request.get('version')}"}}
+            document, exit_code = scripted.execute([str(a) for a in request.get("argv") or []], env=request.get("env"))
+            return {"ok": True, "document": document, "exit_code": exit_code}
+        if command == "launch":
+            argv = ["launch", "--detach"] + (["--profile", str(request["profile"])] if request.get("profile") else ["--browser", str(request.get("browser"))])
+            if request.get("bookmarks"): argv += ["--bookmarks", str(request["bookmarks"])]
+            document, exit_code = scripted.execute(argv, env=request.get("env"))
+            return {"ok": document.get("ok", False), "document": document, "exit_code": exit_code}
+        if command == "stop":
+            summary = state.sessions.stop(int(request.get("session") or 0))
+            if summary is None: return {"ok": False, "error": {"code": "not_found", "message": f"No running session {request.get('session')}"}}
+            return {"ok": True, "session": summary}
+        if command == "sessions":
+            return {"ok": True, **state.sessions.list()}
+        if command == "refresh":
+            browsers = state.browsers(refresh=True)
+            for browser in browsers: state.pool.want(browser, None)
+            return {"ok": True, "browsers": browsers}
+        if command == "shutdown":
+            running = state.sessions.running_count()
+            if running and not request.get("force"):
+                return {"ok": False, "error": {"code": "sessions_running", "message": f"{running} session(s) still running; use force to terminate them"}}
+            return {"ok": True}
+        return {"ok": False, "error": {"code": "unknown_command", "message": f"Unknown command: {command!r}"}}
+
+    def _bind(self):
+        if os.path.exists(self.socket_path):
+            try: DaemonClient(self.socket_path).close()
+            except DaemonUnavailable: os.unlink(self.socket_path) # Socket huérfano de un daemon que murió
+            else: raise RuntimeError(f"A daemon is already listening on {self.socket_path}")
+        os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+        old_umask = os.umask(0o177) # Socket 0600 desde su creación, sin ventana con otros permisos
+        try: self.server = _Server(self.socket_path, _Handler)
+        finally: os.umask(old_umask)
+        self.server.owner = self
+
+    def request_shutdown(self):
+        if self.server: threading.Thread(target=self.server.shutdown, name="gs-daemon-shutdown", daemon=True).start()
+
+    def serve_forever(self):
+        """Binds the socket and serves until 'shutdown' or SIGTERM/SIGINT."""
+        self.state = DaemonState()
+        scripted.DAEMON_STATE = self.state
+        self._bind()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: self.request_shutdown())
+        logger.info("Guardian Spy daemon %s listening on %s (pid %s)", __version__, self.socket_path, os.getpid())
+        self.state.warm_up()
+        try:
+            self.server.serve_forever(poll_interval=0.5)
+        finally:
+            self.server.server_close()
+            try: os.unlink(self.socket_path)
+            except OSError: pass
+            self.state.close(terminate_all=True)
+            scripted.DAEMON_STATE = None
+            logger.info("Guardian Spy daemon stopped")
+
+# --- Control del daemon desde la CLI ('daemon start|stop|status') ---
+
+def get_log_path() -> str:
+    return os.path.join(log_setup.get_logs_dir(), DAEMON_LOG_FILENAME)
+
+def _status(client: DaemonClient, **extra) -> Dict:
+    status = client.request("status")
+    status.pop("id", None)
+    return {**status, **extra}
+
+def start_background() -> Dict:
+    """Starts the daemon as a detached process and waits until it answers. Returns its 'status'."""
+    import subprocess
+    try:
+        with DaemonClient() as client: return _status(client, already_running=True)
+    except DaemonUnavailable: pass
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [package_parent, os.environ.get("PYTHONPATH")])))
+    process = subprocess.Popen([sys.executable, "-m", "guardian_spy.daemon"], env=env, cwd=package_parent, start_new_session=True,
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return {"ok": False, "error": {"code": "start_failed", "message": f"Daemon exited with status {process.returncode}; see {get_log_path()}"}}
+        try:
+            with DaemonClient() as client: return _status(client, already_running=False)
+        except DaemonUnavailable: time.sleep(0.05)
+    return {"ok": False, "error": {"code": "start_timeout", "message": f"Daemon did not answer within {START_TIMEOUT:.0f}s; see {get_log_path()}"}}
+
+def main():
+    if not is_supported():
+        print("The Guardian Spy daemon needs Unix domain sockets.", file=sys.stderr); return 2
+    log_setup.configure(debug=DEBUG_MODE, filename=DAEMON_LOG_FILENAME)
+    metrics.start_exporter("daemon")
+    try: Daemon().serve_forever()
+    except RuntimeError as e:
+        logger.error("%s", e); return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/daemon_client.py
+"""
+Client side of the Guardian Spy daemon (see daemon.py). Kept to socket + json so that
+forwarding a scripted command costs a connect and one round trip, not an import of the UI.
+
+Protocol: one JSON object per line in each direction over a Unix stream socket.
+
+    {"id": 1, "command": "run", "argv": ["profiles", "list"], "env": {...}}
+    {"id": 1, "ok": true, "exit_code": 0, "document": {...}}
+"""
+import itertools
+import json
+import os
+import socket
+from typing import Dict, List, Optional, Tuple
+
+from guardian_spy import __version__
+try:
+    from . import config_manager
+except ImportError:
+    import config_manager
+
+CONNECT_TIMEOUT = 1.0 # Segundos para conectar: si el daemon no responde, se ejecuta en local
+INTERRUPT_GRACE = 5.0 # Tras Ctrl+C: espera a la respuesta en curso para poder cerrar lo que haya lanzado
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024 # Límite de una línea de respuesta
+
+class DaemonUnavailable(Exception):
+    """No daemon is listening on the socket (not started, stale socket, unsupported platform)."""
+
+def is_supported() -> bool:
+    return hasattr(socket, "AF_UNIX")
+
+def get_socket_path() -> str:
+    """The 'daemon_socket_path' setting, or <config dir>/daemon.sock."""
+    configured = config_manager.get_setting("daemon_socket_path")
+    return os.path.expanduser(configured) if configured else os.path.join(config_manager.get_config_dir(), "daemon.sock")
+
+class DaemonClient:
+    """One connection to the daemon; several requests can be sent over it."""
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: Optional[float] = None):
+        if not is_supported(): raise DaemonUnavailable("Unix sockets are not available on this platform")
+        self.socket_path = socket_path or get_socket_path()
+        if not os.path.exists(self.socket_path): raise DaemonUnavailable(f"No daemon socket at {self.socket_path}")
+        self._ids = itertools.count(1)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._sock.settimeout(CONNECT_TIMEOUT)
+            self._sock.connect(self.socket_path)
+        except OSError as e: # ECONNREFUSED = socket huérfano de un daemon que murió
+            self._sock.close()
+            raise DaemonUnavailable(f"Daemon not reachable at {self.socket_path}: {e}") from e
+        self._sock.settimeout(timeout)
+        self._reader = self._sock.makefile("rb")
+
+    def request(self, command: str, **fields) -> Dict:
+        """
+        Sends one request and waits for its response (no timeout unless given to the constructor).
+        On Ctrl+C it waits up to INTERRUPT_GRACE for the response (the daemon finishes the request
+        anyway) and re-raises KeyboardInterrupt with it as .response (None if it did not come).
+        """
+        request_id = next(self._ids)
+        self._sock.sendall((json.dumps({"id": request_id, "command": command, **fields}, separators=(",", ":")) + "\n").encode("utf-8"))
+        try: return self._receive(request_id)
+        except KeyboardInterrupt as e:
+            e.response = None
+            try:
+                self._sock.settimeout(INTERRUPT_GRACE)
+                e.response = self._receive(request_id)
+            except (OSError, ValueError, DaemonUnavailable, KeyboardInterrupt): pass
+            raise e
+
+    def _receive(self, request_id: int) -> Dict:
+        line = self._reader.readline(MAX_MESSAGE_BYTES)
+        if not line: raise DaemonUnavailable("Daemon closed the connection")
+        response = json.loads(line)
+        if response.get("id") != request_id: raise DaemonUnavailable(f"Unexpected response id {response.get('id')} (expected {request_id})")
+        return response
+
+    def close(self):
+        try: self._reader.close()
+        finally: self._sock.close()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+def forward(argv: List[str], env: Optional[Dict[str, str]] = None) -> Optional[Tuple[Dict, int]]:
+    """
+    Runs a scripted command (argv without the program name) in the daemon, with env as the
+    environment of anything it starts.
+    Returns (document, exit_code), or None if no daemon (of this version) is running so the
+    caller runs it locally.
+    """
+    try: client = DaemonClient()
+    except DaemonUnavailable: return None
+    with client:
+        response = client.request("run", argv=argv, version=__version__, env=env)
+    if (response.get("error") or {}).get("code") == "version_mismatch": return None # Daemon de otra versión: no mezclar
+    if "document" not in response: # El daemon rechazó la petición (error de protocolo)
+        return {"ok": False, "error": response.get("error") or {"code": "daemon", "message": "Invalid daemon response"}}, 1
+    return response["document"], response["exit_code"]
@@ -0,0 +1,196 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/disk_usage.py
+"""
+Disk usage of persistent profiles, and cache trimming when their sessions end.
+
+    disk_usage.get_sizes([path, ...])       {path: {"bytes", "files"} or None}
+    disk_usage.trim_after_session(path, "firefox")
+
+Sizes are allocated bytes (st_blocks on POSIX), summed by walking the top-level
+subdirectories of every requested profile in parallel. Results are cached in
+<config dir>/disk_usage.json under a signature of the profile's top-level entries
+(name, mtime, size): browsers touch those on every run, so a session invalidates the
+entry, and the end of a session refreshes it anyway. The list view asks only for the
+profiles on screen, so a long list never walks every profile.
+
+After a persistent session ends, trim_after_session() deletes the browser's cache
+directories ('profile_trim_paths', default TRIM_PATHS: HTTP and code caches, shader
+caches, service worker cache storage, crash dumps). It never touches logins, cookies,
+history or settings. Only profiles under browser_profiles/ are trimmed, only paths inside
+the profile are deleted, and symlinks are unlinked, not followed.
+"""
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from . import config_manager, metrics
+except ImportError:
+    import config_manager, metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILENAME = "disk_usage.json"
+SIZE_WORKERS = 8 # Subárboles recorridos en paralelo
+
+# Cachés que el navegador regenera (patrones glob relativos al perfil)
+_CHROMIUM_TRIM_PATHS = ["*/Cache", "*/Code Cache", "*/GPUCache", "*/DawnCache", "*/DawnGraphiteCache", "*/DawnWebGPUCache",
+                        "*/Service Worker/CacheStorage", "*/Service Worker/ScriptCache", "ShaderCache", "GrShaderCache",
+                        "GraphiteDawnCache", "component_crx_cache", "Crashpad/completed", "Crashpad/pending"]
+TRIM_PATHS: Dict[str, List[str]] = {
+    "firefox": ["cache2", "startupCache", "thumbnails", "shader-cache", "OfflineCache", "jumpListCache",
+                "storage/default/*/cache", "crashes", "minidumps", "datareporting/archived", "saved-telemetry-pings"],
+    "chrome": _CHROMIUM_TRIM_PATHS,
+    "chromium": _CHROMIUM_TRIM_PATHS,
+}
+
+_CACHE: Optional[Dict[str, Dict]] = None # Ruta -> {"signature", "bytes", "files"}
+_LOCK = threading.Lock()
+
+def _get_cache_path() -> str:
+    return os.path.join(config_manager.get_config_dir(), CACHE_FILENAME)
+
+def _load_cache() -> Dict[str, Dict]:
+    global _CACHE
+    if _CACHE is None:
+        try:
+            with open(_get_cache_path(), "r", encoding="utf-8") as f: data = json.load(f)
+            _CACHE = data if isinstance(data, dict) else {}
+        except (OSError, ValueError): _CACHE = {}
+    return _CACHE
+
+def _save_cache():
+    path = _get_cache_path()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f: json.dump(_CACHE, f)
+        os.replace(tmp_path, path)
+    except OSError as e: logger.warning("Could not save the disk usage cache: %s", e)
+
+def _allocated(st: os.stat_result) -> int:
+    blocks = getattr(st, "st_blocks", None)
+    return blocks * 512 if blocks is not None else st.st_size
+
+def _walk(path: str) -> Tuple[int, int]:
+    """(allocated bytes, files) under path, without following symlinks."""
+    total = files = 0
+    stack = [path]
+    while stack:
+        try: entries = os.scandir(stack.pop())
+        except OSError: continue # Borrado o sin permisos mientras se recorre
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False): stack.append(entry.path); continue
+                    total += _allocated(entry.stat(follow_symlinks=False)); files += 1
+                except OSError: continue
+    return total, files
+
+def _top_level(path: str) -> Tuple[str, List[str], int, int]:
+    """(signature, subdirectories, bytes and files directly in path). Raises OSError if path is not a directory."""
+    digest = hashlib.blake2b(digest_size=16)
+    subdirs, total, files = [], 0, 0
+    with os.scandir(path) as entries:
+        for entry in sorted(entries, key=lambda e: e.name):
+            try: st = entry.stat(follow_symlinks=False)
+            except OSError: continue
+            digest.update(f"{entry.name}\0{st.st_mtime_ns}\0{st.st_size}\n".encode("utf-8", "surrogateescape"))
+            if entry.is_dir(follow_symlinks=False): subdirs.append(entry.path)
+            else: total += _allocated(st); files += 1
+    return digest.hexdigest(), subdirs, total, files
+
+def get_sizes(paths: Iterable[str], refresh: bool = False) -> Dict[str, Optional[Dict]]:
+    """{path: {"bytes", "files"}} for each profile directory (None if it does not exist). Walks only stale entries."""
+    results: Dict[str, Optional[Dict]] = {}
+    pending = {} # Ruta -> (firma, subdirectorios, bytes y ficheros de primer nivel)
+    with _LOCK: cache = _load_cache()
+    for path in dict.fromkeys(p for p in paths if p):
+        try: signature, subdirs, total, files = _top_level(path)
+        except OSError: results[path] = None; continue
+        cached = cache.get(path)
+        if not refresh and cached and cached.get("signature") == signature:
+            results[path] = {"bytes": cached["bytes"], "files": cached["files"]}
+        else: pending[path] = (signature, subdirs, total, files)
+    if not pending: return results
+    jobs = [(path, subdir) for path, (_, subdirs, _, _) in pending.items() for subdir in subdirs]
+    with ThreadPoolExecutor(max_workers=max(1, min(SIZE_WORKERS, len(jobs))), thread_name_prefix="gs-du") as pool:
+        walked = list(pool.map(lambda job: (job[0], _walk(job[1])), jobs))
+    totals = {path: [total, files] for path, (_, _, total, files) in pending.items()}
+    for path, (size, count) in walked: totals[path][0] += size; totals[path][1] += count
+    with _LOCK:
+        for path, (size, count) in totals.items():
+            cache[path] = {"signature": pending[path][0], "bytes": size, "files": count}
+            results[path] = {"bytes": size, "files": count}
+        _save_cache()
+    return results
+
+def format_size(size: Optional[int]) -> str:
+    if size is None: return "-"
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB": return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def _inside(path: str, root: str) -> bool:
+    return os.path.realpath(path).startswith(os.path.join(os.path.realpath(root), ""))
+
+def get_trim_paths(browser: str) -> List[str]:
+    configured = config_manager.get_setting("profile_trim_paths")
+    if isinstance(configured, dict) and browser in configured: return list(configured[browser])
+    return TRIM_PATHS.get(browser, [])
+
+def trim_profile(profile_path: str, browser: str) -> Dict:
+    """
+    Deletes the cache directories of one profile. Returns {"removed": [relative paths],
+    "freed_bytes", "failed": [relative paths], "size": {"bytes", "files"} after trimming}.
+    """
+    result = {"removed": [], "freed_bytes": 0, "failed": []}
+    for pattern in get_trim_paths(browser):
+        for target in sorted(glob.glob(os.path.join(glob.escape(profile_path), pattern))):
+            relative = os.path.relpath(target, profile_path)
+            if not os.path.islink(target) and not _inside(target, profile_path): continue # Nunca fuera del perfil
+            try:
+                if os.path.islink(target) or not os.path.isdir(target):
+                    freed = 0 if os.path.islink(target) else _allocated(os.stat(target)); os.unlink(target)
+                else:
+                    freed = _walk(target)[0]; shutil.rmtree(target)
+            except OSError as e:
+                logger.warning("Could not trim %s: %s", target, e); result["failed"].append(relative); continue
+            result["removed"].append(relative); result["freed_bytes"] += freed
+    result["size"] = get_sizes([profile_path], refresh=True).get(profile_path)
+    if result["freed_bytes"]: metrics.inc("profile_trimmed_bytes", result["freed_bytes"])
+    logger.info("Trimmed %s: %s", profile_path, {k: v for k, v in result.items() if k != "removed"}, extra={"removed": result["removed"]})
+    return result
+
+def trim_after_session(profile_path: Optional[str], browser: str) -> Optional[Dict]:
+    """
+    The 'profile_trim_enabled' policy, applied when a persistent session ends: trims the
+    profile if it is at least 'profile_trim_min_mb' large. Returns trim_profile()'s result,
+    or None if nothing was trimmed (disabled, too small, not a persistent profile).
+    """
+    if not profile_path or not config_manager.get_setting("profile_trim_enabled", True): return None
+    if not _inside(profile_path, config_manager.get_browser_profiles_base_dir()) or not os.path.isdir(profile_path): return None
+    min_bytes = float(config_manager.get_setting("profile_trim_min_mb", 0)) * 1024 * 1024
+    if min_bytes > 0: # Sin umbral no hace falta medir antes (trim_profile mide después)
+        size = get_sizes([profile_path], refresh=True).get(profile_path)
+        if size is None or size["bytes"] < min_bytes: return None
+    return trim_profile(profile_path, browser)
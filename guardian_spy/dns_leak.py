@@ -0,0 +1,212 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/dns_leak.py
+"""
+DNS leak test: sends probes for unique random names straight to each resolver over
+UDP (own minimal wire-format encoder, no dnspython) and reports which resolvers
+answer and how fast. All probes are in flight at once and are multiplexed with a
+selector, so the whole test costs one round trip to the slowest resolver.
+"""
+import time
+import errno
+import socket
+import struct
+import secrets
+import selectors
+import ipaddress
+import logging
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from . import config_manager, network_checker, timing
+except ImportError:
+    import config_manager, network_checker, timing
+
+logger = logging.getLogger(__name__)
+
+DNS_PORT = 53
+QTYPE_A = 1
+QTYPE_AAAA = 28
+QCLASS_IN = 1
+_FLAG_RD = 0x0100 # Recursion Desired
+_FLAG_QR = 0x8000 # Es una respuesta
+_HEADER = struct.Struct(">HHHHHH")
+_MAX_UDP_RESPONSE = 4096
+_REFUSED_ERROR = "Connection refused (no DNS service on that address)"
+
+RCODE_NAMES = {0: "NOERROR", 1: "FORMERR", 2: "SERVFAIL", 3: "NXDOMAIN", 4: "NOTIMP", 5: "REFUSED"}
+
+def random_probe_name(domain: str) -> str:
+    """Returns a never-seen-before name under domain, so no cache can answer it."""
+    return f"gs-{secrets.token_hex(8)}.{domain.strip('.')}"
+
+def encode_query(txid: int, name: str, qtype: int = QTYPE_A) -> bytes:
+    """Encodes a single-question, recursion-desired DNS query."""
+    qname = b""
+    for label in name.strip(".").split("."):
+        raw = label.encode("idna")
+        if not 0 < len(raw) < 64: raise ValueError(f"Invalid DNS label in {name!r}")
+        qname += bytes([len(raw)]) + raw
+    return _HEADER.pack(txid, _FLAG_RD, 1, 0, 0, 0) + qname + b"\x00" + struct.pack(">HH", qtype, QCLASS_IN)
+
+def _skip_name(data: bytes, offset: int) -> int:
+    while True:
+        if offset >= len(data): raise ValueError("Truncated name")
+        length = data[offset]
+        if length & 0xC0 == 0xC0: # Puntero de compresión: fin del nombre
+            if offset + 1 >= len(data): raise ValueError("Malformed name")
+            return offset + 2
+        if length == 0: return offset + 1
+        offset += 1 + length
+
+def _read_name(data: bytes, offset: int) -> str:
+    labels, jumps = [], 0
+    while True:
+        if offset >= len(data) or jumps > 32: raise ValueError("Malformed name")
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if offset + 1 >= len(data): raise ValueError("Malformed name") # Paquete cortado tras el primer byte del puntero
+            offset = ((length & 0x3F) << 8) | data[offset + 1]; jumps += 1; continue
+        if length == 0: return ".".join(labels)
+        labels.append(data[offset + 1:offset + 1 + length].decode("ascii", errors="replace"))
+        offset += 1 + length
+
+def decode_response(data: bytes) -> Dict:
+    """
+    Decodes the parts of a DNS response the leak test needs.
+
+    Returns:
+        dict: {"txid", "rcode", "question", "answers": [addresses of A/AAAA records], "truncated"}.
+    Raises:
+        ValueError: if the packet is not a well-formed response.
+    """
+    if len(data) < _HEADER.size: raise ValueError("Packet shorter than a DNS header")
+    txid, flags, qdcount, ancount, _, _ = _HEADER.unpack_from(data)
+    if not flags & _FLAG_QR: raise ValueError("Not a DNS response")
+    offset = _HEADER.size; question = None
+    for _ in range(qdcount):
+        if question is None: question = _read_name(data, offset).lower()
+        offset = _skip_name(data, offset) + 4
+    answers = []
+    for _ in range(ancount):
+        offset = _skip_name(data, offset)
+        if offset + 10 > len(data): raise ValueError("Truncated resource record")
+        rtype, _, _, rdlength = struct.unpack_from(">HHIH", data, offset); offset += 10
+        rdata = data[offset:offset + rdlength]; offset += rdlength
+        if rtype == QTYPE_A and rdlength == 4: answers.append(str(ipaddress.IPv4Address(rdata)))
+        elif rtype == QTYPE_AAAA and rdlength == 16: answers.append(str(ipaddress.IPv6Address(rdata)))
+    return {"txid": txid, "rcode": flags & 0x000F, "question": question, "answers": answers, "truncated": bool(flags & 0x0200)}
+
+def _resolver_address(resolver: str, port: int) -> Tuple[int, Tuple]:
+    address = ipaddress.ip_address(resolver.split("%", 1)[0])
+    if address.version == 4: return socket.AF_INET, (resolver, port)
+    scope_id = socket.if_nametoindex(resolver.split("%", 1)[1]) if "%" in resolver else 0
+    return socket.AF_INET6, (resolver.split("%", 1)[0], port, 0, scope_id)
+
+@timing.timed("dns.leak_test")
+def run_dns_leak_test(resolvers: Optional[List[str]] = None, port: int = DNS_PORT, probes: Optional[int] = None,
+                      domain: Optional[str] = None, timeout: Optional[float] = None, console=None) -> Dict:
+    """
+    Probes every resolver concurrently and reports which ones answer.
+
+    Each resolver gets its own connected UDP socket (so the kernel drops packets from
+    any other source and ICMP "port unreachable" surfaces as a refusal) and 'probes'
+    queries for unique random names under 'domain'. Replies are matched on transaction
+    id and question name. port exists so the test can target a local stand-in server.
+
+    Args:
+        resolvers: IPs to probe (default: network_checker.get_dns_servers()).
+        port, probes, domain, timeout: override 'dns_leak_probes', 'dns_leak_probe_domain'
+            and 'dns_leak_timeout' from settings.
+
+    Returns:
+        dict: {"resolvers": {ip: {"responded", "latency" (fastest reply, s), "rcode",
+               "answers", "sent", "received", "error"}}, "responding": [...],
+               "silent": [...], "elapsed"}.
+    """
+    settings = config_manager.load_settings()
+    probes = max(1, int(probes or settings.get("dns_leak_probes", 2)))
+    domain = domain or settings.get("dns_leak_probe_domain", "example.com")
+    timeout = float(timeout or settings.get("dns_leak_timeout", 3.0))
+    if resolvers is None: resolvers = network_checker.get_dns_servers(console=console)
+
+    started = time.perf_counter()
+    results: Dict[str, Dict] = {}
+    pending: Dict[Tuple[str, int], Tuple[str, float]] = {} # (resolver, txid) -> (nombre, instante de envío)
+    selector = selectors.DefaultSelector()
+    try:
+        for resolver in dict.fromkeys(resolvers): # Sin duplicados, conservando el orden
+            result = results[resolver] = {"responded": False, "latency": None, "rcode": None, "answers": [],
+                                          "sent": 0, "received": 0, "error": None}
+            try:
+                family, address = _resolver_address(resolver, port)
+                sock = socket.socket(family, socket.SOCK_DGRAM)
+            except (ValueError, OSError) as e_sock:
+                result["error"] = f"Invalid resolver address: {e_sock}"; continue
+            try:
+                sock.setblocking(False)
+                sock.connect(address)
+                for _ in range(probes):
+                    txid = secrets.randbits(16)
+                    while (resolver, txid) in pending: txid = secrets.randbits(16)
+                    name = random_probe_name(domain)
+                    sock.send(encode_query(txid, name))
+                    pending[(resolver, txid)] = (name.lower(), time.perf_counter()); result["sent"] += 1
+                selector.register(sock, selectors.EVENT_READ, resolver)
+            except OSError as e_send:
+                result["error"] = _REFUSED_ERROR if e_send.errno == errno.ECONNREFUSED else f"Send failed: {e_send.strerror or e_send}"
+                sock.close()
+                for pending_key in [k for k in pending if k[0] == resolver]: del pending[pending_key]
+
+        deadline = started + timeout
+        while selector.get_map() and pending:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0: break
+            for key, _ in selector.select(remaining):
+                resolver = key.data; result = results[resolver]
+                try: data = key.fileobj.recv(_MAX_UDP_RESPONSE)
+                except BlockingIOError: continue
+                except OSError as e_recv: # ECONNREFUSED: ICMP port unreachable
+                    result["error"] = _REFUSED_ERROR if e_recv.errno == errno.ECONNREFUSED else f"Receive failed: {e_recv.strerror or e_recv}"
+                    selector.unregister(key.fileobj); key.fileobj.close()
+                    for pending_key in [k for k in pending if k[0] == resolver]: del pending[pending_key]
+                    continue
+                received_at = time.perf_counter()
+                try: response = decode_response(data)
+                except ValueError as e_decode:
+                    logger.debug("Ignoring malformed DNS reply from %s: %s", resolver, e_decode)
+                    continue
+                sent = pending.get((resolver, response["txid"]))
+                if not sent or response["question"] != sent[0]: continue # Respuesta tardía o que no es nuestra
+                del pending[(resolver, response["txid"])]
+                latency = received_at - sent[1]
+                result["responded"] = True; result["received"] += 1
+                if result["latency"] is None or latency < result["latency"]: result["latency"] = latency
+                result["rcode"] = RCODE_NAMES.get(response["rcode"], str(response["rcode"]))
+                result["answers"] = sorted(set(result["answers"]) | set(response["answers"]))
+                if result["received"] == result["sent"]:
+                    selector.unregister(key.fileobj); key.fileobj.close()
+    finally:
+        for key in list(selector.get_map().values()): key.fileobj.close()
+        selector.close()
+
+    for resolver, result in results.items():
+        if not result["responded"] and not result["error"]: result["error"] = f"No reply within {timeout:.1f}s"
+    logger.debug("DNS leak test: %s resolver(s) probed in %.3fs", len(results), time.perf_counter() - started)
+    return {"resolvers": results,
+            "responding": [r for r, res in results.items() if res["responded"]],
+            "silent": [r for r, res in results.items() if not res["responded"]],
+            "elapsed": time.perf_counter() - started}
@@ -0,0 +1,113 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/geoip_cache.py
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+try:
+    from . import config_manager
+except ImportError:
+    import config_manager
+
+class GeoIPCache:
+    """
+    In-memory LRU cache of GeoIP results keyed by IP, persisted to geoip_cache.json.
+
+    Successful lookups live for 'geoip_cache_ttl' seconds and failures (negative entries)
+    for 'geoip_negative_ttl' seconds. The cache never holds more than
+    'geoip_cache_max_entries' IPs; the least recently used ones are evicted first.
+    """
+
+    def __init__(self, cache_file: Optional[str] = None):
+        self._cache_file = cache_file
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict() # {ip: {"geo", "error", "expires"}}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _get_cache_file(self) -> str:
+        if not self._cache_file:
+            self._cache_file = os.path.join(config_manager.get_config_dir(), "geoip_cache.json")
+        return self._cache_file
+
+    def _load(self):
+        # Se llama con self._lock adquirido
+        if self._loaded: return
+        self._loaded = True
+        try:
+            with open(self._get_cache_file(), "r", encoding="utf-8") as f: data = json.load(f)
+        except (OSError, ValueError): return # Sin caché previa o corrupta: empezar vacía
+        if not isinstance(data, dict): return
+        now = time.time()
+        for ip, entry in sorted(data.items(), key=lambda item: item[1].get("expires", 0) if isinstance(item[1], dict) else 0):
+            if isinstance(entry, dict) and entry.get("expires", 0) > now:
+                self._entries[ip] = entry
+
+    def _save(self):
+        # Escritura atómica: nunca dejar un JSON a medias si el proceso muere aquí
+        cache_file = self._get_cache_file()
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp" # Por proceso: shell, daemon y --no-daemon pueden guardar a la vez
+        try:
+            with open(tmp_file, "w", encoding="utf-8") as f: json.dump(self._entries, f)
+            os.replace(tmp_file, cache_file)
+        except OSError: # La caché es una optimización; un fallo de escritura no es un error
+            try: os.unlink(tmp_file)
+            except OSError: pass
+
+    def get(self, ip: str) -> Tuple[bool, Optional[Dict], Optional[str]]:
+        """Returns (hit, geo_info, error). A negative hit has geo_info None and the cached error."""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(ip)
+            if entry is None: return False, None, None
+            if entry.get("expires", 0) <= time.time():
+                del self._entries[ip]
+                return False, None, None
+            self._entries.move_to_end(ip)
+            return True, entry.get("geo"), entry.get("error")
+
+    def put(self, ip: str, geo_info: Optional[Dict], error: Optional[str] = None):
+        """Stores a lookup result. geo_info None means a failed lookup (negative entry)."""
+        settings = config_manager.load_settings()
+        ttl = float(settings.get("geoip_cache_ttl", 3600) if geo_info else settings.get("geoip_negative_ttl", 60))
+        if ttl <= 0: return
+        max_entries = max(1, int(settings.get("geoip_cache_max_entries", 256)))
+        with self._lock:
+            self._load()
+            self._entries[ip] = {"geo": geo_info, "error": error, "expires": time.time() + ttl}
+            self._entries.move_to_end(ip)
+            while len(self._entries) > max_entries: self._entries.popitem(last=False)
+            self._save()
+
+    def clear(self):
+        """Drops every entry, in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+            self._loaded = True
+            self._save()
+
+_GEOIP_CACHE: Optional[GeoIPCache] = None
+_GEOIP_CACHE_LOCK = threading.Lock()
+
+def get_geoip_cache() -> GeoIPCache:
+    """Returns the process-wide GeoIP cache, creating it on first use."""
+    global _GEOIP_CACHE
+    with _GEOIP_CACHE_LOCK:
+        if _GEOIP_CACHE is None: _GEOIP_CACHE = GeoIPCache()
+        return _GEOIP_CACHE
@@ -0,0 +1,193 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/history_store.py
+import os
+import re
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+try:
+    from . import config_manager, metrics, network_checker
+except ImportError:
+    import config_manager, metrics, network_checker
+
+HISTORY_DB_FILENAME = "history.sqlite3"
+
+# Campos cuyo cambio respecto a su último valor correcto se registra en changed_fields
+TRACKED_FIELDS = ("public_ip", "country", "city", "isp", "dns_servers")
+# Campo -> columna del estado de la comprobación que lo obtiene (solo cuenta si fue "ok")
+FIELD_STATUS = {"public_ip": "ip_status", "country": "geo_status", "city": "geo_status", "isp": "geo_status", "dns_servers": "dns_status"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checks (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    public_ip TEXT, provider TEXT, disagreement INTEGER NOT NULL DEFAULT 0,
+    country TEXT, region TEXT, city TEXT, isp TEXT,
+    dns_servers TEXT,
+    ip_status TEXT, geo_status TEXT, dns_status TEXT,
+    ip_elapsed REAL, geo_elapsed REAL, dns_elapsed REAL,
+    changed_fields TEXT
+);
+CREATE INDEX IF NOT EXISTS checks_ts ON checks(ts);
+CREATE INDEX IF NOT EXISTS checks_changed_ts ON checks(ts) WHERE changed_fields IS NOT NULL;
+"""
+_COLUMNS = ("ts", "public_ip", "provider", "disagreement", "country", "region", "city", "isp", "dns_servers",
+            "ip_status", "geo_status", "dns_status", "ip_elapsed", "geo_elapsed", "dns_elapsed", "changed_fields")
+_MAINTENANCE_EVERY = 256 # Inserciones entre dos pasadas de rotación/compactación
+
+_DURATION_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhdw])\s*$", re.IGNORECASE)
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+def parse_duration(text: str) -> Optional[float]:
+    """Parses '90s', '30m', '24h', '7d' or '2w' into seconds. Returns None for 'all' or ''."""
+    if not text or text.strip().lower() == "all": return None
+    match = _DURATION_RE.match(text)
+    if not match: raise ValueError(f"Invalid duration '{text}' (use e.g. 30m, 24h, 7d, all)")
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2).lower()]
+
+class HistoryStore:
+    """
+    Append-only history of network checks in history.sqlite3 (config dir).
+
+    Every row stores the public IP, the provider that answered, geolocation, DNS servers,
+    per-check status/timings and the list of tracked fields that changed since their last
+    successful check (NULL when nothing changed; a failed check is not a change, nor is
+    the recovery after it). Rows are indexed by time, and changed rows
+    have their own partial index, so range and "changes only" queries stay fast over
+    years of checks. Every _MAINTENANCE_EVERY inserts, rows older than
+    'history_retention_days' or beyond 'history_max_rows' are dropped and the freed pages
+    are returned to the OS (incremental vacuum).
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self._db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._last_values: Dict[str, Optional[str]] = {} # Campo -> último valor de una comprobación "ok"
+
+    def _connect(self) -> sqlite3.Connection:
+        # Se llama con self._lock adquirido
+        if self._conn is not None: return self._conn
+        if not self._db_path: self._db_path = os.path.join(config_manager.get_config_dir(), HISTORY_DB_FILENAME)
+        conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL") # Solo tiene efecto al crear la base
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        self._last_values = {}
+        for field in TRACKED_FIELDS:
+            last = conn.execute(f"SELECT {field} FROM checks WHERE {FIELD_STATUS[field]} = 'ok' ORDER BY id DESC LIMIT 1").fetchone()
+            if last: self._last_values[field] = last[0]
+        self._conn = conn
+        return conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                try: self._conn.execute("PRAGMA optimize")
+                except sqlite3.Error: pass
+                self._conn.close(); self._conn = None
+
+    def record_check(self, results: Dict[str, Dict], ts: Optional[float] = None) -> Dict:
+        """
+        Appends the outcome of network_checker.run_network_checks_concurrently() and
+        returns the stored row (as a dict).
+        """
+        ip_res = results.get(network_checker.CHECK_IP, {})
+        geo_res = results.get(network_checker.CHECK_GEO, {})
+        dns_res = results.get(network_checker.CHECK_DNS, {})
+        geo = geo_res.get("value") if geo_res.get("status") == "ok" else None
+        row = {
+            "ts": time.time() if ts is None else ts,
+            "public_ip": ip_res.get("value") if ip_res.get("status") == "ok" else None,
+            "provider": ip_res.get("provider"), "disagreement": int(bool(ip_res.get("disagreement"))),
+            "country": (geo or {}).get("country"), "region": (geo or {}).get("region"),
+            "city": (geo or {}).get("city"), "isp": (geo or {}).get("isp"),
+            "dns_servers": ",".join(sorted(dns_res.get("value") or [])) or None,
+            "ip_status": ip_res.get("status"), "geo_status": geo_res.get("status"), "dns_status": dns_res.get("status"),
+            "ip_elapsed": ip_res.get("elapsed"), "geo_elapsed": geo_res.get("elapsed"), "dns_elapsed": dns_res.get("elapsed"),
+        }
+        with self._lock:
+            conn = self._connect()
+            succeeded = [f for f in TRACKED_FIELDS if row[FIELD_STATUS[f]] == "ok"]
+            # Sin valor anterior correcto, el primero solo es un cambio si trae datos
+            changed = [f for f in succeeded if row[f] != self._last_values.get(f) and (f in self._last_values or row[f] is not None)]
+            row["changed_fields"] = ",".join(changed) or None
+            if self._last_values.get("public_ip") and row["public_ip"] and "public_ip" in changed:
+                metrics.inc("ip_changes", source="history")
+            with conn:
+                cursor = conn.execute(f"INSERT INTO checks ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                                      [row[c] for c in _COLUMNS])
+            row["id"] = cursor.lastrowid
+            self._last_values.update({f: row[f] for f in succeeded})
+            if row["id"] % _MAINTENANCE_EVERY == 0: self._maintain(conn)
+        return row
+
+    def _maintain(self, conn: sqlite3.Connection):
+        # Se llama con self._lock adquirido
+        settings = config_manager.load_settings()
+        retention_days = float(settings.get("history_retention_days", 365) or 0)
+        max_rows = int(settings.get("history_max_rows", 50000) or 0)
+        with conn:
+            if retention_days > 0:
+                conn.execute("DELETE FROM checks WHERE ts < ?", (time.time() - retention_days * 86400,))
+            if max_rows > 0:
+                conn.execute("DELETE FROM checks WHERE id <= (SELECT MAX(id) FROM checks) - ?", (max_rows,))
+        conn.execute("PRAGMA incremental_vacuum")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def compact(self):
+        """Applies retention/rotation now and returns freed space to the OS."""
+        with self._lock: self._maintain(self._connect())
+
+    def _where(self, since: Optional[float], until: Optional[float], changed_only: bool):
+        clauses, params = [], []
+        if since is not None: clauses.append("ts >= ?"); params.append(since)
+        if until is not None: clauses.append("ts < ?"); params.append(until)
+        if changed_only: clauses.append("changed_fields IS NOT NULL")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, since: Optional[float] = None, until: Optional[float] = None, changed_only: bool = False,
+              limit: Optional[int] = None) -> List[Dict]:
+        """
+        Returns checks with since <= ts < until (epoch seconds, None = unbounded), oldest
+        first. With limit, only the most recent 'limit' matching rows are returned.
+        """
+        where, params = self._where(since, until, changed_only)
+        sql = f"SELECT * FROM checks{where} ORDER BY ts DESC"
+        if limit: sql += " LIMIT ?"; params.append(int(limit))
+        with self._lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return [dict(r) for r in reversed(rows)]
+
+    def count(self, since: Optional[float] = None, until: Optional[float] = None, changed_only: bool = False) -> int:
+        where, params = self._where(since, until, changed_only)
+        with self._lock:
+            return self._connect().execute(f"SELECT COUNT(*) FROM checks{where}", params).fetchone()[0]
+
+_HISTORY_STORE: Optional[HistoryStore] = None
+_HISTORY_STORE_LOCK = threading.Lock()
+
+def get_history_store() -> HistoryStore:
+    """Returns the process-wide history store, creating it on first use."""
+    global _HISTORY_STORE
+    with _HISTORY_STORE_LOCK:
+        if _HISTORY_STORE is None: _HISTORY_STORE = HistoryStore()
+        return _HISTORY_STORE
@@ -0,0 +1,183 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/leak_monitor.py
+import asyncio
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from guardian_spy import DEBUG_MODE
+try:
+    from . import config_manager, metrics, network_checker, local_network
+except ImportError:
+    import config_manager, metrics, network_checker, local_network
+
+logger = logging.getLogger(__name__)
+
+class LeakMonitor:
+    """
+    Background thread that watches the public IP, the DNS servers and (on Linux) the
+    local tunnel/route inventory while a browser session is running, and queues an alert
+    whenever any of them drifts from the baseline (e.g. the VPN dropped, the resolver
+    changed or an IPv6 route now bypasses the tunnel).
+
+    The check interval adapts: it grows by 'leak_monitor_backoff' after every stable
+    sample up to 'leak_monitor_max_interval', and snaps back to
+    'leak_monitor_min_interval' after any change. Samples reuse the pooled HTTP session
+    and never spawn subprocesses; between samples the thread sleeps on an Event, so
+    stop() wakes it immediately.
+
+    Usage:
+        monitor = LeakMonitor(baseline_ip="1.2.3.4", baseline_dns=["10.8.0.1"])
+        monitor.start()
+        ...
+        for alert in monitor.get_alerts(): console.print(alert["message"])
+        monitor.stop()
+
+    Inside an event loop, run_async() is the same loop as an asyncio task (cancel it to stop).
+    """
+
+    def __init__(self, baseline_ip: Optional[str] = None, baseline_dns: Optional[List[str]] = None,
+                 baseline_local_findings: Optional[List[str]] = None, console=None):
+        settings = config_manager.load_settings()
+        self.min_interval = float(settings.get("leak_monitor_min_interval", 15))
+        self.max_interval = max(self.min_interval, float(settings.get("leak_monitor_max_interval", 300)))
+        self.backoff = max(1.0, float(settings.get("leak_monitor_backoff", 2.0)))
+        self.sample_timeout = float(settings.get("leak_monitor_sample_timeout", 8.0))
+        self.baseline_ip = baseline_ip
+        self.baseline_dns = sorted(baseline_dns) if baseline_dns else None
+        self.baseline_local_findings = set(baseline_local_findings) if baseline_local_findings is not None else None
+        self._reported_local_findings = set()
+        self.interval = self.min_interval
+        self.samples_taken = 0
+        self._console = console if DEBUG_MODE else None
+        self._alerts: "queue.Queue[Dict]" = queue.Queue()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_state = (baseline_ip, tuple(self.baseline_dns or ()))
+
+    def start(self):
+        if self._thread and self._thread.is_alive(): return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="gs-leak-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        self._stop_event.set()
+        if self._thread: self._thread.join(timeout=timeout)
+
+    def get_alerts(self) -> List[Dict]:
+        """Drains and returns the pending alerts: [{"kind", "message", "time", ...}]."""
+        alerts = []
+        while True:
+            try: alerts.append(self._alerts.get_nowait())
+            except queue.Empty: return alerts
+
+    def _sample_ip(self) -> Optional[str]:
+        # Solo el proveedor más rápido; el resto solo si falla (menos tráfico que una carrera completa)
+        providers = network_checker.get_ip_providers()
+        if not providers: return None
+        race = network_checker.race_ip_providers(providers[:1], quorum=1, timeout=self.sample_timeout, console=self._console)
+        if not race["ip"] and len(providers) > 1:
+            race = network_checker.race_ip_providers(providers[1:], quorum=1, timeout=self.sample_timeout, console=self._console)
+        return race["ip"]
+
+    def _sample_dns(self) -> Optional[List[str]]:
+        servers = network_checker.get_dns_servers(console=self._console, allow_subprocess=False)
+        return sorted(servers) if servers else None # None = desconocido en esta plataforma
+
+    def _queue_alert(self, kind: str, message: str, **extra):
+        self._alerts.put({"kind": kind, "message": message, "time": time.time(), **extra})
+
+    def _check_local_inventory(self) -> bool:
+        # Lectura de /proc y /sys (< 1 ms): permite detectar la caída del túnel antes que la IP
+        inventory = local_network.get_local_inventory()
+        if not inventory["supported"]: return False
+        problems = {f["message"] for f in inventory["findings"] if f["severity"] in (local_network.SEVERITY_LEAK, local_network.SEVERITY_WARNING)}
+        if self.baseline_local_findings is None:
+            self.baseline_local_findings = problems
+            return False
+        new_problems = problems - self.baseline_local_findings - self._reported_local_findings
+        for message in sorted(new_problems):
+            self._queue_alert("local_route_changed", f"Local network changed: {message}", tunnels=inventory["tunnel_interfaces"])
+        self._reported_local_findings = (self._reported_local_findings | new_problems) & problems
+        return bool(new_problems)
+
+    def sample_once(self) -> bool:
+        """Takes one sample, queues alerts for new drifts. Returns True if the state changed."""
+        local_changed = self._check_local_inventory()
+        current_ip = self._sample_ip()
+        current_dns = self._sample_dns()
+        self.samples_taken += 1
+        if self.baseline_ip is None and current_ip: self.baseline_ip = current_ip
+        if self.baseline_dns is None and current_dns: self.baseline_dns = current_dns
+
+        state = (current_ip, tuple(current_dns or ()))
+        changed = state != self._last_state
+        if not changed: return local_changed
+        last_ip, last_dns = self._last_state
+        self._last_state = state
+
+        if current_ip != last_ip:
+            if current_ip is None:
+                self._queue_alert("ip_unreachable", "Public IP could not be determined (connection lost or blocked?).")
+            elif self.baseline_ip and current_ip != self.baseline_ip:
+                metrics.inc("ip_changes", source="monitor")
+                self._queue_alert("ip_changed", f"Public IP changed: {self.baseline_ip} -> {current_ip}. Possible VPN drop!",
+                                  baseline=self.baseline_ip, current=current_ip)
+            elif last_ip is not None or self.samples_taken > 1:
+                self._queue_alert("ip_restored", f"Public IP back to baseline ({current_ip}).", current=current_ip)
+        if current_dns is not None and tuple(current_dns) != last_dns:
+            if self.baseline_dns and current_dns != self.baseline_dns:
+                self._queue_alert("dns_changed", f"DNS servers changed: {', '.join(self.baseline_dns)} -> {', '.join(current_dns)}.",
+                                  baseline=self.baseline_dns, current=current_dns)
+            elif last_dns:
+                self._queue_alert("dns_restored", f"DNS servers back to baseline ({', '.join(current_dns)}).", current=current_dns)
+        return True
+
+    def _next_interval(self, changed: bool, first: bool):
+        if changed and not first: self.interval = self.min_interval
+        else: self.interval = min(self.max_interval, self.interval * self.backoff) if not first else self.min_interval
+
+    def _sample_safely(self) -> bool:
+        try: return self.sample_once()
+        except Exception as e_sample: # El monitor nunca debe tumbar la sesión
+            logger.warning("Leak monitor sample failed: %s", e_sample)
+            return False
+
+    def _run(self):
+        first = True
+        while not self._stop_event.is_set():
+            self._next_interval(self._sample_safely(), first)
+            first = False
+            self._stop_event.wait(self.interval)
+
+    async def run_async(self, on_alert: Callable[[Dict], None]):
+        """
+        Sampling loop as an asyncio task: samples run in the loop's default executor, the
+        waits are asyncio sleeps and new alerts are handed to on_alert on the loop thread.
+        Runs until cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        first = True
+        while True:
+            changed = await loop.run_in_executor(None, self._sample_safely)
+            for alert in self.get_alerts(): on_alert(alert)
+            self._next_interval(changed, first)
+            first = False
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,171 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/local_network.py
+"""
+Local interface and route inventory (Linux) for IPv6 / WebRTC leak assessment.
+Everything is read straight from /proc and /sys: no subprocesses, no network traffic.
+"""
+import os
+import platform
+import ipaddress
+from typing import Dict, List, Optional
+
+try:
+    from . import config_manager, timing
+except ImportError:
+    import config_manager, timing
+
+PROC_IF_INET6 = "/proc/net/if_inet6"
+PROC_ROUTE = "/proc/net/route"
+PROC_IPV6_ROUTE = "/proc/net/ipv6_route"
+SYS_CLASS_NET = "/sys/class/net"
+
+# Nombres típicos de interfaces de túnel VPN (OpenVPN, WireGuard, PPP/L2TP, IPsec, clientes comerciales)
+DEFAULT_TUNNEL_PREFIXES = ("tun", "tap", "wg", "ppp", "ipsec", "vti", "utun", "nordlynx", "proton", "mullvad", "tailscale", "zt")
+# ARPHRD_*: NONE (tun/wireguard), PPP, TUNNEL, TUNNEL6, SIT, IPGRE, IP6GRE
+_TUNNEL_ARPHRD_TYPES = {65534, 512, 768, 769, 776, 778, 823}
+
+_IPV6_SCOPES = {0x00: "global", 0x10: "host", 0x20: "link", 0x40: "site"}
+_IFA_F_TEMPORARY = 0x01
+_RTF_UP = 0x0001
+_RTF_REJECT = 0x0200
+_ULA_NETWORK = ipaddress.ip_network("fc00::/7")
+
+SEVERITY_LEAK = "leak"
+SEVERITY_WARNING = "warning"
+SEVERITY_INFO = "info"
+
+def _read_lines(path: str) -> List[str]:
+    try:
+        with open(path, "r", encoding="ascii", errors="ignore") as f: return f.read().splitlines()
+    except OSError: return []
+
+def _read_sys_value(interface: str, attribute: str) -> Optional[str]:
+    try:
+        with open(os.path.join(SYS_CLASS_NET, interface, attribute), "r", encoding="ascii", errors="ignore") as f:
+            return f.read().strip()
+    except OSError: return None
+
+def _is_tunnel_interface(name: str, arphrd_type: Optional[int], prefixes) -> bool:
+    if name.startswith(tuple(prefixes)): return True
+    if arphrd_type in _TUNNEL_ARPHRD_TYPES: return True
+    return os.path.exists(os.path.join(SYS_CLASS_NET, name, "tun_flags")) # Cualquier tun/tap, tenga el nombre que tenga
+
+def _hex_to_ipv4(hex_le: str) -> str:
+    # /proc/net/route guarda las direcciones en hexadecimal little-endian
+    return str(ipaddress.IPv4Address(int.from_bytes(bytes.fromhex(hex_le), "little")))
+
+def read_interfaces(tunnel_prefixes=DEFAULT_TUNNEL_PREFIXES) -> Dict[str, Dict]:
+    """Returns {name: {"up", "operstate", "tunnel", "ipv6": [...]}} for every interface."""
+    interfaces: Dict[str, Dict] = {}
+    try: names = os.listdir(SYS_CLASS_NET)
+    except OSError: names = []
+    for name in names:
+        raw_type = _read_sys_value(name, "type")
+        raw_flags = _read_sys_value(name, "flags")
+        arphrd_type = int(raw_type) if raw_type and raw_type.isdigit() else None
+        up = bool(int(raw_flags, 16) & 0x1) if raw_flags else False # IFF_UP
+        interfaces[name] = {"up": up, "operstate": _read_sys_value(name, "operstate") or "unknown",
+                            "tunnel": name != "lo" and _is_tunnel_interface(name, arphrd_type, tunnel_prefixes),
+                            "loopback": name == "lo" or arphrd_type == 772, "ipv6": []}
+    for line in _read_lines(PROC_IF_INET6):
+        parts = line.split()
+        if len(parts) < 6: continue
+        address_hex, _, prefix_hex, scope_hex, flags_hex, name = parts[:6]
+        address = ipaddress.IPv6Address(int(address_hex, 16))
+        scope = _IPV6_SCOPES.get(int(scope_hex, 16) & 0xF0, f"0x{scope_hex}")
+        interface = interfaces.setdefault(name, {"up": True, "operstate": "unknown", "tunnel": _is_tunnel_interface(name, None, tunnel_prefixes), "loopback": name == "lo", "ipv6": []})
+        interface["ipv6"].append({
+            "address": str(address), "prefix": int(prefix_hex, 16), "scope": scope,
+            "ula": address in _ULA_NETWORK, "temporary": bool(int(flags_hex, 16) & _IFA_F_TEMPORARY),
+        })
+    return interfaces
+
+def read_routes() -> List[Dict]:
+    """Returns the IPv4 and IPv6 routes of the main table that are up and not reject routes."""
+    routes = []
+    for line in _read_lines(PROC_ROUTE)[1:]: # Primera línea: cabecera
+        parts = line.split()
+        if len(parts) < 8: continue
+        name, dest_hex, gateway_hex, flags_hex, _, _, metric, mask_hex = parts[:8]
+        flags = int(flags_hex, 16)
+        if not flags & _RTF_UP or flags & _RTF_REJECT: continue
+        prefix = bin(int.from_bytes(bytes.fromhex(mask_hex), "little")).count("1")
+        routes.append({"family": 4, "destination": f"{_hex_to_ipv4(dest_hex)}/{prefix}", "prefix": prefix,
+                       "gateway": _hex_to_ipv4(gateway_hex), "metric": int(metric), "interface": name})
+    for line in _read_lines(PROC_IPV6_ROUTE):
+        parts = line.split()
+        if len(parts) < 10: continue
+        dest_hex, plen_hex, _, _, next_hop_hex, metric_hex, _, _, flags_hex, name = parts[:10]
+        flags = int(flags_hex, 16)
+        if not flags & _RTF_UP or flags & _RTF_REJECT or name == "lo": continue
+        prefix = int(plen_hex, 16)
+        routes.append({"family": 6, "destination": f"{ipaddress.IPv6Address(int(dest_hex, 16))}/{prefix}", "prefix": prefix,
+                       "gateway": str(ipaddress.IPv6Address(int(next_hop_hex, 16))), "metric": int(metric_hex, 16), "interface": name})
+    return routes
+
+def _covers_default(routes: List[Dict], family: int, interface_filter) -> bool:
+    """True if the routes through interfaces accepted by interface_filter carry all traffic (/0 or the /1+/1 split)."""
+    prefixes = {route["destination"] for route in routes if route["family"] == family and interface_filter(route["interface"])}
+    if family == 4: return "0.0.0.0/0" in prefixes or {"0.0.0.0/1", "128.0.0.0/1"} <= prefixes
+    return "::/0" in prefixes or {"::/1", "8000::/1"} <= prefixes
+
+@timing.timed("net.local_inventory")
+def get_local_inventory() -> Dict:
+    """
+    Reads interfaces and routes and assesses IPv6/WebRTC leak exposure.
+
+    Returns:
+        dict: {"supported", "interfaces", "routes" (default routes only), "tunnel_interfaces",
+               "findings": [{"severity": "leak"|"warning"|"info", "message"}]}.
+            On non-Linux systems "supported" is False and everything else is empty.
+    """
+    inventory = {"supported": False, "interfaces": {}, "routes": [], "tunnel_interfaces": [], "findings": []}
+    if platform.system() != "Linux" or not os.path.exists(PROC_ROUTE): return inventory
+    inventory["supported"] = True
+    prefixes = tuple(config_manager.get_setting("vpn_interface_prefixes") or DEFAULT_TUNNEL_PREFIXES)
+    interfaces = read_interfaces(prefixes)
+    routes = read_routes()
+    inventory["interfaces"] = interfaces
+    inventory["routes"] = [r for r in routes if r["prefix"] <= 1]
+    tunnels = sorted(name for name, info in interfaces.items() if info["tunnel"] and info["up"])
+    inventory["tunnel_interfaces"] = tunnels
+    findings = inventory["findings"]
+
+    is_tunnel = lambda name: name in tunnels
+    is_physical = lambda name: name not in tunnels and not interfaces.get(name, {}).get("loopback")
+    public_v6 = [(name, addr["address"]) for name, info in interfaces.items() if is_physical(name) and info["up"]
+                 for addr in info["ipv6"] if addr["scope"] == "global" and not addr["ula"]]
+
+    if not tunnels:
+        findings.append({"severity": SEVERITY_WARNING, "message": "No VPN tunnel interface detected; traffic leaves through the physical interface."})
+        if public_v6:
+            findings.append({"severity": SEVERITY_INFO, "message": f"Public IPv6 address(es) present: {', '.join(a for _, a in public_v6)} (visible to sites and WebRTC)."})
+        return inventory
+
+    # /proc/net/*route solo muestra la tabla main: las reglas de política (wg-quick usa 'ip rule' e 'ip -6 rule'
+    # con su propia tabla) no se ven, así que una ruta por defecto física es un aviso en ambas familias, no una fuga
+    for family in (4, 6):
+        if _covers_default(routes, family, is_tunnel) or not _covers_default(routes, family, is_physical): continue
+        physical_ifaces = sorted({r["interface"] for r in inventory["routes"] if r["family"] == family and is_physical(r["interface"])})
+        findings.append({"severity": SEVERITY_WARNING, "message": f"IPv{family} default route uses {', '.join(physical_ifaces)}, not the tunnel ({', '.join(tunnels)}). "
+                                                                   f"IPv{family} traffic may bypass the VPN unless policy routing (e.g. wg-quick) redirects it."})
+    if public_v6:
+        findings.append({"severity": SEVERITY_LEAK, "message": f"Public IPv6 address(es) on non-tunnel interfaces can be exposed by WebRTC: "
+                                                               f"{', '.join(f'{a} ({n})' for n, a in public_v6)}."})
+    if not findings:
+        findings.append({"severity": SEVERITY_INFO, "message": f"All default routes go through the tunnel ({', '.join(tunnels)})."})
+    return inventory
@@ -0,0 +1,166 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/log_setup.py
+"""
+Logging of the "guardian_spy" logger tree. Modules only call logging.getLogger(__name__);
+configure() (guardian_spy.py, scripted runs, the daemon) routes their records through a
+QueueHandler to a listener thread that writes JSON-lines files in <config dir>/logs/, one
+per role: guardian_spy.jsonl (interactive shell), daemon.jsonl and scripted.jsonl:
+
+    {"ts": "2025-06-01T10:00:00.123+00:00", "level": "DEBUG", "logger": "guardian_spy.network_checker",
+     "msg": "Fetching public IP from https://...", "thread": "gs-check", "pid": 1234, "where": "network_checker:86"}
+
+Fields passed with extra={...} are added to the record. The calling thread only pays for
+the level check (and, for enabled records, building the message); file I/O and JSON
+encoding happen in the listener. The terminal never gets records, except WARNING and
+above with --debug. Long-lived processes rotate their file by size; short-lived scripted
+runs, many of which may run at once, only append to theirs (rotation would race between
+processes) and reopen it if an external tool such as logrotate moved it.
+
+Levels: 'log_level' for the whole tree (DEBUG with --debug) and 'log_levels' per module,
+e.g. {"network_checker": "DEBUG"}; set_level() changes them at runtime ('loglevel' command).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+try:
+    from . import config_manager
+except ImportError:
+    import config_manager
+
+ROOT_LOGGER = "guardian_spy"
+LOG_FILENAME = "guardian_spy.jsonl"
+SCRIPTED_LOG_FILENAME = "scripted.jsonl"
+LEVEL_NAMES = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+# Atributos propios de LogRecord: el resto son campos de extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_LISTENER: Optional[logging.handlers.QueueListener] = None
+_LOG_PATH: Optional[str] = None
+_LOCK = threading.Lock()
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        document = {"ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+                    "level": record.levelname, "logger": record.name, "msg": record.getMessage(),
+                    "thread": record.threadName, "pid": record.process, "where": f"{record.module}:{record.lineno}"}
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"): document[key] = value
+        if record.exc_info and not record.exc_text: record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text: document["exc"] = record.exc_text
+        if record.stack_info: document["stack"] = record.stack_info
+        return json.dumps(document, ensure_ascii=False, default=str)
+
+class _StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps the traceback apart from the message (the default folds it into msg)."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__) # Copia: otros handlers ven el original
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None # El traceback no se puede pasar entre hilos con seguridad
+        return record
+
+def _level(name, default: int) -> int:
+    level = logging.getLevelName(str(name).upper()) if name is not None else default
+    return level if isinstance(level, int) else default
+
+def _qualified(module: str) -> str:
+    return module if module == ROOT_LOGGER or module.startswith(f"{ROOT_LOGGER}.") else f"{ROOT_LOGGER}.{module}"
+
+def get_logs_dir() -> str:
+    path = os.path.join(config_manager.get_config_dir(), "logs")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def get_log_path() -> Optional[str]:
+    """The JSON-lines file of this process (None until configure())."""
+    return _LOG_PATH
+
+def configure(debug: bool = False, filename: str = LOG_FILENAME, rotate: bool = True) -> str:
+    """
+    Sets up the handlers of the "guardian_spy" logger (only the first call does).
+    rotate=False appends without ever rotating (processes that share the file).
+    Returns the path of the log file.
+    """
+    global _LISTENER, _LOG_PATH
+    with _LOCK:
+        if _LISTENER: return _LOG_PATH
+        _LOG_PATH = os.path.join(get_logs_dir(), filename)
+        if rotate:
+            file_handler = logging.handlers.RotatingFileHandler(
+                _LOG_PATH, maxBytes=int(config_manager.get_setting("log_max_bytes", 5 * 1024 * 1024)),
+                backupCount=int(config_manager.get_setting("log_backup_count", 3)), encoding="utf-8", delay=True) # delay: sin registros, sin fichero
+        else: # Varios procesos a la vez: solo O_APPEND, sin rotar (dos rotaciones simultáneas perderían registros)
+            file_handler = logging.handlers.WatchedFileHandler(_LOG_PATH, encoding="utf-8", delay=True)
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers = [file_handler]
+        if debug: # Solo avisos y errores en la terminal: el detalle va al fichero
+            stderr_handler = logging.StreamHandler(sys.stderr)
+            stderr_handler.setLevel(logging.WARNING)
+            stderr_handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(levelname)s: %(message)s"))
+            handlers.append(stderr_handler)
+        log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        _LISTENER = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _LISTENER.start()
+        atexit.register(shutdown)
+
+        package_logger = logging.getLogger(ROOT_LOGGER)
+        package_logger.addHandler(_StructuredQueueHandler(log_queue))
+        package_logger.propagate = False # Nada sube al root (ni al lastResort de stderr)
+        package_logger.setLevel(logging.DEBUG if debug else _level(config_manager.get_setting("log_level", "INFO"), logging.INFO))
+        levels = config_manager.get_setting("log_levels") or {}
+        if isinstance(levels, dict):
+            for module, level in levels.items(): set_level(module, level)
+    return _LOG_PATH
+
+def set_level(module: str, level: str) -> str:
+    """Sets the level of one module's logger ("network_checker" or the full name). Returns the logger name."""
+    name = _qualified(module)
+    resolved = logging.getLevelName(str(level).upper())
+    if not isinstance(resolved, int): raise ValueError(f"Unknown log level: {level}")
+    logging.getLogger(name).setLevel(resolved)
+    return name
+
+def get_levels() -> Dict[str, str]:
+    """{logger name: level name} of the package loggers with a level of their own."""
+    levels = {}
+    for name, logger_obj in [(ROOT_LOGGER, logging.getLogger(ROOT_LOGGER))] + sorted(logging.Logger.manager.loggerDict.items()):
+        if name.startswith(f"{ROOT_LOGGER}.") or name == ROOT_LOGGER:
+            if isinstance(logger_obj, logging.Logger) and logger_obj.level != logging.NOTSET: levels[name] = logging.getLevelName(logger_obj.level)
+    return levels
+
+def shutdown():
+    """Writes out the queued records and stops the listener (also registered with atexit)."""
+    global _LISTENER
+    with _LOCK:
+        listener, _LISTENER = _LISTENER, None
+    if listener:
+        listener.stop()
+        for handler in listener.handlers: handler.close()
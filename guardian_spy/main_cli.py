@@ -1,8 +1,13 @@
 # guardian_spy/main_cli.py
-import argparse
+import atexit
+import functools
+import importlib
+import io
+import logging
 import sys
 import time 
 import os 
+from contextlib import nullcontext
 from datetime import datetime 
 from typing import List, Dict, Optional, Union, Any # ASEGURARSE DE QUE ESTÉ ESTA LÍNEA
 
@@ -16,18 +21,32 @@ from rich.align import Align
 from rich.box import SIMPLE_HEAVY
 
 try:
-    from . import browser_manager, network_checker, utils, config_manager, bookmarks_handler 
+    from . import browser_manager, network_checker, utils, config_manager, bookmarks_handler, timing, cli_args, startup, log_setup, metrics, disk_usage
     from . import __version__, __app_name__ 
-    from guardian_spy import DEBUG_MODE
+    from guardian_spy import DEBUG_MODE, STARTED_AT
 except ImportError:
     # Fallback para ejecución directa (menos ideal)
-    import browser_manager, network_checker, utils, config_manager, bookmarks_handler
-    try: from __init__ import __version__, __app_name__, DEBUG_MODE
-    except ImportError: __version__ = "0.0.0e"; __app_name__ = "GS(Error)"; DEBUG_MODE = True
+    import browser_manager, network_checker, utils, config_manager, bookmarks_handler, timing, cli_args, startup, log_setup, metrics, disk_usage
+    try: from __init__ import __version__, __app_name__, DEBUG_MODE, STARTED_AT
+    except ImportError: __version__ = "0.0.0e"; __app_name__ = "GS(Error)"; DEBUG_MODE = True; STARTED_AT = time.perf_counter()
 
 
+logger = logging.getLogger(__name__)
+
+def _feature(module_name):
+    """Imports a module only needed by one command (dns_leak, history_store...) on first use, off the startup path."""
+    return importlib.import_module(f"{__package__}.{module_name}") if __package__ else importlib.import_module(module_name)
+
 console = Console(force_terminal=True) 
 
+# asyncio y async_shell se importan al entrar en el bucle interactivo (main_loop), no con el módulo
+asyncio = None
+async_shell = None
+
+def _load_async_shell():
+    global asyncio, async_shell
+    if async_shell is None: asyncio = importlib.import_module("asyncio"); async_shell = _feature("async_shell")
+
 CURRENT_SESSION_SETUP = {
     "profile_type": "Temporary", 
     "gs_profile_name": None,     
@@ -37,6 +56,16 @@ CURRENT_SESSION_SETUP = {
     "browser_profile_on_disk_path": None, 
 }
 
+# Archivo de traza Chrome de esta ejecución (None = trazas desactivadas)
+TRACE_OUTPUT_PATH = None
+
+# profiling.py se importa al activarlo por primera vez; 'check'/'dnsleak' se perfilan en su hilo (_run_in_background)
+PROFILING_LOADED = False
+_UNPROFILED_COMMANDS = {"", "profile", "check", "dnsleak", "quit", "exit", "q"}
+
+# Resultado del último 'check' (línea base para el monitor de fugas durante la sesión)
+LAST_NETWORK_CHECK = {"public_ip": None, "dns_servers": None, "local_findings": None}
+
 ORIGINAL_BANNER_ASCII = """[bold cyan]
 ################################################################################################
 #                                                                                              #
@@ -142,7 +171,14 @@ def display_command_menu_sequential():
         "setup": "Configure current session (profile, browser, bookmarks)",
         "bookmarks": "Select bookmark set(s) for the current session", # NUEVO COMANDO
         "check": "Perform network & browser checks",
-        "launch": "Launch browser with current session setup",
+        "dnsleak": "Probe the system DNS resolvers and show which ones answer",
+        "history": "Show the timeline of past network checks",
+        "stats": "Show timing statistics (p50/p95/p99) for this run",
+        "loglevel": "Show log levels, or set one ('loglevel network_checker debug')",
+        "profile": "Profile the following commands ('profile on', 'profile on cprofile malloc', 'profile off')",
+        "launch": "Launch browser with current session setup (runs in the background)",
+        "sessions": "List the browser sessions launched from this prompt",
+        "stop": "Close a running browser session ('stop N' or 'stop all')",
         "profiles": "Manage persistent profiles",
         "status": "Show current session setup",
         "about": "Show information about Guardian Spy",
@@ -153,32 +189,97 @@ def display_command_menu_sequential():
         console.print(f"  [bold cyan]{cmd:<10}[/bold cyan] - {desc}")
     console.line()
 
-def initial_checks_display_sequential(): 
+def _render_network_check_result(check_name, result, console_obj=None):
+    """Prints the panel for one finished (or timed out) network check."""
+    console_obj = console_obj or console
+    status = result["status"]; value = result["value"]
+    elapsed_str = f"[dim]{result['elapsed']:.1f}s[/dim]"
+    if check_name == network_checker.CHECK_IP:
+        if status == "ok":
+            ip_display = Text(); ip_display.append("  [*] Public IP: "); ip_display.append(value, style="bold green")
+            if result.get("provider"): ip_display.append(f"  (via {result['provider']})", style="dim")
+            border = "green"
+            if result.get("disagreement"):
+                border = "red"
+                ip_display.append("\n  [!] IP providers disagree (possible split tunnel or proxy):", style="bold red")
+                for provider_name, provider_ip in result.get("answers", {}).items():
+                    ip_display.append(f"\n      - {provider_name}: "); ip_display.append(provider_ip, style="yellow")
+            elif result.get("quorum_met") is False:
+                border = "yellow"
+                ip_display.append("\n  [!] Provider quorum not reached.", style="yellow")
+            console_obj.print(Panel(ip_display, title="Public IP", subtitle=elapsed_str, border_style=border, expand=False))
+        elif status == "timeout": console_obj.print(Panel(Text("  [!] Public IP lookup timed out.",style="bold yellow"),title="Public IP", subtitle=elapsed_str, border_style="yellow"))
+        else:
+            if result.get("error"): logger.debug("Check %s failed: %s", check_name, result["error"])
+            console_obj.print(Panel(Text("  [!] Could not retrieve public IP address.",style="bold red"),title="Public IP", subtitle=elapsed_str, border_style="red"))
+    elif check_name == network_checker.CHECK_GEO:
+        if status == "ok" and value and value.get("country"):
+            loc=f"{value.get('city','N/A')}, {value.get('region','N/A')}, {value.get('country','N/A')}"; isp=value.get('isp','N/A')
+            geo_display = Text(); geo_display.append("  [*] Location: "); geo_display.append(loc, style="yellow")
+            geo_display.append("\n      ISP: "); geo_display.append(isp, style="yellow")
+            console_obj.print(Panel(geo_display, title="Geolocation", subtitle=elapsed_str, border_style="green", expand=False))
+        elif status == "skipped": pass # Sin IP no hay nada que geolocalizar; el panel de IP ya lo indica
+        elif status == "timeout": console_obj.print(Panel(Text("  [!] GeoIP lookup timed out.",style="yellow"),title="Geolocation", subtitle=elapsed_str, border_style="yellow", expand=False))
+        else: console_obj.print(Panel(Text.from_markup("  [dim]Could not retrieve detailed IP geolocation.[/dim]"),title="Geolocation", subtitle=elapsed_str, border_style="yellow", expand=False))
+    elif check_name == network_checker.CHECK_DNS:
+        if status == "ok" and value:
+            dns_text = Text("  [*] System DNS Servers:\n"); 
+            for s_ip in value: dns_text.append(f"      - "); dns_text.append(s_ip, style="cyan"); dns_text.append("\n")
+            if dns_text.plain.endswith("\n"): dns_text.truncate(len(dns_text.plain)-1)
+            console_obj.print(Panel(dns_text, title="DNS Servers", subtitle=elapsed_str, border_style="cyan", expand=False))
+        elif status == "timeout": console_obj.print(Panel(Text("  [!] DNS server discovery timed out.",style="bold yellow"),title="DNS Servers", subtitle=elapsed_str, border_style="yellow"))
+        else: console_obj.print(Panel(Text("  [!] Could not retrieve system DNS servers.",style="bold red"),title="DNS Servers", subtitle=elapsed_str, border_style="red"))
+
+def display_local_inventory(inventory, console_obj=None):
+    """Prints the tunnel/default-route/IPv6 assessment from local_network.get_local_inventory()."""
+    console_obj = console_obj or console
+    local_network = _feature("local_network")
+    if not inventory["supported"]:
+        logger.debug("Local interface inventory is only available on Linux.")
+        return
+    inv_text = Text()
+    inv_text.append("  [*] VPN tunnel: ")
+    inv_text.append(", ".join(inventory["tunnel_interfaces"]) or "none detected", style="cyan" if inventory["tunnel_interfaces"] else "yellow")
+    for route in inventory["routes"]:
+        inv_text.append(f"\n      IPv{route['family']} {route['destination']} via {route['interface']}", style="dim")
+    severity_styles = {local_network.SEVERITY_LEAK: ("[!]", "bold red"), local_network.SEVERITY_WARNING: ("[!]", "yellow"), local_network.SEVERITY_INFO: ("[*]", "green")}
+    for finding in inventory["findings"]:
+        marker, style = severity_styles.get(finding["severity"], ("[*]", ""))
+        inv_text.append(f"\n  {marker} {finding['message']}", style=style)
+    worst = {f["severity"] for f in inventory["findings"]}
+    border = "red" if local_network.SEVERITY_LEAK in worst else ("yellow" if local_network.SEVERITY_WARNING in worst else "green")
+    console_obj.print(Panel(inv_text, title="Local Interfaces & Routes", border_style=border, expand=False))
+
+def _status_or_nothing(console_obj, message):
+    """Spinner on the terminal; nothing when the output goes to a buffer (commands running in the background)."""
+    return console_obj.status(message, spinner_style="blue") if console_obj is console else nullcontext()
+
+def initial_checks_display_sequential(console_obj=None, results_future=None):
+    """Runs and prints the network checks; with results_future, prints the checks started at start-up (startup.py) instead."""
+    console_obj = console_obj or console
     nc_console = console if DEBUG_MODE else None
-    public_ip, ip_info = None, None
-    console.print("[+] Performing OPSEC network checks...")
-    with console.status("[spinner.dots]Checking network...", spinner_style="blue"):
-        try: public_ip, ip_info = network_checker.get_public_ip_info(console=nc_console)
-        except: pass 
-    if public_ip:
-        ip_display = Text(); ip_display.append("  [*] Public IP: "); ip_display.append(public_ip, style="bold green")
-        if ip_info and ip_info.get("country"):
-            loc=f"{ip_info.get('city','N/A')}, {ip_info.get('region','N/A')}, {ip_info.get('country','N/A')}"; isp=ip_info.get('isp','N/A')
-            ip_display.append("\n      Location: "); ip_display.append(loc, style="yellow")
-            ip_display.append("\n      ISP: "); ip_display.append(isp, style="yellow")
-        else: ip_display.append("\n      [dim]Could not retrieve detailed IP geolocation.[/dim]")
-        console.print(Panel(ip_display, title="Public IP", border_style="green", expand=False))
-    else: console.print(Panel(Text("  [!] Could not retrieve public IP address.",style="bold red"),title="Public IP", border_style="red"))
-    dns_servers = []
-    with console.status("[spinner.dots]Checking DNS...", spinner_style="blue"):
-        try: dns_servers = network_checker.get_dns_servers(console=nc_console)
-        except: pass
-    if dns_servers:
-        dns_text = Text("  [*] System DNS Servers:\n"); 
-        for s_ip in dns_servers: dns_text.append(f"      - "); dns_text.append(s_ip, style="cyan"); dns_text.append("\n")
-        if dns_text.plain.endswith("\n"): dns_text.truncate(len(dns_text.plain)-1)
-        console.print(Panel(dns_text, title="DNS Servers", border_style="cyan", expand=False))
-    else: console.print(Panel(Text("  [!] Could not retrieve system DNS servers.",style="bold red"),title="DNS Servers",border_style="red"))
+    console_obj.print("[+] Performing OPSEC network checks...")
+    pending_checks = [network_checker.CHECK_IP, network_checker.CHECK_GEO, network_checker.CHECK_DNS]
+    results = {}
+    with _status_or_nothing(console_obj, "[spinner.dots]Checking network (IP, GeoIP, DNS)...") as status:
+        def _on_result(check_name, result):
+            if check_name in pending_checks: pending_checks.remove(check_name)
+            _render_network_check_result(check_name, result, console_obj)
+            if status: status.update(f"[spinner.dots]Waiting for: {', '.join(pending_checks)}..." if pending_checks else "[spinner.dots]Finishing checks...")
+        try:
+            if results_future is None: results = network_checker.run_network_checks_concurrently(console=nc_console, on_result=_on_result)
+            else:
+                results = results_future.result()
+                for check_name, result in results.items(): _on_result(check_name, result)
+        except Exception as e_checks:
+            console_obj.print(f"[bold red][!] Network checks failed: {e_checks}[/bold red]")
+    if results and config_manager.get_setting("history_enabled", True):
+        try: _feature("history_store").get_history_store().record_check(results)
+        except Exception as e_history: # El historial nunca debe impedir la comprobación
+            logger.warning("Could not record check history: %s", e_history)
+    ip_result = results.get(network_checker.CHECK_IP, {}); dns_result = results.get(network_checker.CHECK_DNS, {})
+    public_ip = ip_result.get("value") if ip_result.get("status") == "ok" else None
+    dns_servers = dns_result.get("value") if dns_result.get("status") == "ok" else []
     return public_ip, dns_servers
 
 def select_browser_interactive_sequential(detected_browsers_paths, current_selection=None):
@@ -204,56 +305,73 @@ def select_browser_interactive_sequential(detected_browsers_paths, current_selec
     except ValueError: pass
     console.print("[red]Invalid selection.[/red]"); return current_selection
 
-def start_session_flow_sequential(browser_choice, profile_path, is_temp_profile, console_obj):
-    console_obj.print(f"\n[bold blue][+] Launching [magenta]{browser_choice.capitalize()}[/magenta] with profile: [cyan]{profile_path}[/cyan][/bold blue]")
-    if is_temp_profile: console_obj.print("    [italic]This is a temporary profile and will be deleted after the browser closes.[/italic]")
-    else: console_obj.print("    [italic]This is a persistent profile.[/italic]")
-    
-    browser_process = None
-    with console_obj.status(f"[spinner.dots]Waiting for {browser_choice.capitalize()} to launch...", spinner_style="blue"):
-        browser_process = browser_manager.launch_browser_with_profile(browser_type_requested=browser_choice, profile_path=profile_path, console=console_obj)
-        if browser_process: time.sleep(1) 
-
-    if browser_process:
-        console_obj.line() 
-        console_obj.print(Text.from_markup(LAUNCH_ACTIVE_SHIELD_ASCII)) 
-        console_obj.print(Align.center(Text.from_markup(f"[bold green]Guardian Spy Shield ACTIVE[/bold green] - Browser: [magenta]{browser_choice.capitalize()}[/magenta]")))
-        console_obj.print(Align.center(Text.from_markup("[dim](Close browser window or press Ctrl+C here to return to Guardian Spy prompt)[/dim]")))
-        console_obj.line()
-        
-        session_interrupted_by_user = False
-        try:
-            while browser_process.poll() is None: time.sleep(0.5) 
-        except KeyboardInterrupt:
-            session_interrupted_by_user = True
-            console_obj.print(f"\n[yellow][!] Browser session wait interrupted by user.[/yellow]") 
-        
-        # No limpiar pantalla aquí.
-        if session_interrupted_by_user:
-            console_obj.print(f"\n[yellow][!] Terminating browser due to interruption...[/yellow]")
-            browser_process.terminate()
-            try: browser_process.wait(timeout=3)
-            except: pass 
-        else: 
-            console_obj.print(f"\n[green][+] Browser session for [magenta]{browser_choice.capitalize()}[/magenta] ended.[/green]")
-        
-        if is_temp_profile and profile_path and os.path.exists(profile_path):
-            console_obj.print(f"\n[bold blue][+] Cleaning up temporary profile: [cyan]{profile_path}[/cyan][/bold blue]")
-            if browser_manager.remove_profile(profile_path, console=console_obj): 
-                console_obj.print("  [green][*] Temporary profile successfully removed.[/green]")
-            else: 
-                console_obj.print(f"  [bold red][!] Failed to remove temporary profile.[/bold red]")
-        elif is_temp_profile and profile_path and not os.path.exists(profile_path):
-                 if DEBUG_MODE and hasattr(console_obj, 'log'): console_obj.log(f"[dim]Temp profile {profile_path} seems removed.[/dim]")
-    else: 
-        console_obj.print(f"[bold red][!] Failed to launch {browser_choice.capitalize()}.[/bold red]")
+def _render_leak_alert(alert, console_obj):
+    """Prints one leak monitor alert; drifts from the baseline in red, recoveries in green."""
+    timestamp = datetime.fromtimestamp(alert["time"]).strftime("%H:%M:%S")
+    if alert["kind"].endswith("_restored"):
+        console_obj.print(f"[green][{timestamp}] [*] {alert['message']}[/green]")
+    else:
+        console_obj.print(Panel(Text(f"[{timestamp}] {alert['message']}", style="bold red"), title="LEAK MONITOR ALERT", border_style="red", expand=False))
+
+async def start_session_flow(shell, browser_choice, profile_path, is_temp_profile, profile_name=None):
+    """Launches the browser as a background session of the shell and returns to the prompt."""
+    console.print(f"\n[bold blue][+] Launching [magenta]{browser_choice.capitalize()}[/magenta] with profile: [cyan]{profile_path}[/cyan][/bold blue]")
+    if is_temp_profile: console.print("    [italic]This is a temporary profile and will be deleted after the browser closes.[/italic]")
+    else: console.print("    [italic]This is a persistent profile.[/italic]")
+
+    with console.status(f"[spinner.dots]Waiting for {browser_choice.capitalize()} to launch...", spinner_style="blue"):
+        session = await shell.sessions.launch(browser_choice, profile_path, is_temp_profile, profile_name=profile_name, console=console)
+        if session: await asyncio.sleep(1)
+
+    if not session:
+        console.print(f"[bold red][!] Failed to launch {browser_choice.capitalize()}.[/bold red]")
         if is_temp_profile and profile_path and os.path.exists(profile_path):
-            if browser_manager.remove_profile(profile_path, console=console_obj):
-                console_obj.print(f"[yellow]Cleaned up profile {profile_path} due to launch failure.[/yellow]")
-    
-    print("DEBUG: start_session_flow_sequential - About to Prompt 'Press Enter to continue'", file=sys.stderr) 
-    Prompt.ask("Press Enter to continue...", console=console, default="", show_default=False)
-    print("DEBUG: start_session_flow_sequential - AFTER Prompt 'Press Enter to continue'", file=sys.stderr) 
+            if browser_manager.remove_profile(profile_path, console=console):
+                console.print(f"[yellow]Cleaned up profile {profile_path} due to launch failure.[/yellow]")
+        return
+    console.line()
+    console.print(Text.from_markup(LAUNCH_ACTIVE_SHIELD_ASCII))
+    console.print(Align.center(Text.from_markup(f"[bold green]Guardian Spy Shield ACTIVE[/bold green] - Browser: [magenta]{browser_choice.capitalize()}[/magenta] (session {session['session']})")))
+    console.print(Align.center(Text.from_markup(f"[dim]The prompt stays available: 'sessions' lists running browsers, 'stop {session['session']}' closes this one.[/dim]")))
+    if config_manager.get_setting("leak_monitor_enabled", True):
+        console.print(Align.center(Text.from_markup("[dim]Leak monitor active: public IP and DNS are re-checked in the background.[/dim]")))
+    console.line()
+
+def _new_leak_monitor():
+    """Leak monitor shared by the running sessions (None if disabled). The baseline is the last 'check', if any."""
+    if not config_manager.get_setting("leak_monitor_enabled", True): return None
+    # Se crea antes de lanzar el navegador: si no hubo 'check', la primera muestra es la línea base previa al lanzamiento
+    return _feature("leak_monitor").LeakMonitor(baseline_ip=LAST_NETWORK_CHECK["public_ip"], baseline_dns=LAST_NETWORK_CHECK["dns_servers"],
+                                                baseline_local_findings=LAST_NETWORK_CHECK["local_findings"], console=console)
+
+def _render_session_event(kind, session, console_obj, **details):
+    """Output of the background session supervisor (async_shell.SessionSupervisor)."""
+    if kind == "alert":
+        _render_leak_alert(details["alert"], console_obj); return
+    label = f"[magenta]{session['browser'].capitalize()}[/magenta] (session {session['session']})"
+    if kind == "ended":
+        if session["stopped"]: console_obj.print(f"[yellow][!] Browser session for {label} closed by Guardian Spy.[/yellow]")
+        else: console_obj.print(f"[green][+] Browser session for {label} ended.[/green]")
+    elif kind == "cleanup":
+        if details["removed"]: console_obj.print(f"  [green][*] Temporary profile removed: [cyan]{session['profile_path']}[/cyan][/green]")
+        else: console_obj.print(f"  [bold red][!] Failed to remove temporary profile: {session['profile_path']}[/bold red]")
+    elif kind == "trimmed":
+        result = details["result"]
+        if result["freed_bytes"] or result["failed"]:
+            size = disk_usage.format_size((result["size"] or {}).get("bytes"))
+            console_obj.print(f"  [green][*] Trimmed {disk_usage.format_size(result['freed_bytes'])} of browser cache from profile "
+                              f"[cyan]{session['profile']}[/cyan] (now {size}).[/green]")
+            if result["failed"]: console_obj.print(f"  [yellow][!] Could not trim: {', '.join(result['failed'])}[/yellow]")
+
+def _render_recovery_result(summary, console_obj):
+    """Reports what session_journal.recover() cleaned up from a previous run that was killed."""
+    sessions = summary.get("sessions") or []
+    if not sessions: return
+    console_obj.print(f"[yellow][*] Cleaned up {len(sessions) - summary['unresolved']} session(s) left by a previous run "
+                      f"({summary['browsers_killed']} browser(s) closed, {summary['profiles_removed']} temporary profile(s) removed).[/yellow]")
+    for result in sessions:
+        if not result["resolved"]:
+            console_obj.print(f"  [bold red][!] Could not clean up {result['path']} (browser still running or files in use).[/bold red]")
 
 def _get_bookmark_selection_from_user(current_set_identifier: Union[str, List[str], None]) -> Union[str, List[str], None]:
     console.print(Rule("[blue]Bookmarks Configuration[/blue]", style="blue"))
@@ -342,23 +460,175 @@ def handle_command_bookmarks_seq(): # Nuevo handler para el comando 'bookmarks'
     display_session_status_sequential() # Mostrar estado actualizado
 
 
-def handle_command_check_seq():
-    console.print(Rule("[green]Network & Browser Checks[/green]", style="green"))
-    utils.check_browser_executables(console=console)
-    console.line()
-    public_ip_val, dns_servers_val = initial_checks_display_sequential() 
+@timing.timed("cmd.check")
+def handle_command_check_seq(console_obj=None, results_future=None):
+    console_obj = console_obj or console
+    console_obj.print(Rule("[green]Network & Browser Checks[/green]", style="green"))
+    utils.check_browser_executables(console=console_obj)
+    console_obj.line()
+    public_ip_val, dns_servers_val = initial_checks_display_sequential(console_obj, results_future)
+    inventory = _feature("local_network").get_local_inventory()
+    display_local_inventory(inventory, console_obj)
+    LAST_NETWORK_CHECK.update({"public_ip": public_ip_val, "dns_servers": dns_servers_val or None,
+                               "local_findings": [f["message"] for f in inventory["findings"]] if inventory["supported"] else None})
     status_summary_parts = []
     if public_ip_val: status_summary_parts.append(f"IP: [green]{public_ip_val}[/green]")
     else: status_summary_parts.append("[red]IP: Error[/red]")
     if dns_servers_val: status_summary_parts.append(f"DNS: [green]OK ({len(dns_servers_val)} found)[/green]")
     else: status_summary_parts.append("[red]DNS: Error[/red]")
     CURRENT_SESSION_SETUP["network_checks_status"] = ", ".join(status_summary_parts)
-    console.print(Rule("Checks Complete", style="green"))
+    console_obj.print(Rule("Checks Complete", style="green"))
+
+@timing.timed("cmd.dnsleak")
+def handle_command_dnsleak_seq(console_obj=None):
+    console_obj = console_obj or console
+    console_obj.print(Rule("[green]DNS Leak Test[/green]", style="green"))
+    nc_console = console if DEBUG_MODE else None
+    with _status_or_nothing(console_obj, "[spinner.dots]Discovering DNS resolvers...") as status:
+        resolvers = network_checker.get_dns_servers(console=nc_console)
+        if resolvers:
+            if status: status.update(f"[spinner.dots]Probing {len(resolvers)} resolver(s)...")
+            report = _feature("dns_leak").run_dns_leak_test(resolvers, console=nc_console)
+    if not resolvers:
+        console_obj.print(Panel(Text("  [!] Could not retrieve system DNS servers to test.", style="bold red"), title="DNS Leak Test", border_style="red", expand=False))
+        return
+    table = Table(title="Resolver responses", box=SIMPLE_HEAVY, show_lines=False)
+    table.add_column("Resolver", style="cyan"); table.add_column("Answers?", justify="center")
+    table.add_column("Latency", justify="right"); table.add_column("Probes", justify="right"); table.add_column("Result / Error")
+    for resolver, result in report["resolvers"].items():
+        answered = "[green]yes[/green]" if result["responded"] else "[red]no[/red]"
+        latency = f"{result['latency'] * 1000:.1f} ms" if result["latency"] is not None else "-"
+        detail = result["rcode"] if result["responded"] else f"[dim]{result['error']}[/dim]"
+        table.add_row(resolver, answered, latency, f"{result['received']}/{result['sent']}", detail)
+    console_obj.print(table)
+    summary = Text()
+    if report["responding"]:
+        summary.append("  [*] DNS traffic is answered by: "); summary.append(", ".join(report["responding"]), style="bold cyan")
+        summary.append("\n      Confirm these are your VPN's resolvers; any ISP resolver here is a DNS leak.", style="dim")
+        border = "cyan"
+    else:
+        summary.append("  [!] No resolver answered the probes (blocked UDP/53 or DNS only over a tunnel/DoH).", style="yellow"); border = "yellow"
+    console_obj.print(Panel(summary, title="DNS Leak Test", subtitle=f"[dim]{report['elapsed']:.2f}s[/dim]", border_style=border, expand=False))
+    console_obj.print(Rule("DNS Leak Test Complete", style="green"))
+
+HISTORY_DISPLAY_LIMIT = 200 # Filas mostradas por 'history' (las más recientes)
+
+def handle_command_history_seq():
+    history_store = _feature("history_store")
+    console.print(Rule("[green]Network Check History[/green]", style="green"))
+    while True:
+        range_input = Prompt.ask("Time range (e.g. 24h, 7d, 30d, all)", default="7d", console=console)
+        try: window = history_store.parse_duration(range_input); break
+        except ValueError as e_range: console.print(f"[red]{e_range}[/red]")
+    changed_only = Confirm.ask("Only show checks where the IP, location, ISP or DNS changed?", default=False, console=console)
+    since = time.time() - window if window is not None else None
+    store = history_store.get_history_store()
+    try:
+        total = store.count(since=since, changed_only=changed_only)
+        rows = store.query(since=since, changed_only=changed_only, limit=HISTORY_DISPLAY_LIMIT)
+    except Exception as e_history:
+        console.print(f"[bold red]Could not read check history: {e_history}[/bold red]"); return
+    if not rows:
+        console.print("[yellow]No recorded checks in that range. Run 'check' to record one.[/yellow]"); return
 
-def handle_command_launch_seq(detected_browser_paths):
+    table = Table(box=SIMPLE_HEAVY, show_lines=False)
+    for column in ("Time", "Public IP", "Location", "ISP", "DNS Servers"): table.add_column(column)
+    for row in rows:
+        changed = set((row["changed_fields"] or "").split(","))
+        if changed & {"city", "country"}: changed.add("location")
+        def _cell(field, text):
+            if not text: return "[dim]-[/dim]"
+            return f"[bold yellow]{text}[/bold yellow]" if field in changed else text
+        if row["public_ip"]: ip_cell = _cell("public_ip", row["public_ip"]) + (" [red](providers disagree)[/red]" if row["disagreement"] else "")
+        else: ip_cell = "[red]error[/red]" if row["ip_status"] in ("error", "timeout") else "[dim]-[/dim]"
+        table.add_row(datetime.fromtimestamp(row["ts"]).strftime("%Y-%m-%d %H:%M:%S"), ip_cell,
+                      _cell("location", ", ".join(v for v in (row["city"], row["country"]) if v)),
+                      _cell("isp", row["isp"]), _cell("dns_servers", (row["dns_servers"] or "").replace(",", ", ")))
+    console.print(table)
+    distinct_ips = {row["public_ip"] for row in rows if row["public_ip"]}
+    summary = f"Showing {len(rows)} of {total} check(s); {len(distinct_ips)} distinct public IP(s). Changed values are highlighted."
+    console.print(f"[dim]{summary}[/dim]")
+    console.print(Rule("History Complete", style="green"))
+
+def _format_seconds(seconds):
+    if seconds is None: return "-"
+    if seconds < 1e-3: return f"{seconds * 1e6:.0f} µs"
+    if seconds < 1: return f"{seconds * 1e3:.1f} ms"
+    return f"{seconds:.2f} s"
+
+def handle_command_stats_seq():
+    console.print(Rule("[green]Timing Statistics[/green]", style="green"))
+    stats = timing.get_stats()
+    if not stats:
+        console.print("[yellow]No timings recorded yet. Run 'check' or 'launch' first.[/yellow]"); return
+    table = Table(box=SIMPLE_HEAVY, show_lines=False)
+    table.add_column("Step", style="cyan")
+    for column in ("Count", "p50", "p95", "p99", "Max", "Total"): table.add_column(column, justify="right")
+    for name, summary in stats.items():
+        table.add_row(name, str(summary["count"]), *(_format_seconds(summary[k]) for k in ("p50", "p95", "p99", "max", "total")))
+    console.print(table)
+    if TRACE_OUTPUT_PATH:
+        try: console.print(f"[dim]Chrome trace written to: {timing.dump_trace(TRACE_OUTPUT_PATH)} (open in chrome://tracing or ui.perfetto.dev)[/dim]")
+        except OSError as e_trace: console.print(f"[red]Could not write trace file: {e_trace}[/red]")
+    console.print(Rule("Stats Complete", style="green"))
+
+def handle_command_loglevel(argument):
+    module, _, level = argument.partition(" ")
+    if module and level.strip():
+        try: name = log_setup.set_level(module, level.strip())
+        except ValueError as e_level:
+            console.print(f"[red]{e_level}. Use one of: {', '.join(log_setup.LEVEL_NAMES)}[/red]"); return
+        console.print(f"[green]Log level of [cyan]{name}[/cyan] set to {level.strip().upper()}.[/green]")
+    elif module:
+        console.print("[yellow]Usage: loglevel [MODULE LEVEL][/yellow]"); return
+    for name, level_name in log_setup.get_levels().items(): console.print(f"  [cyan]{name:<32}[/cyan] {level_name}")
+    console.print(f"[dim]Log file: {log_setup.get_log_path() or 'not configured'}[/dim]")
+
+def _profiling():
+    """The profiling module once it was turned on (--profile-run, --trace-malloc, 'profile on'), else None."""
+    return _feature("profiling") if PROFILING_LOADED else None
+
+def _enable_profiling(enabled=None, mode=None, malloc=None):
+    global PROFILING_LOADED
+    PROFILING_LOADED = True # Se importa solo al activarlo: fuera del camino de arranque
+    _profiling().configure(enabled=enabled, mode=mode, malloc=malloc)
+
+def _render_profile_reports(reports, console_obj=None):
+    console_obj = console_obj or console
+    for path in reports: console_obj.print(f"[dim]Profile written to: {path}[/dim]")
+
+def handle_command_profile(argument):
+    words = argument.split()
+    if words[:1] == ["on"]:
+        modes = [w for w in words[1:] if w != "malloc"]
+        if len(modes) > 1 or (modes and modes[0] not in ("sample", "cprofile")):
+            console.print("[yellow]Usage: profile on \\[sample|cprofile] \\[malloc][/yellow]"); return
+        _enable_profiling(enabled=True, mode=modes[0] if modes else None, malloc=True if "malloc" in words else None)
+    elif words == ["off"]:
+        if PROFILING_LOADED: _enable_profiling(enabled=False, malloc=False)
+    elif words:
+        console.print("[yellow]Usage: profile \\[on \\[sample|cprofile] \\[malloc] | off][/yellow]"); return
+    profiling = _profiling()
+    if not profiling or not profiling.is_active(): console.print("Profiling is [bold]off[/bold]."); return
+    cpu = f"[cyan]{profiling.get_mode()}[/cyan]" if profiling.STATE["enabled"] else "off"
+    console.print(f"Profiling is [bold green]on[/bold green]: CPU {cpu}, tracemalloc {'[cyan]on[/cyan]' if profiling.STATE['malloc'] else 'off'}.")
+    console.print(f"[dim]Reports: {profiling.get_reports_dir()}[/dim]")
+
+def _dump_trace_at_exit():
+    if not TRACE_OUTPUT_PATH: return
+    try:
+        written = timing.dump_trace(TRACE_OUTPUT_PATH)
+        if written: print(f"Timing trace written to {written}", file=sys.stderr)
+    except OSError: pass
+
+def _prepare_launch_seq(detected_browser_paths):
+    """
+    Interactive and disk part of 'launch' (runs in a worker thread): confirms the bookmarks and
+    creates the browser profile dir if needed. Returns (browser, profile_path, is_temp, profile_name) or None.
+    """
     console.print(Rule("[green]Launch Session[/green]", style="green"))
     if not CURRENT_SESSION_SETUP["browser_selected"]:
-        console.print("[yellow]No browser selected. Please run 'setup' command first.[/yellow]"); return
+        console.print("[yellow]No browser selected. Please run 'setup' command first.[/yellow]"); return None
 
     console.line()
     bookmarks_identifier_for_this_launch = CURRENT_SESSION_SETUP["bookmarks_set"] 
@@ -415,7 +685,7 @@ def handle_command_launch_seq(detected_browser_paths):
                 bookmark_set_identifier=bookmarks_identifier_for_this_launch, 
                 console=console
             )
-        if not newly_created_path: console.print(f"[red][!] Failed to create browser profile dir.[/red]"); return
+        if not newly_created_path: console.print(f"[red][!] Failed to create browser profile dir.[/red]"); return None
         actual_browser_profile_path = newly_created_path
         console.print(f"  [green][*] Browser profile dir created: [cyan]{actual_browser_profile_path}[/cyan]")
         CURRENT_SESSION_SETUP["browser_profile_on_disk_path"] = actual_browser_profile_path
@@ -423,12 +693,20 @@ def handle_command_launch_seq(detected_browser_paths):
              profile_data_from_config = config_manager.get_profile_by_name(gs_profile_name_for_disk)
              if profile_data_from_config and profile_data_from_config.get("browser_profile_path") != actual_browser_profile_path:
                 profile_data_from_config["browser_profile_path"] = actual_browser_profile_path
-                all_profiles = config_manager.load_profiles_data()
-                for i, p_conf in enumerate(all_profiles):
-                    if p_conf["profile_name"] == gs_profile_name_for_disk: all_profiles[i] = profile_data_from_config; break
-                config_manager.save_profiles_data(all_profiles, console=console)
-    if not actual_browser_profile_path: console.print("[red]Error: Cannot determine browser profile path.[/red]"); return
-    start_session_flow_sequential(browser_choice, actual_browser_profile_path, is_temp, console) 
+                with config_manager.profiles_lock():
+                    all_profiles = config_manager.load_profiles_data(strict=True)
+                    for i, p_conf in enumerate(all_profiles):
+                        if p_conf["profile_name"] == gs_profile_name_for_disk: all_profiles[i] = profile_data_from_config; break
+                    config_manager.save_profiles_data(all_profiles, console=console)
+    if not actual_browser_profile_path: console.print("[red]Error: Cannot determine browser profile path.[/red]"); return None
+    return browser_choice, actual_browser_profile_path, is_temp, gs_profile_name_for_disk
+
+async def handle_command_launch(shell, detected_browser_paths):
+    prepared = await async_shell.run_in_thread(_prepare_launch_seq, detected_browser_paths)
+    if not prepared: return
+    browser_choice, profile_path, is_temp, profile_name = prepared
+    await start_session_flow(shell, browser_choice, profile_path, is_temp, profile_name)
+    # El perfil temporal ya pertenece a la sesión: la siguiente configuración empieza de cero
     if is_temp: 
         CURRENT_SESSION_SETUP.update({"browser_profile_on_disk_path": None, "browser_selected": None, "bookmarks_set": None, "profile_type": "Temporary"})
         gs_profile_name_val = CURRENT_SESSION_SETUP.get("gs_profile_name") or ""
@@ -436,53 +714,72 @@ def handle_command_launch_seq(detected_browser_paths):
             CURRENT_SESSION_SETUP["gs_profile_name"] = None
     CURRENT_SESSION_SETUP["network_checks_status"] = "Pending"
 
+PROFILE_FILTER_KEYS = {"browser": "browser", "bookmarks": "bookmarks", "name": "name_prefix", "from": "created_from", "to": "created_to"}
+
+def _parse_profile_filter(text):
+    """'browser=firefox bookmarks=00_opsec_checks name=work from=2025-01-01 to=2025-06-30 sort=-created' -> query kwargs."""
+    query = {}
+    for token in text.split():
+        key, sep, value = token.partition("=")
+        key = key.lower()
+        if not sep or not value: raise ValueError(f"Expected KEY=VALUE, got '{token}'")
+        if key == "sort":
+            query["descending"] = value.startswith("-")
+            query["sort"] = value.lstrip("-").lower()
+            if query["sort"] not in config_manager.PROFILE_SORT_KEYS: raise ValueError(f"Unknown sort key '{query['sort']}' (use {', '.join(config_manager.PROFILE_SORT_KEYS)})")
+        elif key in PROFILE_FILTER_KEYS:
+            query[PROFILE_FILTER_KEYS[key]] = value.lower() if key == "browser" else value
+            if key in ("from", "to"): config_manager.parse_created_bound(value) # Validar ya, no a mitad del listado
+        else: raise ValueError(f"Unknown filter '{key}' (use {', '.join(list(PROFILE_FILTER_KEYS) + ['sort'])})")
+    return query
+
+def _render_profiles_page(rows, total, page, pages, console_obj=None):
+    """Table of one page of profiles (display fields from config_manager's index, nothing recomputed; sizes only for this page)."""
+    console_obj = console_obj or console
+    sizes = disk_usage.get_sizes([row.get("browser_profile_path") for row in rows])
+    table = Table(title="Available Profiles", box=SIMPLE_HEAVY, show_lines=True, header_style="bold magenta",
+                  caption=f"Page {page + 1}/{pages} - {total} profile(s)")
+    table.add_column("Name", style="cyan", min_width=15); table.add_column("Browser"); table.add_column("Bookmarks Set"); table.add_column("Created")
+    table.add_column("Size", justify="right")
+    if DEBUG_MODE: table.add_column("Browser Dir Path", style="dim", overflow="fold")
+    for row in rows:
+        row_data = [row["profile_name"], str(row.get("browser_type") or "N/A").capitalize(), row["bookmarks_display"], row["created_date"],
+                    disk_usage.format_size((sizes.get(row.get("browser_profile_path")) or {}).get("bytes"))]
+        if DEBUG_MODE: row_data.append(row.get("browser_profile_path", "[Not Set]"))
+        table.add_row(*row_data)
+    console_obj.print(table)
+
+def _browse_profiles():
+    """'profiles' > 'list': optional filter/sort, then one page at a time."""
+    if not config_manager.get_profile_index(): console.print("No persistent profiles found."); return
+    text = Prompt.ask("Filter/sort ([dim]blank = all; e.g. browser=firefox bookmarks=00_opsec_checks name=work from=2025-01-01 to=2025-06-30 sort=-created[/dim])",
+                      default="", show_default=False, console=console)
+    try: query = _parse_profile_filter(text)
+    except ValueError as e_filter: console.print(f"[red]{e_filter}[/red]"); return
+    page_size = max(1, int(config_manager.get_setting("profiles_page_size", 20)))
+    page = 0
+    while True:
+        rows, total = config_manager.query_profiles(offset=page * page_size, limit=page_size, **query)
+        if not total: console.print("No profiles match the filter."); return
+        pages = -(-total // page_size)
+        _render_profiles_page(rows, total, page, pages)
+        if pages == 1: return
+        choices = [c for c, ok in (("n", page + 1 < pages), ("p", page > 0), ("b", True)) if ok]
+        action = Prompt.ask("Next page (n), previous page (p) or back (b)", choices=choices, default=choices[0], console=console)
+        if action == "b": return
+        page += 1 if action == "n" else -1
+
 def handle_command_profiles_seq(detected_browser_paths):
     console.print(Rule("[green]Manage Persistent Profiles[/green]", style="green"))
     while True: 
-        profile_commands = {"list": "List", "create": "Create", "delete": "Delete", "load": "Load to Main Setup", "back": "Back to Main"}
+        profile_commands = {"list": "List", "create": "Create", "clone": "Clone", "delete": "Delete", "load": "Load to Main Setup", "back": "Back to Main"}
         for cmd, desc in profile_commands.items(): console.print(f"  [cyan]{cmd:<8}[/cyan] - {desc}")
         console.line()
         sub_command = Prompt.ask(Text.from_markup("[bold gold1]Profile >[/bold gold1]"), choices=list(profile_commands.keys()), default="back", console=console).lower()
         console.line()
         if sub_command == "list":
             console.print(Rule("[underline green]Persistent Profiles[/underline green]", style="green"))
-            profiles_data = [] 
-            try: profiles_data = config_manager.load_profiles_data()
-            except Exception as e_load: console.print(f"[bold red]Error loading profiles: {e_load}[/bold red]");
-            if not profiles_data: console.print("No persistent profiles found.")
-            else:
-                table = Table(title="Available Profiles", box=SIMPLE_HEAVY, show_lines=True, header_style="bold magenta")
-                table.add_column("Name",style="cyan",min_width=15); table.add_column("Browser"); table.add_column("Bookmarks Set"); table.add_column("Created")
-                if DEBUG_MODE: table.add_column("Browser Dir Path", style="dim", overflow="fold")
-                valid_profiles_displayed = 0
-                for profile_item in profiles_data:
-                    if not isinstance(profile_item, dict): 
-                        if DEBUG_MODE and hasattr(console, 'log'): console.log(f"[dim red]Skipping invalid profile: {profile_item}[/dim red]")
-                        continue
-                    created_at_str = profile_item.get("created_at","N/A"); browser_profile_path_val = profile_item.get("browser_profile_path", "[Not Set]")
-                    bookmarks_identifier = profile_item.get("bookmarks_set_name")
-                    bookmarks_display_name_list = "None"
-                    if bookmarks_identifier == "__ALL__": bookmarks_display_name_list = "All Sets"
-                    elif bookmarks_identifier == "__GENERAL__": bookmarks_display_name_list = "General OSINT"
-                    elif isinstance(bookmarks_identifier, list):
-                        if bookmarks_identifier:
-                            fns_list = [fn.replace(".json","").replace("_"," ").title() for fn in bookmarks_identifier]
-                            bookmarks_display_name_list = ", ".join(fns_list)
-                            if len(bookmarks_display_name_list) > 30: bookmarks_display_name_list = f"{len(bookmarks_identifier)} specific sets"
-                        else: bookmarks_display_name_list = "None (empty specific)"
-                    elif isinstance(bookmarks_identifier, str):
-                        bookmarks_display_name_list = bookmarks_identifier.replace(".json","").replace("_"," ").title()
-                    formatted_date = created_at_str
-                    if created_at_str != "N/A" and "T" in created_at_str:
-                        try:
-                            timestamp_part = created_at_str.split('.')[0].replace('Z', '+00:00')
-                            dt_obj = datetime.fromisoformat(timestamp_part); formatted_date = dt_obj.strftime("%Y-%m-%d")
-                        except ValueError: formatted_date = created_at_str.split("T")[0] 
-                    row_data = [profile_item.get("profile_name", "[N/A]"), profile_item.get("browser_type","N/A").capitalize(), bookmarks_display_name_list, formatted_date]
-                    if DEBUG_MODE: row_data.append(browser_profile_path_val)
-                    table.add_row(*row_data); valid_profiles_displayed += 1
-                if valid_profiles_displayed > 0: console.print(table)
-                else: console.print("No valid profiles found to display.")
+            _browse_profiles()
             console.line()
         elif sub_command == "create":
             console.print(Rule("[green]Create New Persistent Profile[/green]", style="green"))
@@ -491,6 +788,7 @@ def handle_command_profiles_seq(detected_browser_paths):
                 profile_name = Prompt.ask("Enter unique name for new profile", default=f"profile_{int(time.time())%10000}")
                 if not profile_name.strip() or not profile_name.replace('_','').isalnum(): console.print("[red]Invalid name (alphanumeric & underscore only).[/red]"); console.line(); continue
                 if config_manager.get_profile_by_name(profile_name): console.print(f"[red]Profile '{profile_name}' exists.[/red]"); console.line(); continue
+                config_manager.load_profiles_data(strict=True) # profiles.json ilegible: no guardar encima (ProfilesDataError)
                 browser_type = select_browser_interactive_sequential(detected_browser_paths, None)
                 if not browser_type: console.line(); continue
                 bookmarks_set_identifier_create = _get_bookmark_selection_from_user(None) 
@@ -504,13 +802,51 @@ def handle_command_profiles_seq(detected_browser_paths):
                 browser_profile_disk_path = browser_manager.create_profile(browser_type=browser_type, profile_custom_name=profile_name, is_persistent=True, bookmark_set_identifier=bookmarks_set_identifier_create, console=console)
                 if not browser_profile_disk_path: console.print("[red]Failed to create browser profile directory.[/red]"); console.line(); continue
                 new_profile_data = {"profile_name": profile_name, "browser_type": browser_type, "browser_profile_path": browser_profile_disk_path, "bookmarks_set_name": bookmarks_set_identifier_create, "created_at": datetime.now().isoformat()}
-                profiles = config_manager.load_profiles_data(); profiles.append(new_profile_data)
-                if config_manager.save_profiles_data(profiles, console=console): console.print(f"[green]Profile '[cyan]{profile_name}[/cyan]' created.[/green]")
+                with config_manager.profiles_lock():
+                    try: profiles = config_manager.load_profiles_data(strict=True); profiles.append(new_profile_data)
+                    except config_manager.ProfilesDataError as e_registry: console.print(f"[red]{e_registry}[/red]"); profiles = None
+                    saved = profiles is not None and config_manager.save_profiles_data(profiles, console=console)
+                if saved: console.print(f"[green]Profile '[cyan]{profile_name}[/cyan]' created.[/green]")
                 else:
                     console.print("[red]Failed to save profile metadata.[/red]")
                     if os.path.exists(browser_profile_disk_path): browser_manager.remove_profile(browser_profile_disk_path, console)      
             except Exception as e: console.print(f"[red]Error: {e}[/red]");
             console.line()
+        elif sub_command == "clone":
+            console.print(Rule("[green]Clone Persistent Profile[/green]", style="green"))
+            profiles = config_manager.load_profiles_data()
+            if not profiles: console.print("[yellow]No profiles to clone.[/yellow]"); console.line(); continue
+            profile_choices = {str(i+1): p["profile_name"] for i, p in enumerate(profiles)}
+            profile_choices[str(len(profiles)+1)] = "(Cancel)"
+            for k, n in profile_choices.items(): console.print(f"  [cyan]{k}[/cyan]. {n}")
+            choice_key = Prompt.ask("Select profile to clone:", choices=list(profile_choices.keys()), console=console).upper()
+            if profile_choices.get(choice_key) == "(Cancel)": console.print("[yellow]Cancelled.[/yellow]"); console.line(); continue
+            source_name = profile_choices.get(choice_key)
+            source_data = config_manager.get_profile_by_name(source_name)
+            if not source_data: console.print(f"[red]Profile '{source_name}' not found.[/red]"); console.line(); continue
+            profile_name = Prompt.ask("Enter unique name for the clone", default=f"{source_name}_2", console=console)
+            if not profile_name.strip() or not profile_name.replace('_','').isalnum(): console.print("[red]Invalid name (alphanumeric & underscore only).[/red]"); console.line(); continue
+            profile_clone = _feature("profile_clone") # Solo aquí: fuera del camino de arranque
+            # Comprobación, copia y guardado bajo el mismo lock (como 'profiles clone'): otro proceso no puede registrar el nombre entre medias
+            with config_manager.profiles_lock():
+                try: profiles = config_manager.load_profiles_data(strict=True)
+                except config_manager.ProfilesDataError as e_registry: console.print(f"[red]{e_registry}[/red]"); console.line(); continue
+                if config_manager.get_profile_by_name(profile_name): console.print(f"[red]Profile '{profile_name}' exists.[/red]"); console.line(); continue
+                try:
+                    with console.status(f"[spinner.dots]Cloning '{source_name}'...", spinner_style="blue"):
+                        new_profile_data, clone_stats = profile_clone.clone_profile(source_data, profile_name)
+                except profile_clone.ProfileInUse as e: console.print(f"[red]{e}. Close that browser first.[/red]"); console.line(); continue
+                except OSError as e: console.print(f"[red]Could not clone the profile: {e}[/red]"); console.line(); continue
+                profiles.append(new_profile_data)
+                saved = config_manager.save_profiles_data(profiles, console=console)
+            if saved:
+                console.print(f"[green]Profile '[cyan]{profile_name}[/cyan]' cloned from '[cyan]{source_name}[/cyan]': {clone_stats['files']} files, "
+                              f"{disk_usage.format_size(clone_stats['bytes'])} in {clone_stats['seconds']:.2f}s.[/green] "
+                              f"[dim](reflinked {clone_stats['reflinked']}, hardlinked {clone_stats['hardlinked']}, copied {clone_stats['copied']}; caches not copied)[/dim]")
+            else:
+                console.print("[red]Failed to save profile metadata.[/red]")
+                browser_manager.remove_profile(new_profile_data["browser_profile_path"], console)
+            console.line()
         elif sub_command == "delete":
             console.print(Rule("[red]Delete Persistent Profile[/red]", style="red"))
             profiles = config_manager.load_profiles_data()
@@ -527,8 +863,10 @@ def handle_command_profiles_seq(detected_browser_paths):
                 browser_dir_path = profile_to_delete_data.get("browser_profile_path")
                 if browser_dir_path and os.path.exists(browser_dir_path):
                     if browser_manager.remove_profile(browser_dir_path, console=console): console.print(f"  [green]Browser data deleted.[/green]")
-                updated_profiles = [p for p in profiles if p["profile_name"] != profile_name_to_delete]
-                if config_manager.save_profiles_data(updated_profiles, console=console):
+                with config_manager.profiles_lock(): # Releer: otro proceso pudo cambiarlo mientras se confirmaba
+                    updated_profiles = [p for p in config_manager.load_profiles_data() if p["profile_name"] != profile_name_to_delete]
+                    saved = config_manager.save_profiles_data(updated_profiles, console=console)
+                if saved:
                     console.print(f"  [green]Profile '{profile_name_to_delete}' removed from config.[/green]")
                     if CURRENT_SESSION_SETUP.get("gs_profile_name") == profile_name_to_delete:
                         CURRENT_SESSION_SETUP.update({"profile_type": "Temporary", "gs_profile_name": None, "browser_selected": None, "bookmarks_set": None, "browser_profile_on_disk_path": None, "network_checks_status": "Pending"})
@@ -565,116 +903,222 @@ def handle_command_about_seq():
 (Resto de la info...)"""),padding=(1,2), border_style="blue"))
     console.line()
 
-# --- Bucle Principal Secuencial ---
-def main_loop_sequential(cli_args):
-    detected_browser_paths = utils.check_browser_executables(console=None if not DEBUG_MODE else console) 
+def _report_time_to_prompt():
+    """Records the startup time up to the first prompt and warns (debug log) if it exceeds 'startup_budget_ms'."""
+    now_ns = time.perf_counter_ns()
+    elapsed_ms = (now_ns / 1e9 - STARTED_AT) * 1000
+    timing.record("startup.time_to_prompt", int(STARTED_AT * 1e9), now_ns)
+    budget_ms = float(config_manager.get_setting("startup_budget_ms", 250))
+    if elapsed_ms > budget_ms: logger.info("Time to prompt %.0f ms exceeds the %.0f ms budget", elapsed_ms, budget_ms)
+    else: logger.debug("Time to prompt: %.0f ms (budget %.0f ms)", elapsed_ms, budget_ms)
+
+def handle_command_sessions(shell):
+    console.print(Rule("[green]Browser Sessions[/green]", style="green"))
+    running = shell.sessions.running()
+    if not running:
+        console.print("No browser sessions running. Use 'launch' to start one."); return
+    table = Table(box=SIMPLE_HEAVY, show_lines=False)
+    for column in ("Session", "Browser", "Profile", "PID", "Running for"): table.add_column(column)
+    for session in running:
+        profile_label = session["profile"] or ("[italic]temporary[/italic]" if session["temporary"] else os.path.basename(session["profile_path"]))
+        table.add_row(f"[cyan]{session['session']}[/cyan]", session["browser"].capitalize(), profile_label, str(session["pid"]),
+                      _format_seconds(time.time() - session["started"]))
+    console.print(table)
+
+async def handle_command_stop(shell, argument):
+    running = shell.sessions.running()
+    if not running: console.print("[yellow]No browser sessions running.[/yellow]"); return
+    if argument == "all": await shell.sessions.stop_all(); return
+    if not argument and len(running) == 1: argument = str(running[0]["session"])
+    if not argument.isdigit():
+        console.print("[yellow]Usage: 'stop N' (see 'sessions') or 'stop all'.[/yellow]"); return
+    if await shell.sessions.stop(int(argument)) is None: console.print(f"[red]No running session {argument}.[/red]")
+
+async def _run_in_background(shell, name, handler):
+    """Runs an output-only command in a worker thread; its output is printed in one piece when it finishes."""
+    if name in shell.tasks.running():
+        console.print(f"[yellow]'{name}' is already running in the background.[/yellow]"); return
+    console.print(f"[dim]'{name}' is running in the background; the results will be shown here when ready.[/dim]")
+    buffer_console = Console(file=io.StringIO(), force_terminal=True, width=console.width, color_system=console.color_system)
+
+    def _write_output(console_obj):
+        console_obj.file.write(buffer_console.file.getvalue()); console_obj.file.flush()
+
+    profiling = _profiling()
+    if profiling: # Perfil dentro del hilo del comando, con sus informes en su salida
+        handler = profiling.wrap(name, handler, on_report=functools.partial(_render_profile_reports, console_obj=buffer_console))
+
+    async def _task():
+        try: await async_shell.run_in_thread(handler, buffer_console)
+        finally: shell.notify(_write_output) # También la salida parcial si el comando falla
+    shell.tasks.spawn(name, _task())
+
+def _warm_caches():
+    """Loads, after the first prompt, what the first check/launch would otherwise load on demand."""
+    network_checker.get_http_session() # Importa requests y prepara el pool de conexiones
+    for module_name in ("leak_monitor", "local_network"): _feature(module_name)
+
+def _redraw_main_screen():
+    display_initial_banner_and_app_info()
+    display_session_status_sequential()
+    display_command_menu_sequential()
+
+async def _dispatch_command(shell, command_line, browsers_future):
+    """Runs one prompt command. Returns False to leave the shell."""
+    command_input, _, argument = command_line.lower().partition(" ")
+    argument = argument.strip()
+    logger.debug("Command received: %r", command_line)
+    if command_input in ("setup", "launch", "profiles"): # Solo estos esperan al descubrimiento de navegadores
+        detected_browser_paths = await asyncio.shield(browsers_future)
+    # Los comandos con preguntas corren en un hilo: el bucle sigue vigilando sesiones y monitor mientras tanto
+    if command_input == "setup": await async_shell.run_in_thread(handle_command_setup_seq, detected_browser_paths)
+    elif command_input == "bookmarks": await async_shell.run_in_thread(handle_command_bookmarks_seq)
+    elif command_input == "check": await _run_in_background(shell, "check", handle_command_check_seq)
+    elif command_input == "dnsleak": await _run_in_background(shell, "dnsleak", handle_command_dnsleak_seq)
+    elif command_input == "history": await async_shell.run_in_thread(handle_command_history_seq)
+    elif command_input == "stats": handle_command_stats_seq()
+    elif command_input == "loglevel": handle_command_loglevel(argument)
+    elif command_input == "profile": handle_command_profile(argument)
+    elif command_input == "launch": await handle_command_launch(shell, detected_browser_paths)
+    elif command_input == "sessions": handle_command_sessions(shell)
+    elif command_input == "stop": await handle_command_stop(shell, argument)
+    elif command_input == "profiles":
+        await async_shell.run_in_thread(handle_command_profiles_seq, detected_browser_paths)
+        # Después de salir de 'profiles', redibujar el menú principal y estado
+        _redraw_main_screen()
+    elif command_input == "status": display_session_status_sequential()
+    elif command_input == "about": handle_command_about_seq()
+    elif command_input == "help": display_command_menu_sequential()
+    elif command_input in ["quit", "exit", "q"]:
+        running = len(shell.sessions.running())
+        question = f"{running} browser session(s) still running. Close them and quit?" if running else "Are you sure you want to quit?"
+        if await async_shell.run_in_thread(Confirm.ask, question, default=True, console=console):
+            return False
+        _redraw_main_screen() # Si no confirma, redibujar la pantalla principal
+    elif not command_input:
+        return True
+    else:
+        console.print(f"[red]Unknown command: '{command_input}'. Type 'help' for commands.[/red]")
+    console.line()
+    return True
+
+def _apply_cli_session_args(cli_args):
+    if not cli_args: return
+    # Preselección optimista: se deshace si el descubrimiento no encuentra ese navegador
+    if cli_args.browser: CURRENT_SESSION_SETUP["browser_selected"] = cli_args.browser
+    if cli_args.no_bookmarks: CURRENT_SESSION_SETUP["bookmarks_set"] = None
+    elif cli_args.bookmarks: 
+        bm_file_to_load_cli = cli_args.bookmarks
+        if bm_file_to_load_cli in ["__ALL__", "__GENERAL__"] or \
+           (isinstance(bm_file_to_load_cli, str) and hasattr(bookmarks_handler, 'BOOKMARKS_DIR') and os.path.exists(os.path.join(bookmarks_handler.BOOKMARKS_DIR, bm_file_to_load_cli))):
+            CURRENT_SESSION_SETUP["bookmarks_set"] = bm_file_to_load_cli
+        else:
+            console.print(f"[yellow]Warning: Bookmark set '{bm_file_to_load_cli}' from CLI arg not found or invalid. Using no bookmarks.[/yellow]")
+            CURRENT_SESSION_SETUP["bookmarks_set"] = None
+    # else: El default de CURRENT_SESSION_SETUP (None) se mantiene
+
+def _on_browsers_discovered(shell, future):
+    """Fills in the browser discovery result once the start-up task finishes."""
+    try: detected_browser_paths = future.result()
+    except Exception as e_discovery:
+        logger.exception("Browser discovery failed: %s", e_discovery); detected_browser_paths = {}
     if not detected_browser_paths:
-        # console.clear() # No limpiar aquí
-        display_initial_banner_and_app_info()
-        console.print(Panel(Text.from_markup("[bold red]ERROR: No supported browsers found.[/bold red]"),padding=1))
-        return 
-    if cli_args: 
-        if cli_args.browser and cli_args.browser in detected_browser_paths : CURRENT_SESSION_SETUP["browser_selected"] = cli_args.browser
-        if cli_args.no_bookmarks: CURRENT_SESSION_SETUP["bookmarks_set"] = None
-        elif cli_args.bookmarks: 
-            bm_file_to_load_cli = cli_args.bookmarks
-            if bm_file_to_load_cli in ["__ALL__", "__GENERAL__"] or \
-               (isinstance(bm_file_to_load_cli, str) and hasattr(bookmarks_handler, 'BOOKMARKS_DIR') and os.path.exists(os.path.join(bookmarks_handler.BOOKMARKS_DIR, bm_file_to_load_cli))):
-                CURRENT_SESSION_SETUP["bookmarks_set"] = bm_file_to_load_cli
-            else:
-                console.print(f"[yellow]Warning: Bookmark set '{bm_file_to_load_cli}' from CLI arg not found or invalid. Using no bookmarks.[/yellow]")
-                CURRENT_SESSION_SETUP["bookmarks_set"] = None
-        # else: El default de CURRENT_SESSION_SETUP (None) se mantiene
+        shell.request_exit()
+        console.print(Panel(Text.from_markup("[bold red]ERROR: No supported browsers found.[/bold red]"), padding=1)); return
+    selected = CURRENT_SESSION_SETUP["browser_selected"]
+    if selected and selected not in detected_browser_paths:
+        CURRENT_SESSION_SETUP["browser_selected"] = None
+        shell.notify(lambda console_obj: console_obj.print(f"[yellow]Warning: Browser '{selected}' from CLI arg was not found; no browser selected.[/yellow]"))
+
+# --- Bucle Principal (asyncio) ---
+def main_loop(cli_args):
+    """
+    Interactive shell on an asyncio event loop (async_shell.Shell). The start-up tasks
+    (startup.py: browser discovery, config and bookmark caches, the optional network check)
+    run while the banner is drawn; browser sessions, the leak monitor and 'check'/'dnsleak'
+    run as background tasks, so the prompt stays available while they do.
+    """
+    startup_tasks = startup.begin() # Ya en marcha si se entró por guardian_spy.py
+    _load_async_shell()
+    _apply_cli_session_args(cli_args)
     
-    # Pantalla de bienvenida inicial
+    # Pantalla de bienvenida inicial (sin esperar a las tareas de arranque)
     console.clear() 
-    display_initial_banner_and_app_info() 
-    display_session_status_sequential() 
-    display_command_menu_sequential() 
+    _redraw_main_screen()
 
-    while True:
-        print("DEBUG: main_loop_sequential - Top of loop, before Prompt.ask", file=sys.stderr) 
-        try:
-            command_input = Prompt.ask(Text.from_markup("[bold deep_sky_blue1]GuardianSpy >[/bold deep_sky_blue1]"), console=console).strip().lower()
-        except (KeyboardInterrupt, EOFError): command_input = "quit"
-        
-        print(f"DEBUG: main_loop_sequential - Command received: {command_input}", file=sys.stderr)
-        
-        if command_input == "setup": handle_command_setup_seq(detected_browser_paths)
-        elif command_input == "bookmarks": handle_command_bookmarks_seq() # LLAMADA AL NUEVO HANDLER
-        elif command_input == "check": handle_command_check_seq()
-        elif command_input == "launch": handle_command_launch_seq(detected_browser_paths)
-        elif command_input == "profiles": 
-            handle_command_profiles_seq(detected_browser_paths)
-            # Después de salir de 'profiles', redibujar el menú principal y estado
-            display_initial_banner_and_app_info() 
-            display_session_status_sequential() 
-            display_command_menu_sequential()
-        elif command_input == "status": 
-            display_session_status_sequential()
-        elif command_input == "about": 
-            handle_command_about_seq()
-        elif command_input == "help": 
-            display_command_menu_sequential()
-        # elif command_input == "clear": # Comando clear eliminado
-            # console.clear() 
-            # display_initial_banner_and_app_info() 
-            # display_session_status_sequential() 
-            # display_command_menu_sequential() 
-        elif command_input in ["quit", "exit", "q"]:
-            if Confirm.ask("Are you sure you want to quit?", default=True, console=console):
-                console.print(Rule("[blue]Exiting Guardian Spy. Stay safe![/blue]", style="blue"))
-                sys.exit(0) 
-            else: # Si no confirma, redibujar la pantalla principal
-                display_initial_banner_and_app_info()
-                display_session_status_sequential()
-                display_command_menu_sequential()
-        elif not command_input: 
-            pass 
-        else:
-            console.print(f"[red]Unknown command: '{command_input}'. Type 'help' for commands.[/red]")
-        
-        console.line() 
-        print("DEBUG: main_loop_sequential - End of loop iteration.", file=sys.stderr)
-
-
-def start():
-    # ... (start() como en la última versión, con la corrección del NameError)
-    print("DEBUG: main_cli.py - Entered start() function", file=sys.stderr)
-    parser = argparse.ArgumentParser(add_help=False) 
-    info_group = parser.add_argument_group('Informational Arguments')
-    info_group.add_argument("-v", "--version", action="version", version=f"%(prog)s {__version__}")
-    info_group.add_argument("-h", "--help", action="store_true", help="Show Guardian Spy command-line argument help and exit.")
-    info_group.add_argument("--check-setup", action="store_true", help="Perform setup checks (browsers, network) and exit.")
-    action_group = parser.add_argument_group('Session Setup Arguments (influences initial interactive state)')
-    action_group.add_argument("-b", "--browser", choices=['firefox', 'chrome', 'chromium'], help="Pre-select BROWSER for the initial session setup.")
-    action_group.add_argument("--no-bookmarks", action="store_true", help="Start with 'no bookmarks' selected in the initial session setup.")
-    action_group.add_argument("--bookmarks", metavar="SET_IDENTIFIER", help="Pre-select bookmarks. Use filename (e.g. '00_opsec.json'), '__ALL__', or '__GENERAL__'.")
-    args, unknown_args = parser.parse_known_args()
-    print(f"DEBUG: main_cli.py - Args parsed: {args}, Unknown: {unknown_args}", file=sys.stderr)
+    shell = async_shell.Shell(console, Text.from_markup("[bold deep_sky_blue1]GuardianSpy >[/bold deep_sky_blue1] "),
+                              on_session_event=_render_session_event, monitor_factory=_new_leak_monitor)
+    browsers_future = None
 
+    async def _on_start():
+        nonlocal browsers_future
+        browsers_future = asyncio.wrap_future(startup_tasks["browsers"])
+        browsers_future.add_done_callback(lambda future: _on_browsers_discovered(shell, future))
+        try: _render_recovery_result(await asyncio.wrap_future(startup_tasks["recovery"]), console) # Antes del primer prompt
+        except Exception: logger.exception("Session journal recovery failed")
+        if "network" in startup_tasks:
+            await _run_in_background(shell, "check", functools.partial(handle_command_check_seq, results_future=startup_tasks["network"]))
+        _report_time_to_prompt()
+        shell.tasks.spawn("warm-caches", async_shell.run_in_thread(_warm_caches))
+        metrics.start_exporter("shell") # Hilo propio: fichero OpenMetrics (y HTTP local, si se configuró)
+
+    async def _dispatch(command_line):
+        command_input = command_line.lower().partition(" ")[0]
+        profiling = _profiling()
+        if not profiling or command_input in _UNPROFILED_COMMANDS:
+            return await _dispatch_command(shell, command_line, browsers_future)
+        with profiling.command(command_input) as session:
+            result = await _dispatch_command(shell, command_line, browsers_future)
+        if session: _render_profile_reports(session.reports)
+        return result
+
+    loop = asyncio.new_event_loop()
+    main_task = loop.create_task(shell.run(_dispatch, on_start=_on_start))
+    try:
+        loop.run_until_complete(main_task)
+    finally:
+        # Salida normal o Ctrl+C: cerrar navegadores y borrar sus perfiles temporales antes de irse
+        main_task.cancel()
+        loop.run_until_complete(asyncio.gather(main_task, return_exceptions=True))
+        loop.run_until_complete(shell.close())
+        loop.close()
+    console.print(Rule("[blue]Exiting Guardian Spy. Stay safe![/blue]", style="blue"))
+    sys.exit(0)
+
+
+def start(args=None, unknown_args=None, parser=None):
+    """
+    CLI entry point. guardian_spy.py parses the arguments first (cli_args) so that
+    --version/--help never import this module; when called directly they are parsed here.
+    """
+    if args is None: args, unknown_args, parser = cli_args.parse_args()
+    unknown_args = unknown_args or []
     if args.help:
-        console.clear(); display_initial_banner_and_app_info() 
-        parser.print_help(file=sys.stdout) 
-        console.print("\n[italic]Once Guardian Spy starts in interactive mode, type 'help' for in-app commands.[/italic]")
+        cli_args.print_help(parser or cli_args.build_parser())
         sys.exit(0)
+    log_setup.configure(debug=DEBUG_MODE) # Ya configurado si se entró por guardian_spy.py
+    logger.debug("Args parsed: %s, unknown: %s", args, unknown_args)
+
+    global TRACE_OUTPUT_PATH
+    if args.trace is not None or config_manager.get_setting("timing_trace_enabled", False):
+        timing.enable_trace(True)
+        TRACE_OUTPUT_PATH = args.trace or os.path.join(timing.get_traces_dir(), f"trace-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.json")
+        atexit.register(_dump_trace_at_exit)
+
+    if args.profile_run or args.trace_malloc or config_manager.get_setting("profiling_enabled", False):
+        _enable_profiling(enabled=args.profile_run or config_manager.get_setting("profiling_enabled", False), malloc=args.trace_malloc)
+
         
-    if args.check_setup:
-        console.clear(); display_initial_banner_and_app_info() 
-        handle_command_check_seq() 
-        Prompt.ask("Press Enter to exit.", default="",show_default=False,console=console)
-        sys.exit(0) 
+    if args.check_setup: # No interactivo: apto para scripts (código de salida = resultado); guardian_spy.py no llega aquí
+        sys.exit(_feature("check_setup").run(args))
         
     if unknown_args:
         console.print(f"[yellow]Warning: Unrecognized arguments: {unknown_args}. These will be ignored at startup.[/yellow]")
         console.print("[yellow]Starting Guardian Spy in interactive mode. Type 'help' for in-app commands.[/yellow]")
         time.sleep(1) 
     
-    print("DEBUG: main_cli.py - About to call main_loop_sequential()", file=sys.stderr)
-    main_loop_sequential(args) 
-    print("DEBUG: main_cli.py - Returned from main_loop_sequential (this means quit was selected or loop ended)", file=sys.stderr)
+    main_loop(args)
 
 
 if __name__ == '__main__': 
-    print("DEBUG: main_cli.py - Running as script (__main__)", file=sys.stderr)
-    start()
\ No newline at end of file
+    start()
@@ -0,0 +1,246 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/metrics.py
+"""
+Counters and latency histograms of this process for fleet monitoring: the Prometheus
+text format (0.0.4) in a file for node_exporter's textfile collector, and OpenMetrics
+over HTTP for a Prometheus server.
+
+    metrics.inc("sessions_launched", browser="firefox")
+
+Histograms are fed by timing spans (SPAN_HISTOGRAMS maps a span name to a histogram and
+the span arguments used as labels), so the timed code needs no extra calls. Updating a
+metric is a dict update under a lock (well under a microsecond) and nothing is exported
+from the calling thread.
+
+start_exporter(role) (interactive shell, daemon) writes
+<'metrics_textfile_dir' or config dir/metrics>/guardian_spy-<user>-<role>.prom every
+'metrics_interval_s' seconds (temporary file + rename, so readers never see half a file)
+and, with 'metrics_http_port', serves the same metrics as OpenMetrics on
+http://127.0.0.1:<port>/metrics.
+Every sample carries the "user" and "role" labels, so the files of several users and
+processes can share one collector directory.
+"""
+import atexit
+import getpass
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from guardian_spy import __version__
+try:
+    from . import config_manager, timing
+except ImportError:
+    import config_manager, timing
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "guardian_spy"
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8" # Solo HTTP; el fichero es 0.0.4
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0) # Segundos (+Inf implícito)
+
+# Nombre: (tipo, ayuda, etiquetas)
+METRICS: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {
+    "sessions_launched": ("counter", "Browser sessions started.", ("browser",)),
+    "launch_failures": ("counter", "Browser launches that failed (executable missing or not startable).", ("browser",)),
+    "profile_cleanup_failures": ("counter", "Temporary profile removals that gave up.", ()),
+    "profile_cleanup_retries": ("counter", "Retried temporary profile removals (files still in use).", ()),
+    "profile_trimmed_bytes": ("counter", "Bytes of browser caches deleted from persistent profiles after their sessions.", ()),
+    "network_checks": ("counter", "Finished network checks by check and status (ok, error, timeout, skipped).", ("check", "status")),
+    "ip_changes": ("counter", "Public IP changes detected, by the check history or the leak monitor.", ("source",)),
+    "launch_duration_seconds": ("histogram", "Time to start the browser process.", ("browser",)),
+    "profile_create_duration_seconds": ("histogram", "Time to create a browser profile, bookmarks included.", ()),
+    "profile_clone_duration_seconds": ("histogram", "Time to clone a persistent profile, metadata rewrite included.", ()),
+    "profile_cleanup_duration_seconds": ("histogram", "Time to remove a temporary profile, retries included.", ()),
+    "network_check_duration_seconds": ("histogram", "Time of a full network check (IP, GeoIP, DNS).", ()),
+    "ip_provider_duration_seconds": ("histogram", "Time of one public IP provider request.", ("provider",)),
+    "dns_leak_test_duration_seconds": ("histogram", "Time of a DNS leak test.", ()),
+}
+
+# Span de timing -> (histograma, argumentos del span usados como etiquetas)
+SPAN_HISTOGRAMS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "browser.process_start": ("launch_duration_seconds", ("browser",)),
+    "profile.create": ("profile_create_duration_seconds", ()),
+    "profile.clone": ("profile_clone_duration_seconds", ()),
+    "profile.cleanup": ("profile_cleanup_duration_seconds", ()),
+    "check.network": ("network_check_duration_seconds", ()),
+    "net.ip_provider": ("ip_provider_duration_seconds", ("provider",)),
+    "dns.leak_test": ("dns_leak_test_duration_seconds", ()),
+}
+
+_COUNTERS: Dict[str, Dict[Tuple[str, ...], float]] = {name: {} for name, (kind, _, _) in METRICS.items() if kind == "counter"}
+_HISTOGRAMS: Dict[str, Dict[Tuple[str, ...], List]] = {name: {} for name, (kind, _, _) in METRICS.items() if kind == "histogram"}
+_LOCK = threading.Lock()
+_STARTED_AT = time.time()
+
+def inc(name: str, amount: float = 1, **labels):
+    """Adds amount to a counter of METRICS."""
+    key = tuple(str(labels.get(label, "")) for label in METRICS[name][2])
+    with _LOCK:
+        series = _COUNTERS[name]
+        series[key] = series.get(key, 0) + amount
+
+def observe(name: str, seconds: float, **labels):
+    """Adds one duration to a histogram of METRICS."""
+    key = tuple(str(labels.get(label, "")) for label in METRICS[name][2])
+    index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+    with _LOCK:
+        series = _HISTOGRAMS[name].get(key)
+        if series is None: series = _HISTOGRAMS[name][key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+        series[0][index] += 1
+        series[1] += seconds
+
+def _on_span(name: str, seconds: float, args: Optional[Dict]):
+    mapping = SPAN_HISTOGRAMS.get(name)
+    if mapping: observe(mapping[0], seconds, **{label: (args or {}).get(label, "") for label in mapping[1]})
+
+timing.add_listener(_on_span)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(pairs) -> str:
+    return "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in pairs) + "}"
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def render(role: str = "shell", openmetrics: bool = False) -> str:
+    """
+    The text of all metrics: Prometheus 0.0.4 (what node_exporter's textfile collector
+    parses) or, with openmetrics, OpenMetrics 1.0 (info type, # UNIT, ending with '# EOF').
+    """
+    common = (("user", _user()), ("role", role))
+    with _LOCK:
+        counters = {name: dict(series) for name, series in _COUNTERS.items()}
+        histograms = {name: {key: (list(buckets), total) for key, (buckets, total) in series.items()} for name, series in _HISTOGRAMS.items()}
+    # 0.0.4 no tiene tipo info ni # UNIT, y TYPE/HELP van con el nombre de las muestras (_total)
+    lines = ([f"# TYPE {PREFIX} info", f"# HELP {PREFIX} Guardian Spy version."] if openmetrics else
+             [f"# TYPE {PREFIX}_info gauge", f"# HELP {PREFIX}_info Guardian Spy version."])
+    lines += [f"{PREFIX}_info{_labels(common + (('version', __version__),))} 1", f"# TYPE {PREFIX}_start_time_seconds gauge"]
+    if openmetrics: lines.append(f"# UNIT {PREFIX}_start_time_seconds seconds")
+    lines += [f"# HELP {PREFIX}_start_time_seconds Start time of the process (Unix time).",
+              f"{PREFIX}_start_time_seconds{_labels(common)} {_STARTED_AT:.3f}"]
+    for name, (kind, help_text, label_names) in METRICS.items():
+        family = f"{PREFIX}_{name}"
+        header = family if openmetrics or kind != "counter" else f"{family}_total"
+        lines += [f"# TYPE {header} {kind}", f"# HELP {header} {help_text}"]
+        if openmetrics and name.endswith("_seconds"): lines.append(f"# UNIT {family} seconds")
+        if kind == "counter":
+            series = counters[name] or ({(): 0} if not label_names else {}) # Sin etiquetas: 0 explícito
+            for key, value in sorted(series.items()):
+                lines.append(f"{family}_total{_labels(common + tuple(zip(label_names, key)))} {_number(value)}")
+            continue
+        for key, (buckets, total) in sorted(histograms[name].items()):
+            pairs = common + tuple(zip(label_names, key))
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + (None,), buckets):
+                cumulative += count
+                lines.append(f"{family}_bucket{_labels(pairs + (('le', '+Inf' if bound is None else repr(bound)),))} {cumulative}")
+            lines += [f"{family}_count{_labels(pairs)} {cumulative}", f"{family}_sum{_labels(pairs)} {_number(total)}"]
+    return "\n".join(lines + (["# EOF"] if openmetrics else [])) + "\n"
+
+def _user() -> str:
+    try: return getpass.getuser()
+    except Exception: return str(os.getuid()) if hasattr(os, "getuid") else "unknown"
+
+def get_textfile_path(role: str) -> str:
+    directory = config_manager.get_setting("metrics_textfile_dir") or os.path.join(config_manager.get_config_dir(), "metrics")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{PREFIX}-{_user()}-{role}.prom")
+
+def write_textfile(role: str, path: Optional[str] = None) -> str:
+    """Writes render(role) (Prometheus 0.0.4) atomically (temporary file + os.replace). Returns the path."""
+    path = path or get_textfile_path(role)
+    tmp_path = f"{path}.{os.getpid()}.tmp" # Sin extensión .prom: el colector lo ignora
+    with open(tmp_path, "w", encoding="utf-8") as f: f.write(render(role))
+    os.replace(tmp_path, path)
+    return path
+
+class Exporter:
+    """Rewrites the text file on an interval and, optionally, serves it over HTTP on 127.0.0.1."""
+
+    def __init__(self, role: str, interval: float, port: int = 0):
+        self.role = role
+        self.interval = max(1.0, interval)
+        self.port = port
+        self.path: Optional[str] = None
+        self._server = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="gs-metrics", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _write(self):
+        try: self.path = write_textfile(self.role)
+        except OSError as e: logger.warning("Could not write the metrics file: %s", e)
+
+    def _serve(self):
+        import http.server
+        exporter = self
+
+        class _Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404); return
+                body = render(exporter.role, openmetrics=True).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("metrics http: " + format, *args)
+
+        try: self._server = http.server.ThreadingHTTPServer(("127.0.0.1", self.port), _Handler) # Solo local
+        except OSError as e:
+            logger.warning("Could not serve metrics on 127.0.0.1:%s: %s", self.port, e); return
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="gs-metrics-http", daemon=True).start()
+        logger.info("Serving metrics on http://127.0.0.1:%s/metrics", self.port)
+
+    def _run(self):
+        if self.port: self._serve()
+        self._write()
+        while not self._stop.wait(self.interval): self._write()
+
+    def stop(self):
+        """Stops the loop and the server, and writes the final values."""
+        self._stop.set()
+        if self._server: self._server.shutdown(); self._server.server_close()
+        self._write()
+
+_EXPORTER: Optional[Exporter] = None
+
+def start_exporter(role: str) -> Optional[Exporter]:
+    """Starts the exporter of this process (once; None if 'metrics_enabled' is off)."""
+    global _EXPORTER
+    with _LOCK:
+        if _EXPORTER or not config_manager.get_setting("metrics_enabled", True): return _EXPORTER
+        _EXPORTER = Exporter(role, float(config_manager.get_setting("metrics_interval_s", 15)),
+                             int(config_manager.get_setting("metrics_http_port", 0) or 0))
+    _EXPORTER.start()
+    atexit.register(stop_exporter)
+    return _EXPORTER
+
+def stop_exporter():
+    global _EXPORTER
+    with _LOCK: exporter, _EXPORTER = _EXPORTER, None
+    if exporter: exporter.stop()
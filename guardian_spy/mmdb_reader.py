@@ -0,0 +1,231 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/mmdb_reader.py
+"""
+Minimal reader for MaxMind DB (.mmdb) files, e.g. GeoLite2-City / GeoLite2-ASN or the
+free DB-IP "lite" databases. The file is memory-mapped and each lookup walks the binary
+search tree bit by bit, so geolocation works offline and never sends our IP anywhere.
+"""
+import os
+import mmap
+import struct
+import ipaddress
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+METADATA_MARKER = b"\xab\xcd\xefMaxMind.com"
+_METADATA_SEARCH_WINDOW = 128 * 1024 # El formato garantiza los metadatos en los últimos 128 KiB
+_DATA_SECTION_SEPARATOR_SIZE = 16
+
+class InvalidDatabaseError(ValueError):
+    """Raised when a file is not a readable MaxMind DB."""
+
+class _Decoder:
+    """Decodes the MaxMind DB data section format starting at a given base offset."""
+
+    def __init__(self, buf, pointer_base: int):
+        self._buf = buf
+        self._pointer_base = pointer_base
+
+    def decode(self, offset: int) -> Tuple[Any, int]:
+        """Decodes the value at offset. Returns (value, offset_after_value)."""
+        buf = self._buf
+        ctrl = buf[offset]; offset += 1
+        type_num = ctrl >> 5
+        if type_num == 1: # Puntero: el tamaño se codifica en los bits 3-4
+            return self._decode_pointer(ctrl, offset)
+        if type_num == 0: # Tipo extendido
+            type_num = 7 + buf[offset]; offset += 1
+        size = ctrl & 0x1F
+        if size >= 29:
+            extra = size - 28
+            size_bytes = int.from_bytes(buf[offset:offset + extra], "big"); offset += extra
+            size = (29, 285, 65821)[extra - 1] + size_bytes
+
+        if type_num == 2: # utf8_string
+            return buf[offset:offset + size].decode("utf-8"), offset + size
+        if type_num == 7: # map
+            result = {}
+            for _ in range(size):
+                key, offset = self.decode(offset)
+                result[key], offset = self.decode(offset)
+            return result, offset
+        if type_num in (5, 6, 9, 10): # uint16 / uint32 / uint64 / uint128
+            return int.from_bytes(buf[offset:offset + size], "big"), offset + size
+        if type_num == 11: # array
+            result_list = []
+            for _ in range(size):
+                value, offset = self.decode(offset)
+                result_list.append(value)
+            return result_list, offset
+        if type_num == 3: # double
+            if size != 8: raise InvalidDatabaseError(f"Invalid double size {size}")
+            return struct.unpack(">d", buf[offset:offset + 8])[0], offset + 8
+        if type_num == 15: # float
+            if size != 4: raise InvalidDatabaseError(f"Invalid float size {size}")
+            return struct.unpack(">f", buf[offset:offset + 4])[0], offset + 4
+        if type_num == 8: # int32 (puede tener menos de 4 bytes)
+            return int.from_bytes(buf[offset:offset + size].rjust(4, b"\x00"), "big", signed=True), offset + size
+        if type_num == 14: # boolean: el valor está en el campo de tamaño
+            return bool(size), offset
+        if type_num == 4: # bytes
+            return bytes(buf[offset:offset + size]), offset + size
+        raise InvalidDatabaseError(f"Unsupported data type {type_num} at offset {offset - 1}")
+
+    def _decode_pointer(self, ctrl: int, offset: int) -> Tuple[Any, int]:
+        pointer_size = ((ctrl >> 3) & 0x3) + 1
+        raw = self._buf[offset:offset + pointer_size]
+        if pointer_size == 1: pointer = ((ctrl & 0x7) << 8) | raw[0]
+        elif pointer_size == 2: pointer = (((ctrl & 0x7) << 16) | int.from_bytes(raw, "big")) + 2048
+        elif pointer_size == 3: pointer = (((ctrl & 0x7) << 24) | int.from_bytes(raw, "big")) + 526336
+        else: pointer = int.from_bytes(raw, "big")
+        value, _ = self.decode(self._pointer_base + pointer)
+        return value, offset + pointer_size
+
+class MMDBReader:
+    """
+    Memory-mapped MaxMind DB reader.
+
+    Usage:
+        reader = MMDBReader("/path/GeoLite2-City.mmdb")
+        record = reader.lookup("8.8.8.8") # dict or None
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with open(db_path, "rb") as f:
+            try: self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e: raise InvalidDatabaseError(f"Empty or unmappable database: {db_path}") from e
+        try:
+            window_start = max(0, len(self._buf) - _METADATA_SEARCH_WINDOW)
+            marker_pos = self._buf.rfind(METADATA_MARKER, window_start)
+            if marker_pos == -1: raise InvalidDatabaseError(f"MaxMind DB metadata marker not found in {db_path}")
+            metadata_start = marker_pos + len(METADATA_MARKER)
+            self.metadata, _ = _Decoder(self._buf, metadata_start).decode(metadata_start)
+            if not isinstance(self.metadata, dict): raise InvalidDatabaseError("MaxMind DB metadata is not a map")
+            self.node_count = int(self.metadata["node_count"])
+            self.record_size = int(self.metadata["record_size"])
+            self.ip_version = int(self.metadata["ip_version"])
+        except (KeyError, IndexError, TypeError, struct.error, UnicodeDecodeError) as e:
+            self._buf.close()
+            raise InvalidDatabaseError(f"Invalid MaxMind DB metadata in {db_path}: {e}") from e
+        except InvalidDatabaseError:
+            self._buf.close(); raise
+        if self.record_size not in (24, 28, 32):
+            self._buf.close()
+            raise InvalidDatabaseError(f"Unsupported record size {self.record_size}")
+
+        self._node_byte_size = self.record_size * 2 // 8
+        self._search_tree_size = self.node_count * self._node_byte_size
+        self._data_section_start = self._search_tree_size + _DATA_SECTION_SEPARATOR_SIZE
+        self._decoder = _Decoder(self._buf, self._data_section_start)
+        self._record_cache: Dict[int, Any] = {} # Muchas redes comparten el mismo registro
+        self._cache_lock = threading.Lock()
+        self._ipv4_start = self._find_ipv4_start()
+
+    def _read_node(self, node_number: int, bit: int) -> int:
+        buf = self._buf
+        base = node_number * self._node_byte_size
+        if self.record_size == 24:
+            offset = base + bit * 3
+            return (buf[offset] << 16) | (buf[offset + 1] << 8) | buf[offset + 2]
+        if self.record_size == 28:
+            if bit == 0:
+                return ((buf[base + 3] & 0xF0) << 20) | (buf[base] << 16) | (buf[base + 1] << 8) | buf[base + 2]
+            return ((buf[base + 3] & 0x0F) << 24) | (buf[base + 4] << 16) | (buf[base + 5] << 8) | buf[base + 6]
+        offset = base + bit * 4
+        return int.from_bytes(buf[offset:offset + 4], "big")
+
+    def _find_ipv4_start(self) -> int:
+        # En bases IPv6, el espacio IPv4 cuelga de ::/96 (96 bits a cero)
+        if self.ip_version == 4: return 0
+        node = 0
+        for _ in range(96):
+            if node >= self.node_count: break
+            node = self._read_node(node, 0)
+        return node
+
+    def lookup_with_prefix(self, ip: str) -> Tuple[Optional[Dict], int]:
+        """Returns (record, prefix_length) for ip; record is None if the IP is not in the database."""
+        address = ipaddress.ip_address(ip)
+        if address.version == 6 and self.ip_version == 4:
+            raise ValueError(f"Cannot look up IPv6 address {ip} in an IPv4-only database")
+        packed = address.packed
+        bit_count = len(packed) * 8
+        node = self._ipv4_start if address.version == 4 else 0
+        node_count = self.node_count
+        depth = 0
+        while depth < bit_count and node < node_count:
+            bit = (packed[depth >> 3] >> (7 - (depth & 7))) & 1
+            node = self._read_node(node, bit)
+            depth += 1
+        if node == node_count: return None, depth # Red sin datos
+        if node < node_count: raise InvalidDatabaseError("Search tree walk ended inside the tree")
+        return self._resolve_record(node), depth
+
+    def lookup(self, ip: str) -> Optional[Dict]:
+        """Returns the raw database record for ip, or None if it is not in the database."""
+        return self.lookup_with_prefix(ip)[0]
+
+    def _resolve_record(self, pointer: int) -> Any:
+        offset = pointer - self.node_count + self._search_tree_size
+        if offset >= len(self._buf): raise InvalidDatabaseError("Record pointer points past the end of the file")
+        with self._cache_lock:
+            if offset in self._record_cache: return self._record_cache[offset]
+        record, _ = self._decoder.decode(offset)
+        with self._cache_lock:
+            if len(self._record_cache) < 4096: self._record_cache[offset] = record
+        return record
+
+    def close(self):
+        self._buf.close()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc_info): self.close()
+
+def _english_name(section) -> Optional[str]:
+    if isinstance(section, dict):
+        names = section.get("names")
+        if isinstance(names, dict): return names.get("en") or next(iter(names.values()), None)
+    return None
+
+def record_to_geo_info(record: Dict, ip: str) -> Dict:
+    """Converts a City/Country/ASN/ISP record into the geo_info dict used by network_checker."""
+    subdivisions = record.get("subdivisions") or [None]
+    as_org = record.get("autonomous_system_organization")
+    return {
+        "country": _english_name(record.get("country")) or _english_name(record.get("registered_country")),
+        "region": _english_name(subdivisions[0]),
+        "city": _english_name(record.get("city")),
+        "isp": record.get("isp") or as_org,
+        "org": record.get("organization") or as_org,
+        "query_ip": ip,
+    }
+
+# --- Lector compartido (se reabre si cambia la ruta o el archivo) ---
+_READER: Optional[MMDBReader] = None
+_READER_KEY: Optional[Tuple[str, int]] = None
+_READER_LOCK = threading.Lock()
+
+def get_reader(db_path: str) -> MMDBReader:
+    """Returns a shared reader for db_path, reopening it if the file was replaced (e.g. a monthly update)."""
+    global _READER, _READER_KEY
+    key = (os.path.abspath(db_path), os.stat(db_path).st_mtime_ns)
+    with _READER_LOCK:
+        if _READER is None or _READER_KEY != key:
+            # El lector anterior no se cierra: otro hilo podría estar usándolo; el GC liberará el mmap
+            _READER, _READER_KEY = MMDBReader(db_path), key
+        return _READER
@@ -1,96 +1,564 @@
 # guardian_spy/network_checker.py
-import requests
 import platform
 import subprocess
 import re
 import os
 import json
+import time
+import threading
+import ipaddress
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
 
-from guardian_spy import DEBUG_MODE 
+try:
+    from . import config_manager, geoip_cache, metrics, mmdb_reader, timing
+except ImportError:
+    import config_manager, geoip_cache, metrics, mmdb_reader, timing
+
+if TYPE_CHECKING: import requests
+
+logger = logging.getLogger(__name__)
 
-DEFAULT_IP_SERVICE = "https://api.ipify.org?format=json"
 GEO_IP_SERVICE = "http://ip-api.com/json/" 
 
-def get_public_ip_info(console=None):
-    public_ip = None 
-    geo_info = None
-    nc_console_for_logs = console if DEBUG_MODE else None # Usar esto para console.log
+# Nombres de las comprobaciones que devuelve/notifica run_network_checks_concurrently()
+CHECK_IP = "ip"
+CHECK_GEO = "geo"
+CHECK_DNS = "dns"
+
+# --- Sesión HTTP compartida (keep-alive + pool de conexiones) ---
+_HTTP_SESSION = None
+_HTTP_SESSION_LOCK = threading.Lock()
+
+def _requests():
+    # 'requests' es la importación más cara del CLI (~50 ms): solo se carga al hacer la primera petición
+    import requests
+    return requests
+
+def get_http_session() -> "requests.Session":
+    """
+    Returns the shared requests.Session, creating it on first use.
+
+    The session keeps connections alive between calls, so repeated 'check' runs and the
+    background monitor reuse the same TCP/TLS connections instead of handshaking again.
+    Each known service host gets its own adapter sized by the 'http_pool_sizes' setting
+    ({url_prefix: max_connections}); other hosts use 'http_default_pool_size'.
+    """
+    global _HTTP_SESSION
+    if _HTTP_SESSION is not None: return _HTTP_SESSION
+    requests = _requests()
+    with _HTTP_SESSION_LOCK:
+        if _HTTP_SESSION is None:
+            settings = config_manager.load_settings()
+            session = requests.Session()
+            default_size = int(settings.get("http_default_pool_size", 4))
+            # pool_connections = nº de hosts distintos que se mantienen en caché por adaptador
+            session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=default_size, max_retries=0))
+            session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=default_size, max_retries=0))
+            for url_prefix, size in (settings.get("http_pool_sizes") or {}).items():
+                session.mount(url_prefix, requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=int(size), max_retries=0))
+            _HTTP_SESSION = session
+    return _HTTP_SESSION
+
+def close_http_session():
+    """Closes the shared session and its pooled connections (a new one is created on next use)."""
+    global _HTTP_SESSION
+    with _HTTP_SESSION_LOCK:
+        if _HTTP_SESSION is not None:
+            _HTTP_SESSION.close()
+            _HTTP_SESSION = None
+
+def get_http_timeout() -> Tuple[float, float]:
+    """Returns the (connect, read) timeout tuple from the 'http_connect_timeout'/'http_read_timeout' settings."""
+    settings = config_manager.load_settings()
+    return (float(settings.get("http_connect_timeout", 3.0)), float(settings.get("http_read_timeout", 5.0)))
 
+def _fetch_public_ip(url: str, is_json: bool, console=None, json_key: str = "ip",
+                     cancel_event: Optional[threading.Event] = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Queries a single IP-echo service.
+    Returns (ip, None) on success or (None, error_message) on failure; never prints errors itself.
+    If cancel_event is set once the response headers arrive, the body is not read.
+    """
+    requests = _requests()
     try:
-        if nc_console_for_logs: nc_console_for_logs.log(f"Fetching public IP from {DEFAULT_IP_SERVICE}")
-        response = requests.get(DEFAULT_IP_SERVICE, timeout=7)
-        response.raise_for_status()
-        data = response.json()
-        public_ip = data.get("ip") 
-        if nc_console_for_logs:
-            log_data_str = str(data); nc_console_for_logs.log(f"Raw IP response: {log_data_str[:200]}{'...' if len(log_data_str) > 200 else ''}")
+        logger.debug("Fetching public IP from %s", url)
+        with get_http_session().get(url, timeout=get_http_timeout(), stream=True) as response:
+            if cancel_event is not None and cancel_event.is_set(): return None, "Cancelled"
+            response.raise_for_status()
+            if is_json:
+                data = response.json()
+                logger.debug("Raw IP response: %.200s", data) # %.200s: str(data) solo si DEBUG está activo
+                raw_ip = data.get(json_key) if isinstance(data, dict) else None
+            else:
+                raw_ip = response.content.decode("ascii", errors="ignore").strip() # Sin adivinar charset
+        try: return str(ipaddress.ip_address((raw_ip or "").strip())), None
+        except ValueError: return None, f"Data Error: {url} did not return an IP address"
     except requests.exceptions.Timeout:
-        if console: console.print(f"[dim red]Network Timeout: Could not reach {DEFAULT_IP_SERVICE}[/dim red]")
+        return None, f"Network Timeout: Could not reach {url}"
     except requests.exceptions.RequestException as e:
-        if console: console.print(f"[dim red]Network Error (IP Service 1): {type(e).__name__}[/dim red]")
-    
-    if not public_ip:
-        try:
-            if nc_console_for_logs: nc_console_for_logs.log("Fetching public IP from fallback service icanhazip.com")
-            response = requests.get("https://icanhazip.com", timeout=7)
-            response.raise_for_status()
-            public_ip = response.text.strip()
-        except requests.exceptions.Timeout:
-            if console: console.print("[dim red]Network Timeout: Could not reach fallback IP service.[/dim red]")
-        except requests.exceptions.RequestException as e_fallback:
-             if console: console.print(f"[dim red]Network Error (IP Service 2): {type(e_fallback).__name__}[/dim red]")
-    
-    if not public_ip: 
-        if nc_console_for_logs: nc_console_for_logs.log("[dim]Failed to retrieve public IP after all attempts.[/dim]")
-        return None, None 
+        return None, f"Network Error ({url}): {type(e).__name__}"
+    except ValueError as e_json: # JSON inválido
+        return None, f"Data Error: Invalid IP response from {url}: {e_json}"
+
+# --- Proveedores de IP: carrera en paralelo + estadísticas de latencia ---
+_PROVIDER_STATS: Dict[str, Dict] = {} # {nombre: {"ewma": s, "successes": n, "failures": n}}
+_PROVIDER_STATS_LOCK = threading.Lock()
+_PROVIDER_STATS_LOADED = False
+_PROVIDER_EWMA_ALPHA = 0.3
+
+def _get_provider_stats_file_path():
+    return os.path.join(config_manager.get_config_dir(), "ip_provider_stats.json")
+
+def _load_provider_stats():
+    global _PROVIDER_STATS_LOADED
+    if _PROVIDER_STATS_LOADED: return
+    _PROVIDER_STATS_LOADED = True
+    try:
+        with open(_get_provider_stats_file_path(), "r", encoding="utf-8") as f: data = json.load(f)
+        if isinstance(data, dict): _PROVIDER_STATS.update({k: v for k, v in data.items() if isinstance(v, dict)})
+    except (OSError, ValueError): pass # Sin estadísticas previas
+
+def _save_provider_stats():
+    # Escritura atómica con nombre temporal por proceso: shell, monitor y daemon lo guardan y leen a la vez
+    stats_file = _get_provider_stats_file_path()
+    tmp_file = f"{stats_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, "w", encoding="utf-8") as f: json.dump(_PROVIDER_STATS, f, indent=4)
+        os.replace(tmp_file, stats_file)
+    except OSError: # Las estadísticas son una optimización, no un requisito
+        try: os.unlink(tmp_file)
+        except OSError: pass
+
+def _record_provider_result(name: str, elapsed: float, ok: bool):
+    """Updates the latency EWMA of a provider. Failures count as a full read-timeout."""
+    sample = elapsed if ok else sum(get_http_timeout())
+    with _PROVIDER_STATS_LOCK:
+        _load_provider_stats()
+        stats = _PROVIDER_STATS.setdefault(name, {"ewma": sample, "successes": 0, "failures": 0})
+        stats["ewma"] = (1 - _PROVIDER_EWMA_ALPHA) * stats.get("ewma", sample) + _PROVIDER_EWMA_ALPHA * sample
+        stats["successes" if ok else "failures"] = stats.get("successes" if ok else "failures", 0) + 1
+
+def get_provider_stats() -> Dict[str, Dict]:
+    """Returns a copy of the per-provider latency statistics."""
+    with _PROVIDER_STATS_LOCK:
+        _load_provider_stats()
+        return {name: dict(stats) for name, stats in _PROVIDER_STATS.items()}
+
+def get_ip_providers() -> List[Dict]:
+    """
+    Returns the configured IP-echo providers ('ip_providers' setting), fastest first
+    according to their recorded latency. Providers never measured go first so they get sampled.
+    """
+    providers = [p for p in (config_manager.get_setting("ip_providers") or []) if isinstance(p, dict) and p.get("url")]
+    for p in providers: p.setdefault("name", p["url"])
+    stats = get_provider_stats()
+    return sorted(providers, key=lambda p: stats.get(p["name"], {}).get("ewma", 0.0))
+
+@timing.timed("net.ip_race")
+def race_ip_providers(providers: Optional[List[Dict]] = None, quorum: Optional[int] = None,
+                      timeout: Optional[float] = None, console=None) -> Dict:
+    """
+    Queries several IP-echo providers in parallel.
+
+    With quorum=1 the first valid answer wins. With quorum=k the race ends as soon as k
+    providers agree on the same IP. Requests already in flight then get
+    'ip_disagreement_grace_s' more to answer, so a provider that sees a different IP is
+    still noticed with quorum=1; after that, queued requests are cancelled and in-flight
+    ones are abandoned (their bodies are not read).
+
+    Args:
+        providers (list, optional): [{"name", "url", "format": "json"|"text", "json_key"}].
+            Defaults to get_ip_providers().
+        quorum (int, optional): Agreeing answers required. Defaults to the 'ip_quorum' setting.
+        timeout (float, optional): Budget for the whole race. Defaults to 'network_check_timeout'.
+
+    Returns:
+        dict: {"ip", "provider", "answers": {name: ip}, "errors": {name: msg},
+               "disagreement": bool, "quorum_met": bool}. "ip" is None if nobody answered.
+            "disagreement" is True when providers returned different IPs, which can mean a
+            split tunnel or an intercepting proxy.
+    """
+    if providers is None: providers = get_ip_providers()
+    if quorum is None: quorum = int(config_manager.get_setting("ip_quorum", 1))
+    if timeout is None: timeout = float(config_manager.get_setting("network_check_timeout", 12.0))
+    quorum = max(1, min(quorum, len(providers))) if providers else 1
+    result = {"ip": None, "provider": None, "answers": {}, "errors": {}, "disagreement": False, "quorum_met": False}
+    if not providers:
+        result["errors"]["config"] = "No IP providers configured"
+        return result
+
+    deadline = time.monotonic() + timeout
+    cancel_event = threading.Event()
+    max_parallel = max(1, int(config_manager.get_setting("ip_race_max_parallel", 3)))
+    grace = max(0.0, float(config_manager.get_setting("ip_disagreement_grace_s", 0.3) or 0))
+
+    def _query(provider):
+        started = time.monotonic()
+        with timing.span("net.ip_provider", provider=provider["name"]):
+            ip, error = _fetch_public_ip(provider["url"], provider.get("format", "json") == "json", console,
+                                         json_key=provider.get("json_key", "ip"), cancel_event=cancel_event)
+        if error != "Cancelled": _record_provider_result(provider["name"], time.monotonic() - started, ip is not None)
+        return ip, error
+
+    # Con menos hilos que proveedores, los más lentos (al final de la lista) solo se consultan si los rápidos fallan.
+    workers = min(max_parallel, len(providers))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gs-iprace")
+    try:
+        futures = {executor.submit(_query, p): p["name"] for p in providers}
+        pending = set(futures)
+        votes = Counter()
+
+        def _collect(done):
+            for future in done:
+                name = futures[future]
+                try: ip, error = future.result()
+                except Exception as e_future: ip, error = None, f"{type(e_future).__name__}: {e_future}"
+                if not ip:
+                    result["errors"][name] = error
+                    continue
+                result["answers"][name] = ip
+                votes[ip] += 1
+                if votes[ip] >= quorum and not result["quorum_met"]:
+                    result.update({"ip": ip, "provider": name, "quorum_met": True})
+
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            _collect(done)
+            if result["quorum_met"]: break
+        # En curso: los primeros 'workers' pendientes en orden de envío (la cola del pool es FIFO); el resto se cancela
+        in_flight = [f for f in futures if f in pending][:workers]
+        if result["quorum_met"] and in_flight and grace:
+            # Quórum ya decidido: las respuestas tardías solo sirven para detectar discrepancias
+            done, _ = wait(in_flight, timeout=max(0.0, min(grace, deadline - time.monotonic())))
+            _collect(done)
+    finally:
+        cancel_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        with _PROVIDER_STATS_LOCK: _save_provider_stats()
+
+    result["disagreement"] = len(set(result["answers"].values())) > 1
+    if not result["quorum_met"] and votes:
+        # Sin quórum: devolver la IP más votada, pero quorum_met=False lo deja claro
+        best_ip = votes.most_common(1)[0][0]
+        result["ip"] = best_ip
+        result["provider"] = next(n for n, ip in result["answers"].items() if ip == best_ip)
+    return result
+
+def get_geo_info(public_ip: str, console=None) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Geolocates public_ip. If 'geoip_database_path' points to a local MaxMind DB file it is
+    used first (offline, no network). Otherwise, or if the IP is not in it, the GeoIP cache
+    is checked and only a cache miss calls GEO_IP_SERVICE, unless 'geoip_remote_enabled'
+    is False. Returns (geo_info, None) on success or (None, error_message) on failure.
+    """
+    settings = config_manager.load_settings()
+    db_path = settings.get("geoip_database_path")
+    offline_error = None
+    if db_path:
+        geo_info, offline_error = get_geo_info_offline(public_ip, db_path, console=console)
+        if geo_info: return geo_info, None
+    if not settings.get("geoip_remote_enabled", True):
+        return None, offline_error or "Remote GeoIP lookups are disabled and no local database is configured"
+    cache = geoip_cache.get_geoip_cache()
+    hit, geo_info, error = cache.get(public_ip)
+    if hit:
+        logger.debug("GeoIP cache hit for %s", public_ip)
+        return geo_info, error
+    geo_info, error = _fetch_geo_info_remote(public_ip, console=console)
+    cache.put(public_ip, geo_info, error)
+    return geo_info, error
 
+@timing.timed("geoip.offline")
+def get_geo_info_offline(public_ip: str, db_path: str, console=None) -> Tuple[Optional[Dict], Optional[str]]:
+    """Geolocates public_ip from a local MaxMind DB file, without any network access."""
     try:
-        if nc_console_for_logs: nc_console_for_logs.log(f"Fetching geolocation for IP: {public_ip} from {GEO_IP_SERVICE}{public_ip}")
-        geo_response = requests.get(f"{GEO_IP_SERVICE}{public_ip}", timeout=7)
+        record = mmdb_reader.get_reader(os.path.expanduser(db_path)).lookup(public_ip)
+    except (OSError, ValueError) as e: # ValueError incluye InvalidDatabaseError
+        logger.warning("Offline GeoIP lookup failed (%s): %s", db_path, e)
+        return None, f"Offline GeoIP error: {e}"
+    if not record: return None, f"{public_ip} not found in local GeoIP database"
+    return mmdb_reader.record_to_geo_info(record, public_ip), None
+
+@timing.timed("net.geoip_remote")
+def _fetch_geo_info_remote(public_ip: str, console=None) -> Tuple[Optional[Dict], Optional[str]]:
+    """Geolocates public_ip with the 'geoip_remote_url' service, GEO_IP_SERVICE by default (no cache)."""
+    requests = _requests()
+    service_url = config_manager.get_setting("geoip_remote_url") or GEO_IP_SERVICE
+    geo_response = None
+    try:
+        logger.debug("Fetching geolocation for IP: %s from %s%s", public_ip, service_url, public_ip)
+        geo_response = get_http_session().get(f"{service_url}{public_ip}", timeout=get_http_timeout())
         geo_response.raise_for_status()
         geo_data = geo_response.json()
-        if nc_console_for_logs:
-            log_geo_data_str = str(geo_data); nc_console_for_logs.log(f"Raw GeoIP response: {log_geo_data_str[:500]}{'...' if len(log_geo_data_str) > 500 else ''}")
+        logger.debug("Raw GeoIP response: %.500s", geo_data)
         if geo_data.get("status") == "success":
-            geo_info = {"country": geo_data.get("country"), "region": geo_data.get("regionName"), "city": geo_data.get("city"), "isp": geo_data.get("isp"), "org": geo_data.get("org"), "query_ip": geo_data.get("query")}
-        elif console: console.print(f"[dim yellow]GeoIP service status: {geo_data.get('status')} - Msg: {geo_data.get('message')}[/dim yellow]")
+            return {"country": geo_data.get("country"), "region": geo_data.get("regionName"), "city": geo_data.get("city"), "isp": geo_data.get("isp"), "org": geo_data.get("org"), "query_ip": geo_data.get("query")}, None
+        return None, f"GeoIP service status: {geo_data.get('status')} - Msg: {geo_data.get('message')}"
     except requests.exceptions.Timeout:
-        if console: console.print(f"[dim red]Network Timeout: GeoIP service for {public_ip}[/dim red]")
+        return None, f"Network Timeout: GeoIP service for {public_ip}"
     except requests.exceptions.RequestException as e:
-        if console: console.print(f"[dim red]Network Error (GeoIP): {type(e).__name__}[/dim red]")
-    except json.JSONDecodeError as e_json: 
-        if console: console.print(f"[dim red]Data Error: Invalid GeoIP response for {public_ip}: {e_json}[/dim red]")
-        if nc_console_for_logs and 'geo_response' in locals() and hasattr(geo_response, 'text'):
-            nc_console_for_logs.log(f"[dim]GeoIP Response content: {geo_response.text[:200]}...[/dim]")                
+        return None, f"Network Error (GeoIP): {type(e).__name__}"
+    except ValueError as e_json: 
+        if geo_response is not None and hasattr(geo_response, 'text'): logger.debug("GeoIP Response content: %.200s", geo_response.text)
+        return None, f"Data Error: Invalid GeoIP response for {public_ip}: {e_json}"
+
+def get_public_ip_info(console=None):
+    """Races the configured IP providers, then geolocates the winner. Returns (public_ip, geo_info)."""
+    race = race_ip_providers(console=console)
+    public_ip = race["ip"]
+    if race["disagreement"] and console:
+        console.print(f"[bold yellow]IP providers disagree: {race['answers']}[/bold yellow]")
+    if not public_ip: 
+        if console:
+            for error in race["errors"].values(): console.print(f"[dim red]{error}[/dim red]")
+        logger.debug("Failed to retrieve public IP after all attempts.")
+        return None, None 
+
+    geo_info, error = get_geo_info(public_ip, console=console)
+    if error and console: console.print(f"[dim yellow]{error}[/dim yellow]")
     return public_ip, geo_info
 
-def get_dns_servers(console=None):
+@timing.timed("check.network")
+def run_network_checks_concurrently(console=None, timeout: Optional[float] = None,
+                                    on_result: Optional[Callable[[str, Dict], None]] = None) -> Dict[str, Dict]:
+    """
+    Runs the public IP lookup (a race between the configured providers), the GeoIP lookup
+    and DNS discovery concurrently under a single overall deadline.
+
+    Args:
+        console (rich.console.Console, optional): For the few messages shown to the user;
+            diagnostics go to the module logger (log_setup).
+        timeout (float, optional): Overall budget in seconds. Defaults to the
+            'network_check_timeout' setting.
+        on_result (callable, optional): Called as on_result(check_name, result) from the
+            calling thread as soon as each check (CHECK_IP, CHECK_GEO, CHECK_DNS) finishes
+            or times out, so callers can render results as they arrive.
+
+    Returns:
+        dict: {check_name: {"status": "ok"|"error"|"timeout"|"skipped", "value": ...,
+               "error": str|None, "elapsed": seconds}} for every check. The CHECK_IP entry
+            also carries the race details: "provider", "answers", "disagreement", "quorum_met".
+    """
+    if timeout is None: timeout = float(config_manager.get_setting("network_check_timeout", 12.0))
+    started = time.monotonic()
+    deadline = started + timeout
+    results: Dict[str, Dict] = {}
+
+    def _report(name, status, value=None, error=None, **extra):
+        results[name] = {"status": status, "value": value, "error": error, "elapsed": time.monotonic() - started, **extra}
+        metrics.inc("network_checks", check=name, status=status)
+        if on_result:
+            try: on_result(name, results[name])
+            except Exception as e_cb:
+                logger.warning("on_result callback failed for %s: %s", name, e_cb)
+
+    executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="gs-netcheck")
+    try:
+        futures = {
+            executor.submit(race_ip_providers, None, None, timeout, console): CHECK_IP,
+            executor.submit(get_dns_servers, console): CHECK_DNS,
+        }
+        pending = set(futures)
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures[future]
+                try: value = future.result()
+                except Exception as e_future: value = e_future
+                if name == CHECK_DNS:
+                    if isinstance(value, Exception): _report(CHECK_DNS, "error", [], f"{type(value).__name__}: {value}")
+                    elif value: _report(CHECK_DNS, "ok", value)
+                    else: _report(CHECK_DNS, "error", [], "No DNS servers found")
+                elif name == CHECK_GEO:
+                    if isinstance(value, Exception): _report(CHECK_GEO, "error", None, f"{type(value).__name__}: {value}")
+                    else:
+                        geo_info, geo_error = value
+                        _report(CHECK_GEO, "ok" if geo_info else "error", geo_info, geo_error)
+                else: # CHECK_IP
+                    if isinstance(value, Exception):
+                        _report(CHECK_IP, "error", None, f"{type(value).__name__}: {value}")
+                        _report(CHECK_GEO, "skipped", None, "No public IP to geolocate")
+                        continue
+                    race_extra = {"provider": value["provider"], "answers": value["answers"],
+                                  "disagreement": value["disagreement"], "quorum_met": value["quorum_met"]}
+                    if value["ip"]:
+                        _report(CHECK_IP, "ok", value["ip"], **race_extra)
+                        geo_future = executor.submit(get_geo_info, value["ip"], console)
+                        futures[geo_future] = CHECK_GEO
+                        pending.add(geo_future)
+                    else:
+                        _report(CHECK_IP, "error", None, "; ".join(e for e in value["errors"].values() if e), **race_extra)
+                        _report(CHECK_GEO, "skipped", None, "No public IP to geolocate")
+    finally:
+        # No esperar a los hilos rezagados: su propio timeout HTTP los terminará.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    for name in (CHECK_IP, CHECK_GEO, CHECK_DNS):
+        if name not in results:
+            _report(name, "timeout", None, f"Timed out after {timeout:.1f}s")
+    return results
+
+# --- DNS en Linux sin subprocesos (resolv.conf + archivos de systemd-resolved/NetworkManager) ---
+LINUX_RESOLV_CONF = "/etc/resolv.conf"
+# Listas de servidores "reales" cuando /etc/resolv.conf solo apunta al stub local (127.0.0.53)
+LINUX_UPSTREAM_RESOLV_FILES = ["/run/systemd/resolve/resolv.conf", "/run/NetworkManager/no-stub-resolv.conf"]
+# Archivos de estado por interfaz: SERVERS= (resolved, resolvectl) y DNS= (systemd-networkd)
+LINUX_LINK_STATE_DIRS = [("/run/systemd/resolve/netif", "SERVERS"), ("/run/systemd/netif/links", "DNS")]
+_LINUX_STUB_RESOLVERS = ("127.0.0.53", "127.0.0.54")
+
+_LINUX_DNS_CACHE = {"key": None, "servers": []}
+_LINUX_DNS_CACHE_LOCK = threading.Lock()
+
+def _normalize_dns_server_entry(entry: str) -> Optional[str]:
+    """Turns '1.1.1.1#dns.name', '1.1.1.1:53' or '[2606:4700::1111]:53' into a bare IP (link-local keeps its %scope)."""
+    entry = entry.split("#", 1)[0].strip()
+    if entry.startswith("["): entry = entry[1:].split("]", 1)[0]
+    elif entry.count(":") == 1: entry = entry.split(":", 1)[0] # IPv4:puerto
+    try: return str(ipaddress.ip_address(entry))
+    except ValueError: return None
+
+def _read_resolv_conf_nameservers(path: str) -> List[str]:
+    servers = []
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) > 1 and parts[0] == "nameserver":
+                    server = _normalize_dns_server_entry(parts[1])
+                    if server and server not in servers: servers.append(server)
+    except OSError: pass
+    return servers
+
+def _read_link_state_servers(path: str, key: str) -> List[str]:
+    servers = []
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                if line.startswith(f"{key}="):
+                    for entry in line.split("=", 1)[1].split():
+                        server = _normalize_dns_server_entry(entry)
+                        if server and server not in servers: servers.append(server)
+    except OSError: pass
+    return servers
+
+def _linux_dns_source_files() -> List[Tuple[str, Optional[str]]]:
+    """Returns [(path, link_state_key_or_None)] for every file that can hold DNS servers."""
+    files = [(LINUX_RESOLV_CONF, None)] + [(path, None) for path in LINUX_UPSTREAM_RESOLV_FILES]
+    for directory, key in LINUX_LINK_STATE_DIRS:
+        try: entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except OSError: continue
+        files.extend((entry.path, key) for entry in entries if entry.is_file())
+    return files
+
+def _linux_dns_cache_key(source_files) -> Tuple:
+    # Unas pocas llamadas a stat: si nada cambió, la lista cacheada sigue siendo válida
+    key = []
+    for path in [directory for directory, _ in LINUX_LINK_STATE_DIRS] + [path for path, _ in source_files]:
+        try:
+            st = os.stat(path)
+            key.append((path, st.st_mtime_ns, st.st_size, st.st_ino))
+        except OSError:
+            key.append((path, None))
+    return tuple(key)
+
+@timing.timed("dns.resolvectl")
+def _get_dns_via_resolvectl(console=None) -> List[str]:
+    dns_servers = []
+    try:
+        result_resolvectl = subprocess.run(["resolvectl", "dns"], capture_output=True, text=True, check=False, encoding='utf-8', errors='ignore', timeout=10)
+        if result_resolvectl.returncode == 0 and result_resolvectl.stdout:
+            ips_from_resolvectl = re.findall(r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b|\b(?:[0-9a-fA-F]{1,4}:){1,7}[0-9a-fA-F:]{1,}\b', result_resolvectl.stdout)
+            for ip_res in ips_from_resolvectl:
+                if ip_res not in dns_servers and ip_res != "::1" and not ip_res.startswith("127.") and \
+                   not ip_res.lower().startswith("fe80::") and not ip_res.startswith("169.254.") and \
+                   not (ip_res.count(':') > 1 and '%' in ip_res): 
+                    dns_servers.append(ip_res)
+        else: logger.debug("resolvectl failed. RC: %s", result_resolvectl.returncode)
+    except subprocess.TimeoutExpired:
+         logger.debug("resolvectl command timed out.")
+    except FileNotFoundError:
+        logger.debug("'resolvectl' not found.")
+    except Exception as e_resolvectl: 
+        logger.debug("Error with resolvectl: %s", e_resolvectl)
+    return dns_servers
+
+@timing.timed("dns.linux")
+def _get_linux_dns_servers(console=None, allow_subprocess: bool = True) -> List[str]:
+    """
+    Linux DNS discovery without spawning processes.
+
+    Reads /etc/resolv.conf; if it only lists the systemd-resolved stub (127.0.0.53),
+    the upstream servers are taken from systemd-resolved's / NetworkManager's runtime
+    resolv.conf files and the per-link state files. The result is cached and reused
+    until the mtime/size/inode of any of those files (or their directories) changes.
+    resolvectl is only spawned as a last resort when nothing was found.
+    """
+    source_files = _linux_dns_source_files()
+    cache_key = _linux_dns_cache_key(source_files)
+    with _LINUX_DNS_CACHE_LOCK:
+        if _LINUX_DNS_CACHE["key"] == cache_key:
+            logger.debug("DNS servers unchanged since last read (cached).")
+            return list(_LINUX_DNS_CACHE["servers"])
+
+    logger.debug("Reading DNS servers from resolv.conf / systemd-resolved runtime files (Linux)...")
+    dns_servers = _read_resolv_conf_nameservers(LINUX_RESOLV_CONF)
+    if not dns_servers or all(server in _LINUX_STUB_RESOLVERS for server in dns_servers):
+        upstream = []
+        for path, key in source_files[1:]:
+            found = _read_resolv_conf_nameservers(path) if key is None else _read_link_state_servers(path, key)
+            upstream.extend(server for server in found if server not in upstream and server not in _LINUX_STUB_RESOLVERS)
+        if upstream:
+            logger.debug("Stub resolver detected; upstream servers: %s", upstream)
+            dns_servers = upstream
+    if not dns_servers and allow_subprocess:
+        logger.debug("No DNS from runtime files, trying resolvectl...")
+        dns_servers = _get_dns_via_resolvectl(console=console)
+
+    with _LINUX_DNS_CACHE_LOCK:
+        _LINUX_DNS_CACHE.update({"key": cache_key, "servers": list(dns_servers)})
+    return dns_servers
+
+@timing.timed("dns.discover")
+def get_dns_servers(console=None, allow_subprocess: bool = True):
+    """
+    Returns the system DNS servers. With allow_subprocess=False no helper process
+    (PowerShell, ipconfig, scutil, resolvectl) is spawned, so only the Linux
+    resolv.conf files are read and other platforms return an empty list.
+    """
     system = platform.system()
     dns_servers = []
-    nc_console_for_logs = console if DEBUG_MODE else None
     try:
-        if system == "Windows":
-            if nc_console_for_logs: nc_console_for_logs.log("[dim]Attempting DNS via PowerShell (Windows)...[/dim]")
+        if system in ("Windows", "Darwin") and not allow_subprocess:
+            logger.debug("DNS discovery needs a subprocess on this OS; skipped.")
+        elif system == "Windows":
+            logger.debug("Attempting DNS via PowerShell (Windows)...")
             try:
                 ps_command_parts = ["powershell", "-NoProfile", "-ExecutionPolicy", "Bypass", "-Command", "\"try { @(Get-DnsClientServerAddress -AddressFamily IPv4 -ErrorAction SilentlyContinue | Select-Object -ExpandProperty ServerAddresses -ErrorAction SilentlyContinue) + @(Get-DnsClientServerAddress -AddressFamily IPv6 -ErrorAction SilentlyContinue | Select-Object -ExpandProperty ServerAddresses -ErrorAction SilentlyContinue) | Where-Object { $_ -ne $null -and $_ -ne '' } | ForEach-Object { $_.Trim() } } catch { exit 1 }\""]
-                result = subprocess.run(" ".join(ps_command_parts), capture_output=True, text=True, check=False, shell=True, timeout=10, creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+                with timing.span("dns.powershell"): result = subprocess.run(" ".join(ps_command_parts), capture_output=True, text=True, check=False, shell=True, timeout=10, creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
                 if result.returncode == 0 and result.stdout and result.stdout.strip():
-                    if nc_console_for_logs: nc_console_for_logs.log(f"[dim]PS DNS stdout:\n{result.stdout.strip()}[/dim]")
+                    logger.debug("PS DNS stdout:\n%s", result.stdout.strip())
                     found_ips = result.stdout.strip().splitlines()
                     for ip in found_ips:
                         ip = ip.strip()
                         if ip and (re.match(r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$", ip) or ':' in ip) and ip not in dns_servers: dns_servers.append(ip)
-                elif nc_console_for_logs: nc_console_for_logs.log(f"[dim]PS DNS command failed/no output. RC: {result.returncode}, Stdout: '{result.stdout.strip()[:100]}', Stderr: '{result.stderr.strip()[:100]}'[/dim]")
+                else: logger.debug("PS DNS command failed/no output. RC: %s, Stdout: '%s', Stderr: '%s'", result.returncode, result.stdout.strip()[:100], result.stderr.strip()[:100])
             except subprocess.TimeoutExpired:
-                if nc_console_for_logs: nc_console_for_logs.log("[dim]PS DNS command timed out.[/dim]")
+                logger.debug("PS DNS command timed out.")
             except FileNotFoundError:
-                if nc_console_for_logs: nc_console_for_logs.log("[dim]PowerShell not found for DNS.[/dim]")
+                logger.debug("PowerShell not found for DNS.")
             except Exception as e_ps:
-                if nc_console_for_logs: nc_console_for_logs.log(f"[dim]Exception in PS DNS: {e_ps}[/dim]")
+                logger.debug("Exception in PS DNS: %s", e_ps)
             if not dns_servers: 
-                if nc_console_for_logs: nc_console_for_logs.log("[dim]Falling back to ipconfig for Windows DNS...[/dim]")
+                logger.debug("Falling back to ipconfig for Windows DNS...")
                 try:
-                    ipconfig_result = subprocess.run(["ipconfig", "/all"], capture_output=True, text=True, check=False, encoding='utf-8', errors='ignore', timeout=10, creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+                    with timing.span("dns.ipconfig"): ipconfig_result = subprocess.run(["ipconfig", "/all"], capture_output=True, text=True, check=False, encoding='utf-8', errors='ignore', timeout=10, creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
                     if ipconfig_result.returncode == 0:
                         lines = ipconfig_result.stdout.splitlines()
                         for i, line in enumerate(lines):
@@ -110,60 +578,28 @@ def get_dns_servers(console=None):
                                                     if ip_addr_n and ip_addr_n not in dns_servers: dns_servers.append(ip_addr_n)
                                             else: break 
                                         else: break
-                    elif nc_console_for_logs: nc_console_for_logs.log(f"[dim]ipconfig failed. RC: {ipconfig_result.returncode}[/dim]")
+                    else: logger.debug("ipconfig failed. RC: %s", ipconfig_result.returncode)
                 except subprocess.TimeoutExpired:
-                    if nc_console_for_logs: nc_console_for_logs.log("[dim]ipconfig command timed out.[/dim]")
+                    logger.debug("ipconfig command timed out.")
                 except Exception as e_ipconfig:
-                    if nc_console_for_logs: nc_console_for_logs.log(f"[dim]Exception in ipconfig: {e_ipconfig}[/dim]")
+                    logger.debug("Exception in ipconfig: %s", e_ipconfig)
         elif system == "Darwin": 
-            if nc_console_for_logs: nc_console_for_logs.log("[dim]Attempting DNS via scutil (macOS)...[/dim]")
+            logger.debug("Attempting DNS via scutil (macOS)...")
             try:
-                result = subprocess.run(["scutil", "--dns"], capture_output=True, text=True, check=False, encoding='utf-8', errors='ignore', timeout=10)
+                with timing.span("dns.scutil"): result = subprocess.run(["scutil", "--dns"], capture_output=True, text=True, check=False, encoding='utf-8', errors='ignore', timeout=10)
                 if result.returncode == 0 and result.stdout:
                     matches = re.findall(r"nameserver\[\d+\]\s*:\s*([\d\.:a-fA-F]+)", result.stdout)
                     for ip in matches:
                         if ip and ip not in dns_servers: dns_servers.append(ip)
-                elif nc_console_for_logs: nc_console_for_logs.log(f"[dim]scutil failed. RC: {result.returncode}[/dim]")
+                else: logger.debug("scutil failed. RC: %s", result.returncode)
             except subprocess.TimeoutExpired:
-                if nc_console_for_logs: nc_console_for_logs.log("[dim]scutil command timed out.[/dim]")
+                logger.debug("scutil command timed out.")
             except Exception as e_darwin:
-                if nc_console_for_logs: nc_console_for_logs.log(f"[dim]Exception in scutil: {e_darwin}[/dim]")
+                logger.debug("Exception in scutil: %s", e_darwin)
         else: # Linux
-            if nc_console_for_logs: nc_console_for_logs.log("[dim]Attempting DNS via /etc/resolv.conf or resolvectl (Linux)...[/dim]")
-            if os.path.exists("/etc/resolv.conf"):
-                try:
-                    with open("/etc/resolv.conf", "r", encoding='utf-8', errors='ignore') as f:
-                        for line in f:
-                            line = line.strip()
-                            if line.startswith("nameserver"):
-                                parts = line.split()
-                                if len(parts) > 1 and ('.' in parts[1] or ':' in parts[1]) and parts[1] not in dns_servers:
-                                    dns_servers.append(parts[1])
-                except Exception as e_resolv:
-                    if nc_console_for_logs: nc_console_for_logs.log(f"[dim]Error reading /etc/resolv.conf: {e_resolv}[/dim]")
-            if not dns_servers:
-                if nc_console_for_logs: nc_console_for_logs.log("[dim]No DNS from /etc/resolv.conf, trying resolvectl...[/dim]")
-                try:
-                    result_resolvectl = subprocess.run(["resolvectl", "dns"], capture_output=True, text=True, check=False, encoding='utf-8', errors='ignore', timeout=10)
-                    if result_resolvectl.returncode == 0 and result_resolvectl.stdout:
-                        ips_from_resolvectl = re.findall(r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b|\b(?:[0-9a-fA-F]{1,4}:){1,7}[0-9a-fA-F:]{1,}\b', result_resolvectl.stdout)
-                        for ip_res in ips_from_resolvectl:
-                            if ip_res not in dns_servers and ip_res != "::1" and not ip_res.startswith("127.") and \
-                               not ip_res.lower().startswith("fe80::") and not ip_res.startswith("169.254.") and \
-                               not (ip_res.count(':') > 1 and '%' in ip_res): 
-                                dns_servers.append(ip_res)
-                    elif nc_console_for_logs: nc_console_for_logs.log(f"[dim]resolvectl failed. RC: {result_resolvectl.returncode}[/dim]")
-                except subprocess.TimeoutExpired:
-                     if nc_console_for_logs: nc_console_for_logs.log("[dim]resolvectl command timed out.[/dim]")
-                except FileNotFoundError:
-                    if nc_console_for_logs: nc_console_for_logs.log("[dim]'resolvectl' not found.[/dim]")
-                except Exception as e_resolvectl: 
-                    if nc_console_for_logs: nc_console_for_logs.log(f"[dim]Error with resolvectl: {e_resolvectl}[/dim]")
+            dns_servers = _get_linux_dns_servers(console=console, allow_subprocess=allow_subprocess)
     except Exception as e_global: 
-        if nc_console_for_logs: 
-            nc_console_for_logs.log(f"[dim red]Unexpected global error in get_dns_servers: {e_global}[/dim red]")
-            import traceback
-            nc_console_for_logs.log(f"[dim]{traceback.format_exc()}[/dim]")
-        elif console: 
+        logger.exception("Unexpected global error in get_dns_servers: %s", e_global)
+        if console: 
              console.print(f"[dim red]An error occurred while retrieving DNS servers.[/dim red]")
     return list(set(dns_servers))
\ No newline at end of file
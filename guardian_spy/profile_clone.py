@@ -0,0 +1,259 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/profile_clone.py
+"""
+Cloning of persistent profiles: a new persona that starts from a warmed one (logins,
+cookies, history, extensions, settings).
+
+    profile, stats = profile_clone.clone_profile(config_manager.get_profile_by_name("work"), "work_2")
+
+Files are copied in parallel, cheapest method first:
+    reflink     FICLONE (Btrfs, XFS, bcachefs...): the clone shares the data blocks
+                copy-on-write, so even a large profile is cloned in well under a second.
+    hardlink    Only for files the browser never rewrites in place (the "hardlink" rules
+                of BROWSER_RULES: packed and versioned extensions), when reflinks are
+                not available.
+    copy        os.copy_file_range (in-kernel, no data through Python) where available,
+                split into COPY_CHUNK_BYTES pieces so one large database does not hold
+                up the rest of the copy.
+
+The browser's caches ('profile_trim_paths', see disk_usage) and its lock files are not
+copied. Afterwards absolute paths of the source in the profile's own config files are
+rewritten, and the identifiers a browser keeps per installation (telemetry client IDs,
+creation time) are dropped or reset, so the two personas cannot be linked through them.
+The caller registers the returned profile in profiles.json.
+"""
+import errno
+import fnmatch
+import glob
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+try:
+    from . import config_manager, disk_usage, timing
+except ImportError:
+    import config_manager, disk_usage, timing
+
+logger = logging.getLogger(__name__)
+
+CLONE_WORKERS = 8
+COPY_CHUNK_BYTES = 64 * 1024 * 1024 # Ficheros mayores se copian a trozos en paralelo
+_BUFFER_BYTES = 1024 * 1024
+_FICLONE = 0x40049409 # ioctl de Linux (linux/fs.h)
+_NO_REFLINK = (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY, errno.ENOSYS, errno.EPERM)
+
+# Bloqueos de una instancia en marcha: nunca se copian
+LOCK_FILES = ["lock", ".parentlock", "parent.lock", "SingletonLock", "SingletonSocket", "SingletonCookie", "lockfile"]
+
+_CHROMIUM = {
+    "hardlink": ["*/Extensions/*"], # Directorios por versión: una actualización crea otro
+    "paths": ["Local State", "*/Preferences"], # Secure Preferences no: sus MAC romperían al editarla
+    "skip": [],
+}
+BROWSER_RULES: Dict[str, Dict[str, List[str]]] = {
+    "firefox": {
+        "hardlink": ["extensions/*.xpi", "features/*/*.xpi"], # Se sustituyen enteros al actualizar, nunca se reescriben
+        "paths": ["prefs.js", "user.js", "extensions.json", "pkcs11.txt", "compatibility.ini", "handlers.json"],
+        "skip": ["datareporting/state.json", "datareporting/session-state.json", "times.json"], # ID de telemetría, fecha de creación
+    },
+    "chrome": _CHROMIUM,
+    "chromium": _CHROMIUM,
+}
+# Claves de 'Local State' que identifican la instalación (cliente de métricas de uso)
+_CHROMIUM_IDENTITY_KEYS = ("client_id2", "client_id_timestamp", "low_entropy_source3", "pseudo_low_entropy_source",
+                           "limited_entropy_randomization_source", "session_id")
+
+class ProfileInUse(Exception):
+    """The source profile is open in a running browser (its lock file points to a live process)."""
+
+def _matches(relative: str, patterns: List[str]) -> bool:
+    return any(fnmatch.fnmatchcase(relative, pattern) for pattern in patterns)
+
+def _lock_owner(profile_path: str) -> Optional[int]:
+    """PID of the browser holding the profile, from its lock symlink ("host:+PID" / "host-PID"). None if not running."""
+    for name in LOCK_FILES:
+        try: target = os.readlink(os.path.join(profile_path, name))
+        except OSError: continue # No existe o no es un enlace (Windows: fichero bloqueado)
+        match = re.search(r"(\d+)$", target)
+        if not match: continue
+        pid = int(match.group(1))
+        try: os.kill(pid, 0)
+        except ProcessLookupError: continue # Bloqueo huérfano de un navegador que se cerró mal
+        except OSError: pass # Existe pero es de otro usuario
+        return pid
+    return None
+
+class _TreeCloner:
+    def __init__(self, source: str, target: str, browser: str):
+        self.source, self.target = source, target
+        rules = BROWSER_RULES.get(browser, {})
+        self.skip = disk_usage.get_trim_paths(browser) + LOCK_FILES + rules.get("skip", [])
+        self.hardlink = rules.get("hardlink", [])
+        self.reflink = fcntl is not None # Se apaga al primer error de "no soportado"
+        self.copy_file_range = hasattr(os, "copy_file_range")
+        self.stats = {"files": 0, "bytes": 0, "reflinked": 0, "hardlinked": 0, "copied": 0, "skipped": []}
+
+    def _scan(self) -> Tuple[List[str], List[Tuple[str, int]]]:
+        """Creates the directory tree and symlinks under target; returns (directories, [(file, size)]) relative to source."""
+        directories, files = [""], []
+        os.makedirs(self.target)
+        index = 0
+        while index < len(directories):
+            current = directories[index]; index += 1
+            with os.scandir(os.path.join(self.source, current)) as entries:
+                for entry in entries:
+                    relative = f"{current}/{entry.name}" if current else entry.name
+                    if _matches(relative, self.skip): self.stats["skipped"].append(relative); continue
+                    destination = os.path.join(self.target, relative)
+                    if entry.is_symlink(): os.symlink(os.readlink(entry.path), destination) # Tal cual, sin seguirlo
+                    elif entry.is_dir(): os.mkdir(destination); directories.append(relative)
+                    elif entry.is_file(): files.append((relative, entry.stat(follow_symlinks=False).st_size))
+        return directories, files
+
+    def _try_reflink(self, source: str, target: str) -> bool:
+        if not self.reflink: return False
+        with open(source, "rb") as fsrc, open(target, "wb") as fdst:
+            try: fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno()); return True
+            except OSError as e:
+                if e.errno not in _NO_REFLINK: raise
+                self.reflink = False # Otro sistema de ficheros: no volver a intentarlo
+                logger.debug("Reflinks not available for %s (%s); copying", self.target, e)
+                return False
+
+    def _copy_range(self, relative: str, offset: int, length: int):
+        with open(os.path.join(self.source, relative), "rb") as fsrc, open(os.path.join(self.target, relative), "r+b") as fdst:
+            if self.copy_file_range:
+                try:
+                    while length > 0:
+                        done = os.copy_file_range(fsrc.fileno(), fdst.fileno(), length, offset, offset)
+                        if not done: return # El origen se acortó
+                        offset += done; length -= done
+                    return
+                except OSError as e:
+                    if e.errno not in _NO_REFLINK: raise
+                    self.copy_file_range = False # Kernel antiguo o sistema de ficheros sin soporte: lectura/escritura normal
+            fsrc.seek(offset); fdst.seek(offset)
+            while length > 0:
+                chunk = fsrc.read(min(length, _BUFFER_BYTES))
+                if not chunk: return
+                fdst.write(chunk); length -= len(chunk)
+
+    def _clone_file(self, job: Tuple[str, int]) -> Tuple[str, List[Tuple[str, int, int]]]:
+        """(method, ranges still to copy). Small files and reflinks are finished here."""
+        relative, size = job
+        source, target = os.path.join(self.source, relative), os.path.join(self.target, relative)
+        if self._try_reflink(source, target): return "reflinked", []
+        if _matches(relative, self.hardlink):
+            try:
+                if os.path.lexists(target): os.unlink(target) # Vacío, del intento de reflink
+                os.link(source, target); return "hardlinked", []
+            except OSError: pass # Otro dispositivo o sin permisos: se copia
+        with open(target, "wb") as fdst: fdst.truncate(size)
+        ranges = [(relative, offset, min(COPY_CHUNK_BYTES, size - offset)) for offset in range(0, size, COPY_CHUNK_BYTES)]
+        if len(ranges) <= 1:
+            for piece in ranges: self._copy_range(*piece)
+            return "copied", []
+        return "copied", ranges
+
+    def run(self) -> Dict:
+        directories, files = self._scan()
+        files.sort(key=lambda item: -item[1]) # Los grandes primero: mejor reparto entre hilos
+        with ThreadPoolExecutor(max_workers=CLONE_WORKERS, thread_name_prefix="gs-clone") as pool:
+            results = list(pool.map(self._clone_file, files))
+            ranges = [piece for _, pending in results for piece in pending]
+            list(pool.map(lambda piece: self._copy_range(*piece), ranges))
+        for (relative, size), (method, _) in zip(files, results):
+            self.stats[method] += 1; self.stats["files"] += 1; self.stats["bytes"] += size
+            if method != "hardlinked": shutil.copystat(os.path.join(self.source, relative), os.path.join(self.target, relative))
+        for relative in reversed(directories): # Al final: copiar ficheros cambia el mtime de los directorios
+            shutil.copystat(os.path.join(self.source, relative), os.path.join(self.target, relative))
+        return self.stats
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f: f.write(data)
+    if os.path.exists(path): shutil.copymode(path, tmp_path)
+    os.replace(tmp_path, path) # Fichero nuevo: nunca se escribe dentro de un bloque compartido (reflink/hardlink)
+
+def _rewrite_metadata(source: str, target: str, browser: str) -> List[str]:
+    """Points the clone's config files at its own directory and resets per-installation identifiers. Returns the files changed."""
+    rewritten = []
+    old, new = os.path.abspath(source), os.path.abspath(target)
+    replacements = {old.encode(): new.encode(), json.dumps(old)[1:-1].encode(): json.dumps(new)[1:-1].encode()} # Tal cual y escapada en JSON
+    # Solo la ruta completa: seguida de separador, comilla o fin de línea ('work' no reescribe 'work_old')
+    source_re = re.compile(b"(" + b"|".join(re.escape(before) for before in sorted(replacements, key=len, reverse=True)) + rb")(?=[/\\\"'\r]|$)", re.M)
+    for pattern in BROWSER_RULES.get(browser, {}).get("paths", []):
+        for path in glob.glob(os.path.join(glob.escape(target), pattern)):
+            with open(path, "rb") as f: data = f.read()
+            changed = source_re.sub(lambda match: replacements[match.group(1)], data)
+            if changed != data: _write_atomic(path, changed); rewritten.append(os.path.relpath(path, target))
+    if browser == "firefox":
+        now_ms = int(time.time() * 1000)
+        _write_atomic(os.path.join(target, "times.json"), json.dumps({"created": now_ms, "firstUse": None}).encode())
+        rewritten.append("times.json")
+    elif browser in ("chrome", "chromium"):
+        local_state = os.path.join(target, "Local State")
+        try:
+            with open(local_state, "r", encoding="utf-8") as f: state = json.load(f)
+        except (OSError, ValueError): return rewritten
+        metrics_state = state.get("user_experience_metrics")
+        if not isinstance(metrics_state, dict): return rewritten
+        removed = [key for key in _CHROMIUM_IDENTITY_KEYS if metrics_state.pop(key, None) is not None]
+        if removed:
+            _write_atomic(local_state, json.dumps(state).encode("utf-8"))
+            if "Local State" not in rewritten: rewritten.append("Local State")
+    return rewritten
+
+@timing.timed("profile.clone")
+def clone_profile(source_profile: Dict, name: str) -> Tuple[Dict, Dict]:
+    """
+    Copies source_profile's browser directory to browser_profiles/<name>. Returns (the new
+    profiles.json entry, stats: files, bytes, reflinked, hardlinked, copied, skipped,
+    rewritten, seconds). Raises ProfileInUse, FileExistsError (target directory exists)
+    or OSError; a partial copy is removed.
+    """
+    source = source_profile.get("browser_profile_path")
+    browser = source_profile.get("browser_type")
+    if not source or not os.path.isdir(source): raise FileNotFoundError(errno.ENOENT, "Source profile directory not found", source)
+    owner = _lock_owner(source)
+    if owner: raise ProfileInUse(f"Profile '{source_profile.get('profile_name')}' is open in a running browser (PID {owner})")
+    target = os.path.join(config_manager.get_browser_profiles_base_dir(), name)
+    if os.path.lexists(target): raise FileExistsError(errno.EEXIST, "Profile directory already exists", target)
+    started = time.perf_counter()
+    try:
+        stats = _TreeCloner(source, target, browser).run()
+        stats["rewritten"] = _rewrite_metadata(source, target, browser)
+    except BaseException: # También Ctrl+C: no dejar medio perfil
+        shutil.rmtree(target, ignore_errors=True)
+        raise
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    logger.info("Cloned profile %s to %s", source_profile.get("profile_name"), name, extra={"stats": {k: v for k, v in stats.items() if k != "skipped"}})
+    profile = {"profile_name": name, "browser_type": browser, "browser_profile_path": target,
+               "bookmarks_set_name": source_profile.get("bookmarks_set_name"), "created_at": datetime.now().isoformat(),
+               "cloned_from": source_profile.get("profile_name")}
+    return profile, stats
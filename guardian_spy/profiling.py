@@ -0,0 +1,258 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/profiling.py
+"""
+Opt-in profiling of single commands: --profile-run / --trace-malloc on the command line,
+'profile on|off' in the shell.
+
+    with profiling.command("launch") as session: ...
+    session.reports  # paths written under <config dir>/profiling/
+
+CPU modes (the 'profiling_mode' setting, or 'profile on cprofile'):
+    "sample"    A daemon thread reads the stacks of every thread (sys._current_frames)
+                every 'profiling_sample_interval_ms'. Nothing runs inside the profiled
+                code, so it can be left on: reports <time>-<command>.txt (functions by
+                samples) and .folded (flame graph input).
+    "cprofile"  Deterministic cProfile of the calling thread and of the threads started
+                during the command (several times slower): .txt sorted by cumulative
+                time and .pstats for snakeviz / pstats.
+
+--trace-malloc adds a tracemalloc diff over the command (<time>-<command>.alloc.txt:
+top allocations by line, peak). tracemalloc cannot sample, so it costs more than the
+sampler; 'trace_malloc_frames' bounds the stack kept per allocation.
+
+Only one command is profiled at a time; a command that starts while another is being
+profiled runs unprofiled.
+"""
+import cProfile
+import collections
+import contextlib
+import functools
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, List, Optional
+
+try:
+    from . import config_manager
+except ImportError:
+    import config_manager
+
+logger = logging.getLogger(__name__)
+
+MODES = ("sample", "cprofile")
+MAX_STACK_DEPTH = 64 # Frames por muestra (desde la hoja)
+REPORT_ROWS = 40 # Funciones por informe
+ALLOCATION_ROWS = 25 # Líneas en el informe de tracemalloc
+
+# Hojas que son esperas (hilos ociosos): se cuentan aparte para no tapar el trabajo real
+_IDLE_LEAVES = {("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("selectors.py", "select"),
+                ("queue.py", "get"), ("handlers.py", "dequeue"), ("socketserver.py", "serve_forever"), ("base_events.py", "_run_once")}
+
+STATE = {"enabled": False, "mode": None, "malloc": False} # mode None = el de 'profiling_mode'
+_SESSION_LOCK = threading.Lock()
+
+def configure(enabled: Optional[bool] = None, mode: Optional[str] = None, malloc: Optional[bool] = None):
+    """Turns CPU profiling and/or tracemalloc on or off for the following commands."""
+    if mode is not None and mode not in MODES: raise ValueError(f"Unknown profiling mode: {mode} (use {', '.join(MODES)})")
+    if enabled is not None: STATE["enabled"] = enabled
+    if mode is not None: STATE["mode"] = mode
+    if malloc is not None: STATE["malloc"] = malloc
+
+def get_mode() -> str:
+    mode = STATE["mode"] or config_manager.get_setting("profiling_mode", "sample")
+    return mode if mode in MODES else "sample"
+
+def is_active() -> bool:
+    return STATE["enabled"] or STATE["malloc"]
+
+def get_reports_dir() -> str:
+    path = os.path.join(config_manager.get_config_dir(), "profiling")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+class StackSampler:
+    """Counts the Python stacks of all threads at a fixed interval, from its own thread."""
+
+    def __init__(self, interval: float):
+        self.interval = max(0.001, interval)
+        self.stacks: collections.Counter = collections.Counter()
+        self.samples = 0
+        self.idle = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="gs-profiler", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set(); self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id: continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                self.samples += 1
+                if (os.path.basename(stack[0][0]), stack[0][2]) in _IDLE_LEAVES: self.idle += 1
+                else: self.stacks[tuple(reversed(stack))] += 1 # Raíz primero
+
+    @staticmethod
+    def _label(entry) -> str:
+        filename, line, name = entry
+        return f"{os.path.basename(filename)}:{line}({name})"
+
+    def write_reports(self, base_path: str) -> List[str]:
+        busy = sum(self.stacks.values())
+        own, total = collections.Counter(), collections.Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for entry in set(stack): total[entry] += count # Recursión: una vez por muestra
+        lines = [f"Sampling profile: {self.samples} samples every {self.interval * 1000:.0f} ms over {self.elapsed:.3f}s "
+                 f"({self.idle} idle, {busy} busy)", "",
+                 *(["No samples: the command was shorter than the interval (use the 'cprofile' mode).", ""] if not self.samples else []),
+                 f"{'own':>7} {'own%':>6} {'total':>7} {'total%':>7}  function"]
+        for entry, count in total.most_common(REPORT_ROWS):
+            lines.append(f"{own[entry]:>7} {own[entry] * 100 / max(busy, 1):>5.1f}% {count:>7} {count * 100 / max(busy, 1):>6.1f}%  "
+                         f"{self._label(entry)} {entry[0]}")
+        with open(f"{base_path}.txt", "w", encoding="utf-8") as f: f.write("\n".join(lines) + "\n")
+        with open(f"{base_path}.folded", "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.items(): f.write(f"{';'.join(self._label(e) for e in stack)} {count}\n")
+        return [f"{base_path}.txt", f"{base_path}.folded"]
+
+class ThreadsProfiler:
+    """cProfile of the current thread and of the threads started while it runs."""
+
+    def __init__(self):
+        self._profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._global = sys.version_info >= (3, 12) # sys.monitoring: un solo perfil cubre todos los hilos
+
+    def _new_profiler(self) -> cProfile.Profile:
+        profiler = cProfile.Profile()
+        with self._lock: self._profilers.append(profiler)
+        profiler.enable()
+        return profiler
+
+    def _bootstrap(self, *args):
+        # Primer evento de un hilo nuevo: sustituir este gancho por un cProfile propio del hilo
+        sys.setprofile(None)
+        self._new_profiler()
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._new_profiler()
+        if not self._global: threading.setprofile(self._bootstrap)
+
+    def stop(self):
+        if not self._global: threading.setprofile(None)
+        self._profilers[0].disable() # Los de otros hilos se paran cuando esos hilos terminan
+        self.elapsed = time.perf_counter() - self.started
+
+    def write_reports(self, base_path: str) -> List[str]:
+        with self._lock: profilers = list(self._profilers)
+        stats = pstats.Stats(profilers[0], stream=io.StringIO())
+        for profiler in profilers[1:]:
+            try: stats.add(profiler)
+            except (TypeError, ValueError): pass # Hilo sin llamadas registradas
+        stats.dump_stats(f"{base_path}.pstats")
+        stream = io.StringIO()
+        stats.stream = stream
+        stream.write(f"cProfile: {len(profilers)} thread(s) over {self.elapsed:.3f}s\n")
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(REPORT_ROWS)
+        with open(f"{base_path}.txt", "w", encoding="utf-8") as f: f.write(stream.getvalue())
+        return [f"{base_path}.txt", f"{base_path}.pstats"]
+
+class AllocationTracer:
+    """tracemalloc diff between the start and the end of a command."""
+
+    def start(self):
+        self._started_here = not tracemalloc.is_tracing()
+        if self._started_here: tracemalloc.start(max(1, int(config_manager.get_setting("trace_malloc_frames", 5))))
+        tracemalloc.reset_peak()
+        self._before = tracemalloc.take_snapshot()
+
+    def stop(self):
+        self._after = tracemalloc.take_snapshot()
+        self.current, self.peak = tracemalloc.get_traced_memory()
+        if self._started_here: tracemalloc.stop()
+
+    def write_reports(self, base_path: str) -> List[str]:
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+        diff = self._after.filter_traces(ignore).compare_to(self._before.filter_traces(ignore), "lineno")
+        lines = [f"tracemalloc: traced memory {self.current / 1024:.1f} KiB now, peak {self.peak / 1024:.1f} KiB during the command", "",
+                 "Top allocations (size change since the command started):"]
+        lines += [str(stat) for stat in diff[:ALLOCATION_ROWS]]
+        with open(f"{base_path}.alloc.txt", "w", encoding="utf-8") as f: f.write("\n".join(lines) + "\n")
+        return [f"{base_path}.alloc.txt"]
+
+class ProfileSession:
+    def __init__(self, name: str, cpu_mode: Optional[str], malloc: bool):
+        self.name = name
+        self.collectors = []
+        if cpu_mode == "sample": self.collectors.append(StackSampler(float(config_manager.get_setting("profiling_sample_interval_ms", 10)) / 1000))
+        elif cpu_mode == "cprofile": self.collectors.append(ThreadsProfiler())
+        if malloc: self.collectors.append(AllocationTracer())
+        self.reports: List[str] = []
+
+    def start(self):
+        for collector in self.collectors: collector.start()
+
+    def stop(self):
+        for collector in reversed(self.collectors): collector.stop()
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", self.name).strip("_") or "command"
+        base_path = os.path.join(get_reports_dir(), f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')[:-3]}-{slug}")
+        for collector in self.collectors:
+            try: self.reports += collector.write_reports(base_path)
+            except Exception: logger.exception("Could not write the %s report of %r", type(collector).__name__, self.name)
+        logger.info("Profile of %r written: %s", self.name, self.reports)
+
+@contextlib.contextmanager
+def command(name: str):
+    """Profiles the block if profiling is on and no other command is being profiled. Yields the session or None."""
+    if not is_active() or not _SESSION_LOCK.acquire(blocking=False):
+        yield None; return
+    try:
+        session = ProfileSession(name, get_mode() if STATE["enabled"] else None, STATE["malloc"])
+        session.start()
+        try: yield session
+        finally: session.stop()
+    finally:
+        _SESSION_LOCK.release()
+
+def wrap(name: str, func: Callable, on_report: Optional[Callable[[List[str]], None]] = None) -> Callable:
+    """func profiled as command(name) in whatever thread calls it; on_report(paths) afterwards."""
+    @functools.wraps(func)
+    def _profiled(*args, **kwargs):
+        with command(name) as session:
+            result = func(*args, **kwargs)
+        if session and on_report: on_report(session.reports)
+        return result
+    return _profiled
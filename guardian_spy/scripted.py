@@ -0,0 +1,418 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/scripted.py
+"""
+Non-interactive subcommands for automation. Each prints a single JSON document on stdout
+and exits with one of the EXIT_* codes; nothing here imports rich or renders the banner.
+
+    guardian_spy.py check [--timeout S] [--no-history]
+    guardian_spy.py profiles list [--browser B] [--bookmarks ID] [--prefix P] [--created-from D] [--created-to D]
+                                  [--sort name|browser|created] [--desc] [--limit N] [--offset N] [--sizes]
+    guardian_spy.py profiles create NAME --browser B [--bookmarks ID]
+    guardian_spy.py profiles clone SOURCE NAME
+    guardian_spy.py profiles delete NAME
+    guardian_spy.py launch (--profile NAME | --browser B [--bookmarks ID]) [--wait | --detach]
+    guardian_spy.py bookmarks list
+    guardian_spy.py sessions | stop SESSION       (daemon only)
+    guardian_spy.py daemon start | stop [--force] | status
+
+Every document has "command" and "ok"; failures add "error": {"code", "message"}.
+While the daemon (daemon.py) is running, commands are forwarded to it and run against
+its warm state, with this process's environment; --no-daemon runs them in this process,
+and so do 'check' and 'launch --wait' (network route, terminal and Ctrl+C are this process's).
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from . import config_manager, bookmarks_handler, cli_args, session_journal, timing
+except ImportError:
+    import config_manager, bookmarks_handler, cli_args, session_journal, timing
+
+def _feature(module_name):
+    """Imports a module only some subcommands need (requests, browser_manager...) on first use."""
+    return importlib.import_module(f"{__package__}.{module_name}") if __package__ else importlib.import_module(module_name)
+
+BROWSER_TYPES = ("firefox", "chrome", "chromium")
+
+EXIT_OK = 0
+EXIT_FAILED = 1 # La operación se ejecutó pero falló (sin IP/DNS, error de disco...)
+EXIT_USAGE = 2 # Argumentos inválidos (mismo código que argparse)
+EXIT_NOT_FOUND = 3 # El perfil no existe
+EXIT_CONFLICT = 4 # El perfil ya existe
+EXIT_BROWSER = 5 # Navegador no encontrado o no se pudo lanzar
+EXIT_BROWSER_STATUS = 6 # launch --wait: el navegador terminó con un código distinto de 0 (p. ej. un crash)
+EXIT_DAEMON = 7 # El daemon no está en marcha (o la plataforma no tiene sockets Unix)
+EXIT_INTERRUPTED = 130
+
+DAEMON_STATE = None # daemon.DaemonState cuando este módulo se ejecuta dentro del daemon
+LOCAL_ONLY_COMMANDS = ("daemon", "check") # Nunca se reenvían al daemon (check: la ruta de red y los proxies son los de este proceso)
+
+class ScriptedError(Exception):
+    """Ends a subcommand with a JSON error document and exit_code."""
+    def __init__(self, code: str, message: str, exit_code: int):
+        super().__init__(message)
+        self.code = code; self.exit_code = exit_code
+
+class _JsonArgumentParser(argparse.ArgumentParser):
+    # Los errores de uso también salen como JSON (y código 2), no como texto de argparse
+    def error(self, message):
+        raise ScriptedError("usage", f"{self.prog}: {message}", EXIT_USAGE)
+
+def _emit(document: Dict):
+    sys.stdout.write(json.dumps(document, default=str, separators=(",", ":")) + "\n") # Un solo write: nunca medio documento
+    sys.stdout.flush()
+
+def _bookmarks_identifier(value: Optional[str]):
+    # 'none' o vacío = sin bookmarks; varios archivos separados por comas = lista
+    if value is None or value.strip().lower() in ("", "none"): return None
+    if "," in value: return [v.strip() for v in value.split(",") if v.strip()]
+    return value.strip()
+
+def _valid_profile_name(name: str) -> bool:
+    return bool(name.strip()) and name.replace('_', '').isalnum()
+
+def _profile_summary(profile: Dict) -> Dict:
+    path = profile.get("browser_profile_path")
+    return {"name": profile.get("profile_name"), "browser": profile.get("browser_type"), "bookmarks": profile.get("bookmarks_set_name"),
+            "created_at": profile.get("created_at"), "path": path, "on_disk": bool(path) and os.path.isdir(path)}
+
+# --- Subcomandos ---
+
+def cmd_check(args) -> Dict:
+    network_checker, utils = _feature("network_checker"), _feature("utils")
+    results = network_checker.run_network_checks_concurrently(timeout=args.timeout)
+    if not args.no_history and config_manager.get_setting("history_enabled", True):
+        try: _feature("history_store").get_history_store().record_check(results)
+        except Exception: pass # El historial nunca debe impedir la comprobación
+    inventory = _feature("local_network").get_local_inventory()
+    ip_result = results[network_checker.CHECK_IP]; dns_result = results[network_checker.CHECK_DNS]
+    geo_result = results[network_checker.CHECK_GEO]
+    ok = ip_result["status"] == "ok" and dns_result["status"] == "ok"
+    document = {"ok": ok, "public_ip": ip_result["value"] if ip_result["status"] == "ok" else None,
+                "geo": geo_result["value"] if geo_result["status"] == "ok" else None,
+                "dns_servers": dns_result["value"] if dns_result["status"] == "ok" else [],
+                "checks": results, "browsers": DAEMON_STATE.browsers() if DAEMON_STATE else utils.check_browser_executables(),
+                "local_findings": inventory["findings"] if inventory["supported"] else None}
+    if not ok: document["error"] = {"code": "check_failed", "message": "; ".join(r["error"] for r in (ip_result, dns_result) if r["error"])}
+    return document
+
+def cmd_profiles_list(args) -> Dict:
+    try:
+        profiles, total = config_manager.query_profiles(browser=args.browser, bookmarks=args.bookmarks, name_prefix=args.prefix,
+                                                        created_from=args.created_from, created_to=args.created_to, sort=args.sort,
+                                                        descending=args.desc, offset=args.offset, limit=args.limit)
+    except ValueError as e: raise ScriptedError("usage", str(e), EXIT_USAGE)
+    summaries = [_profile_summary(p) for p in profiles]
+    if args.sizes:
+        sizes = _feature("disk_usage").get_sizes([p.get("browser_profile_path") for p in profiles])
+        for summary, profile in zip(summaries, profiles): summary["size_bytes"] = (sizes.get(profile.get("browser_profile_path")) or {}).get("bytes")
+    return {"ok": True, "profiles": summaries, "count": len(summaries), "total": total, "offset": args.offset}
+
+def _load_registry() -> List[Dict]:
+    """profiles.json for a read-modify-write (under profiles_lock()); never saves over a file that could not be read."""
+    try: return config_manager.load_profiles_data(strict=True)
+    except config_manager.ProfilesDataError as e:
+        raise ScriptedError("registry_unreadable", f"{e}. Fix or move the file before changing profiles", EXIT_FAILED)
+
+def cmd_profiles_create(args) -> Dict:
+    browser_manager = _feature("browser_manager")
+    if not _valid_profile_name(args.name): raise ScriptedError("invalid_name", "Profile names may only contain letters, digits and underscores", EXIT_USAGE)
+    with config_manager.profiles_lock(): return _create_registered_profile(args, browser_manager)
+
+def _create_registered_profile(args, browser_manager) -> Dict:
+    profiles = _load_registry()
+    if config_manager.get_profile_by_name(args.name): raise ScriptedError("exists", f"Profile '{args.name}' already exists", EXIT_CONFLICT)
+    bookmarks = _bookmarks_identifier(args.bookmarks)
+    path = browser_manager.create_profile(browser_type=args.browser, profile_custom_name=args.name, is_persistent=True, bookmark_set_identifier=bookmarks)
+    if not path: raise ScriptedError("create_failed", "Failed to create the browser profile directory", EXIT_FAILED)
+    profile = {"profile_name": args.name, "browser_type": args.browser, "browser_profile_path": path,
+               "bookmarks_set_name": bookmarks, "created_at": datetime.now().isoformat()}
+    profiles.append(profile)
+    if not config_manager.save_profiles_data(profiles):
+        browser_manager.remove_profile(path)
+        raise ScriptedError("save_failed", "Failed to save profile metadata", EXIT_FAILED)
+    return {"ok": True, "profile": _profile_summary(profile)}
+
+def cmd_profiles_clone(args) -> Dict:
+    if not _valid_profile_name(args.name): raise ScriptedError("invalid_name", "Profile names may only contain letters, digits and underscores", EXIT_USAGE)
+    with config_manager.profiles_lock(): return _clone_registered_profile(args, _feature("profile_clone"))
+
+def _clone_registered_profile(args, profile_clone) -> Dict:
+    profiles = _load_registry()
+    source = config_manager.get_profile_by_name(args.source)
+    if not source: raise ScriptedError("not_found", f"Profile '{args.source}' not found", EXIT_NOT_FOUND)
+    if config_manager.get_profile_by_name(args.name): raise ScriptedError("exists", f"Profile '{args.name}' already exists", EXIT_CONFLICT)
+    try: profile, stats = profile_clone.clone_profile(source, args.name)
+    except profile_clone.ProfileInUse as e: raise ScriptedError("in_use", str(e), EXIT_CONFLICT)
+    except FileExistsError as e: raise ScriptedError("exists", f"Profile directory already exists: {e.filename}", EXIT_CONFLICT)
+    except OSError as e: raise ScriptedError("clone_failed", f"Could not clone the profile: {e}", EXIT_FAILED)
+    profiles.append(profile)
+    if not config_manager.save_profiles_data(profiles):
+        _feature("browser_manager").remove_profile(profile["browser_profile_path"])
+        raise ScriptedError("save_failed", "Failed to save profile metadata", EXIT_FAILED)
+    return {"ok": True, "profile": _profile_summary(profile), "source": args.source, "clone": stats}
+
+def cmd_profiles_delete(args) -> Dict:
+    with config_manager.profiles_lock(): return _delete_registered_profile(args, _feature("browser_manager"))
+
+def _delete_registered_profile(args, browser_manager) -> Dict:
+    profiles = _load_registry()
+    profile = config_manager.get_profile_by_name(args.name)
+    if not profile: raise ScriptedError("not_found", f"Profile '{args.name}' not found", EXIT_NOT_FOUND)
+    path = profile.get("browser_profile_path")
+    data_removed = browser_manager.remove_profile(path) if path else True
+    if not config_manager.save_profiles_data([p for p in profiles if p.get("profile_name") != args.name]):
+        raise ScriptedError("save_failed", "Failed to save profile metadata", EXIT_FAILED)
+    document = {"ok": data_removed, "profile": _profile_summary(profile), "browser_data_removed": data_removed}
+    if not data_removed: document["error"] = {"code": "remove_failed", "message": f"Profile removed from config but its browser data could not be deleted: {path}"}
+    return document
+
+def cmd_launch(args) -> Dict:
+    browser_manager = _feature("browser_manager")
+    if args.profile:
+        profile = config_manager.get_profile_by_name(args.profile)
+        if not profile: raise ScriptedError("not_found", f"Profile '{args.profile}' not found", EXIT_NOT_FOUND)
+        browser, path, is_temp = profile["browser_type"], profile.get("browser_profile_path"), False
+        if not path or not os.path.isdir(path): # Directorio borrado a mano: se recrea como en el modo interactivo
+            path = browser_manager.create_profile(browser_type=browser, profile_custom_name=args.profile, is_persistent=True,
+                                                  bookmark_set_identifier=profile.get("bookmarks_set_name"))
+            if not path: raise ScriptedError("create_failed", "Failed to create the browser profile directory", EXIT_FAILED)
+            if path != profile.get("browser_profile_path"):
+                with config_manager.profiles_lock():
+                    profiles = _load_registry()
+                    for p in profiles:
+                        if p.get("profile_name") == args.profile: p["browser_profile_path"] = path
+                    config_manager.save_profiles_data(profiles)
+    else:
+        if args.detach and not DAEMON_STATE: # Sin daemon nadie borraría el perfil al cerrar el navegador
+            raise ScriptedError("usage", "Temporary profiles need --wait (or a running daemon): they are removed when the browser exits", EXIT_USAGE)
+        browser, is_temp, bookmarks = args.browser, True, _bookmarks_identifier(args.bookmarks)
+        path = DAEMON_STATE.pool.take(browser, bookmarks) if DAEMON_STATE else None
+        if not path: path = browser_manager.create_profile(browser_type=browser, profile_name_prefix="gs_temp_browser_profile", bookmark_set_identifier=bookmarks)
+        if not path: raise ScriptedError("create_failed", "Failed to create the temporary browser profile", EXIT_FAILED)
+
+    process = browser_manager.launch_browser_with_profile(browser, path, quiet=True, detach=args.detach, env=args.environ)
+    if process is None:
+        if is_temp: browser_manager.remove_profile(path)
+        raise ScriptedError("browser_unavailable", f"Could not launch {browser} (not found or failed to start)", EXIT_BROWSER)
+    document = {"ok": True, "browser": browser, "profile": args.profile, "profile_path": path, "temporary": is_temp, "pid": process.pid}
+    if args.detach:
+        if DAEMON_STATE: document["session"] = DAEMON_STATE.sessions.track(process, browser, path, is_temp, args.profile)["session"]
+        return document
+
+    started = time.monotonic()
+    try: exit_code = process.wait()
+    except KeyboardInterrupt: # Ctrl+C: cerrar el navegador y limpiar igualmente
+        process.terminate()
+        try: exit_code = process.wait(timeout=5)
+        except Exception: process.kill(); exit_code = process.wait()
+        document["interrupted"] = True
+    document.update({"exit_code": exit_code, "duration": round(time.monotonic() - started, 3)})
+    session_journal.record("ended", path, exit_code=exit_code)
+    if exit_code != 0 and not document.get("interrupted"):
+        document["ok"] = False; document["exit_status"] = EXIT_BROWSER_STATUS
+        document["error"] = {"code": "browser_exit", "message": f"{browser} exited with status {exit_code}"}
+    if not is_temp:
+        document["trimmed"] = _feature("disk_usage").trim_after_session(path, browser)
+    else:
+        document["profile_removed"] = browser_manager.remove_profile(path)
+        if not document["profile_removed"]:
+            document.update({"ok": False, "exit_status": EXIT_FAILED, # Prima sobre el código del navegador: deja datos en disco
+                             "error": {"code": "remove_failed", "message": f"Temporary profile could not be removed: {path}"}})
+    return document
+
+def cmd_bookmarks_list(args) -> Dict:
+    sets = []
+    for name, filename in bookmarks_handler.get_available_bookmark_sets().items():
+        entries = bookmarks_handler.load_bookmark_set_data(filename)
+        sets.append({"name": name, "file": filename, "entries": len(entries) if entries is not None else None,
+                     "general": filename in bookmarks_handler.GENERAL_OSINT_SETS})
+    return {"ok": True, "sets": sets, "identifiers": ["__ALL__", "__GENERAL__"] + [s["file"] for s in sets]}
+
+def _require_daemon():
+    if not DAEMON_STATE: raise ScriptedError("daemon_not_running", "This command needs a running daemon ('guardian_spy.py daemon start')", EXIT_DAEMON)
+
+def cmd_sessions(args) -> Dict:
+    _require_daemon()
+    return {"ok": True, **DAEMON_STATE.sessions.list()}
+
+def cmd_stop(args) -> Dict:
+    _require_daemon()
+    summary = DAEMON_STATE.sessions.stop(args.session)
+    if summary is None: raise ScriptedError("not_found", f"No running session {args.session}", EXIT_NOT_FOUND)
+    return {"ok": True, "session": summary}
+
+def cmd_daemon(args) -> Dict:
+    daemon_client = _feature("daemon_client")
+    if not daemon_client.is_supported(): raise ScriptedError("unsupported", "The daemon needs Unix domain sockets", EXIT_DAEMON)
+    if args.daemon_command == "start":
+        document = _feature("daemon").start_background()
+        if not document["ok"]: document["exit_status"] = EXIT_DAEMON
+        return document
+    try: client = daemon_client.DaemonClient()
+    except daemon_client.DaemonUnavailable as e:
+        if args.daemon_command == "stop": return {"ok": True, "was_running": False}
+        raise ScriptedError("daemon_not_running", str(e), EXIT_DAEMON)
+    with client:
+        response = client.request("status" if args.daemon_command == "status" else "shutdown", force=getattr(args, "force", False))
+    response.pop("id", None)
+    if args.daemon_command == "status": return response
+    if not response.get("ok"): response["exit_status"] = EXIT_FAILED
+    return {**response, "was_running": True}
+
+# --- Argumentos y ejecución ---
+
+def _add_global_options(parser: argparse.ArgumentParser, default=False):
+    parser.add_argument("--debug", action="store_true", default=default, help=argparse.SUPPRESS) # Lo consume guardian_spy.py
+    parser.add_argument("--no-daemon", action="store_true", default=default, help="Run in this process even if the daemon is running")
+    parser.add_argument("--profile-run", action="store_true", default=default, help="Profile the command (implies --no-daemon); reports in <config dir>/profiling/")
+    parser.add_argument("--trace-malloc", action="store_true", default=default, help="Trace the command's memory allocations (implies --no-daemon)")
+
+def _leaf_parsers(parser: argparse.ArgumentParser):
+    subparsers = [action for action in parser._actions if isinstance(action, argparse._SubParsersAction)]
+    if not subparsers: yield parser; return
+    for action in subparsers:
+        for child in dict.fromkeys(action.choices.values()): yield from _leaf_parsers(child)
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = _JsonArgumentParser(prog="guardian_spy.py", description="Non-interactive Guardian Spy commands with JSON output.")
+    _add_global_options(parser)
+    commands = parser.add_subparsers(dest="command", required=True, parser_class=_JsonArgumentParser)
+
+    check = commands.add_parser("check", help="Public IP, GeoIP, DNS and local route checks (exit 1 without IP or DNS)")
+    check.add_argument("--timeout", type=float, help="Overall budget in seconds (default: 'network_check_timeout')")
+    check.add_argument("--no-history", action="store_true", help="Do not record this check in the history database")
+    check.set_defaults(handler=cmd_check)
+
+    profiles = commands.add_parser("profiles", help="List, create or delete persistent profiles")
+    profile_commands = profiles.add_subparsers(dest="profiles_command", required=True, parser_class=_JsonArgumentParser)
+    p_list = profile_commands.add_parser("list"); p_list.add_argument("--browser", choices=BROWSER_TYPES)
+    p_list.add_argument("--bookmarks", help="Only profiles using this set file, '__ALL__', '__GENERAL__' or 'none'")
+    p_list.add_argument("--prefix", help="Only names starting with PREFIX (case-insensitive)")
+    p_list.add_argument("--created-from", metavar="DATE", help="Created on or after DATE (YYYY-MM-DD or ISO date-time)")
+    p_list.add_argument("--created-to", metavar="DATE", help="Created on or before DATE (a bare date includes the whole day)")
+    p_list.add_argument("--sort", choices=("name", "browser", "created"), default="name")
+    p_list.add_argument("--desc", action="store_true", help="Reverse the sort order")
+    p_list.add_argument("--limit", type=int, help="At most N profiles (one page)")
+    p_list.add_argument("--offset", type=int, default=0, help="Skip the first N matching profiles")
+    p_list.add_argument("--sizes", action="store_true", help="Add the disk usage of each listed profile (size_bytes)")
+    p_list.set_defaults(handler=cmd_profiles_list)
+    p_create = profile_commands.add_parser("create"); p_create.add_argument("name")
+    p_create.add_argument("--browser", choices=BROWSER_TYPES, required=True)
+    p_create.add_argument("--bookmarks", help="Set file, comma-separated files, '__ALL__', '__GENERAL__' or 'none' (default)")
+    p_create.set_defaults(handler=cmd_profiles_create)
+    p_clone = profile_commands.add_parser("clone"); p_clone.add_argument("source"); p_clone.add_argument("name")
+    p_clone.set_defaults(handler=cmd_profiles_clone)
+    p_delete = profile_commands.add_parser("delete"); p_delete.add_argument("name")
+    p_delete.set_defaults(handler=cmd_profiles_delete)
+
+    launch = commands.add_parser("launch", help="Launch a browser on a persistent or temporary profile")
+    target = launch.add_mutually_exclusive_group(required=True)
+    target.add_argument("--profile", help="Persistent profile name")
+    target.add_argument("--browser", choices=BROWSER_TYPES, help="Browser for a temporary profile (removed on exit)")
+    launch.add_argument("--bookmarks", help="Bookmarks of the temporary profile (see 'profiles create')")
+    mode = launch.add_mutually_exclusive_group()
+    mode.add_argument("--wait", action="store_true", help="Wait for the browser to exit (default)")
+    mode.add_argument("--detach", action="store_true", help="Return right after starting the browser (persistent profiles only)")
+    launch.set_defaults(handler=cmd_launch)
+
+    bookmarks = commands.add_parser("bookmarks", help="Available bookmark sets")
+    bookmark_commands = bookmarks.add_subparsers(dest="bookmarks_command", required=True, parser_class=_JsonArgumentParser)
+    bookmark_commands.add_parser("list").set_defaults(handler=cmd_bookmarks_list)
+
+    commands.add_parser("sessions", help="Browsers launched by the daemon (running and recently finished)").set_defaults(handler=cmd_sessions)
+    stop = commands.add_parser("stop", help="Close a browser launched by the daemon")
+    stop.add_argument("session", type=int); stop.set_defaults(handler=cmd_stop)
+
+    daemon = commands.add_parser("daemon", help="Start, stop or query the resident daemon")
+    daemon_commands = daemon.add_subparsers(dest="daemon_command", required=True, parser_class=_JsonArgumentParser)
+    daemon_commands.add_parser("start").set_defaults(handler=cmd_daemon)
+    daemon_commands.add_parser("status").set_defaults(handler=cmd_daemon)
+    daemon_stop = daemon_commands.add_parser("stop"); daemon_stop.set_defaults(handler=cmd_daemon)
+    daemon_stop.add_argument("--force", action="store_true", help="Also close the browsers the daemon launched")
+    # _forwardable() y guardian_spy.py las buscan en todo argv: también valen tras el subcomando ('profiles list --no-daemon').
+    # SUPPRESS: sin valor por defecto propio, el subcomando no pisa el que ya puso el parser principal
+    for leaf in _leaf_parsers(parser): _add_global_options(leaf, default=argparse.SUPPRESS)
+    return parser
+
+def execute(argv: List[str], env: Optional[Dict[str, str]] = None) -> Tuple[Dict, int]:
+    """
+    Runs one subcommand in this process. Returns (JSON document, exit code). env is the
+    environment of the client (daemon requests): browsers are started with it.
+    """
+    command_name = " ".join(a for a in argv[:2] if not a.startswith("-")) or "?"
+    try:
+        args = build_parser().parse_args(argv)
+        args.environ = env
+        command_name = " ".join(filter(None, (args.command, getattr(args, "profiles_command", None),
+                                              getattr(args, "bookmarks_command", None), getattr(args, "daemon_command", None))))
+        profiling = None
+        if args.profile_run or args.trace_malloc or config_manager.get_setting("profiling_enabled", False):
+            profiling = _feature("profiling")
+            profiling.configure(enabled=args.profile_run or config_manager.get_setting("profiling_enabled", False), malloc=args.trace_malloc)
+        with timing.span("cmd.scripted", command=command_name), (profiling.command(command_name) if profiling else nullcontext()) as session:
+            document = args.handler(args)
+        if session: document["profile_reports"] = session.reports
+        exit_code = EXIT_OK if document.get("ok") else document.pop("exit_status", EXIT_FAILED)
+        if document.get("interrupted"): exit_code = EXIT_INTERRUPTED
+    except ScriptedError as e:
+        document, exit_code = {"ok": False, "error": {"code": e.code, "message": str(e)}}, e.exit_code
+    except KeyboardInterrupt:
+        document, exit_code = {"ok": False, "error": {"code": "interrupted", "message": "Interrupted"}}, EXIT_INTERRUPTED
+    except Exception as e:
+        document, exit_code = {"ok": False, "error": {"code": "internal", "message": f"{type(e).__name__}: {e}"}}, EXIT_FAILED
+    return {"command": command_name, **document}, exit_code
+
+def _forwardable(argv: List[str]) -> bool:
+    # La ayuda se imprime aquí, no en el daemon; y un perfil mide este proceso
+    if any(a in argv for a in ("--no-daemon", "-h", "--help", "--profile-run", "--trace-malloc")): return False
+    command = cli_args.subcommand(argv)
+    if command == "launch": return "--detach" in argv # launch --wait espera aquí: Ctrl+C y la salida del navegador son de este proceso
+    return command not in LOCAL_ONLY_COMMANDS
+
+def _interrupted_forward(response: Optional[Dict]) -> Tuple[Dict, int]:
+    """Ctrl+C while the daemon ran a request: closes the session it may have started."""
+    document = dict((response or {}).get("document") or {})
+    document.update({"ok": False, "interrupted": True, "error": {"code": "interrupted", "message": "Interrupted"}})
+    if document.get("session"):
+        try:
+            with _feature("daemon_client").DaemonClient() as client: document["stopped"] = client.request("stop", session=document["session"]).get("ok", False)
+        except Exception as e: # Daemon caído o sin socket: el navegador sigue abierto
+            document.update({"stopped": False, "stop_error": f"{type(e).__name__}: {e}"})
+    return document, EXIT_INTERRUPTED
+
+def run(argv: List[str]) -> int:
+    """Runs one subcommand (in the daemon if it is running), prints its JSON document and returns the exit code."""
+    forwarded = None
+    if _forwardable(argv):
+        try: forwarded = _feature("daemon_client").forward([a for a in argv if a != "--debug"], env=dict(os.environ))
+        except KeyboardInterrupt as e: forwarded = _interrupted_forward(getattr(e, "response", None))
+        except (OSError, ValueError) as e: # El daemon murió a mitad de la petición
+            forwarded = {"ok": False, "error": {"code": "daemon", "message": f"Daemon request failed: {e}"}}, EXIT_DAEMON
+    try:
+        document, exit_code = forwarded or execute(argv)
+    except SystemExit as e: # --help de argparse
+        return e.code if isinstance(e.code, int) else EXIT_OK
+    _emit(document)
+    return exit_code
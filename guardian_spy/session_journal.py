@@ -0,0 +1,237 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/session_journal.py
+"""
+Write-ahead journal of browser sessions (<config dir>/sessions.journal), so that a
+Guardian Spy process that is killed (kill -9, closed terminal, crash) does not leave
+browsers running on temporary profiles, or the profiles themselves, behind.
+
+browser_manager appends one JSON line per lifecycle event, before acting where it can:
+
+    {"event": "created", "path": ..., "owner": 1234, "browser": "firefox", "ts": ...}  temporary profile (before mkdir)
+    {"event": "started", "path": ..., "owner": 1234, "pid": 5678, "detached": false, ...}
+    {"event": "ended",   "path": ..., "owner": 1234, "exit_code": 0, ...}
+    {"event": "cleaned", "path": ..., "owner": 1234, ...}                                 profile removed
+
+recover() (start of the interactive mode and of the daemon) folds the journal into the
+sessions that are still live and, for those whose owner process is gone, stops their
+browser and removes their temporary profile, in parallel. It never scans the temp
+directory, and the journal is compacted to the live entries, so recovery costs grow with
+the number of live sessions only.
+"""
+import contextlib
+import json
+import logging
+import os
+import platform
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError: # Windows: sin bloqueo entre procesos (las escrituras en modo append siguen siendo de una línea)
+    fcntl = None
+
+try:
+    from . import config_manager
+except ImportError:
+    import config_manager
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILENAME = "sessions.journal"
+COMPACT_THRESHOLD_BYTES = 256 * 1024 # Tamaño a partir del cual record() compacta el diario
+RECOVERY_WORKERS = 8 # Sesiones recuperadas en paralelo
+KILL_TIMEOUT = 3.0 # Segundos de gracia tras SIGTERM antes de SIGKILL
+
+_LOCK = threading.Lock() # Serializa los accesos de este proceso (flock es por proceso, no por hilo)
+
+def get_journal_path() -> str:
+    return os.path.join(config_manager.get_config_dir(), JOURNAL_FILENAME)
+
+def is_enabled() -> bool:
+    return bool(config_manager.get_setting("session_journal_enabled", True))
+
+@contextlib.contextmanager
+def _open_locked(exclusive: bool):
+    """Opens the journal for appending under a shared (appends) or exclusive (compaction) lock."""
+    path = get_journal_path()
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            if fcntl: fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            # compact() pudo reemplazar el fichero mientras esperábamos el bloqueo: reabrir
+            try: current = os.path.samestat(os.fstat(fd), os.stat(path))
+            except FileNotFoundError: current = False
+            if current:
+                yield fd
+                return
+        finally:
+            os.close(fd) # Libera también el flock
+
+def _read_lines(fd: int) -> List[str]:
+    chunks = []
+    os.lseek(fd, 0, os.SEEK_SET)
+    while True:
+        chunk = os.read(fd, 1 << 16)
+        if not chunk: break
+        chunks.append(chunk)
+    return [line for line in b"".join(chunks).decode("utf-8", "replace").splitlines() if line.strip()]
+
+def _parse(line: str) -> Optional[Dict]:
+    try: entry = json.loads(line)
+    except ValueError: return None # Línea a medias de un proceso que murió escribiéndola
+    return entry if isinstance(entry, dict) and entry.get("path") else None
+
+def _fold(lines: List[str]) -> Dict[str, Dict]:
+    """Replays the events into {profile path: state} of the sessions that are still live."""
+    sessions: Dict[str, Dict] = {}
+    for line in lines:
+        entry = _parse(line)
+        if entry is None: continue
+        path, event = entry["path"], entry.get("event")
+        if event == "cleaned":
+            sessions.pop(path, None); continue
+        state = sessions.setdefault(path, {"path": path, "temporary": False, "pid": None, "detached": False, "ended": False})
+        state["owner"] = entry.get("owner")
+        if entry.get("browser"): state["browser"] = entry["browser"]
+        if event == "created": state["temporary"] = True
+        elif event == "started": state.update(pid=entry.get("pid"), detached=bool(entry.get("detached")), ended=False)
+        elif event == "ended":
+            state["ended"] = True
+            if not state["temporary"]: sessions.pop(path) # Perfil persistente: nada más que limpiar
+    return sessions
+
+def record(event: str, profile_path: Optional[str], **fields):
+    """
+    Appends one event. A single write() with O_APPEND: it survives the process being killed
+    right after. No fsync: temporary profiles do not outlive a reboot either.
+    """
+    if not profile_path or not is_enabled(): return
+    entry = {"event": event, "path": os.path.abspath(profile_path), "owner": os.getpid(), "ts": round(time.time(), 3), **fields}
+    line = (json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8")
+    try:
+        with _LOCK, _open_locked(exclusive=False) as fd:
+            os.write(fd, line)
+            size = os.fstat(fd).st_size
+    except OSError as e:
+        logger.warning("Could not write to the session journal: %s", e); return
+    if size > COMPACT_THRESHOLD_BYTES: compact()
+
+def compact(drop_lines: frozenset = frozenset()) -> int:
+    """Rewrites the journal with only the lines of live sessions (minus drop_lines). Returns the live count."""
+    path = get_journal_path()
+    with _LOCK, _open_locked(exclusive=True) as fd:
+        lines = [line for line in _read_lines(fd) if line not in drop_lines]
+        live = _fold(lines)
+        kept = [line for line in lines if (_parse(line) or {}).get("path") in live]
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(line + "\n" for line in kept)
+            f.flush(); os.fsync(f.fileno())
+        os.replace(tmp_path, path) # Quien espere el bloqueo sobre el fichero viejo reabre (_open_locked)
+    return len(live)
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid: return False
+    if platform.system() == "Windows": # os.kill(pid, 0) terminaría el proceso en Windows
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x00100000 | 0x1000, False, int(pid)) # SYNCHRONIZE | PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle: return False
+        try: return kernel32.WaitForSingleObject(handle, 0) == 0x102 # WAIT_TIMEOUT = sigue vivo
+        finally: kernel32.CloseHandle(handle)
+    try: os.kill(int(pid), 0)
+    except ProcessLookupError: return False
+    except PermissionError: return True # Existe, pero es de otro usuario
+    except OSError: return False
+    try: # Linux: un zombi (terminado, sin recoger por su padre) ya no cuenta como vivo
+        with open(f"/proc/{int(pid)}/stat", "rb") as f: return f.read().rpartition(b")")[2].split()[:1] != [b"Z"]
+    except OSError: return True
+
+def _is_browser_of(pid: Optional[int], profile_path: str) -> bool:
+    """True if pid is still a browser running on profile_path (not a recycled PID)."""
+    if not _pid_alive(pid): return False
+    if platform.system() == "Windows": return False # Sin forma barata de leer la línea de órdenes: no se mata nada
+    try:
+        with open(f"/proc/{int(pid)}/cmdline", "rb") as f: command_line = f.read().replace(b"\0", b" ").decode("utf-8", "replace")
+    except OSError: # Sin /proc (macOS, BSD)
+        try: command_line = subprocess.run(["ps", "-o", "command=", "-p", str(int(pid))], capture_output=True, text=True, timeout=5).stdout
+        except (OSError, subprocess.SubprocessError): return False
+    return profile_path in command_line
+
+def _terminate(pid: int) -> bool:
+    for sig, timeout in ((signal.SIGTERM, KILL_TIMEOUT), (getattr(signal, "SIGKILL", signal.SIGTERM), 1.0)):
+        try: os.kill(pid, sig)
+        except ProcessLookupError: return True
+        except OSError: return False
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not _pid_alive(pid): return True
+            time.sleep(0.05)
+    return not _pid_alive(pid)
+
+def _recover_one(state: Dict) -> Dict:
+    try: from . import browser_manager
+    except ImportError: import browser_manager
+    path = state["path"]
+    result = {"path": path, "browser": state.get("browser"), "temporary": state["temporary"],
+              "browser_killed": False, "profile_removed": False, "resolved": False}
+    if not state["ended"] and _is_browser_of(state["pid"], path):
+        if state["detached"]: return result # Lanzado para sobrevivir a Guardian Spy: se revisa en el próximo arranque
+        result["browser_killed"] = _terminate(int(state["pid"]))
+        if not result["browser_killed"]: return result
+    if state["temporary"]:
+        # Solo se borra bajo el directorio de perfiles temporales, diga lo que diga el diario
+        temp_base = os.path.join(os.path.realpath(browser_manager.get_temp_profiles_dir()), "")
+        if os.path.realpath(path).startswith(temp_base): result["profile_removed"] = browser_manager.remove_profile(path)
+        else: logger.warning("Session journal: not removing %s (outside the temporary profiles directory)", path)
+        result["resolved"] = result["profile_removed"]
+    else:
+        result["resolved"] = True
+    return result
+
+def recover(max_workers: int = RECOVERY_WORKERS) -> Dict:
+    """
+    Cleans up the sessions of Guardian Spy processes that are no longer running. Sessions of
+    live processes (another shell, the daemon) are left alone. Returns a summary:
+    {"sessions": [per-session result], "browsers_killed", "profiles_removed", "unresolved"}.
+    """
+    summary = {"sessions": [], "browsers_killed": 0, "profiles_removed": 0, "unresolved": 0}
+    if not is_enabled() or not os.path.exists(get_journal_path()): return summary
+    try:
+        with _LOCK, _open_locked(exclusive=False) as fd: lines = _read_lines(fd)
+    except OSError as e:
+        logger.warning("Could not read the session journal: %s", e); return summary
+    sessions = _fold(lines)
+    orphans = [s for s in sessions.values() if not _pid_alive(s["owner"])]
+    if orphans:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(orphans))), thread_name_prefix="gs-recovery") as pool:
+            summary["sessions"] = list(pool.map(_recover_one, orphans))
+    resolved = {r["path"] for r in summary["sessions"] if r["resolved"]}
+    summary.update(browsers_killed=sum(r["browser_killed"] for r in summary["sessions"]),
+                   profiles_removed=sum(r["profile_removed"] for r in summary["sessions"]),
+                   unresolved=len(summary["sessions"]) - len(resolved))
+    if resolved or any((_parse(line) or {}).get("path") not in sessions for line in lines): # Hay historia muerta que descartar
+        # Solo las líneas leídas aquí: un evento posterior sobre la misma ruta (otro proceso) se conserva
+        try: compact(frozenset(line for line in lines if (_parse(line) or {}).get("path") in resolved))
+        except OSError as e: logger.warning("Could not compact the session journal: %s", e)
+    if summary["sessions"]: logger.info("Session journal recovery: %s", {k: v for k, v in summary.items() if k != "sessions"})
+    return summary
@@ -0,0 +1,85 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/startup.py
+"""
+Start-up work of the interactive mode that does not need the UI. guardian_spy.py calls
+begin() before importing main_cli (rich), so these tasks overlap with the imports and
+the banner instead of running one after another:
+
+    "browsers"  utils.check_browser_executables()
+    "recovery"  session_journal.recover(): browsers and temporary profiles left by a killed run
+    "config"    settings, profiles.json and the bookmark set index (warm caches)
+    "network"   the network checks, only with the 'startup_check_enabled' setting
+
+main_cli waits only for what a command needs (setup/launch/profiles wait for "browsers"),
+and for "recovery" before the first prompt.
+"""
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+try:
+    from . import config_manager, session_journal, timing, utils
+except ImportError:
+    import config_manager, session_journal, timing, utils
+
+logger = logging.getLogger(__name__)
+
+_TASKS: Dict[str, Future] = {}
+_LOCK = threading.Lock()
+
+def _start(name: str, func: Callable) -> Future:
+    future: Future = Future()
+
+    def _target():
+        if not future.set_running_or_notify_cancel(): return
+        try:
+            with timing.span(f"startup.{name}"): result = func()
+        except BaseException as e: future.set_exception(e)
+        else: future.set_result(result)
+
+    # Hilos daemon: una tarea lenta (red) nunca retrasa la salida
+    threading.Thread(target=_target, name=f"gs-startup-{name}", daemon=True).start()
+    return future
+
+def _discover_browsers() -> Dict[str, str]:
+    detected = utils.check_browser_executables()
+    logger.debug("Browsers detected: %s", detected)
+    return detected
+
+def _load_config():
+    try: from . import bookmarks_handler
+    except ImportError: import bookmarks_handler
+    config_manager.load_settings()
+    config_manager.load_profiles_data()
+    bookmarks_handler.get_available_bookmark_sets()
+
+def _network_checks() -> Dict[str, Dict]:
+    try: from . import network_checker
+    except ImportError: import network_checker
+    return network_checker.run_network_checks_concurrently()
+
+def begin() -> Dict[str, Future]:
+    """Starts the start-up tasks (only the first call does). Returns {task name: Future}."""
+    with _LOCK:
+        if not _TASKS:
+            _TASKS["browsers"] = _start("browsers", _discover_browsers)
+            _TASKS["config"] = _start("config", _load_config)
+            _TASKS["recovery"] = _start("recovery", session_journal.recover)
+            if config_manager.get_setting("startup_check_enabled", False):
+                _TASKS["network"] = _start("network", _network_checks)
+        return dict(_TASKS)
@@ -0,0 +1,168 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# guardian_spy/timing.py
+"""
+Lightweight timing spans for 'check', 'launch' and friends.
+
+    with timing.span("net.geoip_remote", ip=ip): ...
+
+    @timing.timed("browser.discover")
+    def check_browser_executables(...): ...
+
+Every finished span is added to an in-memory latency histogram per name (read by the
+'stats' command through get_stats()). When tracing is enabled, spans are also kept as
+Chrome trace events and written by dump_trace() to a JSON file that chrome://tracing or
+https://ui.perfetto.dev can open. A span costs a couple of microseconds.
+"""
+import os
+import json
+import math
+import time
+import threading
+import functools
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+try:
+    from . import config_manager
+except ImportError:
+    import config_manager
+
+# Cubos logarítmicos: cada uno ~9% más ancho que el anterior, así el percentil devuelto
+# está a menos de ~4.5% del real con memoria constante por nombre.
+_BUCKET_RATIO = 2 ** (1 / 8)
+_BUCKET_BASE = 1e-6 # Segundos del primer cubo (1 µs)
+_LOG_RATIO = math.log(_BUCKET_RATIO)
+MAX_TRACE_EVENTS = 100_000 # Límite de eventos de traza en memoria por ejecución
+
+class LatencyHistogram:
+    """Log-bucketed histogram of durations (seconds) with exact count/total/min/max."""
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        index = int(math.log(max(seconds, _BUCKET_BASE) / _BUCKET_BASE) / _LOG_RATIO)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1; self.total += seconds
+        if seconds < self.min: self.min = seconds
+        if seconds > self.max: self.max = seconds
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.count: return None
+        rank = max(1, math.ceil(pct / 100 * self.count)); seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank: # Centro geométrico del cubo, acotado por los extremos reales
+                return min(self.max, max(self.min, _BUCKET_BASE * _BUCKET_RATIO ** (index + 0.5)))
+        return self.max
+
+    def summary(self) -> Dict:
+        return {"count": self.count, "total": self.total, "mean": self.total / self.count if self.count else None,
+                "min": self.min if self.count else None, "max": self.max if self.count else None,
+                "p50": self.percentile(50), "p95": self.percentile(95), "p99": self.percentile(99)}
+
+_HISTOGRAMS: Dict[str, LatencyHistogram] = {}
+_TRACE_EVENTS: List[Dict] = []
+_LOCK = threading.Lock()
+_LISTENERS: List[Callable[[str, float, Optional[Dict]], None]] = [] # metrics.py: histogramas de algunos spans
+_TRACE_ENABLED = False # Lo activa main_cli con --trace o el setting 'timing_trace_enabled'
+_EPOCH_NS = time.perf_counter_ns() # Origen de los "ts" de la traza
+_PID = os.getpid()
+
+def trace_enabled() -> bool:
+    return _TRACE_ENABLED
+
+def enable_trace(enabled: bool = True):
+    """Turns Chrome trace event collection on or off for this run."""
+    global _TRACE_ENABLED
+    _TRACE_ENABLED = enabled
+
+def add_listener(listener: Callable[[str, float, Optional[Dict]], None]):
+    """Calls listener(name, seconds, args) for every finished span, in the thread that ran it."""
+    _LISTENERS.append(listener)
+
+def record(name: str, start_ns: int, end_ns: int, args: Optional[Dict] = None):
+    """Adds a finished span (perf_counter_ns timestamps) to its histogram and, if tracing, to the trace."""
+    seconds = (end_ns - start_ns) / 1e9
+    with _LOCK:
+        histogram = _HISTOGRAMS.get(name)
+        if histogram is None: histogram = _HISTOGRAMS[name] = LatencyHistogram()
+        histogram.add(seconds)
+    for listener in _LISTENERS: listener(name, seconds, args)
+    if _TRACE_ENABLED:
+        event = {"name": name, "cat": name.split(".", 1)[0], "ph": "X", "pid": _PID, "tid": threading.get_ident(),
+                 "ts": (start_ns - _EPOCH_NS) / 1000, "dur": (end_ns - start_ns) / 1000}
+        if args: event["args"] = {k: v if isinstance(v, (int, float, bool, type(None))) else str(v) for k, v in args.items()}
+        with _LOCK:
+            if len(_TRACE_EVENTS) < MAX_TRACE_EVENTS: _TRACE_EVENTS.append(event)
+
+class span:
+    """Context manager timing the enclosed block under 'name'. Extra kwargs go to the trace event args."""
+    __slots__ = ("name", "args", "_start_ns")
+
+    def __init__(self, name: str, **args):
+        self.name = name; self.args = args; self._start_ns = 0
+
+    def __enter__(self):
+        self._start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None: self.args["error"] = exc_type.__name__
+        record(self.name, self._start_ns, time.perf_counter_ns(), self.args)
+        return False
+
+def timed(name: str):
+    """Decorator form of span(name)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name): return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def get_stats() -> Dict[str, Dict]:
+    """Returns {span_name: {"count", "total", "mean", "min", "max", "p50", "p95", "p99"}} (seconds)."""
+    with _LOCK: return {name: histogram.summary() for name, histogram in sorted(_HISTOGRAMS.items())}
+
+def reset():
+    with _LOCK:
+        _HISTOGRAMS.clear(); _TRACE_EVENTS.clear()
+
+def get_traces_dir() -> str:
+    path = os.path.join(config_manager.get_config_dir(), "traces")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def dump_trace(path: Optional[str] = None) -> Optional[str]:
+    """
+    Writes the collected trace events as Chrome trace JSON. Defaults to
+    <config dir>/traces/trace-<date>-<pid>.json. Returns the path, or None if there was nothing to write.
+    """
+    with _LOCK: events = list(_TRACE_EVENTS)
+    if not events: return None
+    if not path: path = os.path.join(get_traces_dir(), f"trace-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{_PID}.json")
+    thread_names = {t.ident: t.name for t in threading.enumerate()}
+    metadata = [{"name": "thread_name", "ph": "M", "pid": _PID, "tid": tid, "args": {"name": thread_names.get(tid, str(tid))}}
+                for tid in {e["tid"] for e in events}]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+    return path
@@ -18,6 +18,11 @@ import platform
 import os
 import shutil # Para shutil.which
 
+try:
+    from . import timing
+except ImportError:
+    import timing
+
 def get_user_home_dir():
     """Returns the user's home directory."""
     return os.path.expanduser("~")
@@ -38,6 +43,7 @@ def find_executable(name):
     """Cross-platform way to find an executable in PATH."""
     return shutil.which(name)
 
+@timing.timed("browser.discover")
 def check_browser_executables(console=None):
     """Checks for Firefox and Chrome/Chromium executables and prints their paths if found."""
     # Import locally to avoid circular dependencies if utils is imported early by browser_manager
@@ -95,6 +101,7 @@ def check_browser_executables(console=None):
                  console.print(f"  [yellow]:information_source: Google Chrome ('{chrome_path_suggestion or 'google-chrome'}') not found. Checking for Chromium...[/yellow]")
             
             chromium_names = ["chromium-browser", "chromium"]
+            if browser_manager.get_configured_browser_path("chromium"): chromium_names.insert(0, browser_manager.get_configured_browser_path("chromium"))
             chromium_exe_found = None
             for name in chromium_names:
                 chromium_path_suggestion_alt = browser_manager.get_os_specific_browser_path("chromium", specific_name=name)
@@ -119,6 +126,6 @@ def check_browser_executables(console=None):
     if not any(browsers_found.values()) and console: # If no browser at all was found
         console.print("[bold red]No supported browsers detected automatically.[/bold red]")
         console.print("[yellow]You might need to ensure Firefox or Chrome/Chromium is installed and in your system's PATH,[/yellow]")
-        console.print("[yellow]or configure paths manually (feature not yet implemented).[/yellow]")
+        console.print("[yellow]or set their paths in the 'browser_executables' setting.[/yellow]")
     
     return detected_paths # Return a dict of found paths: {'firefox': '/path/to/ff', 'chrome': '/path/to/chrome'}
\ No newline at end of file
@@ -0,0 +1,26 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# tests/conftest.py
+import pytest
+
+from guardian_spy import config_manager
+
+@pytest.fixture(autouse=True)
+def isolated_config_dir(tmp_path, monkeypatch):
+    """Every test gets its own empty config directory (settings, profiles, journal)."""
+    config_dir = tmp_path / "config"
+    monkeypatch.setenv(config_manager.CONFIG_DIR_ENV_VAR, str(config_dir))
+    return config_dir
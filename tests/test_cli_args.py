@@ -0,0 +1,63 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# tests/test_cli_args.py
+import pytest
+
+from guardian_spy import cli_args, scripted
+
+@pytest.mark.parametrize("argv, command", [
+    (["check"], "check"),
+    (["--debug", "--no-daemon", "profiles", "list"], "profiles"),
+    (["--trace", "check"], None), # 'check' es el fichero de la traza
+    (["--trace", "--debug", "check"], "check"),
+    (["--trace=out.json", "check"], "check"),
+    (["--bookmarks", "profiles"], None),
+    (["--book", "profiles"], None), # Abreviatura de --bookmarks
+    (["--browser", "firefox"], None),
+    (["-b", "chrome", "sessions"], "sessions"),
+    (["--browser=chrome", "sessions"], "sessions"),
+    (["--", "check"], None),
+    ([], None),
+])
+def test_subcommand_skips_option_values(argv, command):
+    assert cli_args.subcommand(argv) == command
+    assert cli_args.is_scripted(argv) == (command is not None)
+
+@pytest.mark.parametrize("argv, forwarded", [
+    (["profiles", "list"], True),
+    (["--debug", "sessions"], True),
+    (["--no-daemon", "profiles", "list"], False),
+    (["profiles", "list", "--no-daemon"], False),
+    (["sessions", "--profile-run"], False),
+    (["check"], False),
+    (["--debug", "check"], False),
+    (["daemon", "status"], False),
+    (["launch", "--browser", "firefox", "--detach"], True),
+    (["launch", "--browser", "firefox", "--wait"], False),
+    (["profiles", "--help"], False),
+])
+def test_forwardable(argv, forwarded):
+    assert scripted._forwardable(argv) == forwarded
+
+@pytest.mark.parametrize("argv", [["--no-daemon", "profiles", "list"], ["profiles", "list", "--no-daemon"],
+                                  ["daemon", "stop", "--no-daemon", "--force"]])
+def test_global_options_before_or_after_the_subcommand(argv):
+    args = scripted.build_parser().parse_args(argv)
+    assert args.no_daemon and not args.profile_run and not args.trace_malloc and not args.debug
+
+def test_global_options_default_to_false():
+    args = scripted.build_parser().parse_args(["profiles", "list"])
+    assert (args.no_daemon, args.profile_run, args.trace_malloc, args.debug) == (False, False, False, False)
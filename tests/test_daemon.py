@@ -0,0 +1,94 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# tests/test_daemon.py
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from guardian_spy import __version__, config_manager, daemon_client, scripted
+
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(not daemon_client.is_supported(), reason="the daemon needs Unix domain sockets")
+
+@pytest.fixture
+def running_daemon(isolated_config_dir):
+    """A real daemon process on the isolated config dir; shut down (with its sessions) afterwards."""
+    isolated_config_dir.mkdir(parents=True, exist_ok=True)
+    with open(config_manager._get_settings_file_path(), "w", encoding="utf-8") as f: json.dump({"daemon_warm_profiles": 0}, f)
+    process = subprocess.Popen([sys.executable, "-m", "guardian_spy.daemon"], cwd=PACKAGE_PARENT,
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 15
+    while True:
+        try:
+            with daemon_client.DaemonClient() as client: client.request("ping"); break
+        except daemon_client.DaemonUnavailable:
+            assert process.poll() is None and time.monotonic() < deadline, "daemon did not start"
+            time.sleep(0.05)
+    yield process
+    try:
+        with daemon_client.DaemonClient() as client: client.request("shutdown", force=True)
+        process.wait(timeout=10)
+    finally:
+        if process.poll() is None: process.kill(); process.wait()
+
+def test_forward_without_a_daemon():
+    assert daemon_client.forward(["profiles", "list"]) is None
+
+def test_round_trip(running_daemon):
+    with daemon_client.DaemonClient() as client:
+        ping = client.request("ping")
+        assert (ping["id"], ping["ok"], ping["version"], ping["pid"]) == (1, True, __version__, running_daemon.pid)
+        assert client.request("ping")["id"] == 2 # Varias peticiones por la misma conexión
+    document, exit_code = daemon_client.forward(["profiles", "list"], env=dict(os.environ))
+    assert exit_code == scripted.EXIT_OK
+    assert document == {"command": "profiles list", "ok": True, "profiles": [], "count": 0, "total": 0, "offset": 0}
+    with daemon_client.DaemonClient() as client: assert client.request("status")["requests"]["run"] == 1
+
+def test_scripted_commands_are_forwarded(running_daemon, capsys):
+    assert scripted.run(["profiles", "list"]) == scripted.EXIT_OK
+    assert json.loads(capsys.readouterr().out)["ok"]
+    assert scripted.run(["--no-daemon", "profiles", "list"]) == scripted.EXIT_OK # En este proceso
+    with daemon_client.DaemonClient() as client: assert client.request("status")["requests"]["run"] == 1
+
+def test_version_mismatch_runs_locally(running_daemon, monkeypatch):
+    with daemon_client.DaemonClient() as client:
+        response = client.request("run", argv=["profiles", "list"], version="0.0.0-other")
+    assert response["ok"] is False and response["error"]["code"] == "version_mismatch"
+    monkeypatch.setattr(daemon_client, "__version__", "0.0.0-other")
+    assert daemon_client.forward(["profiles", "list"]) is None # El llamador lo ejecuta en local
+
+def test_protocol_errors(running_daemon):
+    with daemon_client.DaemonClient() as client:
+        assert client.request("frobnicate")["error"]["code"] == "unknown_command"
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(5)
+    sock.connect(daemon_client.get_socket_path())
+    with sock, sock.makefile("rb") as reader:
+        sock.sendall(b"not json\n")
+        assert json.loads(reader.readline())["error"]["code"] == "protocol"
+
+def test_stale_socket_is_not_a_daemon(isolated_config_dir):
+    isolated_config_dir.mkdir(parents=True, exist_ok=True)
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(daemon_client.get_socket_path()); stale.close() # Fichero de socket sin nadie escuchando
+    with pytest.raises(daemon_client.DaemonUnavailable): daemon_client.DaemonClient()
+    assert daemon_client.forward(["profiles", "list"]) is None
@@ -0,0 +1,162 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# tests/test_dns_leak.py
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from guardian_spy import dns_leak
+
+def _question_end(query: bytes) -> int:
+    offset = 12
+    while query[offset]: offset += 1 + query[offset]
+    return offset + 5 # Byte 0 final + QTYPE + QCLASS
+
+def make_response(query: bytes, rcode: int = 0, answers=("192.0.2.1",), txid=None, question=None) -> bytes:
+    """A reply to query as a resolver would send it (answers point back to the question name)."""
+    query_txid, flags = struct.unpack_from(">HH", query)
+    body = query[12:_question_end(query)] if question is None else dns_leak.encode_query(0, question)[12:]
+    records = b""
+    for address in answers:
+        rdata = socket.inet_pton(socket.AF_INET6 if ":" in address else socket.AF_INET, address)
+        rtype = dns_leak.QTYPE_AAAA if ":" in address else dns_leak.QTYPE_A
+        records += b"\xc0\x0c" + struct.pack(">HHIH", rtype, dns_leak.QCLASS_IN, 60, len(rdata)) + rdata
+    header = struct.pack(">HHHHHH", query_txid if txid is None else txid, flags | 0x8080 | rcode, 1, len(answers), 0, 0)
+    return header + body + records
+
+class Responder:
+    """Local UDP stand-in for a resolver; handler(query) returns the replies to send (or none)."""
+
+    def __init__(self, handler, delay: float = 0.0):
+        self.handler, self.delay = handler, delay
+        self.queries = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.1)
+        self.port = self.sock.getsockname()[1]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try: query, client = self.sock.recvfrom(4096)
+            except socket.timeout: continue
+            except OSError: return
+            self.queries.append(query)
+            if self.delay: time.sleep(self.delay)
+            for reply in self.handler(query): self.sock.sendto(reply, client)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set(); self._thread.join(); self.sock.close()
+
+def _closed_port() -> int:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+def test_encode_decode_round_trip():
+    query = dns_leak.encode_query(0x1234, "gs-abc.Example.com")
+    assert struct.unpack_from(">HHH", query) == (0x1234, 0x0100, 1)
+    response = dns_leak.decode_response(make_response(query, answers=("192.0.2.7", "2001:db8::7")))
+    assert response == {"txid": 0x1234, "rcode": 0, "question": "gs-abc.example.com",
+                        "answers": ["192.0.2.7", "2001:db8::7"], "truncated": False}
+
+def test_encode_rejects_invalid_labels():
+    with pytest.raises(ValueError): dns_leak.encode_query(1, "a..example.com")
+    with pytest.raises(ValueError): dns_leak.encode_query(1, "x" * 64 + ".example.com")
+
+def test_decode_rejects_queries_and_short_packets():
+    with pytest.raises(ValueError): dns_leak.decode_response(b"\x00\x01")
+    with pytest.raises(ValueError): dns_leak.decode_response(dns_leak.encode_query(1, "example.com"))
+
+def test_decode_rejects_truncated_compression_pointers():
+    header = struct.pack(">HHHHHH", 1, 0x8180, 1, 0, 0, 0)
+    with pytest.raises(ValueError): dns_leak.decode_response(header + b"\xc0") # Pregunta
+    answer_header = struct.pack(">HHHHHH", 1, 0x8180, 1, 1, 0, 0)
+    with pytest.raises(ValueError): dns_leak.decode_response(answer_header + dns_leak.encode_query(1, "example.com")[12:] + b"\xc0")
+
+def test_truncated_reply_does_not_end_the_test():
+    with Responder(lambda query: [query[:2] + b"\x81\x80\x00\x01\x00\x00\x00\x00\x00\x00\xc0", make_response(query)]) as responder:
+        result = dns_leak.run_dns_leak_test(["127.0.0.1"], port=responder.port, probes=1, timeout=2.0)
+    assert result["responding"] == ["127.0.0.1"]
+
+def test_random_probe_names_are_unique():
+    names = {dns_leak.random_probe_name("example.com.") for _ in range(100)}
+    assert len(names) == 100 and all(name.endswith(".example.com") for name in names)
+
+def test_responding_resolver():
+    with Responder(lambda query: [make_response(query)]) as responder:
+        result = dns_leak.run_dns_leak_test(["127.0.0.1"], port=responder.port, probes=3, timeout=2.0)
+    resolver = result["resolvers"]["127.0.0.1"]
+    assert result["responding"] == ["127.0.0.1"] and result["silent"] == []
+    assert resolver["responded"] and resolver["error"] is None
+    assert (resolver["sent"], resolver["received"], resolver["rcode"], resolver["answers"]) == (3, 3, "NOERROR", ["192.0.2.1"])
+    assert len(responder.queries) == 3
+
+def test_replies_must_match_txid_and_question():
+    def handler(query):
+        txid = struct.unpack_from(">H", query)[0]
+        return [make_response(query, txid=txid ^ 0xFFFF, answers=("198.51.100.1",)), # Otro id de transacción
+                make_response(query, question="other.example.com", answers=("198.51.100.2",))] # Otra pregunta
+    with Responder(handler) as responder:
+        result = dns_leak.run_dns_leak_test(["127.0.0.1"], port=responder.port, probes=1, timeout=0.5)
+    resolver = result["resolvers"]["127.0.0.1"]
+    assert not resolver["responded"] and resolver["received"] == 0 and resolver["answers"] == []
+    assert result["silent"] == ["127.0.0.1"]
+
+def test_latency_is_measured():
+    with Responder(lambda query: [make_response(query)], delay=0.2) as responder:
+        result = dns_leak.run_dns_leak_test(["127.0.0.1"], port=responder.port, probes=1, timeout=2.0)
+    latency = result["resolvers"]["127.0.0.1"]["latency"]
+    assert 0.2 <= latency < 2.0
+    assert result["elapsed"] >= latency
+
+def test_nxdomain_counts_as_a_response():
+    with Responder(lambda query: [make_response(query, rcode=3, answers=())]) as responder:
+        result = dns_leak.run_dns_leak_test(["127.0.0.1"], port=responder.port, probes=2, timeout=2.0)
+    resolver = result["resolvers"]["127.0.0.1"]
+    assert resolver["responded"] and resolver["rcode"] == "NXDOMAIN" and resolver["answers"] == []
+
+def test_closed_port_is_reported_as_refused():
+    result = dns_leak.run_dns_leak_test(["127.0.0.1"], port=_closed_port(), probes=1, timeout=2.0)
+    resolver = result["resolvers"]["127.0.0.1"]
+    assert not resolver["responded"]
+    assert resolver["error"].startswith("Connection refused")
+    assert result["elapsed"] < 1.0 # El ICMP llega antes del timeout
+
+def test_silent_resolver_times_out():
+    with Responder(lambda query: []) as responder:
+        result = dns_leak.run_dns_leak_test(["127.0.0.1"], port=responder.port, probes=2, timeout=0.3)
+    resolver = result["resolvers"]["127.0.0.1"]
+    assert not resolver["responded"] and resolver["sent"] == 2
+    assert resolver["error"] == "No reply within 0.3s"
+    assert 0.3 <= result["elapsed"] < 1.0
+
+def test_invalid_address():
+    with Responder(lambda query: [make_response(query)]) as responder:
+        result = dns_leak.run_dns_leak_test(["not-an-ip", "127.0.0.1", "127.0.0.1"], port=responder.port, probes=1, timeout=2.0)
+    assert list(result["resolvers"]) == ["not-an-ip", "127.0.0.1"] # Sin duplicados
+    assert result["resolvers"]["not-an-ip"]["error"].startswith("Invalid resolver address")
+    assert result["responding"] == ["127.0.0.1"] and result["silent"] == ["not-an-ip"]
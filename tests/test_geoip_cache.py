@@ -0,0 +1,92 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# tests/test_geoip_cache.py
+import json
+
+import pytest
+
+from guardian_spy import config_manager, geoip_cache
+
+SPAIN = {"country": "Spain", "query_ip": "192.0.2.1"}
+
+class FakeClock:
+    """Stands in for the time module of geoip_cache: time() only moves when the test says so."""
+
+    def __init__(self): self.now = 1_000_000.0
+    def time(self): return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(geoip_cache, "time", fake)
+    return fake
+
+@pytest.fixture
+def cache(tmp_path):
+    return geoip_cache.GeoIPCache(str(tmp_path / "geoip_cache.json"))
+
+def _settings(**values):
+    with open(config_manager._get_settings_file_path(), "w", encoding="utf-8") as f: json.dump(values, f)
+
+def test_hit_until_the_ttl_expires(clock, cache):
+    _settings(geoip_cache_ttl=100)
+    assert cache.get("192.0.2.1") == (False, None, None)
+    cache.put("192.0.2.1", SPAIN)
+    clock.now += 99
+    assert cache.get("192.0.2.1") == (True, SPAIN, None)
+    clock.now += 1
+    assert cache.get("192.0.2.1") == (False, None, None)
+
+def test_negative_entries_use_their_own_ttl(clock, cache):
+    _settings(geoip_cache_ttl=100, geoip_negative_ttl=10)
+    cache.put("192.0.2.2", None, "HTTP 429")
+    assert cache.get("192.0.2.2") == (True, None, "HTTP 429") # Un fallo reciente no se vuelve a consultar
+    clock.now += 10
+    assert cache.get("192.0.2.2") == (False, None, None)
+
+def test_zero_ttl_disables_caching(clock, cache):
+    _settings(geoip_negative_ttl=0)
+    cache.put("192.0.2.2", None, "Timeout")
+    assert cache.get("192.0.2.2") == (False, None, None)
+
+def test_least_recently_used_entries_are_evicted(clock, cache):
+    _settings(geoip_cache_max_entries=2)
+    cache.put("192.0.2.1", SPAIN); cache.put("192.0.2.2", SPAIN)
+    assert cache.get("192.0.2.1")[0] # 192.0.2.2 pasa a ser el menos usado
+    cache.put("192.0.2.3", SPAIN)
+    assert [ip for ip in ("192.0.2.1", "192.0.2.2", "192.0.2.3") if cache.get(ip)[0]] == ["192.0.2.1", "192.0.2.3"]
+
+def test_entries_persist_without_the_expired_ones(clock, cache, tmp_path):
+    _settings(geoip_cache_ttl=100, geoip_negative_ttl=10)
+    cache.put("192.0.2.1", SPAIN); cache.put("192.0.2.2", None, "HTTP 429")
+    clock.now += 50
+    reloaded = geoip_cache.GeoIPCache(str(tmp_path / "geoip_cache.json"))
+    assert reloaded.get("192.0.2.1") == (True, SPAIN, None)
+    assert reloaded.get("192.0.2.2") == (False, None, None)
+    assert not list(tmp_path.glob("*.tmp"))
+
+def test_corrupt_cache_file_starts_empty(clock, tmp_path):
+    (tmp_path / "geoip_cache.json").write_text("{not json")
+    cache = geoip_cache.GeoIPCache(str(tmp_path / "geoip_cache.json"))
+    assert cache.get("192.0.2.1") == (False, None, None)
+    cache.put("192.0.2.1", SPAIN)
+    assert json.loads((tmp_path / "geoip_cache.json").read_text())["192.0.2.1"]["geo"] == SPAIN
+
+def test_clear(clock, cache, tmp_path):
+    cache.put("192.0.2.1", SPAIN)
+    cache.clear()
+    assert cache.get("192.0.2.1") == (False, None, None)
+    assert json.loads((tmp_path / "geoip_cache.json").read_text()) == {}
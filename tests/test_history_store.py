@@ -0,0 +1,60 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# tests/test_history_store.py
+import pytest
+
+from guardian_spy import history_store, network_checker
+
+GEO = {"country": "Spain", "region": "Madrid", "city": "Madrid", "isp": "Example ISP"}
+
+def _results(ip="192.0.2.1", geo=GEO, dns=("10.0.0.53",), ip_status="ok", geo_status="ok", dns_status="ok"):
+    return {network_checker.CHECK_IP: {"status": ip_status, "value": ip if ip_status == "ok" else None, "elapsed": 0.1},
+            network_checker.CHECK_GEO: {"status": geo_status, "value": geo if geo_status == "ok" else None, "elapsed": 0.1},
+            network_checker.CHECK_DNS: {"status": dns_status, "value": list(dns) if dns_status == "ok" else None, "elapsed": 0.0}}
+
+@pytest.fixture
+def store(tmp_path):
+    store = history_store.HistoryStore(str(tmp_path / "history.sqlite3"))
+    yield store
+    store.close()
+
+def _changed(row):
+    return row["changed_fields"].split(",") if row["changed_fields"] else []
+
+def test_first_check_records_known_fields(store):
+    assert _changed(store.record_check(_results())) == ["public_ip", "country", "city", "isp", "dns_servers"]
+
+def test_failed_checks_and_recoveries_are_not_changes(store):
+    store.record_check(_results())
+    assert _changed(store.record_check(_results(ip_status="timeout", geo_status="error", dns_status="timeout"))) == []
+    assert _changed(store.record_check(_results())) == [] # Mismos valores que la última comprobación correcta
+
+def test_changes_compare_with_the_last_successful_value(store):
+    store.record_check(_results())
+    store.record_check(_results(ip_status="error"))
+    assert _changed(store.record_check(_results(ip="198.51.100.7", geo_status="timeout"))) == ["public_ip"]
+    assert _changed(store.record_check(_results(ip="198.51.100.7", geo=dict(GEO, city="Toledo")))) == ["city"]
+    assert store.count(changed_only=True) == 3
+
+def test_last_values_survive_a_restart(store, tmp_path):
+    store.record_check(_results())
+    store.record_check(_results(ip_status="error"))
+    store.close()
+    reopened = history_store.HistoryStore(str(tmp_path / "history.sqlite3"))
+    try:
+        assert _changed(reopened.record_check(_results())) == []
+        assert _changed(reopened.record_check(_results(dns=("10.0.0.53", "9.9.9.9")))) == ["dns_servers"]
+    finally: reopened.close()
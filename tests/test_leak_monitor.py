@@ -0,0 +1,127 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# tests/test_leak_monitor.py
+import asyncio
+import json
+import time
+
+import pytest
+
+from guardian_spy import config_manager, leak_monitor, local_network
+
+def _settings(**values):
+    with open(config_manager._get_settings_file_path(), "w", encoding="utf-8") as f: json.dump(values, f)
+
+def _inventory(*problems):
+    return {"supported": True, "tunnel_interfaces": ["wg0"], "findings": [{"severity": local_network.SEVERITY_WARNING, "message": m} for m in problems]}
+
+@pytest.fixture
+def samples(monkeypatch):
+    """Lists of public IPs, DNS server lists and local inventories that the next samples return, in order."""
+    feeds = {"ip": [], "dns": [], "local": []}
+    monkeypatch.setattr(leak_monitor.LeakMonitor, "_sample_ip", lambda self: feeds["ip"].pop(0))
+    monkeypatch.setattr(leak_monitor.LeakMonitor, "_sample_dns", lambda self: feeds["dns"].pop(0))
+    monkeypatch.setattr(local_network, "get_local_inventory", lambda: feeds["local"].pop(0) if feeds["local"] else {"supported": False})
+    return feeds
+
+def _kinds(monitor):
+    return [alert["kind"] for alert in monitor.get_alerts()]
+
+def test_backoff_grows_while_stable_and_snaps_back(samples):
+    _settings(leak_monitor_min_interval=10, leak_monitor_max_interval=35, leak_monitor_backoff=2)
+    monitor = leak_monitor.LeakMonitor()
+    intervals = []
+    for changed, first in [(True, True), (False, False), (False, False), (False, False), (True, False), (False, False)]:
+        monitor._next_interval(changed, first)
+        intervals.append(monitor.interval)
+    assert intervals == [10, 20, 35, 35, 10, 20]
+
+def test_ip_drift_and_restore(samples):
+    samples["ip"] += ["192.0.2.1", "192.0.2.1", "198.51.100.7", None, "192.0.2.1"]
+    samples["dns"] += [["10.8.0.1"]] * 5
+    monitor = leak_monitor.LeakMonitor(baseline_ip="192.0.2.1", baseline_dns=["10.8.0.1"])
+    assert not monitor.sample_once() and _kinds(monitor) == [] # Igual que la línea base
+    assert not monitor.sample_once()
+    assert monitor.sample_once()
+    alerts = monitor.get_alerts()
+    assert [a["kind"] for a in alerts] == ["ip_changed"] and (alerts[0]["baseline"], alerts[0]["current"]) == ("192.0.2.1", "198.51.100.7")
+    assert monitor.sample_once() and _kinds(monitor) == ["ip_unreachable"]
+    assert monitor.sample_once() and _kinds(monitor) == ["ip_restored"]
+
+def test_dns_drift_and_restore(samples):
+    samples["ip"] += ["192.0.2.1"] * 4
+    samples["dns"] += [["10.8.0.1"], ["192.168.1.1", "8.8.8.8"], ["10.8.0.1"], None]
+    monitor = leak_monitor.LeakMonitor(baseline_ip="192.0.2.1", baseline_dns=["10.8.0.1"])
+    monitor.sample_once()
+    monitor.sample_once()
+    alerts = monitor.get_alerts()
+    assert [a["kind"] for a in alerts] == ["dns_changed"] and alerts[0]["current"] == ["192.168.1.1", "8.8.8.8"]
+    monitor.sample_once()
+    assert _kinds(monitor) == ["dns_restored"]
+    monitor.sample_once() # DNS desconocido en esta plataforma: sin alerta
+    assert _kinds(monitor) == []
+
+def test_first_sample_sets_the_baseline(samples):
+    samples["ip"] += ["192.0.2.1", "198.51.100.7"]
+    samples["dns"] += [["10.8.0.1"], ["10.8.0.1"]]
+    monitor = leak_monitor.LeakMonitor()
+    monitor.sample_once()
+    assert (monitor.baseline_ip, monitor.baseline_dns, _kinds(monitor)) == ("192.0.2.1", ["10.8.0.1"], [])
+    monitor.sample_once()
+    assert _kinds(monitor) == ["ip_changed"]
+
+def test_new_local_findings_are_reported_once(samples):
+    samples["ip"] += ["192.0.2.1"] * 4
+    samples["dns"] += [["10.8.0.1"]] * 4
+    samples["local"] += [_inventory("known"), _inventory("known", "IPv6 default route uses eth0"),
+                         _inventory("known", "IPv6 default route uses eth0"), _inventory("known")]
+    monitor = leak_monitor.LeakMonitor(baseline_ip="192.0.2.1", baseline_dns=["10.8.0.1"])
+    assert not monitor.sample_once() # Primera lectura: línea base local
+    assert monitor.sample_once()
+    alerts = monitor.get_alerts()
+    assert [a["kind"] for a in alerts] == ["local_route_changed"] and alerts[0]["tunnels"] == ["wg0"]
+    assert not monitor.sample_once() and _kinds(monitor) == [] # Sigue ahí: no se repite
+    assert not monitor.sample_once()
+
+def test_failed_samples_do_not_stop_the_monitor(samples, monkeypatch):
+    def _fail(self): raise OSError("network down")
+    monkeypatch.setattr(leak_monitor.LeakMonitor, "_sample_ip", _fail)
+    assert leak_monitor.LeakMonitor()._sample_safely() is False
+
+def test_stop_wakes_the_thread(samples):
+    _settings(leak_monitor_min_interval=60)
+    samples["ip"] += ["192.0.2.1"]
+    samples["dns"] += [["10.8.0.1"]]
+    monitor = leak_monitor.LeakMonitor(baseline_ip="192.0.2.1", baseline_dns=["10.8.0.1"])
+    monitor.start()
+    while not monitor.samples_taken: time.sleep(0.01)
+    started = time.monotonic()
+    monitor.stop()
+    assert not monitor._thread.is_alive() and time.monotonic() - started < 0.5
+
+def test_run_async_hands_alerts_to_the_loop(samples):
+    _settings(leak_monitor_min_interval=0.01)
+    samples["ip"] += ["192.0.2.1", "198.51.100.7"] + ["198.51.100.7"] * 100
+    samples["dns"] += [["10.8.0.1"]] * 102
+    monitor = leak_monitor.LeakMonitor(baseline_ip="192.0.2.1", baseline_dns=["10.8.0.1"])
+    received = []
+    async def _main():
+        task = asyncio.create_task(monitor.run_async(received.append))
+        while not received: await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError): await task
+    asyncio.run(asyncio.wait_for(_main(), timeout=5))
+    assert [alert["kind"] for alert in received] == ["ip_changed"]
@@ -0,0 +1,102 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# tests/test_local_network.py
+import platform
+
+import pytest
+
+from guardian_spy import local_network
+
+ROUTE_HEADER = "Iface\tDestination\tGateway\tFlags\tRefCnt\tUse\tMetric\tMask\tMTU\tWindow\tIRTT"
+ZERO_V6 = "0" * 32
+
+def v4_route(name, dest, gateway, mask, flags="0003", metric=100):
+    return f"{name}\t{dest}\t{gateway}\t{flags}\t0\t0\t{metric}\t{mask}\t0\t0\t0"
+
+def v6_route(name, dest, plen, next_hop=ZERO_V6, flags="00000003", metric="00000400"):
+    return f"{dest} {plen} {ZERO_V6} 00 {next_hop} {metric} 00000001 00000000 {flags} {name:>8}"
+
+@pytest.fixture
+def fake_proc(tmp_path, monkeypatch):
+    """Points local_network at a fake /proc and /sys; returns write(interfaces, v4_routes, v6_routes)."""
+    sys_net = tmp_path / "sys"
+    monkeypatch.setattr(local_network, "SYS_CLASS_NET", str(sys_net))
+    monkeypatch.setattr(local_network, "PROC_ROUTE", str(tmp_path / "route"))
+    monkeypatch.setattr(local_network, "PROC_IPV6_ROUTE", str(tmp_path / "ipv6_route"))
+    monkeypatch.setattr(local_network, "PROC_IF_INET6", str(tmp_path / "if_inet6"))
+    monkeypatch.setattr(platform, "system", lambda: "Linux")
+    def _write(interfaces, v4_routes=(), v6_routes=(), if_inet6=()):
+        for name, arphrd_type in interfaces.items():
+            (sys_net / name).mkdir(parents=True)
+            (sys_net / name / "type").write_text(f"{arphrd_type}\n")
+            (sys_net / name / "flags").write_text("0x1003\n")
+            (sys_net / name / "operstate").write_text("up\n")
+        (tmp_path / "route").write_text("\n".join([ROUTE_HEADER, *v4_routes]) + "\n")
+        (tmp_path / "ipv6_route").write_text("\n".join(v6_routes) + "\n")
+        (tmp_path / "if_inet6").write_text("\n".join(if_inet6) + "\n")
+    return _write
+
+def test_read_routes(fake_proc):
+    fake_proc({"eth0": 1}, v4_routes=[v4_route("eth0", "00000000", "0102A8C0", "00000000"),
+                                      v4_route("eth0", "0002A8C0", "00000000", "00FFFFFF", flags="0001"),
+                                      v4_route("eth1", "00000000", "00000000", "00000000", flags="0000"), # Caída
+                                      v4_route("eth1", "0000000A", "00000000", "000000FF", flags="0201")], # Reject
+               v6_routes=[v6_route("eth0", ZERO_V6, "00", next_hop="fe800000000000000000000000000001"),
+                          v6_route("lo", "0" * 31 + "1", "80")])
+    assert local_network.read_routes() == [
+        {"family": 4, "destination": "0.0.0.0/0", "prefix": 0, "gateway": "192.168.2.1", "metric": 100, "interface": "eth0"},
+        {"family": 4, "destination": "192.168.2.0/24", "prefix": 24, "gateway": "0.0.0.0", "metric": 100, "interface": "eth0"},
+        {"family": 6, "destination": "::/0", "prefix": 0, "gateway": "fe80::1", "metric": 1024, "interface": "eth0"}]
+
+def test_read_routes_without_proc_files(fake_proc):
+    assert local_network.read_routes() == [] # Ficheros inexistentes
+
+def test_covers_default():
+    route = lambda family, destination, interface: {"family": family, "destination": destination, "interface": interface}
+    is_tunnel = lambda name: name == "wg0"
+    split = [route(4, "0.0.0.0/1", "wg0"), route(4, "128.0.0.0/1", "wg0"), route(6, "::/1", "wg0"), route(6, "8000::/1", "wg0")]
+    assert local_network._covers_default(split, 4, is_tunnel) and local_network._covers_default(split, 6, is_tunnel)
+    assert not local_network._covers_default(split[:1] + split[2:3], 4, is_tunnel)
+    assert not local_network._covers_default(split[:1] + split[2:3], 6, is_tunnel) # Media división no basta
+    assert local_network._covers_default([route(6, "::/0", "wg0")], 6, is_tunnel)
+    assert not local_network._covers_default([route(6, "::/0", "eth0")], 6, is_tunnel)
+    assert not local_network._covers_default([route(4, "0.0.0.0/0", "wg0")], 6, is_tunnel) # Otra familia
+
+@pytest.mark.parametrize("family", [4, 6])
+def test_physical_default_route_is_a_warning(fake_proc, family):
+    tunnel_v4 = [v4_route("wg0", "00000000", "00000000", "00000080"), v4_route("wg0", "00000080", "00000000", "00000080")]
+    tunnel_v6 = [v6_route("wg0", ZERO_V6, "01"), v6_route("wg0", "8" + "0" * 31, "01")]
+    physical_v4, physical_v6 = [v4_route("eth0", "00000000", "0102A8C0", "00000000")], [v6_route("eth0", ZERO_V6, "00")]
+    fake_proc({"eth0": 1, "wg0": 65534}, v4_routes=physical_v4 if family == 4 else tunnel_v4,
+              v6_routes=physical_v6 if family == 6 else tunnel_v6)
+    inventory = local_network.get_local_inventory()
+    assert inventory["tunnel_interfaces"] == ["wg0"]
+    assert [f["severity"] for f in inventory["findings"]] == [local_network.SEVERITY_WARNING]
+    assert inventory["findings"][0]["message"].startswith(f"IPv{family} default route uses eth0, not the tunnel (wg0).")
+
+def test_tunnel_default_routes_are_clean(fake_proc):
+    fake_proc({"eth0": 1, "wg0": 65534}, v4_routes=[v4_route("eth0", "00000000", "0102A8C0", "00000000", metric=600),
+                                                    v4_route("wg0", "00000000", "00000000", "00000000", metric=50)],
+              v6_routes=[v6_route("wg0", ZERO_V6, "00")])
+    findings = local_network.get_local_inventory()["findings"]
+    assert findings == [{"severity": local_network.SEVERITY_INFO, "message": "All default routes go through the tunnel (wg0)."}]
+
+def test_public_ipv6_outside_the_tunnel_is_a_leak(fake_proc):
+    fake_proc({"eth0": 1, "wg0": 65534}, v4_routes=[v4_route("wg0", "00000000", "00000000", "00000000")],
+              if_inet6=["20010db8000000000000000000000001 02 40 00 00 eth0", "fd000000000000000000000000000001 03 40 00 00 eth0"])
+    findings = local_network.get_local_inventory()["findings"]
+    assert [f["severity"] for f in findings] == [local_network.SEVERITY_LEAK]
+    assert "2001:db8::1 (eth0)" in findings[0]["message"] and "fd00::1" not in findings[0]["message"]
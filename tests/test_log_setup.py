@@ -0,0 +1,44 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# tests/test_log_setup.py
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from guardian_spy import DEBUG_ENV_VAR
+
+ENTRY_POINT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "guardian_spy.py")
+
+def _run(*argv, **env):
+    return subprocess.run([sys.executable, ENTRY_POINT, *argv], capture_output=True, text=True, timeout=60,
+                          env=dict(os.environ, **env), stdin=subprocess.DEVNULL)
+
+@pytest.mark.parametrize("argv", [["--version"], ["--help"], ["profiles", "list", "--help"]])
+def test_help_and_version_do_not_configure_logging(isolated_config_dir, argv):
+    assert _run(*argv).returncode == 0
+    assert not (isolated_config_dir / "logs").exists()
+
+def test_scripted_runs_log_to_their_own_file(isolated_config_dir):
+    isolated_config_dir.mkdir(parents=True, exist_ok=True)
+    (isolated_config_dir / "settings.json").write_text(json.dumps({"browser_executables": {"firefox": "/bin/true"}}))
+    result = _run("--no-daemon", "profiles", "create", "p1", "--browser", "firefox", **{DEBUG_ENV_VAR: "1"})
+    assert result.returncode == 0 and json.loads(result.stdout)["ok"]
+    assert os.listdir(isolated_config_dir / "logs") == ["scripted.jsonl"]
+    records = [json.loads(line) for line in (isolated_config_dir / "logs" / "scripted.jsonl").read_text().splitlines()]
+    assert any(record["logger"] == "guardian_spy.config_manager" for record in records)
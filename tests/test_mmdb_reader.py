@@ -0,0 +1,138 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# tests/test_mmdb_reader.py
+import ipaddress
+import os
+import struct
+
+import pytest
+
+from guardian_spy import mmdb_reader
+
+def _ctrl(type_num: int, size: int) -> bytes:
+    if size < 29: size_field, extra = size, b""
+    elif size < 285: size_field, extra = 29, bytes([size - 29])
+    else: size_field, extra = 30, (size - 285).to_bytes(2, "big")
+    if type_num <= 7: return bytes([(type_num << 5) | size_field]) + extra
+    return bytes([size_field, type_num - 7]) + extra # Tipo extendido
+
+def encode(value) -> bytes:
+    """The MaxMind DB data section encoding of value."""
+    if isinstance(value, bool): return _ctrl(14, int(value))
+    if isinstance(value, str):
+        raw = value.encode("utf-8"); return _ctrl(2, len(raw)) + raw
+    if isinstance(value, float): return _ctrl(3, 8) + struct.pack(">d", value)
+    if isinstance(value, int) and value < 0: return _ctrl(8, 4) + value.to_bytes(4, "big", signed=True)
+    if isinstance(value, int):
+        raw = value.to_bytes(4, "big").lstrip(b"\x00"); return _ctrl(6, len(raw)) + raw
+    if isinstance(value, list): return _ctrl(11, len(value)) + b"".join(encode(item) for item in value)
+    if isinstance(value, dict): return _ctrl(7, len(value)) + b"".join(encode(k) + encode(v) for k, v in value.items())
+    raise TypeError(value)
+
+def _pack_node(left: int, right: int, record_size: int) -> bytes:
+    if record_size == 24: return left.to_bytes(3, "big") + right.to_bytes(3, "big")
+    if record_size == 28:
+        return (left & 0xFFFFFF).to_bytes(3, "big") + bytes([((left >> 24) << 4) | (right >> 24)]) + (right & 0xFFFFFF).to_bytes(3, "big")
+    return left.to_bytes(4, "big") + right.to_bytes(4, "big")
+
+def build_mmdb(networks, ip_version: int = 4, record_size: int = 24, data_prefix: bytes = b"") -> bytes:
+    """A MaxMind DB mapping each (cidr, record) of networks; everything else has no data."""
+    data, nodes = bytearray(data_prefix), [[None, None]]
+    for cidr, record in networks:
+        network = ipaddress.ip_network(cidr)
+        if ip_version == 6 and network.version == 4: network = ipaddress.ip_network(f"::{network.network_address}/{96 + network.prefixlen}")
+        bits, width = int(network.network_address), network.max_prefixlen
+        leaf = ("data", len(data)); data += record if isinstance(record, bytes) else encode(record)
+        node = 0
+        for depth in range(network.prefixlen):
+            bit = (bits >> (width - 1 - depth)) & 1
+            if depth == network.prefixlen - 1: nodes[node][bit] = leaf; break
+            if nodes[node][bit] is None: nodes.append([None, None]); nodes[node][bit] = len(nodes) - 1
+            node = nodes[node][bit]
+    node_count = len(nodes)
+    def _value(child):
+        if child is None: return node_count
+        return node_count + 16 + child[1] if isinstance(child, tuple) else child
+    tree = b"".join(_pack_node(_value(left), _value(right), record_size) for left, right in nodes)
+    metadata = encode({"node_count": node_count, "record_size": record_size, "ip_version": ip_version,
+                       "database_type": "Test-City", "binary_format_major_version": 2})
+    return tree + b"\x00" * 16 + bytes(data) + mmdb_reader.METADATA_MARKER + metadata
+
+CITY = {"country": {"names": {"en": "Spain", "es": "España"}}, "subdivisions": [{"names": {"en": "Madrid"}}],
+        "city": {"names": {"en": "Madrid"}}, "autonomous_system_organization": "Example ISP", "location": {"latitude": 40.4165}}
+
+@pytest.fixture
+def write_db(tmp_path):
+    def _write(content: bytes):
+        path = tmp_path / "test.mmdb"
+        path.write_bytes(content)
+        return str(path)
+    return _write
+
+@pytest.mark.parametrize("record_size", [24, 28, 32])
+def test_lookup_ipv4(write_db, record_size):
+    db = build_mmdb([("192.0.2.0/24", CITY), ("198.51.100.0/25", {"country": {"names": {"en": "France"}}})], record_size=record_size)
+    with mmdb_reader.MMDBReader(write_db(db)) as reader:
+        assert reader.record_size == record_size
+        assert reader.lookup_with_prefix("192.0.2.77") == (CITY, 24)
+        assert reader.lookup("198.51.100.1")["country"]["names"]["en"] == "France"
+        assert reader.lookup("198.51.100.200") is None # Fuera del /25
+        assert reader.lookup("203.0.113.1") is None
+
+def test_lookup_ipv6_database(write_db):
+    db = build_mmdb([("2001:db8::/32", {"city": {"names": {"en": "Lisbon"}}}), ("192.0.2.0/24", CITY)], ip_version=6)
+    with mmdb_reader.MMDBReader(write_db(db)) as reader:
+        assert reader.lookup("2001:db8::1")["city"]["names"]["en"] == "Lisbon"
+        assert reader.lookup("192.0.2.1") == CITY # IPv4 bajo ::/96
+        assert reader.lookup("2001:db9::1") is None
+
+def test_ipv6_lookup_in_ipv4_database(write_db):
+    with mmdb_reader.MMDBReader(write_db(build_mmdb([("192.0.2.0/24", CITY)]))) as reader:
+        with pytest.raises(ValueError): reader.lookup("2001:db8::1")
+
+def test_decoder_types(write_db):
+    record = {"bool": True, "false": False, "double": 1.5, "negative": -42, "uint": 70000, "list": ["a", 1],
+              "long": "x" * 40, "longer": "y" * 300, "nested": {"empty": {}}}
+    with mmdb_reader.MMDBReader(write_db(build_mmdb([("192.0.2.0/24", record)]))) as reader:
+        assert reader.lookup("192.0.2.1") == record
+
+def test_decoder_follows_pointers(write_db):
+    shared = encode({"names": {"en": "Spain"}}) # Offset 0 de la sección de datos
+    record = encode("country") + b"\x20\x00" # Puntero de 1 byte al offset 0
+    db = build_mmdb([("192.0.2.0/24", _ctrl(7, 1) + record)], data_prefix=shared)
+    with mmdb_reader.MMDBReader(write_db(db)) as reader:
+        assert reader.lookup("192.0.2.1") == {"country": {"names": {"en": "Spain"}}}
+
+def test_record_to_geo_info():
+    assert mmdb_reader.record_to_geo_info(CITY, "192.0.2.1") == {
+        "country": "Spain", "region": "Madrid", "city": "Madrid", "isp": "Example ISP", "org": "Example ISP", "query_ip": "192.0.2.1"}
+    assert mmdb_reader.record_to_geo_info({"registered_country": {"names": {"de": "Spanien"}}}, "192.0.2.1")["country"] == "Spanien"
+
+def test_invalid_databases(write_db):
+    with pytest.raises(mmdb_reader.InvalidDatabaseError): mmdb_reader.MMDBReader(write_db(b""))
+    with pytest.raises(mmdb_reader.InvalidDatabaseError): mmdb_reader.MMDBReader(write_db(b"not a database" * 10))
+    with pytest.raises(mmdb_reader.InvalidDatabaseError):
+        mmdb_reader.MMDBReader(write_db(mmdb_reader.METADATA_MARKER + encode({"node_count": 1})))
+    with pytest.raises(mmdb_reader.InvalidDatabaseError):
+        mmdb_reader.MMDBReader(write_db(mmdb_reader.METADATA_MARKER + encode({"node_count": 1, "record_size": 20, "ip_version": 4})))
+
+def test_get_reader_reopens_replaced_files(write_db):
+    path = write_db(build_mmdb([("192.0.2.0/24", CITY)]))
+    first = mmdb_reader.get_reader(path)
+    assert mmdb_reader.get_reader(path) is first
+    write_db(build_mmdb([("192.0.2.0/24", {"city": {"names": {"en": "Porto"}}})]))
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+    assert mmdb_reader.get_reader(path).lookup("192.0.2.1")["city"]["names"]["en"] == "Porto"
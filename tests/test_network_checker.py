@@ -0,0 +1,133 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# tests/test_network_checker.py
+import json
+import time
+
+import pytest
+
+from guardian_spy import config_manager, network_checker
+
+def _providers(*names):
+    return [{"name": name, "url": f"https://{name}.test/", "format": "text"} for name in names]
+
+@pytest.fixture
+def fake_ip_services(monkeypatch):
+    """{provider name: (delay in seconds, ip or None)} answered instead of real HTTP requests."""
+    services = {}
+    def _fetch(url, is_json, console=None, json_key="ip", cancel_event=None):
+        delay, ip = services[url.split("//", 1)[1].split(".", 1)[0]]
+        if cancel_event is not None and cancel_event.wait(delay): return None, "Cancelled"
+        if cancel_event is None: time.sleep(delay)
+        return (ip, None) if ip else (None, "Network Error: refused")
+    monkeypatch.setattr(network_checker, "_fetch_public_ip", _fetch)
+    return services
+
+def _settings(**values):
+    with open(config_manager._get_settings_file_path(), "w", encoding="utf-8") as f: json.dump(values, f)
+
+def test_first_answer_wins(fake_ip_services):
+    fake_ip_services.update(fast=(0.0, "192.0.2.1"), slow=(5.0, "192.0.2.1"))
+    started = time.monotonic()
+    result = network_checker.race_ip_providers(_providers("fast", "slow"), quorum=1, timeout=10)
+    assert (result["ip"], result["provider"], result["quorum_met"]) == ("192.0.2.1", "fast", True)
+    assert time.monotonic() - started < 1.0 # El lento se abandona tras la gracia
+
+def test_disagreement_is_seen_with_quorum_one(fake_ip_services):
+    fake_ip_services.update(fast=(0.0, "192.0.2.1"), other=(0.1, "198.51.100.9"))
+    result = network_checker.race_ip_providers(_providers("fast", "other"), quorum=1, timeout=10)
+    assert result["ip"] == "192.0.2.1" and result["disagreement"]
+    assert result["answers"] == {"fast": "192.0.2.1", "other": "198.51.100.9"}
+
+def test_no_grace_stops_at_quorum(fake_ip_services):
+    _settings(ip_disagreement_grace_s=0)
+    fake_ip_services.update(fast=(0.0, "192.0.2.1"), other=(0.2, "198.51.100.9"))
+    result = network_checker.race_ip_providers(_providers("fast", "other"), quorum=1, timeout=10)
+    assert result["answers"] == {"fast": "192.0.2.1"} and not result["disagreement"]
+
+def test_quorum_needs_agreeing_answers(fake_ip_services):
+    fake_ip_services.update(a=(0.0, "192.0.2.1"), b=(0.05, "198.51.100.9"), c=(0.1, "192.0.2.1"))
+    result = network_checker.race_ip_providers(_providers("a", "b", "c"), quorum=2, timeout=10)
+    assert (result["ip"], result["provider"], result["quorum_met"], result["disagreement"]) == ("192.0.2.1", "c", True, True)
+
+def test_quorum_not_met_returns_the_best_answer(fake_ip_services):
+    fake_ip_services.update(a=(0.0, "192.0.2.1"), b=(0.0, None))
+    result = network_checker.race_ip_providers(_providers("a", "b"), quorum=2, timeout=10)
+    assert (result["ip"], result["quorum_met"]) == ("192.0.2.1", False)
+    assert result["errors"] == {"b": "Network Error: refused"}
+
+def test_nobody_answers(fake_ip_services):
+    fake_ip_services.update(a=(0.0, None), b=(0.0, None))
+    result = network_checker.race_ip_providers(_providers("a", "b"), timeout=10)
+    assert result["ip"] is None and set(result["errors"]) == {"a", "b"}
+    assert network_checker.race_ip_providers([], timeout=1)["errors"] == {"config": "No IP providers configured"}
+
+def test_provider_stats_are_replaced_atomically(fake_ip_services, monkeypatch):
+    fake_ip_services.update(a=(0.0, "192.0.2.1"))
+    network_checker.race_ip_providers(_providers("a"), timeout=10)
+    stats_file = network_checker._get_provider_stats_file_path()
+    with open(stats_file, encoding="utf-8") as f: assert json.load(f)["a"]["successes"] >= 1
+    replaced = []
+    real_replace = network_checker.os.replace
+    monkeypatch.setattr(network_checker.os, "replace", lambda src, dst: (replaced.append(src), real_replace(src, dst)))
+    network_checker.race_ip_providers(_providers("a"), timeout=10)
+    assert replaced == [f"{stats_file}.{network_checker.os.getpid()}.tmp"]
+    assert not any(name.endswith(".tmp") for name in network_checker.os.listdir(network_checker.os.path.dirname(stats_file)))
+
+def _race_result(ip, errors=None):
+    return {"ip": ip, "provider": "fake" if ip else None, "answers": {"fake": ip} if ip else {},
+            "disagreement": False, "quorum_met": bool(ip), "errors": errors or {}}
+
+@pytest.fixture
+def fake_checks(monkeypatch):
+    """{check: (delay in seconds, value)} returned by the IP race, GeoIP and DNS lookups."""
+    checks = {network_checker.CHECK_IP: (0.0, _race_result("192.0.2.1")), network_checker.CHECK_GEO: (0.0, ({"country": "Spain"}, None)),
+              network_checker.CHECK_DNS: (0.0, ["192.0.2.53"])}
+    def _after(name):
+        def _check(*args, **kwargs):
+            delay, value = checks[name]
+            time.sleep(delay)
+            return value
+        return _check
+    monkeypatch.setattr(network_checker, "race_ip_providers", _after(network_checker.CHECK_IP))
+    monkeypatch.setattr(network_checker, "get_geo_info", _after(network_checker.CHECK_GEO))
+    monkeypatch.setattr(network_checker, "get_dns_servers", _after(network_checker.CHECK_DNS))
+    return checks
+
+def test_concurrent_checks(fake_checks):
+    reported = []
+    results = network_checker.run_network_checks_concurrently(timeout=5, on_result=lambda name, result: reported.append(name))
+    assert {name: result["status"] for name, result in results.items()} == {"ip": "ok", "geo": "ok", "dns": "ok"}
+    assert (results["ip"]["value"], results["geo"]["value"], results["dns"]["value"]) == ("192.0.2.1", {"country": "Spain"}, ["192.0.2.53"])
+    assert sorted(reported) == ["dns", "geo", "ip"]
+
+def test_overall_deadline(fake_checks):
+    fake_checks[network_checker.CHECK_DNS] = (1.5, ["192.0.2.53"])
+    fake_checks[network_checker.CHECK_GEO] = (1.5, ({"country": "Spain"}, None))
+    reported = {}
+    started = time.monotonic()
+    results = network_checker.run_network_checks_concurrently(timeout=0.3, on_result=lambda name, result: reported.setdefault(name, result["status"]))
+    assert time.monotonic() - started < 1.0 # Los hilos rezagados no se esperan
+    assert results["ip"]["status"] == "ok"
+    assert results["geo"]["status"] == results["dns"]["status"] == "timeout"
+    assert results["dns"]["error"] == "Timed out after 0.3s"
+    assert reported == {"ip": "ok", "geo": "timeout", "dns": "timeout"} # Los timeouts también se notifican
+
+def test_geo_is_skipped_without_an_ip(fake_checks):
+    fake_checks[network_checker.CHECK_IP] = (0.0, _race_result(None, {"fake": "Network Error: refused"}))
+    results = network_checker.run_network_checks_concurrently(timeout=5)
+    assert results["ip"]["status"] == "error" and results["ip"]["error"] == "Network Error: refused"
+    assert results["geo"]["status"] == "skipped" and results["dns"]["status"] == "ok"
@@ -0,0 +1,38 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# tests/test_profile_clone.py
+import json
+
+from guardian_spy import profile_clone
+
+def test_rewrite_metadata_replaces_only_the_source_path(tmp_path):
+    source, target = tmp_path / "work", tmp_path / "copy"
+    source.mkdir(); target.mkdir()
+    prefs = (f'user_pref("a", "{source}/cache");\n'
+             f'user_pref("b", "{source}_old/cache");\n' # Otro perfil cuyo nombre empieza igual
+             f'user_pref("c", "{source}");\n'
+             f"user_pref('d', '{source}old');\n")
+    (target / "prefs.js").write_text(prefs, encoding="utf-8")
+    (target / "compatibility.ini").write_bytes(f"[Compatibility]\r\nLastPlatformDir={source}\r\n".encode())
+    (target / "extensions.json").write_text(json.dumps({"path": f"{source}/extensions/a.xpi", "other": f"{source}-2"}), encoding="utf-8")
+    rewritten = profile_clone._rewrite_metadata(str(source), str(target), "firefox")
+    assert sorted(rewritten) == ["compatibility.ini", "extensions.json", "prefs.js", "times.json"]
+    assert (target / "prefs.js").read_text(encoding="utf-8") == (f'user_pref("a", "{target}/cache");\n'
+                                                                  f'user_pref("b", "{source}_old/cache");\n'
+                                                                  f'user_pref("c", "{target}");\n'
+                                                                  f"user_pref('d', '{source}old');\n")
+    assert (target / "compatibility.ini").read_bytes().endswith(f"LastPlatformDir={target}\r\n".encode())
+    assert json.loads((target / "extensions.json").read_text(encoding="utf-8")) == {"path": f"{target}/extensions/a.xpi", "other": f"{source}-2"}
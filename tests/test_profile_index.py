@@ -0,0 +1,101 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# tests/test_profile_index.py
+import os
+
+import pytest
+
+from guardian_spy import config_manager
+
+PROFILES = [
+    {"profile_name": "Work", "browser_type": "firefox", "bookmarks_set_name": "osint.json", "created_at": "2025-06-01T09:00:00"},
+    {"profile_name": "work-old", "browser_type": "chrome", "bookmarks_set_name": None, "created_at": "2025-05-15T18:30:00"},
+    {"profile_name": "Banking", "browser_type": "firefox", "bookmarks_set_name": ["osint.json", "news.json"], "created_at": "2025-06-02T00:00:00"},
+    {"profile_name": "general", "browser_type": "chromium", "bookmarks_set_name": "__GENERAL__", "created_at": "not a date"},
+    {"profile_name": "", "browser_type": "firefox"}, # Sin nombre: se ignora
+    "not a profile",
+]
+
+@pytest.fixture
+def index():
+    return config_manager.ProfileIndex(PROFILES)
+
+def _names(result):
+    page, total = result
+    return [profile["profile_name"] for profile in page], total
+
+def test_invalid_entries_are_skipped(index):
+    assert len(index) == 4
+
+def test_default_order_is_by_name(index):
+    assert _names(index.query()) == (["Banking", "general", "Work", "work-old"], 4)
+
+def test_filter_by_browser(index):
+    assert _names(index.query(browser="firefox")) == (["Banking", "Work"], 2)
+    assert _names(index.query(browser="safari")) == ([], 0)
+
+def test_filter_by_bookmarks(index):
+    assert _names(index.query(bookmarks="osint")) == (["Banking", "Work"], 2) # '.json' opcional
+    assert _names(index.query(bookmarks="news.json")) == (["Banking"], 1)
+    assert _names(index.query(bookmarks="None")) == (["work-old"], 1)
+    assert _names(index.query(bookmarks="__GENERAL__")) == (["general"], 1)
+
+def test_name_prefix_is_case_insensitive(index):
+    assert _names(index.query(name_prefix="WORK")) == (["Work", "work-old"], 2)
+    assert _names(index.query(name_prefix="work-")) == (["work-old"], 1)
+    assert _names(index.query(name_prefix="z")) == ([], 0)
+
+def test_created_range(index):
+    assert _names(index.query(created_from="2025-06-01")) == (["Banking", "Work"], 2)
+    assert _names(index.query(created_to="2025-06-01")) == (["Work", "work-old"], 2) # Fecha final: todo el día
+    assert _names(index.query(created_from="2025-05-15T18:30:00", created_to="2025-05-15T18:30:00")) == (["work-old"], 1)
+    with pytest.raises(ValueError): index.query(created_from="yesterday")
+
+def test_filters_combine(index):
+    assert _names(index.query(browser="firefox", bookmarks="osint", created_to="2025-06-01")) == (["Work"], 1)
+
+def test_sort_and_pages(index):
+    assert _names(index.query(sort="created")) == (["general", "work-old", "Work", "Banking"], 4) # Sin fecha: primero
+    assert _names(index.query(sort="created", descending=True, limit=2)) == (["Banking", "Work"], 4)
+    assert _names(index.query(sort="name", offset=1, limit=2)) == (["general", "Work"], 4)
+    assert _names(index.query(sort="name", descending=True, offset=3)) == (["Banking"], 4)
+    assert _names(index.query(browser="firefox", sort="name", descending=True, offset=1, limit=5)) == (["Banking"], 2)
+    assert _names(index.query(offset=10)) == ([], 4)
+    with pytest.raises(ValueError): index.query(sort="size")
+
+def test_results_are_copies_with_display_fields(index):
+    page, _ = index.query(name_prefix="work-old")
+    assert page[0]["bookmarks_display"] and page[0]["created_date"] == "2025-05-15"
+    page[0]["profile_name"] = "changed"
+    assert _names(index.query(name_prefix="work-old")) == (["work-old"], 1)
+
+def test_get_profile_index_follows_the_file():
+    config_manager.save_profiles_data(PROFILES[:2])
+    assert len(config_manager.get_profile_index()) == 2
+    config_manager.save_profiles_data(PROFILES[:4])
+    assert _names(config_manager.query_profiles(browser="firefox")) == (["Banking", "Work"], 2)
+
+def test_replaced_file_with_same_size_and_mtime_is_reloaded():
+    config_manager.save_profiles_data([dict(PROFILES[0], profile_name="aaaa")])
+    profiles_file = config_manager._get_profiles_data_file_path()
+    st = os.stat(profiles_file)
+    assert _names(config_manager.query_profiles()) == (["aaaa"], 1)
+    replacement = profiles_file + ".new"
+    with open(profiles_file, encoding="utf-8") as f: content = f.read()
+    with open(replacement, "w", encoding="utf-8") as f: f.write(content.replace("aaaa", "bbbb"))
+    os.utime(replacement, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(replacement, profiles_file)
+    assert _names(config_manager.query_profiles()) == (["bbbb"], 1)
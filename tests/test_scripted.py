@@ -0,0 +1,56 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# tests/test_scripted.py
+import json
+
+import pytest
+
+from guardian_spy import config_manager, scripted
+
+CORRUPT = '[{"profile_name": "work",'
+
+@pytest.fixture
+def corrupt_registry():
+    path = config_manager._get_profiles_data_file_path()
+    with open(path, "w", encoding="utf-8") as f: f.write(CORRUPT)
+    return path
+
+def _run(capsys, *argv):
+    exit_code = scripted.run(["--no-daemon", *argv])
+    return exit_code, json.loads(capsys.readouterr().out) # stdout: un único documento JSON
+
+def test_corrupt_registry_keeps_stdout_json(corrupt_registry, capsys):
+    exit_code, document = _run(capsys, "profiles", "list")
+    assert exit_code == scripted.EXIT_OK and document["profiles"] == []
+
+@pytest.mark.parametrize("argv", [("profiles", "create", "new", "--browser", "firefox"),
+                                  ("profiles", "clone", "work", "copy"),
+                                  ("profiles", "delete", "work")])
+def test_changes_never_overwrite_a_corrupt_registry(corrupt_registry, capsys, argv):
+    exit_code, document = _run(capsys, *argv)
+    assert exit_code == scripted.EXIT_FAILED
+    assert document["ok"] is False and document["error"]["code"] == "registry_unreadable"
+    with open(corrupt_registry, encoding="utf-8") as f: assert f.read() == CORRUPT
+
+def test_no_daemon_after_the_subcommand(capsys):
+    assert scripted.run(["profiles", "list", "--no-daemon"]) == scripted.EXIT_OK
+    assert json.loads(capsys.readouterr().out)["profiles"] == []
+
+def test_strict_load():
+    assert config_manager.load_profiles_data(strict=True) == [] # Sin fichero no es un error
+    with open(config_manager._get_profiles_data_file_path(), "w", encoding="utf-8") as f: json.dump({"not": "a list"}, f)
+    assert config_manager.load_profiles_data() == []
+    with pytest.raises(config_manager.ProfilesDataError): config_manager.load_profiles_data(strict=True)
@@ -0,0 +1,154 @@
+# Copyright (C) 2025 Kanarath.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# tests/test_session_journal.py
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from guardian_spy import browser_manager, session_journal
+
+def _line(event, path="/tmp/gs-profile", **fields):
+    return json.dumps({"event": event, "path": path, "owner": 100, **fields})
+
+def test_live_temporary_session():
+    state = session_journal._fold([_line("created", browser="firefox"), _line("started", pid=4321, detached=True)])
+    assert state == {"/tmp/gs-profile": {"path": "/tmp/gs-profile", "temporary": True, "pid": 4321, "detached": True,
+                                         "ended": False, "owner": 100, "browser": "firefox"}}
+
+def test_ended_temporary_session_still_needs_cleanup():
+    state = session_journal._fold([_line("created"), _line("started", pid=1), _line("ended")])
+    assert state["/tmp/gs-profile"]["ended"] and state["/tmp/gs-profile"]["temporary"]
+
+def test_cleaned_sessions_are_dropped():
+    assert session_journal._fold([_line("created"), _line("started", pid=1), _line("ended"), _line("cleaned")]) == {}
+    assert session_journal._fold([_line("created"), _line("cleaned")]) == {}
+
+def test_persistent_profiles_are_dropped_when_they_end():
+    lines = [_line("started", path="/profiles/work", pid=7)]
+    assert session_journal._fold(lines)["/profiles/work"]["temporary"] is False
+    assert session_journal._fold(lines + [_line("ended", path="/profiles/work")]) == {}
+
+def test_restart_after_end():
+    state = session_journal._fold([_line("created"), _line("started", pid=1), _line("ended"), _line("started", pid=2)])
+    assert state["/tmp/gs-profile"]["pid"] == 2 and state["/tmp/gs-profile"]["ended"] is False
+
+def test_sessions_are_independent():
+    state = session_journal._fold([_line("created", path="/tmp/a"), _line("created", path="/tmp/b"), _line("cleaned", path="/tmp/a")])
+    assert list(state) == ["/tmp/b"]
+
+def test_malformed_lines_are_skipped():
+    lines = [_line("created"), '{"event": "started", "path": "/tmp/gs-prof', # Línea a medias
+             "[1, 2]", json.dumps({"event": "cleaned"}), "not json", _line("started", pid=9)]
+    state = session_journal._fold(lines)
+    assert state["/tmp/gs-profile"]["pid"] == 9 and state["/tmp/gs-profile"]["temporary"]
+
+def _journal_state():
+    with session_journal._open_locked(exclusive=False) as fd: return session_journal._fold(session_journal._read_lines(fd))
+
+def test_record_and_compact():
+    session_journal.record("created", "/tmp/gs-journal", browser="chrome")
+    session_journal.record("started", "/tmp/gs-journal", pid=123, detached=False)
+    session_journal.record("created", "/tmp/gs-done")
+    session_journal.record("cleaned", "/tmp/gs-done")
+    state = _journal_state()
+    assert list(state) == ["/tmp/gs-journal"] and state["/tmp/gs-journal"]["pid"] == 123
+    assert session_journal.compact() == 1
+    with open(session_journal.get_journal_path(), encoding="utf-8") as f: assert "/tmp/gs-done" not in f.read()
+    assert _journal_state() == state
+
+@pytest.fixture
+def temp_profiles_dir(tmp_path, monkeypatch):
+    path = tmp_path / "temp_profiles"
+    path.mkdir()
+    monkeypatch.setattr(browser_manager, "get_temp_profiles_dir", lambda: str(path))
+    return path
+
+@pytest.fixture
+def fake_browser():
+    """Starts a process whose command line names the profile, as a browser's does."""
+    processes = []
+    def _start(profile_path):
+        process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)", "--profile", str(profile_path)])
+        processes.append(process)
+        return process
+    yield _start
+    for process in processes:
+        if process.poll() is None: process.kill()
+        process.wait()
+
+@pytest.fixture
+def dead_owner():
+    """The PID of a Guardian Spy process that is gone (killed without cleaning up)."""
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def _write_journal(*entries):
+    os.makedirs(os.path.dirname(session_journal.get_journal_path()), exist_ok=True)
+    with open(session_journal.get_journal_path(), "a", encoding="utf-8") as f:
+        f.writelines(json.dumps(entry) + "\n" for entry in entries)
+
+def _journal_lines():
+    with open(session_journal.get_journal_path(), encoding="utf-8") as f: return [json.loads(line) for line in f if line.strip()]
+
+def test_recover_kills_orphaned_browsers_and_removes_their_profiles(temp_profiles_dir, fake_browser, dead_owner):
+    profile = temp_profiles_dir / "gs-orphan"
+    profile.mkdir()
+    browser = fake_browser(profile)
+    _write_journal({"event": "created", "path": str(profile), "owner": dead_owner, "browser": "firefox"},
+                   {"event": "started", "path": str(profile), "owner": dead_owner, "pid": browser.pid, "detached": False})
+    summary = session_journal.recover()
+    assert (summary["browsers_killed"], summary["profiles_removed"], summary["unresolved"]) == (1, 1, 0)
+    assert browser.wait(timeout=5) is not None and not profile.exists()
+    assert _journal_lines() == [] # Compactado: no queda nada vivo
+
+def test_recover_leaves_live_owners_and_detached_browsers(temp_profiles_dir, fake_browser, dead_owner):
+    mine, detached = temp_profiles_dir / "gs-mine", temp_profiles_dir / "gs-detached"
+    mine.mkdir(); detached.mkdir()
+    browser = fake_browser(detached)
+    _write_journal({"event": "created", "path": str(mine), "owner": os.getpid()}, # Otra sesión viva (este proceso)
+                   {"event": "created", "path": str(detached), "owner": dead_owner},
+                   {"event": "started", "path": str(detached), "owner": dead_owner, "pid": browser.pid, "detached": True})
+    summary = session_journal.recover()
+    assert (summary["browsers_killed"], summary["profiles_removed"], summary["unresolved"]) == (0, 0, 1)
+    assert browser.poll() is None and mine.exists() and detached.exists()
+    assert {entry["path"] for entry in _journal_lines()} == {str(mine), str(detached)}
+
+def test_recover_cleans_ended_sessions_and_drops_dead_history(temp_profiles_dir, dead_owner):
+    ended = temp_profiles_dir / "gs-ended"
+    ended.mkdir()
+    _write_journal({"event": "created", "path": str(ended), "owner": dead_owner},
+                   {"event": "started", "path": str(ended), "owner": dead_owner, "pid": dead_owner},
+                   {"event": "ended", "path": str(ended), "owner": dead_owner, "exit_code": 0},
+                   {"event": "started", "path": "/profiles/work", "owner": dead_owner, "pid": 1},
+                   {"event": "ended", "path": "/profiles/work", "owner": dead_owner})
+    summary = session_journal.recover()
+    assert (summary["browsers_killed"], summary["profiles_removed"], summary["unresolved"]) == (0, 1, 0)
+    assert not ended.exists() and _journal_lines() == []
+
+def test_recover_never_removes_paths_outside_the_temp_dir(temp_profiles_dir, tmp_path, dead_owner):
+    elsewhere = tmp_path / "not-a-temp-profile"
+    elsewhere.mkdir()
+    _write_journal({"event": "created", "path": str(elsewhere), "owner": dead_owner})
+    summary = session_journal.recover()
+    assert summary["unresolved"] == 1 and elsewhere.exists()
+    assert [entry["path"] for entry in _journal_lines()] == [str(elsewhere)]
+
+def test_recover_without_a_journal():
+    assert session_journal.recover() == {"sessions": [], "browsers_killed": 0, "profiles_removed": 0, "unresolved": 0}